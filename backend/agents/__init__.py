@@ -9,9 +9,16 @@ from .agent import (
     AgentState,
     create_agent,
 )
+from .agent_pool import AgentPool
+from .checkpointer import BoundedSqliteSaver
+from .thread_summary import ThreadStateSummary, ThreadSummaryStore
 
 __all__ = [
     "BAAgent",
     "AgentState",
     "create_agent",
+    "AgentPool",
+    "BoundedSqliteSaver",
+    "ThreadStateSummary",
+    "ThreadSummaryStore",
 ]
@@ -4,9 +4,12 @@ BA-Agent 主 Agent 类
 使用 LangGraph 和 Claude 3.5 Sonnet 实现
 """
 
+import asyncio
+import copy
 import os
 import threading
 import time
+from contextvars import ContextVar
 from typing import Any, Dict, List, Optional, Sequence, TypedDict
 from datetime import datetime
 from pathlib import Path
@@ -14,9 +17,10 @@ from pathlib import Path
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import BaseTool
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_anthropic import ChatAnthropic
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 # LangGraph V2.0 迁移 - 使用新的 langchain.agents API
 # 使用别名避免与本地 create_agent 便捷函数冲突
@@ -33,8 +37,9 @@ from backend.models.agent import (
     MessageType,
     AgentConfig as AgentConfigModel,
 )
-from backend.memory.flush import MemoryFlush, MemoryFlushConfig, MemoryExtractor
+from backend.memory.flush import MemoryFlush, MemoryFlushConfig, MemoryExtractor, get_memory_flush_worker
 from backend.memory.index import MemoryIndexer, MemoryWatcher, get_index_db_path
+from backend.memory.line_index import get_line_index
 # NEW: Skills system integration
 from backend.skills import (
     SkillLoader,
@@ -56,6 +61,8 @@ from backend.pipeline import (
 # NEW: Context Coordinator integration
 from backend.core.context_coordinator import create_context_coordinator
 from backend.core.context_manager import create_context_manager
+from backend.agents.sync_executor import run_sync
+from backend.agents.thread_summary import ThreadStateSummary, ThreadSummaryStore
 
 # Monitoring integration
 from backend.monitoring import (
@@ -72,6 +79,26 @@ logger = logging.getLogger(__name__)
 # Clawdbot 风格的静默响应标记
 SILENT_REPLY_TOKEN = "_SILENT_"
 
+# 单次调用的监控和会话状态按 contextvars 隔离：
+# 同一个 BAAgent 上并发的异步调用（各自的 asyncio task）互不覆盖
+_invocation_tracer: ContextVar[Optional[ExecutionTracer]] = ContextVar(
+    "ba_agent_tracer", default=None
+)
+_invocation_metrics: ContextVar[Optional[MetricsCollector]] = ContextVar(
+    "ba_agent_metrics", default=None
+)
+_invocation_session_id: ContextVar[Optional[str]] = ContextVar(
+    "ba_agent_session_id", default=None
+)
+
+
+def _is_async_tool(tool: BaseTool) -> bool:
+    """工具是否有原生协程实现（否则 ainvoke 只是把同步函数丢进默认执行器）"""
+    if hasattr(tool, "coroutine"):
+        # StructuredTool / Tool: 只有提供了 coroutine 才是原生异步
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
 
 class AgentState(TypedDict):
     """Agent 状态定义"""
@@ -179,14 +206,87 @@ class BAAgent:
         # 会话 token 跟踪
         self.session_tokens = 0
         self.compaction_count = 0
+        # 线程状态摘要（消息数、token 总数、最近压缩），由图节点增量更新；
+        # 派生实例共享 checkpointer，也共享摘要
+        self.thread_summaries = ThreadSummaryStore()
         # Memory Flush 状态追踪 (Clawdbot 风格)
         self.memory_flush_compaction_count: Optional[int] = None
 
-        # Monitoring: Execution tracer and metrics collector (lazy initialization)
-        self._tracer: Optional[ExecutionTracer] = None
-        self._metrics_collector: Optional[MetricsCollector] = None
+        # Monitoring: Execution tracer and metrics collector (lazy initialization,
+        # stored per invocation in contextvars, see _tracer / _metrics_collector)
         self._monitoring_enabled: bool = True  # Can be controlled via config
 
+    # ------------------------------------------------------------------
+    # 单次调用状态（contextvars，并发调用互相隔离）
+    # ------------------------------------------------------------------
+
+    @property
+    def _tracer(self) -> Optional[ExecutionTracer]:
+        return _invocation_tracer.get()
+
+    @_tracer.setter
+    def _tracer(self, value: Optional[ExecutionTracer]) -> None:
+        _invocation_tracer.set(value)
+
+    @property
+    def _metrics_collector(self) -> Optional[MetricsCollector]:
+        return _invocation_metrics.get()
+
+    @_metrics_collector.setter
+    def _metrics_collector(self, value: Optional[MetricsCollector]) -> None:
+        _invocation_metrics.set(value)
+
+    @property
+    def _current_session_id(self) -> Optional[str]:
+        return _invocation_session_id.get()
+
+    @_current_session_id.setter
+    def _current_session_id(self, value: Optional[str]) -> None:
+        _invocation_session_id.set(value)
+
+    def derive(self, config: AgentConfigModel, api_key: Optional[str] = None) -> "BAAgent":
+        """
+        基于当前实例派生一个使用不同模型/API Key 的 Agent
+
+        只重建与模型相关的部分（LLM 客户端、上下文压缩器、Memory Flush、
+        LangGraph 图），工具、Skills 加载器/注册表、系统提示词、checkpointer
+        和上下文协调器与当前实例共享。Memory Watcher 由当前实例持有，
+        派生实例不启动。
+
+        Args:
+            config: 派生 Agent 的配置
+            api_key: API 密钥（可选，默认按环境变量/配置获取）
+
+        Returns:
+            新的 BAAgent 实例
+        """
+        agent = copy.copy(self)
+        agent.config = config
+        agent._api_key = api_key
+        agent.llm = agent._init_llm()
+
+        # 与 __init__ 一致：图在 skill_tool 加入工具列表之前构建
+        agent.tools = [t for t in self.tools if t is not self.skill_tool]
+        agent.agent = agent._create_agent()
+        if agent.skill_tool:
+            agent.tools.append(agent.skill_tool)
+
+        agent.memory_flush = agent._init_memory_flush()
+        agent.memory_watcher = None
+        agent.context_manager = AdvancedContextManager(
+            max_tokens=self.app_config.llm.max_tokens,
+            compression_mode=CompressionMode.EXTRACT,
+            llm_summarizer=agent.llm,
+            token_counter=self.token_counter,
+        )
+
+        # 单实例状态
+        agent._active_skill_context = {}
+        agent.session_tokens = 0
+        agent.compaction_count = 0
+        agent.memory_flush_compaction_count = None
+        return agent
+
     def _load_default_config(self) -> AgentConfigModel:
         """
         从全局配置加载默认 Agent 配置
@@ -293,14 +393,19 @@ class BAAgent:
         获取 Anthropic API 密钥
 
         优先级:
-        1. 环境变量 ANTHROPIC_API_KEY
-        2. 环境变量 BA_ANTHROPIC_API_KEY
-        3. 配置文件中的值
+        1. 请求指定的密钥（_api_key）
+        2. 环境变量 ANTHROPIC_API_KEY
+        3. 环境变量 BA_ANTHROPIC_API_KEY
+        4. 配置文件中的值
 
         Returns:
             API 密钥
         """
-        # 首先检查环境变量
+        # 请求指定的密钥（derive 或在 __init__ 之前设置 _api_key）
+        if getattr(self, "_api_key", None):
+            return self._api_key
+
+        # 其次检查环境变量
         api_key = os.environ.get("ANTHROPIC_API_KEY") or os.environ.get(
             "BA_ANTHROPIC_API_KEY"
         )
@@ -490,11 +595,18 @@ class BAAgent:
         # 创建 watch 路径列表
         watch_paths = [Path(p) for p in watcher_config.watch_paths]
 
+        # memory_search 的行级索引跟随同一变更通知更新
+        for path in watch_paths:
+            if path.is_dir():
+                get_line_index(path).attach(indexer)
+
         # 创建 MemoryWatcher
         watcher = MemoryWatcher(
             indexer=indexer,
             watch_paths=watch_paths,
             debounce_seconds=watcher_config.debounce_seconds,
+            backend=watcher_config.backend,
+            scan_interval=watcher_config.check_interval_seconds,
         )
 
         # 创建包装器
@@ -661,6 +773,7 @@ class BAAgent:
 
         # Update state with new messages
         self.agent.update_state(config, {"messages": current_messages})
+        self.thread_summaries.invalidate(conversation_id)
 
         logger.debug(f"Injected {len(messages_data)} messages into conversation {conversation_id}")
 
@@ -887,6 +1000,7 @@ class BAAgent:
         conversation_id: str,
         messages: List[BaseMessage],
         current_tokens: int,
+        total_tokens: Optional[int] = None,
     ) -> Optional[Dict[str, Any]]:
         """
         检查是否需要触发 Memory Flush
@@ -897,8 +1011,9 @@ class BAAgent:
 
         Args:
             conversation_id: 对话 ID
-            messages: 消息列表
+            messages: 加入 Memory Flush 缓存的消息（调用路径只传本轮新增的消息）
             current_tokens: 当前使用的 token 数
+            total_tokens: 对话的 token 总数（来自线程状态摘要；None 时按 messages 计数）
 
         Returns:
             Flush 结果，如果未触发则返回 None
@@ -907,10 +1022,13 @@ class BAAgent:
             return None
 
         # v2.1: 使用 DynamicTokenCounter 精确计算
-        try:
-            actual_tokens = self.token_counter.count_messages(messages)
-        except Exception:
-            actual_tokens = current_tokens  # 降级
+        if total_tokens is not None:
+            actual_tokens = total_tokens
+        else:
+            try:
+                actual_tokens = self.token_counter.count_messages(messages)
+            except Exception:
+                actual_tokens = current_tokens  # 降级
 
         # 始终更新消息缓存（积累上下文）
         for msg in messages:
@@ -926,6 +1044,9 @@ class BAAgent:
         # 记录当前 compaction_count
         self.memory_flush_compaction_count = self.compaction_count
 
+        if self._memory_flush_in_background():
+            return self._schedule_memory_flush(conversation_id, actual_tokens)
+
         # 检查并触发 flush
         result = self.memory_flush.check_and_flush(actual_tokens)
 
@@ -939,31 +1060,90 @@ class BAAgent:
                 f"{result['memories_written']} memories written"
             )
 
-            # v2.1: 使用 AdvancedContextManager 执行智能压缩
-            # 获取当前状态以获取完整消息列表
-            config = {"configurable": {"thread_id": conversation_id}}
-            state = self.agent.get_state(config)
-            all_messages = list(state.messages.get("messages", [])) if state else []
-
-            if all_messages:
-                # 智能压缩到 50% 容量
-                target_tokens = int(self.app_config.llm.max_tokens * 0.5)
-                compressed = self.context_manager.compress(
-                    all_messages,
-                    target_tokens=target_tokens,
-                    mode=CompressionMode.EXTRACT,
-                )
-                self.agent.update_state(config, {"messages": compressed})
+            self._compress_after_flush(conversation_id, actual_tokens)
 
-                logger.info(
-                    f"Context compressed (v2.1): {len(all_messages)} -> {len(compressed)} messages, "
-                    f"tokens: {actual_tokens} -> {self.token_counter.count_messages(compressed)}"
-                )
+        return result if result["flushed"] else None
 
-            # 重置 token 计数
-            self.session_tokens = 0
+    def _memory_flush_in_background(self) -> bool:
+        """是否在后台执行 Memory Flush（memory.flush.background，默认开启）"""
+        background = getattr(self.app_config.memory.flush, "background", True)
+        return background if isinstance(background, bool) else True
 
-        return result if result["flushed"] else None
+    def _schedule_memory_flush(
+        self,
+        conversation_id: str,
+        actual_tokens: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        将 Memory Flush 提交到后台执行器并立即压缩上下文
+
+        消息缓存的快照交给后台线程提取和写入，压缩不等待 LLM 提取；
+        执行器保证同一 compaction 周期最多提交一次。
+
+        Args:
+            conversation_id: 对话 ID
+            actual_tokens: 当前 token 数
+
+        Returns:
+            调度结果，未调度时返回 None
+        """
+        if not self.memory_flush.should_flush(actual_tokens):
+            return None
+
+        cycle = self.compaction_count
+        future = get_memory_flush_worker().submit(
+            self.memory_flush,
+            cycle=cycle,
+            current_tokens=actual_tokens,
+        )
+        if future is None:
+            return None
+
+        reason = self.memory_flush._get_flush_reason(actual_tokens)
+        logger.info(f"Memory Flush scheduled in background (cycle {cycle}): {reason}")
+
+        self.compaction_count += 1
+        self._compress_after_flush(conversation_id, actual_tokens)
+
+        return {
+            "scheduled": True,
+            "cycle": cycle,
+            "reason": reason,
+            "future": future,
+        }
+
+    def _compress_after_flush(self, conversation_id: str, actual_tokens: int) -> None:
+        """
+        Memory Flush 之后压缩对话上下文并重置 token 计数
+
+        Args:
+            conversation_id: 对话 ID
+            actual_tokens: 压缩前的 token 数
+        """
+        # v2.1: 使用 AdvancedContextManager 执行智能压缩
+        # 获取当前状态以获取完整消息列表
+        config = {"configurable": {"thread_id": conversation_id}}
+        state = self.agent.get_state(config)
+        all_messages = list(state.messages.get("messages", [])) if state else []
+
+        if all_messages:
+            # 智能压缩到 50% 容量
+            target_tokens = int(self.app_config.llm.max_tokens * 0.5)
+            compressed = self.context_manager.compress(
+                all_messages,
+                target_tokens=target_tokens,
+                mode=CompressionMode.EXTRACT,
+            )
+            self.agent.update_state(config, {"messages": compressed})
+            self.thread_summaries.mark_compacted(conversation_id, self.compaction_count)
+
+            logger.info(
+                f"Context compressed (v2.1): {len(all_messages)} -> {len(compressed)} messages, "
+                f"tokens: {actual_tokens} -> {self.token_counter.count_messages(compressed)}"
+            )
+
+        # 重置 token 计数
+        self.session_tokens = 0
 
     def _compact_conversation(
         self,
@@ -987,6 +1167,11 @@ class BAAgent:
             是否成功压缩
         """
         try:
+            # 摘要显示消息数不足时无需加载对话历史
+            summary = self.thread_summaries.get(conversation_id)
+            if summary and summary.synced and summary.message_count <= keep_recent:
+                return False
+
             config = {"configurable": {"thread_id": conversation_id}}
             state = self.agent.get_state(config)
 
@@ -1010,6 +1195,7 @@ class BAAgent:
 
             # 更新状态
             self.agent.update_state(config, {"messages": compressed_messages})
+            self.thread_summaries.mark_compacted(conversation_id, self.compaction_count)
 
             logger.info(
                 f"Conversation compacted (v2.1): {len(all_messages)} -> {len(compressed_messages)} "
@@ -1092,7 +1278,7 @@ class BAAgent:
             # 默认继续
             return "end"
 
-        def convert_to_tool_call(state: AgentState) -> dict:
+        def _convert_to_tool_call(state: AgentState) -> dict:
             """
             将结构化 JSON 响应转换为 LangChain 工具调用
 
@@ -1146,27 +1332,25 @@ class BAAgent:
 
             return {"messages": messages}
 
-        def call_model(state: AgentState) -> dict:
-            """
-            调用 LLM 进行决策
-
-            输入包含系统提示词和用户消息
+        def convert_to_tool_call(state: AgentState, config: RunnableConfig) -> dict:
+            """转换工具调用并记录追加到线程的消息"""
+            update = _convert_to_tool_call(state)
+            self._record_thread_messages(config, update["messages"])
+            return update
 
-            重要：只返回新增的消息（AI 响应），而不是完整的消息列表
-            这样 LangGraph 会将其追加到现有状态，而不是替换
+        def prepare_model_call(state: AgentState):
+            """
+            准备 LLM 调用：清理文件内容、插入系统提示词、创建监控 span
 
             注意：文件内容清理通过 ContextCoordinator 统一处理
             """
-            import time
-            llm_start = time.time()
-
             messages = list(state["messages"])
 
             # 使用 ContextCoordinator 清理大文件内容
             # 这样确保文件清理逻辑统一在 ContextManager 中
             messages = self._context_coordinator.prepare_messages(
                 messages,
-                session_id=getattr(self, '_current_session_id', None)
+                session_id=self._current_session_id
             )
 
             # 确保第一条消息是系统提示词
@@ -1175,8 +1359,7 @@ class BAAgent:
 
             # Monitoring: Create LLM span
             llm_span = None
-            tracer = getattr(self, '_tracer', None)
-            metrics = getattr(self, '_metrics_collector', None)
+            tracer = self._tracer
 
             if tracer:
                 llm_span = tracer.create_span(
@@ -1188,67 +1371,150 @@ class BAAgent:
                     }
                 )
 
+            return messages, llm_span
+
+        def record_model_call(response, llm_span, llm_start: float) -> None:
+            """记录 LLM 调用的耗时和 token 使用"""
+            tracer = self._tracer
+            metrics = self._metrics_collector
+
+            # Calculate duration and tokens
+            llm_duration_ms = (time.time() - llm_start) * 1000
+
+            # Extract token usage from response
+            input_tokens = 0
+            output_tokens = 0
+            if hasattr(response, 'usage_metadata'):
+                usage = response.usage_metadata or {}
+                input_tokens = usage.get('input_tokens', 0)
+                output_tokens = usage.get('output_tokens', 0)
+            elif hasattr(response, 'response_metadata'):
+                metadata = response.response_metadata or {}
+                if 'usage' in metadata:
+                    usage = metadata['usage']
+                    input_tokens = usage.get('input_tokens', 0)
+                    output_tokens = usage.get('output_tokens', 0)
+
+            # Record metrics
+            if metrics:
+                metrics.record_llm_call(
+                    model=self.config.model,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    duration_ms=llm_duration_ms
+                )
+
+            # Add event to span
+            if tracer and llm_span:
+                tracer.add_event("llm_response", {
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "duration_ms": llm_duration_ms,
+                })
+                tracer.end_span(llm_span, SpanStatus.SUCCESS)
+
+        def record_model_error(e: Exception, llm_span) -> None:
+            """记录 LLM 调用失败"""
+            tracer = self._tracer
+            metrics = self._metrics_collector
+
+            if tracer and llm_span:
+                tracer.add_event("llm_error", {
+                    "error_type": type(e).__name__,
+                    "error_message": str(e),
+                })
+                tracer.end_span(llm_span, SpanStatus.ERROR)
+
+            if metrics:
+                metrics.record_error("LLMError", str(e))
+
+        def call_model(state: AgentState, config: RunnableConfig) -> dict:
+            """
+            调用 LLM 进行决策
+
+            输入包含系统提示词和用户消息
+
+            重要：只返回新增的消息（AI 响应），而不是完整的消息列表
+            这样 LangGraph 会将其追加到现有状态，而不是替换
+            """
+            llm_start = time.time()
+            messages, llm_span = prepare_model_call(state)
+
             # 调用 LLM
             try:
                 response = self.llm.invoke(messages)
+            except Exception as e:
+                record_model_error(e, llm_span)
+                raise
 
-                # Calculate duration and tokens
-                llm_duration_ms = (time.time() - llm_start) * 1000
+            record_model_call(response, llm_span, llm_start)
+            self._record_thread_messages(config, [response])
 
-                # Extract token usage from response
-                input_tokens = 0
-                output_tokens = 0
-                if hasattr(response, 'usage_metadata'):
-                    usage = response.usage_metadata or {}
-                    input_tokens = usage.get('input_tokens', 0)
-                    output_tokens = usage.get('output_tokens', 0)
-                elif hasattr(response, 'response_metadata'):
-                    metadata = response.response_metadata or {}
-                    if 'usage' in metadata:
-                        usage = metadata['usage']
-                        input_tokens = usage.get('input_tokens', 0)
-                        output_tokens = usage.get('output_tokens', 0)
-
-                # Record metrics
-                if metrics:
-                    metrics.record_llm_call(
-                        model=self.config.model,
-                        input_tokens=input_tokens,
-                        output_tokens=output_tokens,
-                        duration_ms=llm_duration_ms
-                    )
+            # 只返回新增的 AI 响应，让 LangGraph 追加到状态
+            return {"messages": [response]}
 
-                # Add event to span
-                if tracer and llm_span:
-                    tracer.add_event("llm_response", {
-                        "input_tokens": input_tokens,
-                        "output_tokens": output_tokens,
-                        "duration_ms": llm_duration_ms,
-                    })
-                    tracer.end_span(llm_span, SpanStatus.SUCCESS)
+        async def acall_model(state: AgentState, config: RunnableConfig) -> dict:
+            """call_model 的异步版本（图通过 ainvoke/astream 执行时使用）"""
+            llm_start = time.time()
+            messages, llm_span = prepare_model_call(state)
 
+            try:
+                response = await self.llm.ainvoke(messages)
             except Exception as e:
-                if tracer and llm_span:
-                    tracer.add_event("llm_error", {
-                        "error_type": type(e).__name__,
-                        "error_message": str(e),
-                    })
-                    tracer.end_span(llm_span, SpanStatus.ERROR)
-
-                if metrics:
-                    metrics.record_error("LLMError", str(e))
-
+                record_model_error(e, llm_span)
                 raise
 
-            # 只返回新增的 AI 响应，让 LangGraph 追加到状态
+            record_model_call(response, llm_span, llm_start)
+            self._record_thread_messages(config, [response])
+
             return {"messages": [response]}
 
+        def call_tools(state: AgentState, config: RunnableConfig) -> dict:
+            """执行工具调用（同步路径）"""
+            result = tool_node.invoke(state, config)
+            self._record_thread_messages(config, result.get("messages", []) if isinstance(result, dict) else [])
+            return result
+
+        async def acall_tools(state: AgentState, config: RunnableConfig) -> dict:
+            """
+            执行工具调用（异步路径）
+
+            本轮请求的工具都有原生协程时直接 await；否则整个工具节点交给
+            有界的同步执行器，避免同步工具（Docker、SQL、文件 I/O）阻塞事件循环
+            """
+            last_message = state["messages"][-1] if state["messages"] else None
+            tool_calls = getattr(last_message, "tool_calls", None) or []
+            requested = [tool_node.tools_by_name.get(call["name"]) for call in tool_calls]
+
+            # 流式调用（stream_mode 含 custom）时推送工具开始/结束事件，否则为空操作
+            writer = get_stream_writer()
+            for call in tool_calls:
+                writer({"event": "tool_start", "id": call.get("id"), "name": call["name"], "args": call.get("args", {})})
+            tools_start = time.time()
+
+            if requested and all(tool is not None and _is_async_tool(tool) for tool in requested):
+                result = await tool_node.ainvoke(state, config)
+            else:
+                result = await run_sync(tool_node.invoke, state, config)
+
+            duration_ms = (time.time() - tools_start) * 1000
+            for message in result.get("messages", []) if isinstance(result, dict) else []:
+                writer({
+                    "event": "tool_end",
+                    "id": getattr(message, "tool_call_id", None),
+                    "name": getattr(message, "name", None),
+                    "status": getattr(message, "status", "success"),
+                    "duration_ms": duration_ms,
+                })
+            self._record_thread_messages(config, result.get("messages", []) if isinstance(result, dict) else [])
+            return result
+
         # 构建图
         workflow = StateGraph(AgentState)
 
         # 添加节点
-        workflow.add_node("agent", call_model)
-        workflow.add_node("tools", tool_node)
+        workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model, name="agent"))
+        workflow.add_node("tools", RunnableLambda(call_tools, afunc=acall_tools, name="tools"))
         workflow.add_node("convert_to_tool_call", convert_to_tool_call)
 
         # 设置入口点
@@ -1332,31 +1598,53 @@ class BAAgent:
                 logger.warning(f"Failed to save trace: {e}")
 
         # Reset for next conversation
+        self._clear_invocation_state()
+
+    def _record_thread_messages(self, config: Optional[RunnableConfig], messages: Sequence[BaseMessage]) -> None:
+        """
+        记录追加到线程的消息（图节点和调用输入），增量更新线程状态摘要
+
+        Args:
+            config: 运行配置（从 configurable.thread_id 获取线程）
+            messages: 追加的消息
+        """
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        summaries = getattr(self, "thread_summaries", None)
+        if thread_id is None or summaries is None or not messages:
+            return
+        summaries.record(str(thread_id), messages, self.token_counter)
+
+    def get_thread_summary(self, conversation_id: str) -> Optional[ThreadStateSummary]:
+        """
+        获取对话的状态摘要（不加载对话历史）
+
+        Args:
+            conversation_id: 对话 ID
+
+        Returns:
+            摘要，本进程中尚未记录该对话时返回 None
+        """
+        return self.thread_summaries.get(conversation_id)
+
+    def _clear_invocation_state(self) -> None:
+        """清理单次调用的监控和会话状态"""
         self._tracer = None
         self._metrics_collector = None
+        self._current_session_id = None
 
-    def invoke(
+    def _start_invocation(
         self,
         message: str,
-        conversation_id: Optional[str] = None,
-        user_id: Optional[str] = None,
-        config: Optional[RunnableConfig] = None,
-        session_id: Optional[str] = None,
-        file_context: Optional[Dict[str, Any]] = None,
+        conversation_id: Optional[str],
+        user_id: Optional[str],
+        config: Optional[RunnableConfig],
+        session_id: Optional[str],
     ) -> Dict[str, Any]:
         """
-        调用 Agent
-
-        Args:
-            message: 用户消息
-            conversation_id: 对话 ID
-            user_id: 用户 ID
-            config: 可选的运行配置
-            session_id: 会话 ID（用于代码列表，传递给 ContextCoordinator）
-            file_context: 文件上下文（可选，用于文件上下文处理）
+        准备一次调用：创建监控 span、生成 ID、构建输入和运行配置
 
         Returns:
-            Agent 响应结果
+            调用上下文（conversation_id, user_id, config, messages, tracer, root_span）
         """
         # Initialize monitoring
         tracer = None
@@ -1385,11 +1673,6 @@ class BAAgent:
         if user_id is None:
             user_id = "user_default"
 
-        # 准备输入消息
-        # 注意：如果 file_context 存在，需要将其添加到消息中
-        # 这里暂时不做处理，由 BAAgentService 层处理
-        messages = [HumanMessage(content=message)]
-
         # 准备配置
         if config is None:
             config = {}
@@ -1397,27 +1680,149 @@ class BAAgent:
         # 添加线程 ID 用于记忆
         config["configurable"] = {"thread_id": conversation_id}
 
+        # 注意：file_context 由 BAAgentService 层拼接到消息中
+        messages = [HumanMessage(content=message)]
+
+        # 本轮之前的消息数（摘要已同步时），用于只把本轮新增的消息交给 Memory Flush
+        summary = self.thread_summaries.get(conversation_id)
+        history_count = summary.message_count if summary and summary.synced else None
+        if summary:
+            logger.info(f"[BAAgent] conversation_id={conversation_id}, 已有 {summary.message_count} 条历史消息")
+        self._record_thread_messages(config, messages)
+
+        return {
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "config": config,
+            "messages": messages,
+            "history_count": history_count,
+            "tracer": tracer,
+            "root_span": root_span,
+        }
+
+    def _complete_invocation(self, result: Dict[str, Any], invocation: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        调用完成后的处理：token 统计、Memory Flush 检查、提取响应、保存监控数据
+
+        Args:
+            result: 图的执行结果
+            invocation: _start_invocation 返回的调用上下文
+
+        Returns:
+            Agent 响应结果
+        """
+        conversation_id = invocation["conversation_id"]
+        tracer = invocation["tracer"]
+        root_span = invocation["root_span"]
+
+        # 图返回完整消息列表：摘要与之一致时直接使用增量计数，否则重新计数一次
+        messages = list(result.get("messages", []))
+        summary_before = self.thread_summaries.get(conversation_id)
+        history_count = invocation.get("history_count")
+        if history_count is None or summary_before is None or not summary_before.synced or history_count > len(messages):
+            new_messages = messages
+        else:
+            new_messages = messages[history_count:]
+        summary = self.thread_summaries.sync(conversation_id, messages, self.token_counter)
+        logger.info(f"[BAAgent] conversation_id={conversation_id}, 调用后共有 {summary.message_count} 条消息")
+
+        # 提取 token 使用
+        tokens_used = summary.token_total or self._get_total_tokens(result)
+        self.session_tokens += tokens_used
+
+        # 检查是否需要 Memory Flush (静默执行，用户不可见)
+        self._check_and_flush(
+            conversation_id,
+            new_messages,
+            self.session_tokens,
+            total_tokens=summary.token_total,
+        )
+
+        # Flush 结果不对用户暴露，只记录日志
+        # (Clawdbot 风格: 静默轮次)
+
+        # 提取响应
+        response = self._extract_response(result)
+
+        # End root span
+        if root_span:
+            tracer.end_span(root_span, SpanStatus.SUCCESS if result.get("success", True) else SpanStatus.ERROR)
+
+        # Finalize and save monitoring data（同时清理临时状态）
+        self._finalize_monitoring()
+
+        return {
+            "conversation_id": conversation_id,
+            "user_id": invocation["user_id"],
+            "response": response,
+            "success": True,
+            "timestamp": datetime.now().isoformat(),
+            "tokens_used": tokens_used,
+            "session_tokens": self.session_tokens,
+            "trace_id": tracer.trace_id if tracer else None,  # Include trace_id for debugging
+            # flush_triggered 不再暴露给用户 (Clawdbot 风格: 静默)
+        }
+
+    def _fail_invocation(self, e: Exception, invocation: Dict[str, Any]) -> Dict[str, Any]:
+        """调用失败时结束监控并构建错误结果"""
+        tracer = invocation["tracer"]
+        root_span = invocation["root_span"]
+
+        # End root span with error status
+        if root_span:
+            tracer.end_span(root_span, SpanStatus.ERROR)
+            if tracer:
+                tracer.add_event("error", {"error_type": type(e).__name__, "error_message": str(e)})
+
+        # Finalize monitoring even on error（同时清理临时状态）
+        self._finalize_monitoring()
+
+        return {
+            "conversation_id": invocation["conversation_id"],
+            "user_id": invocation["user_id"],
+            "response": f"抱歉，处理过程中出现错误: {str(e)}",
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat(),
+            "trace_id": tracer.trace_id if tracer else None,
+        }
+
+    def invoke(
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        config: Optional[RunnableConfig] = None,
+        session_id: Optional[str] = None,
+        file_context: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        调用 Agent
+
+        Args:
+            message: 用户消息
+            conversation_id: 对话 ID
+            user_id: 用户 ID
+            config: 可选的运行配置
+            session_id: 会话 ID（用于代码列表，传递给 ContextCoordinator）
+            file_context: 文件上下文（可选，用于文件上下文处理）
+
+        Returns:
+            Agent 响应结果
+        """
+        invocation = self._start_invocation(message, conversation_id, user_id, config, session_id)
+        conversation_id = invocation["conversation_id"]
+        config = invocation["config"]
+
         # 调用 Agent（LangGraph 会自动从 checkpointer 加载历史）
+        # 消息数日志来自线程状态摘要，不再在调用前后 get_state
         try:
-            # 调试：检查 checkpointer 中是否有现有状态
-            existing_state = self.agent.get_state(config)
-            if existing_state and existing_state.values:
-                existing_messages = existing_state.values.get("messages", [])
-                if existing_messages:
-                    logger.info(f"[BAAgent.invoke] conversation_id={conversation_id}, 从 checkpointer 加载了 {len(list(existing_messages))} 条历史消息")
-
             # 直接调用 invoke，LangGraph 会自动处理 checkpointer 中的历史
             result = self.agent.invoke(
-                {"messages": messages},
+                {"messages": invocation["messages"]},
                 config,
             )
 
-            # 调试：检查 invoke 后的状态
-            new_state = self.agent.get_state(config)
-            if new_state and new_state.values:
-                new_messages = new_state.values.get("messages", [])
-                logger.info(f"[BAAgent.invoke] invoke 后共有 {len(list(new_messages))} 条消息")
-
             # 检查是否有 skill 激活结果
             skill_result = self._extract_skill_activation_result(result)
             if skill_result:
@@ -1432,69 +1837,65 @@ class BAAgent:
                     config,
                 )
 
-            # 提取 token 使用
-            tokens_used = self._get_total_tokens(result)
-            self.session_tokens += tokens_used
+            return self._complete_invocation(result, invocation)
 
-            # 检查是否需要 Memory Flush (静默执行，用户不可见)
-            flush_result = self._check_and_flush(
-                conversation_id,
-                result.get("messages", []),
-                self.session_tokens,
+        except Exception as e:
+            return self._fail_invocation(e, invocation)
+
+    async def ainvoke(
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        config: Optional[RunnableConfig] = None,
+        session_id: Optional[str] = None,
+        file_context: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        异步调用 Agent（不阻塞事件循环）
+
+        图通过 LangGraph ainvoke 执行：LLM 调用使用 ChatAnthropic.ainvoke，
+        原生异步工具直接 await，同步工具以及 skill 注入、Memory Flush 检查、
+        监控落盘等同步步骤交给有界的同步执行器。单次调用的监控状态保存在
+        contextvars 中，同一实例上的并发调用互不干扰。
+
+        Args:
+            message: 用户消息
+            conversation_id: 对话 ID
+            user_id: 用户 ID
+            config: 可选的运行配置
+            session_id: 会话 ID（用于代码列表，传递给 ContextCoordinator）
+            file_context: 文件上下文（可选，用于文件上下文处理）
+
+        Returns:
+            Agent 响应结果（与 invoke 相同）
+        """
+        invocation = self._start_invocation(message, conversation_id, user_id, config, session_id)
+        conversation_id = invocation["conversation_id"]
+        config = invocation["config"]
+
+        try:
+            result = await self.agent.ainvoke(
+                {"messages": invocation["messages"]},
+                config,
             )
 
-            # Flush 结果不对用户暴露，只记录日志
-            # (Clawdbot 风格: 静默轮次)
-
-            # 提取响应
-            response = self._extract_response(result)
-
-            # End root span
-            if root_span:
-                tracer.end_span(root_span, SpanStatus.SUCCESS if result.get("success", True) else SpanStatus.ERROR)
-
-            # 清理临时状态
-            if hasattr(self, '_current_session_id'):
-                delattr(self, '_current_session_id)
-
-            # Finalize and save monitoring data
-            self._finalize_monitoring()
-
-            return {
-                "conversation_id": conversation_id,
-                "user_id": user_id,
-                "response": response,
-                "success": True,
-                "timestamp": datetime.now().isoformat(),
-                "tokens_used": tokens_used,
-                "session_tokens": self.session_tokens,
-                "trace_id": tracer.trace_id if tracer else None,  # Include trace_id for debugging
-                # flush_triggered 不再暴露给用户 (Clawdbot 风格: 静默)
-            }
+            skill_result = self._extract_skill_activation_result(result)
+            if skill_result:
+                await run_sync(
+                    self._handle_skill_activation_result,
+                    skill_result, conversation_id, config
+                )
+                result = await self.agent.ainvoke({"messages": []}, config)
+
+            return await run_sync(self._complete_invocation, result, invocation)
 
         except Exception as e:
-            # End root span with error status
-            if root_span:
-                tracer.end_span(root_span, SpanStatus.ERROR)
-                if tracer:
-                    tracer.add_event("error", {"error_type": type(e).__name__, "error_message": str(e)})
-
-            # 清理临时状态
-            if hasattr(self, '_current_session_id'):
-                delattr(self, '_current_session_id')
-
-            # Finalize monitoring even on error
-            self._finalize_monitoring()
-
-            return {
-                "conversation_id": conversation_id,
-                "user_id": user_id,
-                "response": f"抱歉，处理过程中出现错误: {str(e)}",
-                "success": False,
-                "error": str(e),
-                "timestamp": datetime.now().isoformat(),
-                "trace_id": tracer.trace_id if tracer else None,
-            }
+            return await run_sync(self._fail_invocation, e, invocation)
+
+        finally:
+            # 执行器中的清理只作用于上下文副本，这里清理调用方上下文
+            self._clear_invocation_state()
 
     def _extract_skill_activation_result(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -1627,7 +2028,8 @@ class BAAgent:
                 if has_html:
                     display_parts.append(f'<div class="final-report">{final_report}</div>')
                 else:
-                    display_parts.append(f'<div class="final-report" style="line-height: 1.6;">{final_report.replace("\\n", "<br>")}</div>')
+                    report_html = final_report.replace("\n", "<br>")
+                    display_parts.append(f'<div class="final-report" style="line-height: 1.6;">{report_html}</div>')
 
                 # 推荐问题
                 if structured.action.recommended_questions:
@@ -1718,6 +2120,175 @@ class BAAgent:
                 "success": False,
             }
 
+    async def astream(
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        config: Optional[RunnableConfig] = None,
+    ):
+        """
+        异步流式调用 Agent（LangGraph astream，节点更新逐个产出）
+
+        Args:
+            message: 用户消息
+            conversation_id: 对话 ID
+            user_id: 用户 ID
+            config: 可选的运行配置
+
+        Yields:
+            Agent 响应片段
+        """
+        if conversation_id is None:
+            conversation_id = f"conv_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+        if config is None:
+            config = {}
+        config["configurable"] = {"thread_id": conversation_id}
+
+        try:
+            async for chunk in self.agent.astream(
+                {"messages": [HumanMessage(content=message)]},
+                config,
+            ):
+                yield chunk
+
+        except Exception as e:
+            yield {
+                "error": str(e),
+                "success": False,
+            }
+
+    async def astream_events(
+        self,
+        message: str,
+        conversation_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        config: Optional[RunnableConfig] = None,
+        session_id: Optional[str] = None,
+    ):
+        """
+        异步流式调用 Agent，逐个产出结构化事件
+
+        与 ainvoke 走同一条调用路径（监控、skill 激活、Memory Flush 检查），
+        图的执行过程以事件形式推送：
+
+        - {"event": "node", "node": ..., "tool_calls": [...]}: 节点完成
+        - {"event": "token", "text": ...}: LLM 输出增量
+        - {"event": "tool_start" / "tool_end", ...}: 工具开始/结束
+        - {"event": "final", "result": ...}: 最终结果（与 ainvoke 返回值相同）
+
+        调用方停止迭代（aclose）或所在任务被取消时，图的执行随之取消，
+        进行中的原生异步工具被取消，尚未开始的同步工具不再执行。
+
+        Args:
+            message: 用户消息
+            conversation_id: 对话 ID
+            user_id: 用户 ID
+            config: 可选的运行配置
+            session_id: 会话 ID（传递给 ContextCoordinator）
+
+        Yields:
+            事件字典
+        """
+        invocation = self._start_invocation(message, conversation_id, user_id, config, session_id)
+        conversation_id = invocation["conversation_id"]
+        config = invocation["config"]
+        stream = None
+
+        try:
+            graph_input = {"messages": invocation["messages"]}
+            skill_handled = False
+            while True:
+                # values 模式的最后一项即执行后的完整状态，无需再 aget_state
+                stream = self.agent.astream(
+                    graph_input,
+                    config,
+                    stream_mode=["updates", "messages", "custom", "values"],
+                )
+                result: Dict[str, Any] = {}
+                async for mode, chunk in stream:
+                    if mode == "values":
+                        result = dict(chunk)
+                        continue
+                    event = self._to_stream_event(mode, chunk)
+                    if event:
+                        yield event
+                stream = None
+
+                # 与 ainvoke 一致：skill 激活后注入状态并继续执行一轮
+                skill_result = None if skill_handled else self._extract_skill_activation_result(result)
+                if not skill_result:
+                    break
+                await run_sync(
+                    self._handle_skill_activation_result,
+                    skill_result, conversation_id, config
+                )
+                graph_input = {"messages": []}
+                skill_handled = True
+
+            final = await run_sync(self._complete_invocation, result, invocation)
+
+        except (asyncio.CancelledError, GeneratorExit) as e:
+            logger.info(f"[BAAgent.astream_events] conversation_id={conversation_id}, 流式调用被取消")
+            if stream is not None:
+                # 关闭图的流，取消进行中的节点任务
+                await stream.aclose()
+            self._fail_invocation(e, invocation)
+            raise
+
+        except Exception as e:
+            final = await run_sync(self._fail_invocation, e, invocation)
+
+        finally:
+            self._clear_invocation_state()
+
+        yield {"event": "final", "result": final}
+
+    @staticmethod
+    def _to_stream_event(mode: str, chunk: Any) -> Optional[Dict[str, Any]]:
+        """
+        将 LangGraph 流式输出转换为事件
+
+        Args:
+            mode: stream_mode（updates, messages, custom）
+            chunk: 对应模式的输出
+
+        Returns:
+            事件字典，无需推送时返回 None
+        """
+        if mode == "custom":
+            return chunk if isinstance(chunk, dict) and "event" in chunk else None
+
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") != "agent" or not isinstance(message, AIMessage):
+                return None
+            content = message.content
+            if isinstance(content, list):
+                content = "".join(
+                    part.get("text", "") for part in content
+                    if isinstance(part, dict) and part.get("type") == "text"
+                )
+            return {"event": "token", "text": content} if content else None
+
+        if mode == "updates" and isinstance(chunk, dict):
+            for node, update in chunk.items():
+                messages = update.get("messages", []) if isinstance(update, dict) else []
+                tool_calls = [
+                    {"id": call.get("id"), "name": call["name"], "args": call.get("args", {})}
+                    for msg in messages
+                    for call in getattr(msg, "tool_calls", None) or []
+                ]
+                return {
+                    "event": "node",
+                    "node": node,
+                    "message_count": len(messages),
+                    "tool_calls": tool_calls,
+                }
+
+        return None
+
     def get_conversation_history(
         self,
         conversation_id: str,
@@ -1747,6 +2318,7 @@ class BAAgent:
         # 删除检查点中的对话
         config = {"configurable": {"thread_id": conversation_id}}
         self.agent.update_state(config, {"messages": []})
+        self.thread_summaries.discard(conversation_id)
 
     def shutdown(self) -> None:
         """
@@ -1763,7 +2335,8 @@ class MemoryWatcherWrapper:
     """
     Memory Watcher 包装器
 
-    在后台线程中运行 MemoryWatcher，定期检查文件变更
+    在后台线程中运行 MemoryWatcher 的索引工作循环：阻塞等待防抖后的
+    文件变更并批量索引（事件由 MemoryWatcher 的监听线程产生）
     """
 
     def __init__(
@@ -1776,7 +2349,7 @@ class MemoryWatcherWrapper:
 
         Args:
             watcher: MemoryWatcher 实例
-            check_interval: 检查间隔（秒）
+            check_interval: 空闲时的最长等待间隔（秒）
         """
         self.watcher = watcher
         self.check_interval = check_interval
@@ -1791,8 +2364,12 @@ class MemoryWatcherWrapper:
 
         while not self._stop_event.is_set():
             try:
+                # 等待防抖后的变更（有事件时立即唤醒）
+                if not self.watcher.wait_for_changes(timeout=self.check_interval):
+                    continue
+
                 # 处理变更
-                results = self.watcher.process_changes()
+                results = self.watcher.process_due_changes()
 
                 if results["processed"] > 0 or results["failed"] > 0:
                     logger.info(
@@ -1806,9 +2383,7 @@ class MemoryWatcherWrapper:
 
             except Exception as e:
                 logger.error(f"MemoryWatcher 循环错误: {e}")
-
-            # 等待指定间隔或停止事件
-            self._stop_event.wait(self.check_interval)
+                self._stop_event.wait(self.check_interval)
 
     def start(self) -> None:
         """启动监听线程"""
@@ -1833,13 +2408,13 @@ class MemoryWatcherWrapper:
 
         self._running = False
         self._stop_event.set()
+        # 唤醒阻塞在 wait_for_changes 中的工作线程
+        self.watcher.stop()
 
         if self._thread:
             self._thread.join(timeout=2.0)
             self._thread = None
 
-        self.watcher.stop()
-
     def is_running(self) -> bool:
         """检查是否正在运行"""
         return self._running and self._thread is not None and self._thread.is_alive()
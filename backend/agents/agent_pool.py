@@ -0,0 +1,219 @@
+"""
+Agent 实例池
+
+请求指定 model / api_key 时复用已构建的 BAAgent，而不是每次重新加载工具、
+Skills、系统提示词并重新编译 LangGraph 图。
+
+池的键为 (模型名, API Key 指纹, 配置哈希)：
+- API Key 只保存 SHA-256 指纹，不同密钥的请求不会共用 LLM 客户端
+- 配置哈希覆盖 Agent 配置和影响 LLM 客户端的全局配置（base_url、超时等），
+  配置变化后自动构建新实例
+
+超过容量时按 LRU 淘汰，被淘汰的实例调用 shutdown()。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 默认容量（api.agent_pool_size）
+DEFAULT_POOL_SIZE = 8
+
+PoolKey = Tuple[str, str, str]
+
+
+def api_key_fingerprint(api_key: Optional[str]) -> str:
+    """
+    API Key 指纹（未指定时为 "default"，使用环境变量/配置中的密钥）
+
+    Args:
+        api_key: API 密钥
+
+    Returns:
+        SHA-256 前 16 位十六进制
+    """
+    if not api_key:
+        return "default"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def agent_config_hash(agent_config: Any) -> str:
+    """
+    Agent 配置哈希
+
+    包含 Agent 配置本身以及构建 LLM 客户端时读取的全局配置。
+
+    Args:
+        agent_config: AgentConfig（pydantic 模型）或字典
+
+    Returns:
+        SHA-256 前 16 位十六进制
+    """
+    if hasattr(agent_config, "model_dump"):
+        agent_config = agent_config.model_dump()
+
+    payload: Dict[str, Any] = {"agent": agent_config}
+    try:
+        from config import get_config
+        app_config = get_config()
+        payload["llm"] = app_config.llm.model_dump(exclude={"api_key"})
+        payload["memory_enabled"] = app_config.memory.enabled
+    except Exception:
+        pass
+    payload["base_url_env"] = os.environ.get("ANTHROPIC_BASE_URL")
+
+    encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+class AgentPool:
+    """
+    LRU Agent 实例池
+
+    使用方式:
+        pool = AgentPool(max_size=8)
+        key = pool.make_key(model_name, api_key, agent_config)
+        agent = pool.get_or_create(key, lambda: template.derive(agent_config, api_key))
+    """
+
+    def __init__(self, max_size: int = DEFAULT_POOL_SIZE):
+        """
+        初始化实例池
+
+        Args:
+            max_size: 最大实例数
+        """
+        self.max_size = max(1, max_size)
+        self._agents: "OrderedDict[PoolKey, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 同一个键只构建一次（并发未命中时后到的请求等待）
+        self._key_locks: Dict[PoolKey, threading.Lock] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "build_ms_total": 0.0,
+            "last_build_ms": 0.0,
+        }
+
+    @staticmethod
+    def make_key(model_name: str, api_key: Optional[str], agent_config: Any) -> PoolKey:
+        """
+        构建池的键
+
+        Args:
+            model_name: 模型名称
+            api_key: API 密钥（只使用指纹）
+            agent_config: Agent 配置
+
+        Returns:
+            (model_name, api_key_fingerprint, config_hash)
+        """
+        return (model_name, api_key_fingerprint(api_key), agent_config_hash(agent_config))
+
+    def _lookup(self, key: PoolKey) -> Optional[Any]:
+        agent = self._agents.get(key)
+        if agent is not None:
+            self._agents.move_to_end(key)
+            self._stats["hits"] += 1
+        return agent
+
+    def get_or_create(self, key: PoolKey, factory: Callable[[], T]) -> T:
+        """
+        获取实例，不存在时调用 factory 构建
+
+        Args:
+            key: make_key 返回的键
+            factory: 构建函数
+
+        Returns:
+            Agent 实例
+        """
+        with self._lock:
+            agent = self._lookup(key)
+            if agent is not None:
+                return agent
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                agent = self._lookup(key)
+                if agent is not None:
+                    return agent
+
+            start = time.perf_counter()
+            agent = factory()
+            build_ms = (time.perf_counter() - start) * 1000
+
+            evicted = []
+            with self._lock:
+                self._agents[key] = agent
+                self._stats["misses"] += 1
+                self._stats["build_ms_total"] += build_ms
+                self._stats["last_build_ms"] = build_ms
+                while len(self._agents) > self.max_size:
+                    old_key, old_agent = self._agents.popitem(last=False)
+                    self._key_locks.pop(old_key, None)
+                    self._stats["evictions"] += 1
+                    evicted.append((old_key, old_agent))
+
+        logger.info(f"Agent 池构建实例: model={key[0]}, key={key[1]}, 耗时 {build_ms:.1f}ms")
+        for old_key, old_agent in evicted:
+            logger.info(f"Agent 池淘汰实例: model={old_key[0]}, key={old_key[1]}")
+            self._shutdown(old_agent)
+        return agent
+
+    @staticmethod
+    def _shutdown(agent: Any) -> None:
+        shutdown = getattr(agent, "shutdown", None)
+        if shutdown is None:
+            return
+        try:
+            shutdown()
+        except Exception as e:
+            logger.warning(f"关闭 Agent 实例失败: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._agents)
+
+    def __contains__(self, key: PoolKey) -> bool:
+        with self._lock:
+            return key in self._agents
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取实例池状态"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._agents)
+            stats["models"] = [key[0] for key in self._agents]
+        stats["max_size"] = self.max_size
+        stats["avg_build_ms"] = stats["build_ms_total"] / stats["misses"] if stats["misses"] else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """清空实例池并关闭所有实例"""
+        with self._lock:
+            agents = list(self._agents.values())
+            self._agents.clear()
+            self._key_locks.clear()
+        for agent in agents:
+            self._shutdown(agent)
+
+
+__all__ = [
+    "AgentPool",
+    "DEFAULT_POOL_SIZE",
+    "agent_config_hash",
+    "api_key_fingerprint",
+]
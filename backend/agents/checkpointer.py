@@ -0,0 +1,366 @@
+"""
+对话检查点存储
+
+替代进程内 MemorySaver（保存所有对话的所有检查点，无上限且重启丢失）：
+- 持久化: 基于 langgraph-checkpoint-sqlite 的 SqliteSaver，每个检查点一行，
+  通道值（消息列表）序列化为 BLOB；WAL 日志 + synchronous=NORMAL
+- 有界: 每次写入检查点后只保留该线程最近 N 个检查点及其 pending writes
+- 热线程缓存: 最近访问线程的最新检查点保存在内存 LRU 中，继续对话时
+  读取最新状态无需查询和反序列化
+
+数据库位于存储根目录（backend/storage/config.py）下的 checkpoints/ 目录。
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from backend.agents.sync_executor import run_sync
+
+
+logger = logging.getLogger(__name__)
+
+# 默认每个线程保留的检查点数（一轮对话通常产生 3-6 个检查点）
+DEFAULT_KEEP_CHECKPOINTS = 20
+# 默认内存中缓存的线程数
+DEFAULT_HOT_THREADS = 256
+# 数据库文件（存储根目录下）
+CHECKPOINT_DB_NAME = "checkpoints/agent_checkpoints.db"
+
+CHECKPOINT_BUSY_TIMEOUT_MS = 5000
+
+ThreadKey = Tuple[str, str]
+
+
+def get_checkpoint_db_path(storage_dir: Optional[Path] = None) -> Path:
+    """
+    获取检查点数据库路径
+
+    Args:
+        storage_dir: 存储根目录，None 时使用 backend/storage/config.py 的默认目录
+
+    Returns:
+        数据库文件路径
+    """
+    if storage_dir is None:
+        from backend.storage.config import get_storage_dir
+        storage_dir = get_storage_dir()
+    return Path(storage_dir) / CHECKPOINT_DB_NAME
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    有界的 SQLite 检查点存储
+
+    使用方式:
+        saver = BoundedSqliteSaver.open(db_path, keep_checkpoints=20, hot_threads=256)
+        app = workflow.compile(checkpointer=saver)
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        keep_checkpoints: int = DEFAULT_KEEP_CHECKPOINTS,
+        hot_threads: int = DEFAULT_HOT_THREADS,
+        **kwargs: Any
+    ):
+        """
+        初始化检查点存储
+
+        Args:
+            conn: SQLite 连接（需 check_same_thread=False）
+            keep_checkpoints: 每个线程保留的检查点数（0 表示不清理）
+            hot_threads: 内存中缓存最新检查点的线程数（0 表示不缓存）
+            **kwargs: 传递给 SqliteSaver（serde）
+        """
+        super().__init__(conn, **kwargs)
+        self.keep_checkpoints = max(0, keep_checkpoints)
+        self.hot_threads = max(0, hot_threads)
+        self._hot: "OrderedDict[ThreadKey, CheckpointTuple]" = OrderedDict()
+        self._hot_lock = threading.Lock()
+        self._stats = {"hot_hits": 0, "hot_misses": 0, "pruned": 0}
+
+    @classmethod
+    def open(
+        cls,
+        db_path: Path,
+        keep_checkpoints: int = DEFAULT_KEEP_CHECKPOINTS,
+        hot_threads: int = DEFAULT_HOT_THREADS
+    ) -> "BoundedSqliteSaver":
+        """
+        打开（或创建）数据库文件
+
+        Args:
+            db_path: 数据库文件路径
+            keep_checkpoints: 每个线程保留的检查点数
+            hot_threads: 内存中缓存的线程数
+
+        Returns:
+            BoundedSqliteSaver 实例
+        """
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={CHECKPOINT_BUSY_TIMEOUT_MS}")
+        except sqlite3.Error:
+            pass
+        return cls(conn, keep_checkpoints=keep_checkpoints, hot_threads=hot_threads)
+
+    # ------------------------------------------------------------------
+    # 热线程缓存
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _thread_key(config: RunnableConfig) -> ThreadKey:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _copy_tuple(value: CheckpointTuple) -> CheckpointTuple:
+        # Pregel 会原地修改读到的 checkpoint（versions_seen 等），缓存中只放副本
+        return value._replace(
+            checkpoint=copy_checkpoint(value.checkpoint),
+            metadata=dict(value.metadata),
+            pending_writes=list(value.pending_writes or []),
+        )
+
+    def _cache_get(self, key: ThreadKey) -> Optional[CheckpointTuple]:
+        with self._hot_lock:
+            cached = self._hot.get(key)
+            if cached is None:
+                self._stats["hot_misses"] += 1
+                return None
+            self._hot.move_to_end(key)
+            self._stats["hot_hits"] += 1
+        return self._copy_tuple(cached)
+
+    def _cache_put(self, key: ThreadKey, value: CheckpointTuple) -> None:
+        if not self.hot_threads:
+            return
+        value = self._copy_tuple(value)
+        with self._hot_lock:
+            self._hot[key] = value
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_threads:
+                self._hot.popitem(last=False)
+
+    def _cache_discard(self, key: ThreadKey) -> None:
+        with self._hot_lock:
+            self._hot.pop(key, None)
+
+    # ------------------------------------------------------------------
+    # 同步接口
+    # ------------------------------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """获取检查点（未指定 checkpoint_id 时优先读取热线程缓存）"""
+        if get_checkpoint_id(config):
+            return super().get_tuple(config)
+
+        key = self._thread_key(config)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        result = super().get_tuple(config)
+        if result is not None:
+            self._cache_put(key, result)
+        return result
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """写入检查点，并在同一事务中清理该线程的旧检查点"""
+        thread_id, checkpoint_ns = self._thread_key(config)
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        full_metadata = get_checkpoint_metadata(config, metadata)
+        serialized_metadata = json.dumps(full_metadata, ensure_ascii=False).encode("utf-8", "ignore")
+
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+                "parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_checkpoint_id,
+                 type_, serialized_checkpoint, serialized_metadata),
+            )
+            if self.keep_checkpoints:
+                self._prune(cur, thread_id, checkpoint_ns)
+
+        saved_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+        parent_config = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": parent_checkpoint_id,
+            }
+        } if parent_checkpoint_id else None
+        self._cache_put(
+            (thread_id, checkpoint_ns),
+            CheckpointTuple(saved_config, checkpoint, full_metadata, parent_config, []),
+        )
+        return saved_config
+
+    def _prune(self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str) -> None:
+        # checkpoint_id 为时间有序的 UUID6，按 id 排序即按时间排序。
+        # Agent 图的通道每个检查点都保存完整快照（未使用 DeltaChannel），
+        # 删除旧检查点不影响恢复最新状态
+        cur.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_checkpoints - 1),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return
+        cutoff = row[0]
+        cur.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, cutoff),
+        )
+        pruned = cur.rowcount
+        cur.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, cutoff),
+        )
+        if pruned > 0:
+            with self._hot_lock:
+                self._stats["pruned"] += pruned
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """写入中间结果（缓存的最新检查点随之失效，下次读取时从数据库加载）"""
+        super().put_writes(config, writes, task_id, task_path)
+        key = self._thread_key(config)
+        with self._hot_lock:
+            cached = self._hot.get(key)
+            if cached is not None and cached.config["configurable"]["checkpoint_id"] == config["configurable"].get("checkpoint_id"):
+                del self._hot[key]
+
+    def delete_thread(self, thread_id: str) -> None:
+        """删除线程的所有检查点"""
+        super().delete_thread(thread_id)
+        with self._hot_lock:
+            for key in [k for k in self._hot if k[0] == str(thread_id)]:
+                del self._hot[key]
+
+    # ------------------------------------------------------------------
+    # 异步接口（SqliteSaver 不提供；缓存命中直接返回，其余在 Agent 同步执行器中执行）
+    # ------------------------------------------------------------------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if not get_checkpoint_id(config):
+            key = self._thread_key(config)
+            with self._hot_lock:
+                cached = self._hot.get(key)
+                if cached is not None:
+                    self._hot.move_to_end(key)
+                    self._stats["hot_hits"] += 1
+            if cached is not None:
+                return self._copy_tuple(cached)
+        return await run_sync(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await run_sync(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await run_sync(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await run_sync(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await run_sync(self.delete_thread, thread_id)
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储状态"""
+        with self.cursor(transaction=False) as cur:
+            cur.execute("SELECT COUNT(*), COUNT(DISTINCT thread_id) FROM checkpoints")
+            checkpoints, threads = cur.fetchone()
+        with self._hot_lock:
+            stats = dict(self._stats)
+            stats["hot_cached"] = len(self._hot)
+        stats.update({
+            "checkpoints": checkpoints,
+            "threads": threads,
+            "keep_checkpoints": self.keep_checkpoints,
+            "hot_threads": self.hot_threads,
+        })
+        return stats
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._hot_lock:
+            self._hot.clear()
+        with self.lock:
+            self.conn.close()
+
+
+__all__ = [
+    "BoundedSqliteSaver",
+    "CHECKPOINT_DB_NAME",
+    "DEFAULT_HOT_THREADS",
+    "DEFAULT_KEEP_CHECKPOINTS",
+    "get_checkpoint_db_path",
+]
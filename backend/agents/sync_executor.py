@@ -0,0 +1,163 @@
+"""
+Agent 同步任务执行器
+
+异步调用路径（BAAgent.ainvoke）中仍有同步代码：没有原生协程的工具
+（Docker 执行、SQL 查询、文件读写）、skill 激活后的状态注入、Memory Flush
+检查和监控数据落盘。这些任务统一提交到一个有界线程池，不占用事件循环，
+也不挤占 asyncio 默认执行器（asyncio.to_thread 等共用）。
+
+任务在调用方 contextvars 的副本中运行，单次调用的监控状态随之传递。
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 默认线程数（api.agent_sync_workers）
+DEFAULT_SYNC_WORKERS = 16
+
+
+class AgentSyncExecutor:
+    """
+    有界同步任务执行器
+
+    使用方式:
+        executor = get_agent_sync_executor()
+        result = await executor.run(tool_node.invoke, state, config)
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_SYNC_WORKERS):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 最大线程数
+        """
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="agent-sync",
+        )
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "active": 0}
+
+    def _call(self, context: contextvars.Context, func: Callable[..., T]) -> T:
+        with self._lock:
+            self._stats["active"] += 1
+        try:
+            result = context.run(func)
+        except BaseException:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        else:
+            with self._lock:
+                self._stats["completed"] += 1
+            return result
+        finally:
+            with self._lock:
+                self._stats["active"] -= 1
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        在线程池中执行同步函数并等待结果
+
+        Args:
+            func: 同步函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        with self._lock:
+            self._stats["submitted"] += 1
+        return await loop.run_in_executor(
+            self._executor,
+            self._call,
+            context,
+            functools.partial(func, *args, **kwargs),
+        )
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取执行器状态"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = stats["submitted"] - stats["completed"] - stats["failed"] - stats["active"]
+        stats["max_workers"] = self.max_workers
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
+
+
+# 全局执行器
+_sync_executor: Optional[AgentSyncExecutor] = None
+_sync_executor_lock = threading.Lock()
+
+
+def get_agent_sync_executor() -> AgentSyncExecutor:
+    """
+    获取 Agent 同步任务执行器（首次调用时按配置创建）
+
+    Returns:
+        AgentSyncExecutor: 全局执行器
+    """
+    global _sync_executor
+
+    with _sync_executor_lock:
+        if _sync_executor is None:
+            max_workers = DEFAULT_SYNC_WORKERS
+            try:
+                from config import get_config
+                max_workers = int(get_config().api.agent_sync_workers)
+            except Exception:
+                pass
+            _sync_executor = AgentSyncExecutor(max_workers)
+        return _sync_executor
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    在全局执行器中执行同步函数
+
+    Args:
+        func: 同步函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        函数返回值
+    """
+    return await get_agent_sync_executor().run(func, *args, **kwargs)
+
+
+def reset_agent_sync_executor(wait: bool = True) -> None:
+    """关闭并重置全局执行器（测试用）"""
+    global _sync_executor
+
+    with _sync_executor_lock:
+        executor, _sync_executor = _sync_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+__all__ = [
+    "AgentSyncExecutor",
+    "DEFAULT_SYNC_WORKERS",
+    "get_agent_sync_executor",
+    "run_sync",
+    "reset_agent_sync_executor",
+]
@@ -0,0 +1,201 @@
+"""
+对话线程状态摘要
+
+每个线程只保存消息数、token 总数和最近一次压缩信息，由图节点在产生新消息时
+增量更新。调用日志、Memory Flush 阈值判断和压缩判断读取摘要，不需要
+get_state 反序列化整个对话历史（开销随对话长度线性增长）。
+
+摘要只是缓存：不在内存中的线程（进程重启、被 LRU 淘汰）或被 update_state
+改写过的线程标记为未同步，下次调用结束时用图返回的完整消息列表重新计数一次。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+
+# 默认缓存的线程数
+DEFAULT_MAX_THREADS = 1024
+
+
+@dataclass
+class ThreadStateSummary:
+    """单个线程的状态摘要"""
+
+    message_count: int = 0
+    token_total: int = 0
+    # 最近一次压缩（Memory Flush 周期号和时间戳），未压缩过为 None
+    last_compaction_cycle: Optional[int] = None
+    last_compaction_at: Optional[float] = None
+    # False 表示计数可能与 checkpointer 中的状态不一致，需要重新计数
+    synced: bool = True
+    updated_at: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return asdict(self)
+
+
+class ThreadSummaryStore:
+    """
+    线程状态摘要存储（LRU，线程安全）
+
+    使用方式:
+        store = ThreadSummaryStore()
+        store.record(thread_id, new_messages, token_counter)   # 图节点产生消息时
+        summary = store.sync(thread_id, result["messages"], token_counter)  # 调用结束时
+    """
+
+    def __init__(self, max_threads: int = DEFAULT_MAX_THREADS):
+        """
+        初始化摘要存储
+
+        Args:
+            max_threads: 最多保存的线程数
+        """
+        self.max_threads = max(1, max_threads)
+        self._summaries: "OrderedDict[str, ThreadStateSummary]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"records": 0, "syncs": 0, "recounts": 0}
+
+    @staticmethod
+    def _count_tokens(messages: Sequence[BaseMessage], token_counter: Any) -> int:
+        if not messages or token_counter is None:
+            return 0
+        try:
+            return token_counter.count_messages(list(messages))
+        except Exception:
+            return 0
+
+    def _put(self, thread_id: str, summary: ThreadStateSummary) -> None:
+        summary.updated_at = time.time()
+        self._summaries[thread_id] = summary
+        self._summaries.move_to_end(thread_id)
+        while len(self._summaries) > self.max_threads:
+            self._summaries.popitem(last=False)
+
+    def get(self, thread_id: str) -> Optional[ThreadStateSummary]:
+        """
+        获取线程摘要（副本）
+
+        Args:
+            thread_id: 线程 ID（conversation_id）
+
+        Returns:
+            摘要，不在缓存中时返回 None
+        """
+        with self._lock:
+            summary = self._summaries.get(thread_id)
+            if summary is None:
+                return None
+            self._summaries.move_to_end(thread_id)
+            return ThreadStateSummary(**asdict(summary))
+
+    def record(self, thread_id: str, messages: Sequence[BaseMessage], token_counter: Any = None) -> None:
+        """
+        记录追加到线程的消息（图节点返回新消息、调用输入消息时）
+
+        未知线程的历史长度未知，不创建摘要，等待 sync。
+
+        Args:
+            thread_id: 线程 ID
+            messages: 本次追加的消息
+            token_counter: token 计数器
+        """
+        if not messages:
+            return
+        tokens = self._count_tokens(messages, token_counter)
+        with self._lock:
+            summary = self._summaries.get(thread_id)
+            if summary is None:
+                return
+            summary.message_count += len(messages)
+            summary.token_total += tokens
+            self._stats["records"] += 1
+            self._put(thread_id, summary)
+
+    def sync(
+        self,
+        thread_id: str,
+        messages: Sequence[BaseMessage],
+        token_counter: Any = None
+    ) -> ThreadStateSummary:
+        """
+        用图返回的完整消息列表校验摘要
+
+        摘要已同步且消息数一致时直接返回（不重新计数 token）；否则完整计数一次。
+
+        Args:
+            thread_id: 线程 ID
+            messages: 线程当前的全部消息（图执行结果的 messages）
+            token_counter: token 计数器
+
+        Returns:
+            摘要（副本）
+        """
+        with self._lock:
+            self._stats["syncs"] += 1
+            summary = self._summaries.get(thread_id)
+            if summary is not None and summary.synced and summary.message_count == len(messages):
+                self._summaries.move_to_end(thread_id)
+                return ThreadStateSummary(**asdict(summary))
+
+        tokens = self._count_tokens(messages, token_counter)
+        with self._lock:
+            self._stats["recounts"] += 1
+            summary = self._summaries.get(thread_id) or ThreadStateSummary()
+            summary.message_count = len(messages)
+            summary.token_total = tokens
+            summary.synced = True
+            self._put(thread_id, summary)
+            return ThreadStateSummary(**asdict(summary))
+
+    def mark_compacted(self, thread_id: str, cycle: Optional[int]) -> None:
+        """
+        记录一次压缩（压缩通过 update_state 改写消息，计数在下次 sync 时重算）
+
+        Args:
+            thread_id: 线程 ID
+            cycle: Memory Flush 周期号（compaction_count）
+        """
+        with self._lock:
+            summary = self._summaries.get(thread_id) or ThreadStateSummary()
+            summary.last_compaction_cycle = cycle
+            summary.last_compaction_at = time.time()
+            summary.synced = False
+            self._put(thread_id, summary)
+
+    def invalidate(self, thread_id: str) -> None:
+        """标记线程摘要需要重新计数（消息被 update_state 等外部操作修改时）"""
+        with self._lock:
+            summary = self._summaries.get(thread_id)
+            if summary is not None:
+                summary.synced = False
+
+    def discard(self, thread_id: str) -> None:
+        """删除线程摘要"""
+        with self._lock:
+            self._summaries.pop(thread_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._summaries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["threads"] = len(self._summaries)
+        stats["max_threads"] = self.max_threads
+        return stats
+
+
+__all__ = [
+    "DEFAULT_MAX_THREADS",
+    "ThreadStateSummary",
+    "ThreadSummaryStore",
+]
@@ -8,6 +8,7 @@ BA-Agent FastAPI 服务
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 import os
@@ -41,6 +42,48 @@ setup_logging(log_level=LOG_LEVEL, log_file=LOG_FILE)
 logger = logging.getLogger(__name__)
 
 
+async def preload_embedding_runtime() -> None:
+    """预加载记忆搜索使用的嵌入提供商（本地模型在此加载）"""
+    try:
+        from config import get_config
+        memory_config = get_config().memory
+        search_config = memory_config.search
+        if not (memory_config.enabled and search_config.enabled and search_config.runtime.preload):
+            return
+
+        from backend.memory.embedding import warm_up_embedding_provider
+        status = await asyncio.to_thread(warm_up_embedding_provider, "auto")
+        runtime = status.get("runtime")
+        if runtime:
+            logger.info(
+                f"嵌入模型预加载完成: {runtime['model']} (backend={runtime['backend']}, "
+                f"load={runtime['load_seconds']:.2f}s)"
+            )
+        else:
+            logger.info(f"嵌入提供商预热完成: {status['provider']}/{status['model']}")
+    except Exception as e:
+        logger.warning(f"嵌入模型预加载失败，将在首次搜索时加载: {e}")
+
+
+async def warm_up_agent_pool() -> None:
+    """预构建 api.agent_pool_warmup_models 中的 Agent（首个请求不承担构建耗时）"""
+    try:
+        from config import get_config
+        models = list(get_config().api.agent_pool_warmup_models)
+        if not models:
+            return
+
+        from backend.api.routes.agent import _get_agent_service
+        service = _get_agent_service()
+        status = await asyncio.to_thread(service.warm_up, models)
+        logger.info(
+            f"Agent 实例池预热完成: {status['size']} 个实例, "
+            f"平均构建 {status['avg_build_ms']:.1f}ms"
+        )
+    except Exception as e:
+        logger.warning(f"Agent 实例池预热失败，将在首次请求时构建: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
@@ -70,6 +113,12 @@ async def lifespan(app: FastAPI):
         all_metadata = skill_registry.get_all_metadata()
         logger.info(f"Skills 系统初始化完成，已加载 {len(all_metadata)} 个 Skills")
 
+        # 预加载嵌入模型（首个记忆搜索请求不承担模型加载耗时）
+        await preload_embedding_runtime()
+
+        # 预构建 Agent 实例
+        await warm_up_agent_pool()
+
         # 启动数据库定期清理任务
         try:
             from tools.database import start_periodic_cleanup
@@ -89,9 +138,44 @@ async def lifespan(app: FastAPI):
         from backend.api.state import get_app_state
         app_state = get_app_state()
 
+        # 停止后台 Memory Flush 线程池（等待已提交的记忆写入完成）
+        try:
+            from backend.memory.flush import reset_memory_flush_worker
+            reset_memory_flush_worker(wait=True)
+        except Exception as e:
+            logger.warning(f"关闭 Memory Flush 执行器出错: {e}")
+
         if "file_store" in app_state:
             app_state["file_store"].close()
 
+        # 停止嵌入模型推理线程
+        try:
+            from backend.memory.embedding_runtime import reset_embedding_runtimes
+            reset_embedding_runtimes()
+        except Exception as e:
+            logger.warning(f"关闭嵌入模型运行时出错: {e}")
+
+        # 关闭 Agent 实例
+        if "agent_service" in app_state:
+            try:
+                app_state["agent_service"].shutdown()
+            except Exception as e:
+                logger.warning(f"关闭 Agent 服务出错: {e}")
+
+        # 关闭对话检查点数据库
+        try:
+            from backend.api.services.ba_agent import reset_shared_memory_saver
+            reset_shared_memory_saver()
+        except Exception as e:
+            logger.warning(f"关闭 checkpointer 出错: {e}")
+
+        # 关闭 Agent 同步任务线程池
+        try:
+            from backend.agents.sync_executor import reset_agent_sync_executor
+            reset_agent_sync_executor(wait=False)
+        except Exception as e:
+            logger.warning(f"关闭 Agent 同步执行器出错: {e}")
+
         # 关闭数据库连接并清理文件
         try:
             from tools.database import _close_connections
@@ -4,9 +4,12 @@ Agent 交互路由
 处理 Agent 查询、对话等
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
+import asyncio
+import json
 import logging
 
 from backend.api.state import get_app_state
@@ -15,6 +18,16 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 流式响应：客户端断开检测间隔（秒）
+STREAM_DISCONNECT_POLL_SECONDS = 0.5
+# 流式响应：无事件时的保活间隔（秒），防止代理超时断开
+STREAM_KEEPALIVE_SECONDS = 15.0
+
+STREAM_MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
+
 
 # ===== 请求/响应模型 =====
 
@@ -56,6 +69,75 @@ def _get_agent_service():
     return service
 
 
+def _encode_stream_event(event: Dict[str, Any], stream_format: str) -> str:
+    """按 SSE 或 NDJSON 格式编码事件"""
+    payload = json.dumps(event, ensure_ascii=False, default=str)
+    if stream_format == "sse":
+        return f"event: {event.get('event', 'message')}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+async def _stream_until_disconnect(
+    request: Request,
+    events: AsyncIterator[Dict[str, Any]],
+    stream_format: str
+) -> AsyncIterator[str]:
+    """
+    转发事件流，客户端断开时取消 Agent 执行
+
+    事件在独立任务中生产；等待事件期间定期检查连接状态（工具长时间执行
+    时没有输出，仅靠写失败无法及时发现断开），断开或响应被取消时取消
+    生产任务，取消随之传递到 LangGraph 图和进行中的工具。
+
+    Args:
+        request: 当前请求
+        events: 事件异步迭代器
+        stream_format: sse 或 ndjson
+
+    Yields:
+        编码后的事件文本
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            logger.error(f"Agent 流式查询失败: {e}", exc_info=True)
+        finally:
+            queue.put_nowait(done)
+
+    producer = asyncio.create_task(produce())
+    idle = 0.0
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), STREAM_DISCONNECT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    logger.info("Agent 流式查询: 客户端已断开，取消执行")
+                    break
+                idle += STREAM_DISCONNECT_POLL_SECONDS
+                if idle >= STREAM_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keep-alive\n\n" if stream_format == "sse" else _encode_stream_event({"event": "ping"}, stream_format)
+                continue
+
+            if event is done:
+                break
+            idle = 0.0
+            yield _encode_stream_event(event, stream_format)
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+
 # ===== 端点 =====
 
 @router.post("/query", response_model=AgentQueryResponse)
@@ -91,6 +173,42 @@ async def agent_query(request: AgentQueryRequest):
         )
 
 
+@router.post("/query/stream")
+async def agent_query_stream(
+    request: AgentQueryRequest,
+    http_request: Request,
+    format: str = Query("sse", pattern="^(sse|ndjson)$", description="流格式: sse 或 ndjson")
+):
+    """
+    Agent 流式查询接口
+
+    以 SSE（默认）或 NDJSON 推送事件：start、node（节点完成）、token（LLM 输出增量）、
+    tool_start / tool_end（工具开始/结束）、final（与 /query 的 data 相同）。
+    客户端断开连接时取消 Agent 执行。
+    """
+    service = _get_agent_service()
+
+    events = service.stream_query(
+        message=request.message,
+        model=request.model,
+        api_key=request.api_key,
+        conversation_id=request.conversation_id,
+        file_context=request.file_context,
+        session_id=request.session_id,
+        user_id=request.user_id
+    )
+
+    return StreamingResponse(
+        _stream_until_disconnect(http_request, events, format),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={
+            "Cache-Control": "no-cache",
+            # 关闭 nginx 等反向代理的响应缓冲，保证事件即时送达
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
 @router.post("/conversation/start", response_model=AgentQueryResponse)
 async def start_conversation(
     user_id: Optional[str] = None,
@@ -211,6 +329,7 @@ async def get_agent_status():
             "active_conversations": service_status["active_conversations"],
             "total_conversations": service_status["total_conversations"],
             "model_name": service_status["model_name"],
+            "agent_pool": service_status["agent_pool"],
             "version": "2.1.0"
         }
 
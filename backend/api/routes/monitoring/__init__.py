@@ -9,6 +9,7 @@ Endpoints:
 - GET /api/v1/monitoring/metrics - Query aggregated metrics
 - GET /api/v1/monitoring/performance/:conversation_id - Get performance summary
 - GET /api/v1/monitoring/conversations - List conversations with traces
+- GET /api/v1/monitoring/embedding - Embedding model load time and batch latency
 """
 
 import logging
@@ -342,6 +343,21 @@ async def get_recent_activity(
         raise HTTPException(status_code=500, detail=f"Failed to get recent activity: {str(e)}")
 
 
+@router.get("/embedding")
+async def get_embedding_metrics(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Get embedding runtime metrics
+
+    Returns model load time and per-batch inference latency for each
+    shared local embedding runtime.
+    """
+    from backend.memory.embedding_runtime import get_runtime_metrics
+
+    return {"runtimes": get_runtime_metrics()}
+
+
 # ===== Helper Functions =====
 
 def _generate_mermaid_from_trace(trace: Dict[str, Any]) -> str:
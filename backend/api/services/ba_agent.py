@@ -11,6 +11,7 @@ BA-Agent 服务
 from typing import Optional, Dict, Any, List
 from pathlib import Path
 import logging
+import threading
 from datetime import datetime
 
 from backend.models.response import (
@@ -18,32 +19,91 @@ from backend.models.response import (
     parse_structured_response,
 )
 from backend.core.context_manager import create_context_manager
+from backend.agents.agent_pool import AgentPool, DEFAULT_POOL_SIZE
+from backend.agents.checkpointer import (
+    BoundedSqliteSaver,
+    DEFAULT_HOT_THREADS,
+    DEFAULT_KEEP_CHECKPOINTS,
+    get_checkpoint_db_path,
+)
+from backend.agents.sync_executor import run_sync
 
 logger = logging.getLogger(__name__)
 
-# 全局共享的 MemorySaver 实例
+# 全局共享的 checkpointer 实例
 # 所有 Agent 实例共享同一个 checkpointer，确保跨模型的对话历史可以被访问
 _shared_memory_saver = None
+_shared_memory_saver_lock = threading.Lock()
+
+
+def _create_checkpointer():
+    """按 api.checkpoint_* 配置创建 checkpointer（SQLite 不可用时回退到 MemorySaver）"""
+    backend = "sqlite"
+    keep_checkpoints = DEFAULT_KEEP_CHECKPOINTS
+    hot_threads = DEFAULT_HOT_THREADS
+    try:
+        from config import get_config
+        api_config = get_config().api
+        backend = api_config.checkpoint_backend
+        keep_checkpoints = api_config.checkpoint_keep_per_thread
+        hot_threads = api_config.checkpoint_hot_threads
+    except Exception:
+        pass
+
+    if backend == "sqlite":
+        try:
+            db_path = get_checkpoint_db_path()
+            saver = BoundedSqliteSaver.open(
+                db_path,
+                keep_checkpoints=keep_checkpoints,
+                hot_threads=hot_threads
+            )
+            saver.setup()
+            logger.info(
+                f"创建全局共享 SQLite checkpointer: {db_path} "
+                f"(每线程保留 {keep_checkpoints} 个检查点, 缓存 {hot_threads} 个线程)"
+            )
+            return saver
+        except Exception as e:
+            logger.warning(f"SQLite checkpointer 初始化失败，回退到 MemorySaver: {e}")
+
+    from langgraph.checkpoint.memory import MemorySaver
+    logger.info("创建全局共享 MemorySaver 实例")
+    return MemorySaver()
 
 
 def get_shared_memory_saver():
     """
-    获取全局共享的 MemorySaver 实例
+    获取全局共享的 checkpointer 实例
 
     确保所有 Agent（无论是默认 Agent 还是动态创建的 Agent）使用同一个 checkpointer，
-    从而实现跨模型的对话历史保存和恢复。
+    从而实现跨模型的对话历史保存和恢复。默认使用存储目录下的 SQLite 数据库
+    （有界、重启后保留），api.checkpoint_backend 为 "memory" 时使用 MemorySaver。
 
     Returns:
-        MemorySaver: 全局共享的 checkpointer 实例
+        BoundedSqliteSaver 或 MemorySaver: 全局共享的 checkpointer 实例
     """
     global _shared_memory_saver
     if _shared_memory_saver is None:
-        from langgraph.checkpoint.memory import MemorySaver
-        _shared_memory_saver = MemorySaver()
-        logger.info("创建全局共享 MemorySaver 实例")
+        with _shared_memory_saver_lock:
+            if _shared_memory_saver is None:
+                _shared_memory_saver = _create_checkpointer()
     return _shared_memory_saver
 
 
+def reset_shared_memory_saver() -> None:
+    """关闭并重置全局共享的 checkpointer（用于服务关闭和测试）"""
+    global _shared_memory_saver
+    with _shared_memory_saver_lock:
+        saver = _shared_memory_saver
+        _shared_memory_saver = None
+    if saver is not None and hasattr(saver, "close"):
+        try:
+            saver.close()
+        except Exception as e:
+            logger.warning(f"关闭 checkpointer 出错: {e}")
+
+
 class BAAgentService:
     """
     BA-Agent 服务类 (API 层)
@@ -86,8 +146,18 @@ class BAAgentService:
         # 对话状态管理（仅 API 层需要，BAAgent 有自己的记忆系统）
         self._conversations: Dict[str, Dict[str, Any]] = {}
 
-        # BAAgent 实例（延迟初始化）
+        # BAAgent 实例（延迟初始化，并发请求只初始化一次）
         self._ba_agent = None
+        self._init_lock = threading.Lock()
+
+        # 按 (模型, API Key 指纹, 配置哈希) 复用的动态 Agent
+        pool_size = DEFAULT_POOL_SIZE
+        try:
+            from config import get_config
+            pool_size = int(get_config().api.agent_pool_size)
+        except Exception:
+            pass
+        self._agent_pool = AgentPool(max_size=pool_size)
 
         # 上下文管理器（用于新对话的系统提示构建）
         self._context_manager = None
@@ -100,15 +170,21 @@ class BAAgentService:
 
         使用 BAAgent (backend/agents/agent.py) 作为核心实现
         """
+        with self._init_lock:
+            if self._ba_agent is None:
+                self._initialize_agent()
+
+    def _initialize_agent(self):
+        """创建默认 BAAgent 实例"""
         try:
             from backend.agents.agent import BAAgent
             from backend.api.state import get_app_state
 
-            # 获取全局共享的 MemorySaver
+            # 获取全局共享的 checkpointer
             shared_memory = get_shared_memory_saver()
 
             # 创建 BAAgent 实例
-            # 通过设置 _memory 属性，让 BAAgent 使用全局共享的 MemorySaver
+            # 通过设置 _memory 属性，让 BAAgent 使用全局共享的 checkpointer
             ba_agent_instance = BAAgent.__new__(BAAgent)
             ba_agent_instance._memory = shared_memory
             ba_agent_instance.__init__(
@@ -119,7 +195,7 @@ class BAAgentService:
             )
             self._ba_agent = ba_agent_instance
 
-            logger.info("BAAgent 实例初始化完成（使用全局共享 MemorySaver）")
+            logger.info("BAAgent 实例初始化完成（使用全局共享 checkpointer）")
 
         except Exception as e:
             logger.error(f"BAAgent 初始化失败: {e}", exc_info=True)
@@ -145,11 +221,28 @@ class BAAgentService:
             self._context_manager = create_context_manager(file_store)
         return self._context_manager
 
+    def _request_agent_config(self, model_name: str):
+        """动态 Agent 的配置"""
+        from backend.models.agent import AgentConfig
+
+        return AgentConfig(
+            name=f"BA-Agent-{model_name}",
+            model=model_name,
+            temperature=0.7,
+            max_tokens=4096,
+            system_prompt="你是 BA-Agent，一个专业的商业分析助手。",  # 简化提示词
+            tools=[],
+            memory_enabled=self.enable_memory,
+            hooks_enabled=True,
+        )
+
     def _create_agent_for_request(self, model_name: str, api_key: str = None):
         """
-        为特定请求创建 BAAgent 实例
+        获取特定请求使用的 BAAgent 实例
 
-        当用户指定不同的模型或 API Key 时，创建临时的 BAAgent 实例
+        当用户指定不同的模型或 API Key 时使用动态 Agent。实例按
+        (模型, API Key 指纹, 配置哈希) 缓存在 LRU 池中，同一组合只构建一次；
+        构建时从默认 Agent 派生，共享工具、Skills、系统提示词和全局 checkpointer。
 
         Args:
             model_name: 模型名称
@@ -158,38 +251,66 @@ class BAAgentService:
         Returns:
             BAAgent 实例
         """
-        from backend.agents.agent import BAAgent
-        from backend.models.agent import AgentConfig
+        config = self._request_agent_config(model_name)
+        key = AgentPool.make_key(model_name, api_key, config)
+        return self._agent_pool.get_or_create(
+            key, lambda: self._build_agent_for_request(config, api_key)
+        )
 
-        # 获取全局共享的 MemorySaver
-        shared_memory = get_shared_memory_saver()
+    def _build_agent_for_request(self, config, api_key: Optional[str] = None):
+        """
+        构建动态 Agent（实例池未命中时调用）
 
-        # 创建针对该模型的配置
-        config = AgentConfig(
-            name=f"BA-Agent-{model_name}",
-            model=model_name,
-            temperature=0.7,
-            max_tokens=4096,
-            system_prompt="你是 BA-Agent，一个专业的商业分析助手。",  # 简化提示词
-            tools=[],
-            memory_enabled=self.enable_memory,
-            hooks_enabled=True,
-        )
+        Args:
+            config: Agent 配置
+            api_key: API 密钥（可选）
 
-        # 创建临时 BAAgent（使用全局共享 MemorySaver）
-        temp_agent_instance = BAAgent.__new__(BAAgent)
-        temp_agent_instance._memory = shared_memory
+        Returns:
+            BAAgent 实例
+        """
+        try:
+            template = self.agent
+        except Exception as e:
+            # 默认 Agent 不可用（例如环境变量中没有 API Key）时独立构建
+            logger.warning(f"默认 Agent 不可用，独立构建动态 Agent: {e}")
+            return self._build_standalone_agent(config, api_key)
+
+        agent = template.derive(config, api_key)
+        logger.info(f"派生动态 BAAgent: model={config.model}, 共享工具/Skills/checkpointer")
+        return agent
+
+    def _build_standalone_agent(self, config, api_key: Optional[str] = None):
+        """完整构建一个 BAAgent（使用全局共享 checkpointer）"""
+        from backend.agents.agent import BAAgent
 
-        # 调用 __init__
-        temp_agent_instance.__init__(
+        agent = BAAgent.__new__(BAAgent)
+        agent._memory = get_shared_memory_saver()
+        agent._api_key = api_key
+        agent.__init__(
             config=config,
             tools=None,
             system_prompt=None,
             use_default_tools=True,
         )
+        return agent
 
-        logger.info(f"创建临时 BAAgent: model={model_name}, 使用全局共享 MemorySaver")
-        return temp_agent_instance
+    def warm_up(self, models: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        预构建默认 Agent 和指定模型的动态 Agent（启动时调用）
+
+        Args:
+            models: 模型列表（使用环境变量/配置中的 API Key）
+
+        Returns:
+            实例池状态
+        """
+        self.initialize()
+        for model_name in models or []:
+            try:
+                self._create_agent_for_request(model_name)
+            except Exception as e:
+                logger.warning(f"预构建 Agent 失败: model={model_name}, {e}")
+        return self._agent_pool.get_status()
 
     async def query(
         self,
@@ -204,6 +325,9 @@ class BAAgentService:
         """
         执行 Agent 查询
 
+        通过 BAAgent.ainvoke 执行，LLM 调用和工具执行期间不阻塞事件循环；
+        Agent 的构建（首次初始化、动态模型）在同步执行器中完成。
+
         Args:
             message: 用户消息
             model: 使用的模型名称（可选，覆盖默认模型）
@@ -218,141 +342,241 @@ class BAAgentService:
         """
         try:
             import time
-            import traceback
             start_time = time.time()
 
-            # 确定使用的 Agent
-            agent_to_use = self._ba_agent
-            model_to_log = self.model_name
-
-            # 如果指定了模型或 API Key，创建临时 Agent
-            if model or api_key:
-                effective_model = model or self.model_name
-                logger.info(f"创建动态 Agent: model={effective_model}, api_key_provided={api_key is not None}")
-                agent_to_use = self._create_agent_for_request(effective_model, api_key)
-                model_to_log = effective_model
-            else:
-                # 确保 Agent 已初始化
-                if agent_to_use is None:
-                    self.initialize()
-                agent_to_use = self._ba_agent
+            agent_to_use, model_to_log = await self._resolve_agent(model, api_key)
 
             # 确保对话存在
-            is_new_conversation = conversation_id is None
-            if is_new_conversation:
+            if conversation_id is None:
                 conversation_id = self._create_conversation(user_id, session_id)
 
             # === 统一调用路径 ===
-            # 所有查询都通过 BAAgent.invoke()，由 ContextCoordinator 处理：
+            # 所有查询都通过 BAAgent.ainvoke()，由 ContextCoordinator 处理：
             # - 文件清理（统一在 ContextManager 中）
             # - 系统提示词插入
             # - 对话历史管理（由 LangGraph checkpointer 自动处理）
             # - Memory Flush（由 BAAgent 内部处理）
-
-            # 如果有 file_context，将其添加到消息中
-            enhanced_message = message
-            if file_context:
-                # 将文件上下文信息添加到消息中
-                file_info = self.context_manager._build_file_context(file_context)
-                if file_info:
-                    file_context_str = "\n\n".join([
-                        f"[{msg.get('role', 'system')}] {msg.get('content', '')}"
-                        for msg in file_info
-                    ])
-                    enhanced_message = f"{file_context_str}\n\n用户消息：{message}"
+            enhanced_message = self._enhance_message(message, file_context)
 
             logger.info(f"Agent 查询: model={model_to_log}, conversation_id={conversation_id}, message={message[:100]}...")
 
-            result = agent_to_use.invoke(
+            result = await agent_to_use.ainvoke(
                 message=enhanced_message,
                 conversation_id=conversation_id,
                 user_id=user_id,
                 session_id=session_id,  # 传递 session_id 供 ContextCoordinator 使用
             )
 
-            # 处理响应
-            duration_ms = (time.time() - start_time) * 1000
-
-            # 更新对话状态（API 层的简单计数）
-            self._update_conversation(conversation_id, {
-                "last_message_at": datetime.utcnow().isoformat() + "Z",
-                "message_count": self._conversations[conversation_id]["message_count"] + 1
-            })
-
-            # 提取响应内容
-            response_content = result.get("response", "")
-            success = result.get("success", True)
-            error = result.get("error")
-
-            # 解析结构化响应（如果存在）
-            structured_response = None
-            if success:
-                try:
-                    structured_response = parse_structured_response(response_content)
-                except:
-                    pass
-
-            # 构建元数据
-            metadata = {
-                "content_type": "text",
-                "has_structured_response": structured_response is not None,
-                "tokens_used": result.get("tokens_used", 0),
-                "session_tokens": result.get("session_tokens", 0),
-            }
-
-            if structured_response:
-                metadata["action_type"] = structured_response.action.type
-                metadata["current_round"] = structured_response.current_round
-                metadata["task_analysis"] = structured_response.task_analysis
-                metadata["execution_plan"] = structured_response.execution_plan
-
-                if structured_response.is_complete():
-                    metadata["status"] = "complete"
-                    if structured_response.action.recommended_questions:
-                        metadata["recommended_questions"] = structured_response.action.recommended_questions
-                    if structured_response.action.download_links:
-                        metadata["download_links"] = structured_response.action.download_links
-
-                    final_report = structured_response.get_final_report()
-                    has_html = '<div' in final_report or '<script' in final_report or 'echarts' in final_report.lower()
-                    metadata["contains_html"] = has_html
-                    metadata["content_type"] = "html" if has_html else "markdown"
-
-            return {
-                "response": response_content,
-                "conversation_id": conversation_id,
-                "duration_ms": duration_ms,
-                "tool_calls": result.get("tool_calls", []),
-                "artifacts": result.get("artifacts", []),
-                "metadata": metadata
-            }
+            return self._build_query_result(result, conversation_id, start_time)
 
         except Exception as e:
-            import traceback
-            error_type = type(e).__name__
-            error_msg = str(e)
-            error_traceback = traceback.format_exc()
-
-            # 详细的错误日志
-            logger.error(
-                f"Agent 查询失败: "
-                f"type={error_type}, "
-                f"msg={error_msg}, "
-                f"model={model_to_log if 'model_to_log' in locals() else 'unknown'}, "
-                f"conversation_id={conversation_id}, "
-                f"traceback={error_traceback}"
+            return self._build_query_error(
+                e, conversation_id,
+                model_to_log if 'model_to_log' in locals() else self.model_name,
             )
 
-            # 构建错误响应
-            return {
-                "response": f"查询失败: {error_msg}",
-                "conversation_id": conversation_id,
-                "error": {
-                    "error_type": error_type,
-                    "error_message": error_msg,
-                    "model": model_to_log if 'model_to_log' in locals() else self.model_name,
-                }
+    async def stream_query(
+        self,
+        message: str,
+        model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        file_context: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ):
+        """
+        流式执行 Agent 查询
+
+        先推送 start 事件（包含 conversation_id），再逐个转发
+        BAAgent.astream_events 的节点、token、工具事件，最后推送与 query
+        返回值相同结构的 final 事件。调用方停止迭代或任务被取消时 Agent
+        的执行随之取消。
+
+        Args:
+            message: 用户消息
+            model: 使用的模型名称（可选，覆盖默认模型）
+            api_key: API 密钥（可选，覆盖环境变量）
+            conversation_id: 对话 ID
+            file_context: 文件上下文
+            session_id: 会话 ID
+            user_id: 用户 ID
+
+        Yields:
+            事件字典（start, node, token, tool_start, tool_end, final）
+        """
+        import time
+        start_time = time.time()
+
+        # 先推送 start 事件，Agent 构建和首次 LLM 调用前客户端即可收到首字节
+        if conversation_id is None:
+            conversation_id = self._create_conversation(user_id, session_id)
+        yield {"event": "start", "conversation_id": conversation_id}
+
+        model_to_log = model or self.model_name
+        try:
+            agent_to_use, model_to_log = await self._resolve_agent(model, api_key)
+            enhanced_message = self._enhance_message(message, file_context)
+
+            logger.info(f"Agent 流式查询: model={model_to_log}, conversation_id={conversation_id}, message={message[:100]}...")
+
+            async for event in agent_to_use.astream_events(
+                message=enhanced_message,
+                conversation_id=conversation_id,
+                user_id=user_id,
+                session_id=session_id,
+            ):
+                if event["event"] == "final":
+                    event = {
+                        "event": "final",
+                        "data": self._build_query_result(event["result"], conversation_id, start_time),
+                    }
+                yield event
+
+        except Exception as e:
+            yield {"event": "final", "data": self._build_query_error(e, conversation_id, model_to_log)}
+
+    async def _resolve_agent(self, model: Optional[str], api_key: Optional[str]):
+        """
+        确定本次查询使用的 Agent（构建在同步执行器中完成）
+
+        Returns:
+            (agent, model_name)
+        """
+        # 如果指定了模型或 API Key，创建临时 Agent
+        if model or api_key:
+            effective_model = model or self.model_name
+            logger.info(f"创建动态 Agent: model={effective_model}, api_key_provided={api_key is not None}")
+            agent = await run_sync(self._create_agent_for_request, effective_model, api_key)
+            return agent, effective_model
+
+        # 确保 Agent 已初始化
+        if self._ba_agent is None:
+            await run_sync(self.initialize)
+        return self._ba_agent, self.model_name
+
+    def _enhance_message(self, message: str, file_context: Optional[Dict[str, Any]]) -> str:
+        """如果有 file_context，将其添加到消息中"""
+        if not file_context:
+            return message
+
+        file_info = self.context_manager._build_file_context(file_context)
+        if not file_info:
+            return message
+
+        file_context_str = "\n\n".join([
+            f"[{msg.get('role', 'system')}] {msg.get('content', '')}"
+            for msg in file_info
+        ])
+        return f"{file_context_str}\n\n用户消息：{message}"
+
+    def _build_query_result(
+        self,
+        result: Dict[str, Any],
+        conversation_id: str,
+        start_time: float
+    ) -> Dict[str, Any]:
+        """
+        将 BAAgent 的调用结果构建为 API 响应（解析结构化响应、构建元数据）
+
+        Args:
+            result: BAAgent.ainvoke 的返回值
+            conversation_id: 对话 ID
+            start_time: 查询开始时间（time.time()）
+
+        Returns:
+            API 响应数据
+        """
+        import time
+
+        # 处理响应
+        duration_ms = (time.time() - start_time) * 1000
+
+        # 更新对话状态（API 层的简单计数）
+        self._update_conversation(conversation_id, {
+            "last_message_at": datetime.utcnow().isoformat() + "Z",
+            "message_count": self._conversations[conversation_id]["message_count"] + 1
+        })
+
+        # 提取响应内容
+        response_content = result.get("response", "")
+        success = result.get("success", True)
+
+        # 解析结构化响应（如果存在）
+        structured_response = None
+        if success:
+            try:
+                structured_response = parse_structured_response(response_content)
+            except:
+                pass
+
+        # 构建元数据
+        metadata = {
+            "content_type": "text",
+            "has_structured_response": structured_response is not None,
+            "tokens_used": result.get("tokens_used", 0),
+            "session_tokens": result.get("session_tokens", 0),
+        }
+
+        if structured_response:
+            metadata["action_type"] = structured_response.action.type
+            metadata["current_round"] = structured_response.current_round
+            metadata["task_analysis"] = structured_response.task_analysis
+            metadata["execution_plan"] = structured_response.execution_plan
+
+            if structured_response.is_complete():
+                metadata["status"] = "complete"
+                if structured_response.action.recommended_questions:
+                    metadata["recommended_questions"] = structured_response.action.recommended_questions
+                if structured_response.action.download_links:
+                    metadata["download_links"] = structured_response.action.download_links
+
+                final_report = structured_response.get_final_report()
+                has_html = '<div' in final_report or '<script' in final_report or 'echarts' in final_report.lower()
+                metadata["contains_html"] = has_html
+                metadata["content_type"] = "html" if has_html else "markdown"
+
+        return {
+            "response": response_content,
+            "conversation_id": conversation_id,
+            "duration_ms": duration_ms,
+            "tool_calls": result.get("tool_calls", []),
+            "artifacts": result.get("artifacts", []),
+            "metadata": metadata
+        }
+
+    def _build_query_error(
+        self,
+        e: Exception,
+        conversation_id: Optional[str],
+        model_name: str
+    ) -> Dict[str, Any]:
+        """记录查询异常并构建错误响应"""
+        import traceback
+        error_type = type(e).__name__
+        error_msg = str(e)
+        error_traceback = traceback.format_exc()
+
+        # 详细的错误日志
+        logger.error(
+            f"Agent 查询失败: "
+            f"type={error_type}, "
+            f"msg={error_msg}, "
+            f"model={model_name}, "
+            f"conversation_id={conversation_id}, "
+            f"traceback={error_traceback}"
+        )
+
+        # 构建错误响应
+        return {
+            "response": f"查询失败: {error_msg}",
+            "conversation_id": conversation_id,
+            "error": {
+                "error_type": error_type,
+                "error_message": error_msg,
+                "model": model_name,
             }
+        }
 
     def _create_conversation(
         self,
@@ -430,8 +654,15 @@ class BAAgentService:
                 c for c in self._conversations.values()
                 if c.get("status") != "ended"
             ]),
-            "total_conversations": len(self._conversations)
+            "total_conversations": len(self._conversations),
+            "agent_pool": self._agent_pool.get_status(),
         }
 
+    def shutdown(self):
+        """关闭实例池中的动态 Agent 和默认 Agent"""
+        self._agent_pool.clear()
+        if self._ba_agent is not None:
+            self._ba_agent.shutdown()
+
 
-__all__ = ["BAAgentService", "get_shared_memory_saver"]
+__all__ = ["BAAgentService", "get_shared_memory_saver", "reset_shared_memory_saver"]
@@ -6,31 +6,63 @@
 
 from .schema import (
     ensure_memory_index_schema,
+    migrate_vector_storage,
+    migrate_vector_rowids,
     get_index_db_path,
     open_index_db,
     DEFAULT_INDEX_PATH
 )
 from .index import MemoryIndexer, MemoryWatcher
+from .line_index import LineIndex, get_line_index
+from .line_offsets import LineOffsetIndex, get_line_offset_index
 from .embedding import (
     EmbeddingProvider,
     ZhipuEmbeddingProvider,
     OpenAIEmbeddingProvider,
     LocalEmbeddingProvider,
     FallbackEmbeddingProvider,
-    create_embedding_provider
+    EmbeddingLRUCache,
+    EmbeddingQueue,
+    create_embedding_provider,
+    get_embedding_provider,
+    warm_up_embedding_provider,
+    get_embedding_queue,
+    embed_query
 )
+from .embedding_runtime import EmbeddingRuntime, get_embedding_runtime
+from .vector_format import (
+    encode_vector,
+    decode_vector,
+    decode_vector_array,
+)
+from .vector_compression import VectorCompressor
 from .vector_search import (
     cosine_similarity,
     normalize_scores,
     combine_scores,
+    VectorMatrix,
+    QuantizedVectorMatrix,
+    IVFIndex,
     VectorSearchEngine,
-    HybridSearchEngine
+    HybridSearchEngine,
+    get_ann_index,
+    get_ann_index_path,
+)
+from .sharded_search import (
+    ShardedSearchExecutor,
+    get_sharded_search_executor,
+)
+from .result_cache import (
+    SearchResultCache,
+    get_search_result_cache,
 )
 from .flush import (
     RetainFormatter,
     MemoryExtractor,
     MemoryFlushConfig,
-    MemoryFlush
+    MemoryFlush,
+    MemoryFlushWorker,
+    get_memory_flush_worker
 )
 from .flush_enhanced import (
     FileRefDetector,
@@ -49,26 +81,55 @@ from .search_enhanced import (
 
 __all__ = [
     "ensure_memory_index_schema",
+    "migrate_vector_storage",
+    "migrate_vector_rowids",
     "get_index_db_path",
     "open_index_db",
     "DEFAULT_INDEX_PATH",
     "MemoryIndexer",
     "MemoryWatcher",
+    "LineIndex",
+    "get_line_index",
+    "LineOffsetIndex",
+    "get_line_offset_index",
     "EmbeddingProvider",
     "ZhipuEmbeddingProvider",
     "OpenAIEmbeddingProvider",
     "LocalEmbeddingProvider",
     "FallbackEmbeddingProvider",
+    "EmbeddingLRUCache",
+    "EmbeddingQueue",
     "create_embedding_provider",
+    "get_embedding_provider",
+    "warm_up_embedding_provider",
+    "EmbeddingRuntime",
+    "get_embedding_runtime",
+    "get_embedding_queue",
+    "embed_query",
+    "encode_vector",
+    "decode_vector",
+    "decode_vector_array",
+    "VectorCompressor",
     "cosine_similarity",
     "normalize_scores",
     "combine_scores",
+    "VectorMatrix",
+    "QuantizedVectorMatrix",
+    "IVFIndex",
     "VectorSearchEngine",
     "HybridSearchEngine",
+    "get_ann_index",
+    "get_ann_index_path",
+    "ShardedSearchExecutor",
+    "get_sharded_search_executor",
+    "SearchResultCache",
+    "get_search_result_cache",
     "RetainFormatter",
     "MemoryExtractor",
     "MemoryFlushConfig",
     "MemoryFlush",
+    "MemoryFlushWorker",
+    "get_memory_flush_worker",
     # Enhanced flush with file reference support
     "FileRefDetector",
     "EnhancedMemoryFlush",
@@ -0,0 +1,118 @@
+"""
+中日韩 (CJK) 文本的 FTS5 支持
+
+FTS5 默认的 unicode61 分词器把连续的汉字视为一个 token，中文查询
+无法命中。这里为每个文本块生成一份预分词的影子文本写入 chunks_cjk 表：
+连续的 CJK 字符切成重叠二元组（bigram），每段末尾再补一个单字，
+非 CJK 部分保持原样。
+
+查询时把中文查询改写为 MATCH 表达式：
+- 两个字及以上：bigram 短语（要求相邻，等价于子串匹配）
+- 单字：前缀匹配（命中以该字开头的 bigram 或段尾单字）
+"""
+
+import re
+from typing import List, Optional
+
+# CJK 统一汉字（含扩展 A）、兼容汉字、日文假名、韩文音节
+_CJK_RANGES = (
+    "぀-ヿ"      # 平假名、片假名
+    "㐀-䶿"      # 扩展 A
+    "一-鿿"      # 基本汉字
+    "가-힯"      # 韩文音节
+    "豈-﫿"      # 兼容汉字
+)
+_CJK_RUN = re.compile(f"[{_CJK_RANGES}]+")
+_CJK_CHAR = re.compile(f"[{_CJK_RANGES}]")
+# 查询中的词：CJK 段或其他单词字符段
+_QUERY_TOKEN = re.compile(f"[{_CJK_RANGES}]+|[^\\W{_CJK_RANGES}]+")
+
+# 影子 FTS 表名
+CJK_FTS_TABLE = "chunks_cjk"
+
+# 分词方案版本（变更后需要重建影子表）
+CJK_SEGMENT_VERSION = 1
+
+
+def contains_cjk(text: str) -> bool:
+    """
+    文本是否包含 CJK 字符
+
+    Args:
+        text: 文本
+
+    Returns:
+        是否包含
+    """
+    return bool(text) and _CJK_CHAR.search(text) is not None
+
+
+def _bigrams(run: str) -> List[str]:
+    """CJK 段的重叠二元组，末尾补单字"""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def segment_cjk(text: str) -> str:
+    """
+    生成影子文本：CJK 段切成 bigram，其余部分保持不变
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        用空格分隔的影子文本
+    """
+    if not contains_cjk(text):
+        return text
+    return _CJK_RUN.sub(lambda m: " " + " ".join(_bigrams(m.group(0))) + " ", text)
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_cjk_match(query: str) -> Optional[str]:
+    """
+    将查询改写为 chunks_cjk 的 MATCH 表达式
+
+    各词之间为 AND 关系；FTS5 语法字符一律作为普通文本处理。
+
+    Args:
+        query: 用户查询
+
+    Returns:
+        MATCH 表达式，查询中没有可索引的词时返回 None
+    """
+    terms = []
+    for token in _QUERY_TOKEN.findall(query or ""):
+        if _CJK_CHAR.match(token):
+            if len(token) == 1:
+                terms.append(_quote(token) + "*")
+            else:
+                grams = [token[i:i + 2] for i in range(len(token) - 1)]
+                terms.append(_quote(" ".join(grams)))
+        else:
+            terms.append(_quote(token))
+
+    if not terms:
+        return None
+    return " AND ".join(terms)
+
+
+def has_cjk_index(db) -> bool:
+    """
+    数据库中是否存在 CJK 影子表
+
+    Args:
+        db: 数据库连接
+
+    Returns:
+        是否存在
+    """
+    row = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (CJK_FTS_TABLE,)
+    ).fetchone()
+    return row is not None
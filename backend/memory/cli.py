@@ -15,6 +15,7 @@ import click
 
 from .index import (
     MemoryIndexer,
+    list_memory_files,
     open_index_db,
     get_index_db_path,
     DEFAULT_INDEX_PATH,
@@ -26,7 +27,7 @@ from .index_rotation import (
     get_all_index_paths,
 )
 from .vector_search import HybridSearchEngine
-from .embedding import create_embedding_provider
+from .embedding import get_embedding_provider
 from .flush import MemoryFlush, MemoryExtractor
 
 
@@ -43,11 +44,13 @@ def memory():
 @memory.command()
 @click.option("--memory-dir", type=click.Path(exists=True), default="./memory", help="记忆目录路径")
 @click.option("--index-path", type=click.Path(), default=None, help="索引文件路径（默认使用轮换管理器自动管理）")
-@click.option("--force", is_flag=True, help="强制重建索引，即使已存在")
-def index(memory_dir: str, index_path: Optional[str], force: bool):
+@click.option("--force", is_flag=True, help="强制重新索引所有文件，即使内容未变化")
+@click.option("--rebuild", is_flag=True, help="清空索引后整体重建（批量导入模式）")
+@click.option("--batch-size", type=int, default=100, help="每个事务包含的文件数")
+def index(memory_dir: str, index_path: Optional[str], force: bool, rebuild: bool, batch_size: int):
     """重建记忆索引
 
-    扫描 memory 目录下的所有文件并重建搜索索引
+    扫描 memory 目录下的所有文件并更新搜索索引
     支持索引轮换：自动管理多个索引文件
     """
     memory_path = Path(memory_dir)
@@ -58,6 +61,7 @@ def index(memory_dir: str, index_path: Optional[str], force: bool):
     # 确定索引路径
     if index_path:
         idx_path = Path(index_path)
+        idx_path.parent.mkdir(parents=True, exist_ok=True)
     else:
         # 使用轮换管理器获取当前索引路径
         idx_path = get_current_index_path()
@@ -66,30 +70,35 @@ def index(memory_dir: str, index_path: Optional[str], force: bool):
     click.echo(f"🗂️  索引路径: {idx_path}")
 
     # 创建索引器
-    indexer = MemoryIndexer(
-        memory_dir=memory_path,
-        index_path=idx_path,
-        force=force
-    )
+    indexer = MemoryIndexer(db_path=idx_path)
+    file_count = len(list_memory_files(memory_path))
 
     try:
         # 执行索引
         with click.progressbar(
-            length=100,
-            label='📊 正在重建索引'
+            length=file_count,
+            label='📊 正在重建索引' if rebuild else '📊 正在更新索引'
         ) as bar:
-            stats = indexer.rebuild_index(
-                progress_callback=lambda p: bar.update(p)
+            stats = indexer.index_directory(
+                memory_path,
+                rebuild=rebuild,
+                incremental=not force,
+                batch_size=batch_size,
+                progress_callback=bar.update
             )
 
-        click.echo("\n✅ 索引重建完成")
-        click.echo(f"   文件数: {stats.get('files', 0)}")
+        click.echo("\n✅ 索引完成")
+        click.echo(f"   文件数: {stats.get('files', 0)}（更新 {stats.get('updated', 0)}）")
         click.echo(f"   分块数: {stats.get('chunks', 0)}")
         click.echo(f"   向量数: {stats.get('vectors', 0)}")
+        if stats.get("failed"):
+            click.echo(f"   失败数: {stats['failed']}")
 
     except Exception as e:
         click.echo(f"\n❌ 索引失败: {e}", err=True)
         sys.exit(1)
+    finally:
+        indexer.close()
 
 
 @memory.command()
@@ -111,13 +120,14 @@ def search(query: str, max_results: int, min_score: float, source: str, hybrid:
         sys.exit(1)
 
     try:
-        db = open_index_db(index_path)
+        # 只读打开，搜索不产生写事务
+        db = open_index_db(index_path, read_only=True)
 
         if hybrid:
-            # 尝试混合搜索
+            # 尝试混合搜索（查询向量仅作为参数，不写入索引）
             try:
-                provider = create_embedding_provider(provider="auto")
-                query_embedding = provider.encode_batch([query])[0]
+                provider = get_embedding_provider(provider="auto")
+                query_embedding = provider.encode_single(query)
                 embedding_dims = len(query_embedding)
 
                 engine = HybridSearchEngine(
@@ -125,10 +135,6 @@ def search(query: str, max_results: int, min_score: float, source: str, hybrid:
                     dims=embedding_dims,
                     use_sqlite_vec=False
                 )
-                engine.ensure_vector_tables()
-
-                query_id = "__query__"
-                engine.insert_vector(query_id, query_embedding)
 
                 source_filter = None if source == "all" else [source]
                 results = engine.search(
@@ -138,12 +144,6 @@ def search(query: str, max_results: int, min_score: float, source: str, hybrid:
                     source_filter=source_filter
                 )
 
-                # 清理查询向量
-                try:
-                    engine.delete_by_path("")
-                except:
-                    pass
-
             except Exception as e:
                 click.echo(f"⚠️  混合搜索失败，回退到 FTS: {e}", err=True)
                 hybrid = False
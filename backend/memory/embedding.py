@@ -5,9 +5,13 @@
 """
 
 import hashlib
+import logging
+import threading
 import time
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple
 from pathlib import Path
 
 try:
@@ -28,16 +32,132 @@ try:
 except ImportError:
     HAS_OPENAI = False
 
+from .vector_format import encode_vector, decode_vector
+from .embedding_runtime import EmbeddingRuntime, get_embedding_runtime
+
+logger = logging.getLogger(__name__)
+
+
+# 进程内 LRU 缓存默认上限
+DEFAULT_MEMORY_CACHE_ENTRIES = 4096
+DEFAULT_MEMORY_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class EmbeddingLRUCache:
+    """
+    进程内嵌入向量 LRU 缓存
+
+    位于 SQLite embedding_cache 之前，按条目数和字节数双重限制。
+    向量以 float32 二进制形式存储，字节数即实际占用。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MEMORY_CACHE_ENTRIES,
+        max_bytes: int = DEFAULT_MEMORY_CACHE_BYTES
+    ):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数（0 表示禁用）
+            max_bytes: 最大字节数（0 表示禁用）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """
+        查找向量（命中时移到最近使用端）
+
+        Args:
+            key: 缓存键（content hash）
+
+        Returns:
+            嵌入向量，未命中时返回 None
+        """
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return decode_vector(blob)
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        """
+        写入向量，超出上限时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键（content hash）
+            embedding: 嵌入向量
+        """
+        if not self.enabled or not embedding:
+            return
+
+        blob = encode_vector(embedding)
+        if len(blob) > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存（计数保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
 
 class EmbeddingProvider(ABC):
     """嵌入提供商抽象基类"""
 
+    # 提供商单次请求的最佳输入条数（None 表示使用 batch_size）
+    preferred_batch_size: Optional[int] = None
+
     def __init__(
         self,
         model: str,
         cache_db=None,
         batch_size: int = 100,
-        request_timeout: float = 30.0
+        request_timeout: float = 30.0,
+        vector_dtype: str = "float32",
+        memory_cache_entries: int = DEFAULT_MEMORY_CACHE_ENTRIES,
+        memory_cache_bytes: int = DEFAULT_MEMORY_CACHE_BYTES
     ):
         """
         初始化嵌入提供商
@@ -47,12 +167,19 @@ class EmbeddingProvider(ABC):
             cache_db: SQLite 缓存数据库连接 (可选)
             batch_size: 批处理大小
             request_timeout: 请求超时时间（秒）
+            vector_dtype: 缓存向量的存储精度 (float32, float16)
+            memory_cache_entries: 进程内 LRU 缓存条目上限（0 表示禁用）
+            memory_cache_bytes: 进程内 LRU 缓存字节上限
         """
         self.model = model
         self.cache_db = cache_db
         self.batch_size = batch_size
         self.request_timeout = request_timeout
+        self.vector_dtype = vector_dtype
+        self.memory_cache = EmbeddingLRUCache(memory_cache_entries, memory_cache_bytes)
         self._provider_name = self.__class__.__name__.replace("EmbeddingProvider", "").lower()
+        self._cache_stats = {"sqlite_hits": 0, "sqlite_misses": 0}
+        self._cache_stats_lock = threading.Lock()
 
     @abstractmethod
     def _encode_batch(self, texts: List[str]) -> List[List[float]]:
@@ -79,24 +206,29 @@ class EmbeddingProvider(ABC):
         if not texts:
             return []
 
-        # 检查缓存
-        if self.cache_db:
-            cached_results = self._get_from_cache(texts)
-            if cached_results:
-                return cached_results
+        # 检查缓存（逐条命中，只编码未命中的文本）
+        hashes = [self._compute_hash(text) for text in texts]
+        found = self._get_from_cache(texts)
+
+        missing: Dict[str, str] = {}
+        for text, h in zip(texts, hashes):
+            if h not in found and h not in missing:
+                missing[h] = text
 
         # 批处理编码
-        all_embeddings = []
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i:i + self.batch_size]
-            embeddings = self._encode_batch(batch)
-            all_embeddings.extend(embeddings)
+        missing_items = list(missing.items())
+        for i in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[i:i + self.batch_size]
+            batch_texts = [text for _, text in batch]
+            embeddings = self._encode_batch(batch_texts)
+            for (h, _), embedding in zip(batch, embeddings):
+                found[h] = embedding
 
             # 缓存结果
-            if self.cache_db:
-                self._save_to_cache(batch, embeddings)
+            self._save_to_cache(batch_texts, embeddings)
 
-        return all_embeddings
+        # 按输入顺序重组
+        return [found[h] for h in hashes]
 
     def encode_single(self, text: str) -> List[float]:
         """
@@ -111,75 +243,121 @@ class EmbeddingProvider(ABC):
         result = self.encode([text])
         return result[0] if result else []
 
+    @property
+    def optimal_batch_size(self) -> int:
+        """实际使用的批大小（不超过提供商的单次请求上限）"""
+        if self.preferred_batch_size:
+            return max(1, min(self.batch_size, self.preferred_batch_size))
+        return max(1, self.batch_size)
+
     def _compute_hash(self, text: str) -> str:
         """计算文本 hash"""
         return hashlib.md5(text.encode('utf-8')).hexdigest()
 
-    def _get_from_cache(self, texts: List[str]) -> Optional[List[List[float]]]:
-        """从缓存获取嵌入"""
-        if not self.cache_db:
-            return None
+    def _get_from_cache(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        从缓存获取嵌入（先查进程内 LRU，再查 SQLite）
 
-        try:
-            hashes = [self._compute_hash(text) for text in texts]
-            placeholders = ', '.join(['?'] * len(hashes))
+        Args:
+            texts: 文本列表
 
-            cursor = self.cache_db.execute(f"""
-                SELECT content_hash, embedding
-                FROM embedding_cache
-                WHERE provider = ? AND model = ? AND content_hash IN ({placeholders})
-            """, [self._provider_name, self.model] + hashes)
+        Returns:
+            命中的 {content_hash: 嵌入向量}，可能只包含部分文本
+        """
+        hashes = list(dict.fromkeys(self._compute_hash(text) for text in texts))
+        return self._lookup_hashes(hashes, self.cache_db)
 
-            cached = {row[0]: row[1] for row in cursor.fetchall()}
+    def _lookup_hashes(self, hashes: List[str], cache_db=None) -> Dict[str, List[float]]:
+        """按 content hash 逐级查找缓存，SQLite 命中的结果提升到 LRU"""
+        found = {}
+        for h in hashes:
+            embedding = self.memory_cache.get(h)
+            if embedding is not None:
+                found[h] = embedding
 
-            # 检查是否全部命中
-            if all(h in cached for h in hashes):
-                # 解析缓存的嵌入向量
-                return [self._parse_embedding(cached[h]) for h in hashes]
+        missing = [h for h in hashes if h not in found]
+        if cache_db is None or not missing:
+            return found
 
-        except Exception:
-            pass
+        try:
+            for start in range(0, len(missing), 500):
+                part = missing[start:start + 500]
+                placeholders = ', '.join(['?'] * len(part))
+                cursor = cache_db.execute(f"""
+                    SELECT content_hash, embedding
+                    FROM embedding_cache
+                    WHERE provider = ? AND model = ? AND content_hash IN ({placeholders})
+                """, [self._provider_name, self.model] + part)
+                for content_hash, blob in cursor.fetchall():
+                    embedding = self._parse_embedding(blob)
+                    if embedding:
+                        found[content_hash] = embedding
+                        self.memory_cache.put(content_hash, embedding)
+        except Exception as e:
+            logger.debug(f"查询 embedding_cache 失败: {e}")
 
-        return None
+        sqlite_hits = sum(1 for h in missing if h in found)
+        with self._cache_stats_lock:
+            self._cache_stats["sqlite_hits"] += sqlite_hits
+            self._cache_stats["sqlite_misses"] += len(missing) - sqlite_hits
+        return found
 
     def _save_to_cache(self, texts: List[str], embeddings: List[List[float]]) -> None:
-        """保存嵌入到缓存"""
+        """保存嵌入到缓存（LRU + SQLite）"""
+        hashes = [self._compute_hash(text) for text in texts]
+        for h, embedding in zip(hashes, embeddings):
+            self.memory_cache.put(h, embedding)
+
         if not self.cache_db:
             return
 
         try:
             now = int(time.time())
-            for text, embedding in zip(texts, embeddings):
-                content_hash = self._compute_hash(text)
-                embedding_str = self._serialize_embedding(embedding)
-
-                self.cache_db.execute("""
-                    INSERT OR REPLACE INTO embedding_cache
-                    (provider, model, content_hash, embedding, dims, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
+            self.cache_db.executemany("""
+                INSERT OR REPLACE INTO embedding_cache
+                (provider, model, content_hash, embedding, dims, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (
                     self._provider_name,
                     self.model,
-                    content_hash,
-                    embedding_str,
+                    h,
+                    self._serialize_embedding(embedding),
                     len(embedding),
                     now
-                ))
+                )
+                for h, embedding in zip(hashes, embeddings)
+            ])
             self.cache_db.commit()
 
         except Exception:
             pass
 
-    def _serialize_embedding(self, embedding: List[float]) -> str:
-        """序列化嵌入向量为字符串"""
-        return ','.join(str(x) for x in embedding)
-
-    def _parse_embedding(self, embedding_str: str) -> List[float]:
-        """解析嵌入向量字符串"""
-        if not embedding_str:
+    def get_status(self) -> Dict[str, Any]:
+        """获取提供商状态（含缓存命中/未命中/淘汰计数）"""
+        return {
+            "provider": self._provider_name,
+            "model": self.model,
+            "batch_size": self.optimal_batch_size,
+            "cache": {
+                "memory": self.memory_cache.get_stats(),
+                **dict(self._cache_stats),
+            },
+        }
+
+    def warm_up(self) -> None:
+        """预热（创建 API 客户端或加载模型），服务启动时调用"""
+
+    def _serialize_embedding(self, embedding: List[float]) -> bytes:
+        """序列化嵌入向量为二进制格式"""
+        return encode_vector(embedding, self.vector_dtype)
+
+    def _parse_embedding(self, embedding_value) -> List[float]:
+        """解析嵌入向量（二进制格式或旧版逗号分隔字符串）"""
+        if not embedding_value:
             return []
         try:
-            return [float(x) for x in embedding_str.split(',')]
+            return decode_vector(embedding_value)
         except ValueError:
             # 如果格式错误，返回空列表
             return []
@@ -198,6 +376,9 @@ class ZhipuEmbeddingProvider(EmbeddingProvider):
     使用智谱 AI 的 embedding API
     """
 
+    # embedding-3 单次请求最多 64 条输入
+    preferred_batch_size = 64
+
     def __init__(
         self,
         api_key: Optional[str] = None,
@@ -231,6 +412,10 @@ class ZhipuEmbeddingProvider(EmbeddingProvider):
             self._client = ZhipuAI(api_key=key)
         return self._client
 
+    def warm_up(self) -> None:
+        """创建 API 客户端"""
+        self.client
+
     def _encode_batch(self, texts: List[str]) -> List[List[float]]:
         """调用智谱 API 编码"""
         try:
@@ -294,6 +479,10 @@ class OpenAIEmbeddingProvider(EmbeddingProvider):
             self._client = OpenAI(**client_kwargs)
         return self._client
 
+    def warm_up(self) -> None:
+        """创建 API 客户端"""
+        self.client
+
     def _encode_batch(self, texts: List[str]) -> List[List[float]]:
         """调用 OpenAI API 编码"""
         try:
@@ -335,7 +524,9 @@ class LocalEmbeddingProvider(EmbeddingProvider):
         # 使用 _model_name 存储模型名称，避免与 property 冲突
         self._model_name = model
         self.device = device
+        # 直接指定的模型（不经过共享运行时）
         self._st_model = None
+        self._runtime: Optional[EmbeddingRuntime] = None
 
         # 传递父类需要的模型名称
         super().__init__(model=model, **kwargs)
@@ -343,43 +534,50 @@ class LocalEmbeddingProvider(EmbeddingProvider):
         if not HAS_NUMPY:
             raise ImportError("numpy is required. Install with: pip install numpy")
 
+    @property
+    def runtime(self) -> EmbeddingRuntime:
+        """进程内共享的模型运行时（同一模型只加载一次）"""
+        if self._runtime is None:
+            self._runtime = get_embedding_runtime(self._model_name, device=self.device)
+        return self._runtime
+
     @property
     def st_model(self):
         """懒加载模型"""
-        if self._st_model is None:
-            try:
-                from sentence_transformers import SentenceTransformer
-            except ImportError:
-                raise ImportError(
-                    "sentence-transformers is required. "
-                    "Install with: pip install sentence-transformers"
-                )
-
-            # 自动选择设备
-            device = self.device
-            if device is None:
-                if HAS_NUMPY:
-                    import torch
-                    device = "mps" if torch.backends.mps.is_available() else "cpu"
-
-            self._st_model = SentenceTransformer(self._model_name, device=device)
-        return self._st_model
+        if self._st_model is not None:
+            return self._st_model
+        return self.runtime.model
 
     def _encode_batch(self, texts: List[str]) -> List[List[float]]:
-        """使用本地模型编码"""
+        """使用本地模型编码（共享运行时合并并发请求）"""
         try:
-            embeddings = self.st_model.encode(
-                texts,
-                convert_to_numpy=True,
-                show_progress_bar=False
-            )
+            if self._st_model is not None:
+                embeddings = self._st_model.encode(
+                    texts,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
+                # 转换为列表格式
+                return embeddings.tolist()
 
-            # 转换为列表格式
-            return embeddings.tolist()
+            return self.runtime.encode(texts)
 
         except Exception as e:
             raise RuntimeError(f"Local embedding failed: {e}")
 
+    def get_status(self) -> Dict[str, Any]:
+        """获取提供商状态（含运行时加载耗时和批次延迟）"""
+        status = super().get_status()
+        if self._runtime is not None:
+            status["runtime"] = self._runtime.get_metrics()
+        return status
+
+    def warm_up(self) -> None:
+        """加载模型并执行一次推理"""
+        if self._st_model is None:
+            self.runtime.load()
+            self.runtime.encode(["warm up"])
+
 
 class FallbackEmbeddingProvider(EmbeddingProvider):
     """
@@ -403,6 +601,8 @@ class FallbackEmbeddingProvider(EmbeddingProvider):
         # 使用第一个提供商的模型名称
         super().__init__(model=providers[0].model, **kwargs)
         self.providers = providers
+        limits = [p.optimal_batch_size for p in providers]
+        self.preferred_batch_size = min(limits) if limits else None
 
     def _encode_batch(self, texts: List[str]) -> List[List[float]]:
         """依次尝试每个提供商"""
@@ -417,6 +617,440 @@ class FallbackEmbeddingProvider(EmbeddingProvider):
 
         raise RuntimeError(f"All embedding providers failed. Last error: {last_error}")
 
+    def warm_up(self) -> None:
+        """预热首个可用的提供商"""
+        for provider in self.providers:
+            try:
+                provider.warm_up()
+                return
+            except Exception as e:
+                logger.warning(f"嵌入提供商预热失败 ({provider._provider_name}): {e}")
+
+
+class EmbeddingQueue:
+    """
+    嵌入工作队列
+
+    - 批量请求（索引）进入队列，按提供商最佳批大小打包，攒满一批或
+      超过 flush_interval 后提交，最多 max_concurrent_batches 个批次并发
+    - 提交前按 content hash 与 embedding_cache、进行中的请求去重
+    - 队列中待处理文本超过 max_pending 时 submit 阻塞（背压）
+    - 查询向量走优先通道：在调用线程直接编码，且进行期间暂停派发新的批次
+    - 新生成的向量暂存，由调用方通过 write_cache 在自己的事务中批量写回
+    """
+
+    # 暂存待写回缓存的向量上限（超出时丢弃最旧的，缓存丢失不影响正确性）
+    MAX_CACHE_WRITES = 10000
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        batch_size: Optional[int] = None,
+        flush_interval: float = 0.05,
+        max_concurrent_batches: int = 2,
+        max_pending: int = 10000
+    ):
+        """
+        初始化嵌入队列
+
+        Args:
+            provider: 嵌入提供商
+            batch_size: 批大小（默认使用提供商的最佳批大小）
+            flush_interval: 未攒满一批时的最长等待（秒）
+            max_concurrent_batches: 最大并发批次数
+            max_pending: 排队文本数上限（背压阈值）
+        """
+        self.provider = provider
+        self.batch_size = batch_size or provider.optimal_batch_size
+        self.flush_interval = flush_interval
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.max_pending = max(1, max_pending)
+
+        self._cond = threading.Condition()
+        # 排队中的 (content_hash, text, 入队时间)
+        self._queue: deque = deque()
+        # content_hash -> Future（排队或进行中，用于去重）
+        self._inflight: Dict[str, Future] = {}
+        self._active_batches = 0
+        self._priority_active = 0
+        self._flush_requested = False
+        self._closed = False
+        self._cache_writes: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._stats = {
+            "submitted": 0,
+            "cache_hits": 0,
+            "deduplicated": 0,
+            "batches": 0,
+            "encoded": 0,
+            "priority": 0,
+            "failed_batches": 0,
+        }
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_batches,
+            thread_name_prefix="embedding-batch"
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop, daemon=True, name="EmbeddingQueue"
+        )
+        self._dispatcher.start()
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    def _lookup_cache(self, hashes: List[str], cache_db=None) -> Dict[str, List[float]]:
+        """在暂存区、提供商 LRU 和 embedding_cache 中查找已有向量"""
+        found = {}
+        with self._cond:
+            for h in hashes:
+                if h in self._cache_writes:
+                    found[h] = self._cache_writes[h]
+
+        missing = [h for h in hashes if h not in found]
+        if missing:
+            found.update(self.provider._lookup_hashes(missing, cache_db))
+        return found
+
+    def _remember(self, hashes: List[str], embeddings: List[List[float]]) -> None:
+        """暂存新生成的向量，等待写回缓存"""
+        for h, embedding in zip(hashes, embeddings):
+            self.provider.memory_cache.put(h, embedding)
+        with self._cond:
+            for h, embedding in zip(hashes, embeddings):
+                self._cache_writes[h] = embedding
+                self._cache_writes.move_to_end(h)
+            while len(self._cache_writes) > self.MAX_CACHE_WRITES:
+                self._cache_writes.popitem(last=False)
+
+    def write_cache(self, db) -> int:
+        """
+        将暂存的向量批量写回 embedding_cache
+
+        调用方负责事务（MemoryIndexer 在写 chunks 的同一事务中调用）。
+
+        Args:
+            db: 可写的索引数据库连接
+
+        Returns:
+            写入的行数
+        """
+        with self._cond:
+            if not self._cache_writes:
+                return 0
+            items = list(self._cache_writes.items())
+
+        now = int(time.time())
+        db.executemany("""
+            INSERT OR REPLACE INTO embedding_cache
+            (provider, model, content_hash, embedding, dims, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                self.provider._provider_name,
+                self.provider.model,
+                content_hash,
+                self.provider._serialize_embedding(embedding),
+                len(embedding),
+                now
+            )
+            for content_hash, embedding in items
+        ])
+
+        with self._cond:
+            for content_hash, embedding in items:
+                if self._cache_writes.get(content_hash) is embedding:
+                    del self._cache_writes[content_hash]
+        return len(items)
+
+    # ------------------------------------------------------------------
+    # 批量通道
+    # ------------------------------------------------------------------
+
+    def submit(self, texts: List[str], cache_db=None) -> List[Future]:
+        """
+        提交一批文本（批量通道）
+
+        Args:
+            texts: 文本列表
+            cache_db: 用于去重的索引数据库连接（可选，在调用线程查询）
+
+        Returns:
+            与 texts 一一对应的 Future，结果为嵌入向量
+        """
+        hashes = [self.provider._compute_hash(text) for text in texts]
+        cached = self._lookup_cache(list(dict.fromkeys(hashes)), cache_db)
+
+        futures: List[Future] = []
+        with self._cond:
+            self._stats["submitted"] += len(texts)
+            for text, h in zip(texts, hashes):
+                if h in cached:
+                    self._stats["cache_hits"] += 1
+                    future = Future()
+                    future.set_result(cached[h])
+                elif h in self._inflight:
+                    self._stats["deduplicated"] += 1
+                    future = self._inflight[h]
+                else:
+                    while len(self._queue) >= self.max_pending and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        raise RuntimeError("EmbeddingQueue is closed")
+                    future = Future()
+                    self._inflight[h] = future
+                    self._queue.append((h, text, time.monotonic()))
+                    self._cond.notify_all()
+                futures.append(future)
+        return futures
+
+    def encode(
+        self,
+        texts: List[str],
+        cache_db=None,
+        timeout: Optional[float] = None
+    ) -> List[List[float]]:
+        """
+        编码一批文本并等待结果
+
+        调用方阻塞等待，因此提交后立即派发，不等 flush_interval。
+
+        Args:
+            texts: 文本列表
+            cache_db: 用于去重的索引数据库连接（可选）
+            timeout: 最长等待秒数
+
+        Returns:
+            嵌入向量列表
+        """
+        if not texts:
+            return []
+        futures = self.submit(texts, cache_db=cache_db)
+        self.flush(wait=False)
+        return [future.result(timeout=timeout) for future in futures]
+
+    def flush(self, wait: bool = True, timeout: Optional[float] = None) -> None:
+        """
+        立即派发队列中的文本
+
+        Args:
+            wait: 是否等待所有批次完成
+            timeout: 最长等待秒数
+        """
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            if not wait:
+                return
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._queue or self._active_batches:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def _next_batch(self) -> Optional[List[Tuple[str, str, float]]]:
+        """等待下一批（持有 _cond 调用）"""
+        while not self._closed:
+            can_dispatch = (
+                self._queue
+                and self._active_batches < self.max_concurrent_batches
+                and self._priority_active == 0
+            )
+            if can_dispatch:
+                age = time.monotonic() - self._queue[0][2]
+                if (
+                    len(self._queue) >= self.batch_size
+                    or self._flush_requested
+                    or age >= self.flush_interval
+                ):
+                    batch = [
+                        self._queue.popleft()
+                        for _ in range(min(self.batch_size, len(self._queue)))
+                    ]
+                    if not self._queue:
+                        self._flush_requested = False
+                    self._cond.notify_all()
+                    return batch
+                self._cond.wait(self.flush_interval - age)
+            else:
+                self._cond.wait()
+        return None
+
+    def _dispatch_loop(self) -> None:
+        """派发线程：打包批次并提交到线程池"""
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._active_batches += 1
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[Tuple[str, str, float]]) -> None:
+        """编码一个批次并完成对应的 Future"""
+        hashes = [item[0] for item in batch]
+        texts = [item[1] for item in batch]
+        try:
+            embeddings = self.provider._encode_batch(texts)
+            if len(embeddings) != len(texts):
+                raise RuntimeError(
+                    f"Embedding count mismatch: {len(embeddings)} != {len(texts)}"
+                )
+        except Exception as e:
+            logger.warning(f"嵌入批次失败: {len(texts)} texts, error={e}")
+            with self._cond:
+                self._stats["failed_batches"] += 1
+                futures = [self._inflight.pop(h, None) for h in hashes]
+                self._active_batches -= 1
+                self._cond.notify_all()
+            for future in futures:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        self._remember(hashes, embeddings)
+        with self._cond:
+            self._stats["batches"] += 1
+            self._stats["encoded"] += len(texts)
+            futures = [self._inflight.pop(h, None) for h in hashes]
+            self._active_batches -= 1
+            self._cond.notify_all()
+        for future, embedding in zip(futures, embeddings):
+            if future is not None and not future.done():
+                future.set_result(embedding)
+
+    # ------------------------------------------------------------------
+    # 优先通道
+    # ------------------------------------------------------------------
+
+    def encode_query(self, text: str, cache_db=None) -> List[float]:
+        """
+        编码查询文本（优先通道）
+
+        不进入批量队列，在调用线程直接请求提供商；进行期间不派发新的
+        批量批次，因此不会排在整库重建之后。
+
+        Args:
+            text: 查询文本
+            cache_db: 用于去重的索引数据库连接（可选）
+
+        Returns:
+            嵌入向量
+        """
+        h = self.provider._compute_hash(text)
+        cached = self._lookup_cache([h], cache_db)
+        with self._cond:
+            self._stats["priority"] += 1
+            if h in cached:
+                self._stats["cache_hits"] += 1
+                return cached[h]
+            self._priority_active += 1
+
+        try:
+            embedding = self.provider._encode_batch([text])[0]
+        finally:
+            with self._cond:
+                self._priority_active -= 1
+                self._cond.notify_all()
+
+        self._remember([h], [embedding])
+        return embedding
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取队列状态和计数"""
+        with self._cond:
+            return {
+                "provider": self.provider._provider_name,
+                "model": self.provider.model,
+                "batch_size": self.batch_size,
+                "pending": len(self._queue),
+                "active_batches": self._active_batches,
+                "unsaved_cache_writes": len(self._cache_writes),
+                "cache": self.provider.get_status()["cache"],
+                **self._stats,
+            }
+
+    def close(self) -> None:
+        """停止派发线程（排队中的请求以异常结束）"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            pending = [self._inflight.pop(h, None) for h, _, _ in self._queue]
+            self._queue.clear()
+            self._cond.notify_all()
+        for future in pending:
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError("EmbeddingQueue is closed"))
+        self._dispatcher.join(timeout=2.0)
+        self._executor.shutdown(wait=True)
+
+
+# 进程级嵌入队列（按 provider/model 共享，索引与查询使用同一队列）
+_queues: Dict[Tuple[str, str], EmbeddingQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_embedding_queue(provider: EmbeddingProvider, **kwargs) -> EmbeddingQueue:
+    """
+    获取提供商对应的嵌入队列（首次调用时创建）
+
+    同一 (provider, model) 的后续调用复用首次注册的提供商实例。
+
+    Args:
+        provider: 嵌入提供商
+        **kwargs: 传递给 EmbeddingQueue 的参数（仅首次创建时生效，
+            未指定时读取 memory.search.embedding_queue 配置）
+
+    Returns:
+        EmbeddingQueue: 嵌入队列
+    """
+    key = (provider._provider_name, provider.model)
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            if not kwargs:
+                try:
+                    from config import get_config
+                    queue_config = get_config().memory.search.embedding_queue
+                    kwargs = {
+                        "flush_interval": queue_config.flush_interval_ms / 1000.0,
+                        "max_concurrent_batches": queue_config.max_concurrent_batches,
+                        "max_pending": queue_config.max_pending,
+                    }
+                except Exception:
+                    pass
+            queue = EmbeddingQueue(provider, **kwargs)
+            _queues[key] = queue
+        return queue
+
+
+def embed_query(provider, text: str, cache_db=None) -> List[float]:
+    """
+    通过优先通道编码查询文本
+
+    Args:
+        provider: 嵌入提供商（非 EmbeddingProvider 的自定义实现直接调用 encode_single）
+        text: 查询文本
+        cache_db: 用于去重的索引数据库连接（可选）
+
+    Returns:
+        嵌入向量
+    """
+    if isinstance(provider, EmbeddingProvider):
+        return get_embedding_queue(provider).encode_query(text, cache_db=cache_db)
+    return provider.encode_single(text)
+
+
+def reset_embedding_queues() -> None:
+    """关闭并清空所有嵌入队列（测试用）"""
+    with _queues_lock:
+        queues = list(_queues.values())
+        _queues.clear()
+    for queue in queues:
+        queue.close()
+
 
 def create_embedding_provider(
     provider: str = "auto",
@@ -438,6 +1072,32 @@ def create_embedding_provider(
     Returns:
         嵌入提供商实例
     """
+    provider, model = _resolve_provider(provider, model, api_key)
+
+    if provider == "zhipu":
+        return ZhipuEmbeddingProvider(api_key=api_key, model=model, cache_db=cache_db, **kwargs)
+
+    elif provider == "openai":
+        return OpenAIEmbeddingProvider(api_key=api_key, model=model, cache_db=cache_db, **kwargs)
+
+    else:
+        return LocalEmbeddingProvider(model=model, cache_db=cache_db, **kwargs)
+
+
+# 各提供商的默认模型
+DEFAULT_EMBEDDING_MODELS = {
+    "zhipu": "embedding-3",
+    "openai": "text-embedding-3-small",
+    "local": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+}
+
+
+def _resolve_provider(
+    provider: str,
+    model: Optional[str],
+    api_key: Optional[str] = None
+) -> Tuple[str, str]:
+    """解析 auto 提供商和默认模型，返回 (provider, model)"""
     if provider == "auto":
         # 自动选择：zhipu > openai > local
         if HAS_ZHIPU and (api_key or __import__("os").getenv("ZHIPUAI_API_KEY")):
@@ -447,20 +1107,66 @@ def create_embedding_provider(
         else:
             provider = "local"
 
-    if provider == "zhipu":
-        if model is None:
-            model = "embedding-3"
-        return ZhipuEmbeddingProvider(api_key=api_key, model=model, cache_db=cache_db, **kwargs)
+    if provider not in DEFAULT_EMBEDDING_MODELS:
+        raise ValueError(f"Unknown provider: {provider}. Choose from: auto, zhipu, openai, local")
 
-    elif provider == "openai":
-        if model is None:
-            model = "text-embedding-3-small"
-        return OpenAIEmbeddingProvider(api_key=api_key, model=model, cache_db=cache_db, **kwargs)
+    return provider, model or DEFAULT_EMBEDDING_MODELS[provider]
 
-    elif provider == "local":
-        if model is None:
-            model = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-        return LocalEmbeddingProvider(model=model, cache_db=cache_db, **kwargs)
 
-    else:
-        raise ValueError(f"Unknown provider: {provider}. Choose from: auto, zhipu, openai, local")
+# 进程级提供商（按 provider/model 共享，复用 API 客户端和本地模型）
+_providers: Dict[Tuple[str, str], EmbeddingProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_embedding_provider(
+    provider: str = "auto",
+    model: Optional[str] = None
+) -> EmbeddingProvider:
+    """
+    获取进程内共享的嵌入提供商（首次调用时创建）
+
+    搜索路径使用该函数，避免每次查询都重新构造 API 客户端或加载本地模型。
+    需要独立缓存连接或 API 密钥时使用 create_embedding_provider。
+
+    Args:
+        provider: 提供商名称 (auto, zhipu, openai, local)
+        model: 模型名称（None 表示提供商默认模型）
+
+    Returns:
+        嵌入提供商实例
+    """
+    key = _resolve_provider(provider, model)
+    with _providers_lock:
+        instance = _providers.get(key)
+        if instance is None:
+            instance = create_embedding_provider(provider=key[0], model=key[1])
+            _providers[key] = instance
+        return instance
+
+
+def warm_up_embedding_provider(
+    provider: str = "auto",
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    预热共享提供商（API 启动时调用）
+
+    Args:
+        provider: 提供商名称
+        model: 模型名称
+
+    Returns:
+        提供商状态（本地模型包含加载耗时）
+    """
+    instance = get_embedding_provider(provider, model)
+    start = time.perf_counter()
+    instance.warm_up()
+    status = instance.get_status()
+    status["warm_up_seconds"] = time.perf_counter() - start
+    return status
+
+
+def reset_embedding_providers() -> None:
+    """清空共享提供商（测试用）"""
+    with _providers_lock:
+        _providers.clear()
@@ -0,0 +1,401 @@
+"""
+本地嵌入模型运行时
+
+LocalEmbeddingProvider 原先在每个提供商实例上懒加载 sentence-transformers
+模型，memory_search_v2 每次搜索都新建提供商，可能反复加载模型。这里把模型
+放到进程级运行时中（按 模型/设备/后端 共享）：
+- API 启动时在 lifespan 中预加载，首个请求不承担加载耗时
+- 模型只由一个推理线程访问；并发请求在 batch_window_ms 的微批窗口内
+  合并为一次前向计算（最多 max_batch_size 条）
+- 可选 ONNX 后端（需要 onnxruntime），quantize=True 时使用动态 int8 量化
+  的 CPU 模型；后端不可用时回退到 PyTorch
+- 记录模型加载耗时和每批推理延迟
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import onnxruntime  # noqa: F401
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+
+logger = logging.getLogger(__name__)
+
+
+# 运行时默认参数
+DEFAULT_BATCH_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH_SIZE = 64
+RUNTIME_BACKENDS = ("torch", "onnx")
+
+# 保留最近多少个批次的延迟用于分位数
+LATENCY_WINDOW = 512
+
+# 动态 int8 量化配置和导出目录（每个模型一个子目录）
+QUANTIZED_CONFIG = "avx2"
+ONNX_EXPORT_DIR = Path(".cache") / "embedding-onnx"
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class EmbeddingRuntime:
+    """
+    进程内共享的本地嵌入模型
+
+    使用方式:
+        runtime = get_embedding_runtime("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        runtime.load()                       # 启动时预加载（可选）
+        vectors = runtime.encode(["文本"])   # 线程安全，自动微批
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: Optional[str] = None,
+        backend: str = "torch",
+        quantize: bool = False,
+        batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE
+    ):
+        """
+        初始化运行时（不加载模型）
+
+        Args:
+            model_name: 模型名称或路径
+            device: 设备 (cpu, cuda, mps)，None 表示自动选择
+            backend: 推理后端 (torch, onnx)
+            quantize: ONNX 后端是否使用动态 int8 量化模型
+            batch_window_ms: 微批窗口（毫秒），0 表示不等待
+            max_batch_size: 单次前向计算的最大文本数
+        """
+        if backend not in RUNTIME_BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}. Choose from: {', '.join(RUNTIME_BACKENDS)}")
+
+        self.model_name = model_name
+        self.device = device
+        self.backend = backend
+        self.quantize = quantize
+        self.batch_window = max(0.0, batch_window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._model = None
+        self._active_backend: Optional[str] = None
+        self._load_lock = threading.Lock()
+        self._requests: "queue.Queue[Optional[Tuple[List[str], Future]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {
+            "load_seconds": None,
+            "requests": 0,
+            "batches": 0,
+            "texts": 0,
+            "max_batch_texts": 0,
+            "failed_batches": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 模型加载
+    # ------------------------------------------------------------------
+
+    @property
+    def model(self):
+        """已加载的模型（首次访问时加载）"""
+        if self._model is None:
+            self.load()
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """
+        加载模型（幂等，并发调用只加载一次）
+
+        Returns:
+            加载的模型
+
+        Raises:
+            ImportError: 未安装 sentence-transformers
+        """
+        with self._load_lock:
+            if self._model is not None:
+                return self._model
+
+            start = time.perf_counter()
+            self._model, self._active_backend = self._load_model()
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self._stats["load_seconds"] = elapsed
+            logger.info(
+                f"嵌入模型已加载: {self.model_name} (backend={self._active_backend}, "
+                f"{elapsed:.2f}s)"
+            )
+            return self._model
+
+    def _resolve_device(self) -> str:
+        if self.device is not None:
+            return self.device
+        try:
+            import torch
+            if torch.cuda.is_available():
+                return "cuda"
+            if torch.backends.mps.is_available():
+                return "mps"
+        except ImportError:
+            pass
+        return "cpu"
+
+    def _load_model(self) -> Tuple[Any, str]:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "sentence-transformers is required. "
+                "Install with: pip install sentence-transformers"
+            )
+
+        if self.backend == "onnx":
+            if not HAS_ONNXRUNTIME:
+                logger.warning("未安装 onnxruntime，嵌入模型回退到 PyTorch 后端")
+            else:
+                try:
+                    return self._load_onnx_model(SentenceTransformer), "onnx-int8" if self.quantize else "onnx"
+                except Exception as e:
+                    logger.warning(f"ONNX 嵌入模型加载失败，回退到 PyTorch 后端: {e}")
+
+        return SentenceTransformer(self.model_name, device=self._resolve_device()), "torch"
+
+    def _load_onnx_model(self, model_cls):
+        """加载 ONNX 模型（CPU）；quantize 时导出并加载动态 int8 量化版本"""
+        model = model_cls(self.model_name, device="cpu", backend="onnx")
+        if not self.quantize:
+            return model
+
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        file_name = f"model_qint8_{QUANTIZED_CONFIG}.onnx"
+        local_dir = ONNX_EXPORT_DIR / self.model_name.replace("/", "--")
+        if not (local_dir / "onnx" / file_name).exists():
+            model.save(str(local_dir))
+            export_dynamic_quantized_onnx_model(model, QUANTIZED_CONFIG, str(local_dir))
+        return model_cls(
+            str(local_dir),
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": f"onnx/{file_name}"},
+        )
+
+    # ------------------------------------------------------------------
+    # 推理
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self) -> None:
+        with self._worker_lock:
+            if self._closed:
+                raise RuntimeError("EmbeddingRuntime is closed")
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._worker_loop, daemon=True, name="EmbeddingRuntime"
+                )
+                self._worker.start()
+
+    def encode(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """
+        编码文本（线程安全）
+
+        请求进入推理线程，与微批窗口内的其他请求合并计算。
+
+        Args:
+            texts: 文本列表
+            timeout: 最长等待秒数
+
+        Returns:
+            嵌入向量列表
+        """
+        if not texts:
+            return []
+        future: Future = Future()
+        self._ensure_worker()
+        with self._stats_lock:
+            self._stats["requests"] += 1
+        self._requests.put((list(texts), future))
+        return future.result(timeout=timeout)
+
+    def _collect(self, first: Tuple[List[str], Future]) -> Tuple[List[Tuple[List[str], Future]], bool]:
+        """从第一个请求开始，在微批窗口内收集更多请求"""
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.batch_window
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            size += len(item[0])
+        return batch, False
+
+    def _worker_loop(self) -> None:
+        """推理线程：合并请求并执行前向计算"""
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[Tuple[List[str], Future]]) -> None:
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        start = time.perf_counter()
+        try:
+            vectors = self._forward(texts)
+        except Exception as e:
+            with self._stats_lock:
+                self._stats["failed_batches"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["texts"] += len(texts)
+            self._stats["max_batch_texts"] = max(self._stats["max_batch_texts"], len(texts))
+            self._latencies.append(elapsed_ms)
+
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def _forward(self, texts: List[str]) -> List[List[float]]:
+        """按 max_batch_size 分段执行前向计算"""
+        model = self.model
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.max_batch_size):
+            embeddings = model.encode(
+                texts[i:i + self.max_batch_size],
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            vectors.extend(embeddings.tolist())
+        return vectors
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取加载耗时和批次延迟统计"""
+        with self._stats_lock:
+            latencies = list(self._latencies)
+            stats = dict(self._stats)
+        batches = stats["batches"]
+        return {
+            "model": self.model_name,
+            "backend": self._active_backend or self.backend,
+            "loaded": self.loaded,
+            "batch_window_ms": self.batch_window * 1000,
+            "max_batch_size": self.max_batch_size,
+            **stats,
+            "avg_batch_texts": stats["texts"] / batches if batches else 0.0,
+            "batch_latency_ms": {
+                "avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "p50": _percentile(latencies, 50),
+                "p95": _percentile(latencies, 95),
+                "max": max(latencies) if latencies else 0.0,
+            },
+        }
+
+    def close(self) -> None:
+        """停止推理线程（已排队的请求会先完成）"""
+        with self._worker_lock:
+            self._closed = True
+            worker = self._worker
+        if worker is not None and worker.is_alive():
+            self._requests.put(None)
+            worker.join(timeout=5.0)
+
+
+# 进程级运行时（按 模型/设备/后端 共享）
+_runtimes: Dict[Tuple, EmbeddingRuntime] = {}
+_runtimes_lock = threading.Lock()
+
+
+def _runtime_settings() -> Dict[str, Any]:
+    """读取 memory.search.runtime 配置（缺失时使用默认值）"""
+    try:
+        from config import get_config
+        runtime_config = get_config().memory.search.runtime
+        return {
+            "backend": runtime_config.backend,
+            "quantize": runtime_config.quantize,
+            "batch_window_ms": runtime_config.batch_window_ms,
+            "max_batch_size": runtime_config.max_batch_size,
+        }
+    except Exception:
+        return {}
+
+
+def get_embedding_runtime(
+    model_name: str,
+    device: Optional[str] = None,
+    **kwargs
+) -> EmbeddingRuntime:
+    """
+    获取模型对应的共享运行时（首次调用时创建，不加载模型）
+
+    Args:
+        model_name: 模型名称或路径
+        device: 设备（None 表示自动选择）
+        **kwargs: 传递给 EmbeddingRuntime 的参数（未指定时读取
+            memory.search.runtime 配置）
+
+    Returns:
+        EmbeddingRuntime 实例
+    """
+    settings = {**_runtime_settings(), **kwargs}
+    key = (model_name, device, settings.get("backend", "torch"), bool(settings.get("quantize", False)))
+    with _runtimes_lock:
+        runtime = _runtimes.get(key)
+        if runtime is None:
+            runtime = EmbeddingRuntime(model_name, device=device, **settings)
+            _runtimes[key] = runtime
+        return runtime
+
+
+def get_runtime_metrics() -> List[Dict[str, Any]]:
+    """获取所有运行时的指标"""
+    with _runtimes_lock:
+        runtimes = list(_runtimes.values())
+    return [runtime.get_metrics() for runtime in runtimes]
+
+
+def reset_embedding_runtimes() -> None:
+    """关闭并清空所有运行时（测试和服务关闭时使用）"""
+    with _runtimes_lock:
+        runtimes = list(_runtimes.values())
+        _runtimes.clear()
+    for runtime in runtimes:
+        runtime.close()
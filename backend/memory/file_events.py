@@ -0,0 +1,329 @@
+"""
+记忆文件变更事件源
+
+为 MemoryWatcher 提供文件系统事件：
+- InotifyEventSource: Linux inotify（通过 ctypes 调用 libc，无额外依赖），
+  空闲时阻塞在 select 上，不做轮询
+- StatScanEventSource: 其他平台的回退实现，按间隔比较 (mtime, size) 快照
+
+两者都只报告匹配模式的文件，并跳过隐藏目录（.index 中的 WAL 写入
+不会触发事件）。
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# 检查 inotify 是否可用
+try:
+    if not sys.platform.startswith("linux"):
+        raise OSError("inotify requires Linux")
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    HAS_INOTIFY = True
+except (OSError, AttributeError):
+    _libc = None
+    HAS_INOTIFY = False
+
+
+# inotify 常量（<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+_WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+# 默认配置
+DEFAULT_FILE_PATTERN = "*.md"
+DEFAULT_SCAN_INTERVAL = 5.0
+
+
+def _is_hidden(name: str) -> bool:
+    return name.startswith(".")
+
+
+def _iter_dirs(root: Path):
+    """递归列出 root 及其非隐藏子目录"""
+    yield root
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not _is_hidden(d)]
+        for name in dirnames:
+            yield Path(dirpath) / name
+
+
+def _iter_files(root: Path, pattern: str):
+    """递归列出 root 下匹配模式的文件（跳过隐藏目录和隐藏文件）"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not _is_hidden(d)]
+        for name in filenames:
+            if not _is_hidden(name) and fnmatch(name, pattern):
+                yield Path(dirpath) / name
+
+
+class InotifyEventSource:
+    """
+    inotify 事件源
+
+    递归监听目录（新建子目录会自动加入），read() 阻塞直到有事件、
+    超时或 close()。
+    """
+
+    def __init__(self, paths: List[Path], pattern: str = DEFAULT_FILE_PATTERN):
+        """
+        初始化事件源
+
+        Args:
+            paths: 监听的目录列表
+            pattern: 文件名匹配模式
+
+        Raises:
+            OSError: inotify 不可用或初始化失败
+        """
+        if not HAS_INOTIFY:
+            raise OSError("inotify is not available on this platform")
+
+        self.paths = [Path(p) for p in paths]
+        self.pattern = pattern
+        self._fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._wake_r, self._wake_w = os.pipe()
+        self._watches: Dict[int, Path] = {}
+        self._closed = False
+
+        for root in self.paths:
+            if root.is_dir():
+                self._add_tree(root)
+            else:
+                logger.warning(f"监听路径不存在，跳过: {root}")
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning("inotify watch 数量达到上限 (fs.inotify.max_user_watches)")
+            else:
+                logger.debug(f"添加 inotify watch 失败 {directory}: {os.strerror(err)}")
+            return
+        self._watches[wd] = directory
+
+    def _add_tree(self, root: Path) -> List[Path]:
+        """监听目录树，返回其中已存在的匹配文件（用于补齐创建目录时的竞态）"""
+        for directory in _iter_dirs(root):
+            self._add_watch(directory)
+        return list(_iter_files(root, self.pattern))
+
+    def read(self, timeout: Optional[float] = None) -> List[Path]:
+        """
+        等待并读取一批变更
+
+        Args:
+            timeout: 最长等待秒数，None 表示一直等待
+
+        Returns:
+            变更的文件路径（去重），超时或关闭时返回空列表
+        """
+        if self._closed:
+            return []
+
+        try:
+            ready, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+        except (OSError, ValueError):
+            return []
+        if self._closed or self._fd not in ready:
+            return []
+
+        changed: Dict[Path, None] = {}
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            except OSError:
+                return list(changed)
+            if not data:
+                break
+            self._parse(data, changed)
+
+        return list(changed)
+
+    def _parse(self, data: bytes, changed: Dict[Path, None]) -> None:
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出：重新报告所有文件
+                logger.warning("inotify 事件队列溢出，执行全量扫描")
+                for root in self.paths:
+                    if root.is_dir():
+                        for path in _iter_files(root, self.pattern):
+                            changed[path] = None
+                continue
+
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None or not raw_name:
+                continue
+            name = os.fsdecode(raw_name)
+            if _is_hidden(name):
+                continue
+            path = directory / name
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    for file_path in self._add_tree(path):
+                        changed[file_path] = None
+                continue
+
+            if fnmatch(name, self.pattern):
+                changed[path] = None
+
+    def close(self) -> None:
+        """关闭事件源（唤醒阻塞中的 read）"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._watches.clear()
+
+
+class StatScanEventSource:
+    """
+    stat 扫描事件源（inotify 不可用时的回退）
+
+    每隔 interval 秒比较一次 (mtime_ns, size) 快照，报告新增、修改和删除的文件。
+    """
+
+    def __init__(
+        self,
+        paths: List[Path],
+        pattern: str = DEFAULT_FILE_PATTERN,
+        interval: float = DEFAULT_SCAN_INTERVAL
+    ):
+        """
+        初始化事件源
+
+        Args:
+            paths: 监听的目录列表
+            pattern: 文件名匹配模式
+            interval: 扫描间隔（秒）
+        """
+        self.paths = [Path(p) for p in paths]
+        self.pattern = pattern
+        self.interval = interval
+        self._closed = threading.Event()
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for root in self.paths:
+            if not root.is_dir():
+                continue
+            for path in _iter_files(root, self.pattern):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def read(self, timeout: Optional[float] = None) -> List[Path]:
+        """
+        等待一个扫描间隔后返回变更
+
+        Args:
+            timeout: 最长等待秒数，None 表示等待一个完整间隔
+
+        Returns:
+            变更的文件路径，关闭时返回空列表
+        """
+        wait = self.interval if timeout is None else min(timeout, self.interval)
+        if self._closed.wait(wait):
+            return []
+
+        current = self._scan()
+        previous, self._snapshot = self._snapshot, current
+        changed = [path for path, sig in current.items() if previous.get(path) != sig]
+        changed.extend(path for path in previous if path not in current)
+        return changed
+
+    def close(self) -> None:
+        """关闭事件源（唤醒阻塞中的 read）"""
+        self._closed.set()
+
+
+def create_event_source(
+    paths: List[Path],
+    backend: str = "auto",
+    pattern: str = DEFAULT_FILE_PATTERN,
+    scan_interval: float = DEFAULT_SCAN_INTERVAL
+):
+    """
+    创建文件事件源
+
+    Args:
+        paths: 监听的目录列表
+        backend: auto（优先 inotify）、inotify 或 poll
+        pattern: 文件名匹配模式
+        scan_interval: poll 回退的扫描间隔（秒）
+
+    Returns:
+        InotifyEventSource 或 StatScanEventSource
+    """
+    if backend in ("auto", "inotify") and HAS_INOTIFY:
+        try:
+            return InotifyEventSource(paths, pattern=pattern)
+        except OSError as e:
+            if backend == "inotify":
+                raise
+            logger.warning(f"inotify 初始化失败，回退到 stat 扫描: {e}")
+    elif backend == "inotify":
+        raise OSError("inotify is not available on this platform")
+
+    return StatScanEventSource(paths, pattern=pattern, interval=scan_interval)
@@ -6,9 +6,12 @@ Memory Flush - 自动记忆持久化
 
 import json
 import logging
+import threading
 import time
 import re
-from typing import List, Dict, Any, Optional, Callable
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Hashable
 from datetime import datetime
 from pathlib import Path
 
@@ -28,6 +31,11 @@ except ImportError:
     HAS_ZHIPU = False
 
 
+# 后台 flush 默认配置
+DEFAULT_FLUSH_WORKERS = 2        # 同时执行的提取任务数
+DEFAULT_FLUSH_MAX_PENDING = 16   # 排队 + 执行中的任务上限
+
+
 class RetainFormatter:
     """
     Retain 格式化器
@@ -524,6 +532,7 @@ class MemoryFlush:
 
         # 消息缓存 (用于提取记忆)
         self.message_buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
 
     def update_token_count(self, tokens: int) -> None:
         """
@@ -542,12 +551,40 @@ class MemoryFlush:
             role: 消息角色 (user/assistant/system)
             content: 消息内容
         """
-        self.message_count += 1
-        self.message_buffer.append({
-            "role": role,
-            "content": content,
-            "timestamp": time.time()
-        })
+        with self._buffer_lock:
+            self.message_count += 1
+            self.message_buffer.append({
+                "role": role,
+                "content": content,
+                "timestamp": time.time()
+            })
+
+    def take_snapshot(self) -> List[Dict[str, Any]]:
+        """
+        取出消息缓存的快照
+
+        快照中的消息从缓存中移出，之后新增的消息不受影响；
+        flush 未完成（失败或记忆数不足）时用 restore_snapshot 放回。
+
+        Returns:
+            快照消息列表
+        """
+        with self._buffer_lock:
+            snapshot = list(self.message_buffer)
+            self.message_buffer.clear()
+        return snapshot
+
+    def restore_snapshot(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        将未 flush 的快照放回缓存头部（保持消息顺序）
+
+        Args:
+            messages: take_snapshot 返回的消息列表
+        """
+        if not messages:
+            return
+        with self._buffer_lock:
+            self.message_buffer[:0] = messages
 
     def check_and_flush(
         self,
@@ -566,7 +603,22 @@ class MemoryFlush:
         """
         self.update_token_count(current_tokens)
 
-        result = {
+        # 检查是否需要 flush
+        should_flush = force or self._should_flush(current_tokens)
+
+        if not should_flush:
+            return self._empty_result()
+
+        messages = self.take_snapshot()
+        result = self.flush_messages(messages, current_tokens, force=force)
+        if not result["flushed"]:
+            # 未 flush 的消息留在缓存中继续积累
+            self.restore_snapshot(messages)
+        return result
+
+    @staticmethod
+    def _empty_result() -> Dict[str, Any]:
+        return {
             "flushed": False,
             "memories_extracted": 0,
             "memories_written": 0,
@@ -574,47 +626,74 @@ class MemoryFlush:
             "error": None
         }
 
-        # 检查是否需要 flush
-        should_flush = force or self._should_flush(current_tokens)
+    def flush_messages(
+        self,
+        messages: List[Dict[str, Any]],
+        current_tokens: int,
+        force: bool = False
+    ) -> Dict[str, Any]:
+        """
+        从给定消息中提取记忆并写入（不读写消息缓存）
 
-        if should_flush:
-            try:
-                logger.info(f"Memory Flush 触发: tokens={current_tokens}, force={force}")
-                # 提取记忆
-                memories = self.extractor.extract_from_messages(self.message_buffer)
-
-                # 过滤条件（强制 flush 时跳过 min_memory_count 检查）
-                session_age = (time.time() - self.session_start) / 3600  # 小时
-
-                if force or (len(memories) >= self.config.min_memory_count and session_age <= self.config.max_memory_age_hours):
-                    # 执行 flush
-                    memories_written = self._flush_memories(memories)
-
-                    result["flushed"] = True
-                    result["memories_extracted"] = len(memories)
-                    result["memories_written"] = memories_written
-                    result["reason"] = self._get_flush_reason(current_tokens)
-
-                    logger.info(
-                        f"Memory Flush 完成: 提取={len(memories)}, 写入={memories_written}, "
-                        f"原因={result['reason']}"
-                    )
-
-                    # 清空缓存
-                    self.message_buffer.clear()
-                    self.last_flush_tokens = current_tokens
-                else:
-                    logger.debug(
-                        f"Memory Flush 跳过: 记忆数不足 ({len(memories)} < {self.config.min_memory_count}) "
-                        f"或会话年龄过长 ({session_age:.1f}h > {self.config.max_memory_age_hours}h)"
-                    )
+        供同步 check_and_flush 和后台 MemoryFlushWorker 共用。
 
-            except Exception as e:
-                result["error"] = str(e)
-                logger.error(f"Memory Flush 失败: {e}")
+        Args:
+            messages: 消息快照
+            current_tokens: 触发时的 token 数
+            force: 是否强制 flush（跳过记忆数量和会话年龄检查）
+
+        Returns:
+            Flush 结果字典
+        """
+        result = self._empty_result()
+
+        try:
+            logger.info(f"Memory Flush 触发: tokens={current_tokens}, force={force}")
+            # 提取记忆
+            memories = self.extractor.extract_from_messages(messages)
+
+            # 过滤条件（强制 flush 时跳过 min_memory_count 检查）
+            session_age = (time.time() - self.session_start) / 3600  # 小时
+
+            if force or (len(memories) >= self.config.min_memory_count and session_age <= self.config.max_memory_age_hours):
+                # 执行 flush
+                memories_written = self._flush_memories(memories)
+
+                result["flushed"] = True
+                result["memories_extracted"] = len(memories)
+                result["memories_written"] = memories_written
+                result["reason"] = self._get_flush_reason(current_tokens)
+
+                logger.info(
+                    f"Memory Flush 完成: 提取={len(memories)}, 写入={memories_written}, "
+                    f"原因={result['reason']}"
+                )
+
+                self.last_flush_tokens = current_tokens
+            else:
+                logger.debug(
+                    f"Memory Flush 跳过: 记忆数不足 ({len(memories)} < {self.config.min_memory_count}) "
+                    f"或会话年龄过长 ({session_age:.1f}h > {self.config.max_memory_age_hours}h)"
+                )
+
+        except Exception as e:
+            result["error"] = str(e)
+            logger.error(f"Memory Flush 失败: {e}")
 
         return result
 
+    def should_flush(self, current_tokens: int) -> bool:
+        """
+        判断当前 token 数是否达到 flush 条件
+
+        Args:
+            current_tokens: 当前使用的 token 数
+
+        Returns:
+            是否应该 flush
+        """
+        return self._should_flush(current_tokens)
+
     def _should_flush(self, current_tokens: int) -> bool:
         """判断是否应该 flush"""
         # 检查硬阈值
@@ -725,3 +804,195 @@ class MemoryFlush:
         self.total_tokens = 0
         self.last_flush_tokens = 0
         self.message_buffer.clear()
+
+
+class MemoryFlushWorker:
+    """
+    后台 Memory Flush 执行器
+
+    将记忆提取（LLM 调用）和写入移出请求路径：
+    - 提交时取出 message_buffer 快照，调用方随即可以压缩上下文
+    - 线程池限制并发提取数，排队任务数超过上限时拒绝（消息留在缓存中，
+      下一个周期再提取）
+    - 每个 MemoryFlush 在同一个 compaction 周期内最多提交一次
+    - 未 flush 成功（失败或记忆数不足）的快照放回缓存头部
+
+    使用方式:
+        worker = get_memory_flush_worker()
+        future = worker.submit(memory_flush, cycle=compaction_count, current_tokens=tokens)
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_FLUSH_WORKERS,
+        max_pending: int = DEFAULT_FLUSH_MAX_PENDING
+    ):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 同时执行的提取任务数
+            max_pending: 排队 + 执行中的任务上限
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cond = threading.Condition()
+        self._pending = 0
+        # MemoryFlush -> 最近一次提交的 compaction 周期
+        self._cycles: "weakref.WeakKeyDictionary[MemoryFlush, Hashable]" = weakref.WeakKeyDictionary()
+        self.stats = {
+            "submitted": 0,
+            "flushed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "duplicates": 0,
+            "rejected": 0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="memory-flush"
+            )
+        return self._executor
+
+    def submit(
+        self,
+        flush: MemoryFlush,
+        cycle: Hashable,
+        current_tokens: int,
+        force: bool = False
+    ) -> Optional[Future]:
+        """
+        提交一次后台 flush
+
+        Args:
+            flush: MemoryFlush 实例
+            cycle: compaction 周期标识（同一 flush 同一周期只执行一次）
+            current_tokens: 触发时的 token 数
+            force: 是否强制 flush
+
+        Returns:
+            Future（结果为 flush 结果字典），重复提交、队列已满或缓存为空时返回 None
+        """
+        with self._cond:
+            if flush in self._cycles and self._cycles[flush] == cycle:
+                self.stats["duplicates"] += 1
+                return None
+            if self._pending >= self.max_pending:
+                self.stats["rejected"] += 1
+                logger.warning("后台 Memory Flush 队列已满，消息保留到下一个周期")
+                return None
+
+            messages = flush.take_snapshot()
+            if not messages:
+                return None
+
+            self._cycles[flush] = cycle
+            self._pending += 1
+            self.stats["submitted"] += 1
+            executor = self._get_executor()
+
+        flush.update_token_count(current_tokens)
+        return executor.submit(self._run, flush, messages, current_tokens, force)
+
+    def _run(
+        self,
+        flush: MemoryFlush,
+        messages: List[Dict[str, Any]],
+        current_tokens: int,
+        force: bool
+    ) -> Dict[str, Any]:
+        """在工作线程中提取并写入记忆"""
+        result = None
+        try:
+            result = flush.flush_messages(messages, current_tokens, force=force)
+            return result
+        finally:
+            if result is None or not result["flushed"]:
+                flush.restore_snapshot(messages)
+            with self._cond:
+                if result is None or result["error"]:
+                    self.stats["failed"] += 1
+                elif result["flushed"]:
+                    self.stats["flushed"] += 1
+                else:
+                    self.stats["skipped"] += 1
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有已提交的任务完成
+
+        Args:
+            timeout: 最长等待秒数，None 表示一直等待
+
+        Returns:
+            是否全部完成
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取执行器状态"""
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                **self.stats,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        关闭线程池
+
+        Args:
+            wait: 是否等待已提交的任务完成
+        """
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# 全局实例
+_flush_worker: Optional[MemoryFlushWorker] = None
+_flush_worker_lock = threading.Lock()
+
+
+def get_memory_flush_worker() -> MemoryFlushWorker:
+    """
+    获取后台 Memory Flush 执行器（首次调用时按配置创建）
+
+    Returns:
+        MemoryFlushWorker: 后台执行器
+    """
+    global _flush_worker
+
+    with _flush_worker_lock:
+        if _flush_worker is None:
+            max_workers = DEFAULT_FLUSH_WORKERS
+            max_pending = DEFAULT_FLUSH_MAX_PENDING
+            try:
+                from config import get_config
+                flush_config = get_config().memory.flush
+                max_workers = int(flush_config.background_workers)
+                max_pending = int(flush_config.background_max_pending)
+            except Exception:
+                pass
+            _flush_worker = MemoryFlushWorker(max_workers, max_pending)
+        return _flush_worker
+
+
+def reset_memory_flush_worker(wait: bool = True) -> None:
+    """关闭并重置全局执行器（应用关闭时及测试用）"""
+    global _flush_worker
+
+    with _flush_worker_lock:
+        worker, _flush_worker = _flush_worker, None
+    if worker is not None:
+        worker.shutdown(wait=wait)
@@ -6,18 +6,38 @@
 
 import hashlib
 import logging
+import os
 import sqlite3
 import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Callable
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
 
+from .result_cache import get_search_result_cache, make_search_cache_key
 from .schema import (
+    bump_index_generation,
     ensure_memory_index_schema,
     get_index_db_path,
     open_index_db,
-    DEFAULT_INDEX_PATH
+    read_index_generation,
+    set_fts_automerge,
+    DEFAULT_INDEX_PATH,
+    FTS_DEFAULT_AUTOMERGE
 )
+from .vector_search import (
+    VectorSearchEngine,
+    bm25_relevance,
+    forget_chunks,
+    normalize_scores,
+    sync_ann_index
+)
+from .file_events import create_event_source
+from .cjk import CJK_FTS_TABLE, build_cjk_match, contains_cjk, segment_cjk
+from .embedding import EmbeddingProvider, EmbeddingQueue, get_embedding_queue
+from .index_rotation import SHARD_TIME_RANGE_KEY, extract_path_date, update_shard_time_range
+
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -29,6 +49,26 @@ DEFAULT_CHUNK_OVERLAP = 80  # overlap
 DEFAULT_FTS_TABLE = "chunks_fts"
 
 
+def list_memory_files(directory: Path, pattern: str = "*.md") -> List[Path]:
+    """
+    递归列出目录下的记忆文件（跳过 .index 等隐藏目录）
+
+    Args:
+        directory: 目录路径
+        pattern: 文件匹配模式
+
+    Returns:
+        排序后的文件路径列表
+    """
+    directory = Path(directory)
+    return sorted(
+        p for p in directory.rglob(pattern)
+        if p.is_file() and not any(
+            part.startswith('.') for part in p.relative_to(directory).parts
+        )
+    )
+
+
 class MemoryIndexer:
     """
     记忆索引管理器
@@ -45,7 +85,9 @@ class MemoryIndexer:
         db_path: Optional[Path] = None,
         fts_enabled: bool = True,
         chunk_size: int = DEFAULT_CHUNK_SIZE,
-        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        embedding_provider: Optional[EmbeddingProvider] = None,
+        embedding_queue: Optional[EmbeddingQueue] = None
     ):
         """
         初始化索引管理器
@@ -55,14 +97,25 @@ class MemoryIndexer:
             fts_enabled: 是否启用 FTS5
             chunk_size: 分块大小（行数）
             chunk_overlap: 分块重叠（行数）
+            embedding_provider: 嵌入提供商（可选，设置后为新增块生成向量）
+            embedding_queue: 嵌入队列（可选，默认使用提供商对应的进程级队列）
         """
         self.db_path = db_path or get_index_db_path()
         self.fts_enabled = fts_enabled
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.embedding_provider = embedding_provider
+        self.embedding_queue = embedding_queue
+        if embedding_queue is None and isinstance(embedding_provider, EmbeddingProvider):
+            self.embedding_queue = get_embedding_queue(embedding_provider)
+        self._vector_engine: Optional[VectorSearchEngine] = None
+
+        # 线程锁（用于并发控制，可重入以支持批量事务嵌套单文件事务）
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
 
-        # 线程锁（用于并发控制）
-        self._lock = threading.Lock()
+        # 变更通知订阅者（文件被重新索引或移除后调用）
+        self._change_listeners: List[Callable[[Path], None]] = []
 
         # 打开数据库连接
         self.db = self._open_db()
@@ -76,81 +129,594 @@ class MemoryIndexer:
 
         self.fts_available = schema_result["fts_available"]
         self.fts_error = schema_result.get("fts_error")
+        self.cjk_available = schema_result.get("cjk_available", False)
 
     def _open_db(self) -> sqlite3.Connection:
-        """打开数据库连接"""
-        return open_index_db(self.db_path)
+        """打开数据库连接（autocommit 模式，写入由 _transaction 显式管理）"""
+        return open_index_db(self.db_path, isolation_level=None, check_same_thread=False)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """
+        写事务（BEGIN IMMEDIATE ... COMMIT）
+
+        可嵌套：index_files 为一批文件开启外层事务时，index_file 内部
+        的事务直接并入外层，整批只提交一次。事务内有数据变更时，提交前
+        递增索引代数（搜索结果缓存据此失效），提交后同步一次已有的 ANN 索引。
+        """
+        with self._lock:
+            if self._transaction_depth:
+                self._transaction_depth += 1
+                try:
+                    yield
+                finally:
+                    self._transaction_depth -= 1
+                return
+
+            self.db.execute("BEGIN IMMEDIATE")
+            self._transaction_depth = 1
+            changes_before = self.db.total_changes
+            try:
+                yield
+                changed = self.db.total_changes != changes_before
+                if changed:
+                    bump_index_generation(self.db)
+            except BaseException:
+                self.db.rollback()
+                raise
+            else:
+                self.db.commit()
+            finally:
+                self._transaction_depth = 0
+
+            if changed:
+                # 已有 ANN 索引时增量同步新增向量：每个外层事务一次，
+                # 在提交之后执行（不持有 SQLite 写锁，只包含已提交的行）
+                sync_ann_index(self.db)
+
+    @contextmanager
+    def bulk_ingest(self) -> Iterator[None]:
+        """
+        批量导入模式
+
+        导入期间关闭 FTS5 automerge，避免每次提交都合并段；
+        结束后恢复默认级别并 optimize 一次。
+        """
+        fts_tables = self._fts_tables()
+        for table in fts_tables:
+            set_fts_automerge(self.db, table, 0)
+        try:
+            yield
+        finally:
+            for table in fts_tables:
+                set_fts_automerge(self.db, table, FTS_DEFAULT_AUTOMERGE)
+                self.db.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+
+    def add_change_listener(self, listener: Callable[[Path], None]) -> None:
+        """
+        订阅文件变更通知
+
+        文件被重新索引（内容有变化）或从索引移除后，以文件路径调用 listener，
+        供行级索引等派生索引跟随更新。
+
+        Args:
+            listener: 回调函数，参数为文件路径
+        """
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: Callable[[Path], None]) -> None:
+        """
+        取消订阅文件变更通知
+
+        Args:
+            listener: 回调函数
+        """
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def _notify_change(self, path: str) -> None:
+        """通知订阅者文件已变更（订阅者的异常不影响索引）"""
+        for listener in list(self._change_listeners):
+            try:
+                listener(Path(path))
+            except Exception as e:
+                logger.warning(f"变更通知处理失败: {path}, error={e}")
+
+    def _fts_tables(self) -> List[str]:
+        """需要与 chunks 同步的 FTS 表（rowid 与 chunks.rowid 一致）"""
+        tables = []
+        if self.fts_available:
+            tables.append(DEFAULT_FTS_TABLE)
+        if self.cjk_available:
+            tables.append(CJK_FTS_TABLE)
+        return tables
+
+    def index_files(
+        self,
+        file_paths: List[Path],
+        incremental: bool = True,
+        batch_size: int = 100,
+        progress_callback: Optional[Callable[[int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        批量索引文件（每批文件一个事务）
+
+        每批先在事务外读取、分块并为全部新增块生成向量（一次批量调用），
+        再开启写事务写入，事务内不调用 embedding 接口。同一批内重复的路径
+        只索引一次；写入前在事务内重新校验计划（见 _apply_chunks）。
+
+        Args:
+            file_paths: 文件路径列表
+            incremental: 是否增量更新
+            batch_size: 每个事务包含的文件数
+            progress_callback: 进度回调，参数为本次完成的文件数
+
+        Returns:
+            dict: 汇总统计
+        """
+        stats = {
+            "files": 0,
+            "updated": 0,
+            "failed": 0,
+            "chunks_added": 0,
+            "chunks_removed": 0
+        }
+        batch_size = max(1, batch_size)
+
+        def record(file_path, result: Dict[str, Any]) -> None:
+            stats["files"] += 1
+            if not result["success"]:
+                stats["failed"] += 1
+                logger.warning(f"索引失败: {file_path}, error={result.get('error')}")
+                return
+            if result.get("updated"):
+                stats["updated"] += 1
+            stats["chunks_added"] += result.get("chunks_added", 0)
+            stats["chunks_removed"] += result.get("chunks_removed", 0)
+
+        for start in range(0, len(file_paths), batch_size):
+            batch = file_paths[start:start + batch_size]
+
+            plans = []
+            for file_path in dict.fromkeys(str(p) for p in batch):
+                plan, result = self._prepare_file(Path(file_path), incremental=incremental)
+                if plan is None:
+                    record(file_path, result)
+                else:
+                    plans.append(plan)
+
+            self._embed_plans(plans)
+            for plan in [plan for plan in plans if plan.get("error")]:
+                plans.remove(plan)
+                record(plan["path"], self._failed_plan_result(plan))
+
+            if plans:
+                with self._transaction():
+                    for plan in plans:
+                        record(plan["path"], self._apply_chunks(plan))
+
+            if progress_callback:
+                progress_callback(len(batch))
+
+        return stats
+
+    def index_directory(
+        self,
+        directory: Path,
+        pattern: str = "*.md",
+        rebuild: bool = False,
+        incremental: bool = True,
+        batch_size: int = 100,
+        progress_callback: Optional[Callable[[int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        索引整个目录（批量导入模式）
+
+        已从目录中删除的文件会同时从索引移除。
+
+        Args:
+            directory: 目录路径
+            pattern: 文件匹配模式（递归，跳过隐藏目录）
+            rebuild: 是否先清空索引再全部重建
+            incremental: 是否增量更新（rebuild 时无意义）
+            batch_size: 每个事务包含的文件数
+            progress_callback: 进度回调，参数为本次完成的文件数
+
+        Returns:
+            dict: 汇总统计（含 chunks 总数和 vectors 总数）
+        """
+        directory = Path(directory)
+        file_paths = list_memory_files(directory, pattern)
+
+        with self.bulk_ingest():
+            if rebuild:
+                self.clear()
+            else:
+                current = {str(p) for p in file_paths}
+                prefix = str(directory)
+                stale = [
+                    row[0] for row in self.db.execute("SELECT path FROM files")
+                    if row[0].startswith(prefix) and row[0] not in current
+                ]
+                with self._transaction():
+                    for path in stale:
+                        self.remove_file(Path(path))
+
+            stats = self.index_files(
+                file_paths,
+                incremental=incremental,
+                batch_size=batch_size,
+                progress_callback=progress_callback
+            )
+
+        status = self.get_status()
+        stats["chunks"] = status["chunk_count"]
+        stats["vectors"] = (
+            self.db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
+            if self._has_vector_table() else 0
+        )
+        return stats
+
+    def remove_file(self, file_path: Path) -> bool:
+        """
+        从索引中移除文件
+
+        Args:
+            file_path: 文件路径
 
-    def index_file(self, file_path: Path) -> Dict[str, Any]:
+        Returns:
+            是否存在并已移除
+        """
+        path = str(file_path)
+        with self._transaction():
+            if self._get_file_record(path) is None:
+                return False
+            self._delete_chunks(path)
+            self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._notify_change(path)
+        return True
+
+    def clear(self) -> None:
+        """清空索引中的所有文件、分块和向量"""
+        paths = [row[0] for row in self.db.execute("SELECT path FROM files")]
+        with self._transaction():
+            if self._has_vector_table():
+                try:
+                    chunk_ids = [row[0] for row in self.db.execute("SELECT id FROM chunks")]
+                    self.db.execute("DELETE FROM chunk_vectors")
+                    forget_chunks(self.db, chunk_ids)
+                except sqlite3.Error as e:
+                    logger.warning(f"清空向量失败: {e}")
+            for table in self._fts_tables():
+                self.db.execute(f"DELETE FROM {table}")
+            self.db.execute("DELETE FROM chunks")
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM meta WHERE key = ?", (SHARD_TIME_RANGE_KEY,))
+        for path in paths:
+            self._notify_change(path)
+
+    def index_file(self, file_path: Path, incremental: bool = True) -> Dict[str, Any]:
         """
         索引单个文件
 
+        增量模式下按 chunk ID（包含内容 hash）对比新旧分块，只插入新增块、
+        删除消失的块，未变化的块及其向量保持不动。每日日志只增长且上次索引
+        的末尾内容未变时走追加快速路径，只读取上次记录的续读位置之后的内容。
+
         Args:
             file_path: 要索引的文件路径
+            incremental: 是否增量更新（False 时删除全部旧块后重建）
 
         Returns:
             dict: 索引结果统计
         """
+        plan, result = self._prepare_file(file_path, incremental=incremental)
+        if plan is None:
+            return result
+
+        self._embed_plans([plan])
+        if plan.get("error"):
+            return self._failed_plan_result(plan)
+        return self._apply_chunks(plan)
+
+    def _prepare_file(
+        self,
+        file_path: Path,
+        incremental: bool = True
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        读取并分块，计算需要写入的变更（只读，不开启写事务）
+
+        Args:
+            file_path: 文件路径
+            incremental: 是否增量更新
+
+        Returns:
+            (写入计划, None)；无需写入（未变化或失败）时为 (None, 索引结果)
+        """
         if not file_path.exists():
-            return {
+            return None, {
                 "success": False,
                 "error": "文件不存在",
                 "chunks_added": 0
             }
 
+        path = str(file_path)
+        existing = self._get_file_record(path)
+
+        # 追加快速路径：仅用于按日期命名的日志（约定只追加），
+        # 其他文件可能在增长的同时修改前文，走完整读取 + 分块对比
+        base_hash = existing["hash"] if existing else None
+        if incremental and existing and existing["tail_hash"] and extract_path_date(file_path.name):
+            try:
+                if file_path.stat().st_size > existing["size"]:
+                    plan = self._plan_appended(file_path, existing)
+                    if plan is not None:
+                        return plan, None
+            except Exception as e:
+                logger.debug(f"追加索引失败，回退到完整索引: {path}, error={e}")
+
         # 读取文件内容
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            content = self._decode(data)
         except Exception as e:
-            return {
+            return None, {
                 "success": False,
                 "error": str(e),
                 "chunks_added": 0
             }
 
-        # 计算文件 hash
-        file_hash = self._compute_hash(content)
-        file_stat = file_path.stat()
-        mtime = int(file_stat.st_mtime)
-        size = file_stat.st_size
-
         # 检查是否需要更新
-        existing = self._get_file_record(str(file_path))
+        file_hash = self._compute_hash(content)
         if existing and existing["hash"] == file_hash:
-            return {
+            return None, {
                 "success": True,
                 "updated": False,
                 "chunks_added": 0
             }
 
-        # 分块
-        chunks = self._chunk_content(content, str(file_path))
-        chunks_added = 0
+        # 分块，并记录最后一个分块（追加时会变化）的起始位置
+        chunks, resume_line = self._chunk_lines(content.split('\n'), path)
+        resume_offset = self._line_offset(data, resume_line)
+
+        old_ids = self._get_chunk_ids(path) if incremental else None
+        record = {
+            "hash": file_hash,
+            "mtime": int(file_path.stat().st_mtime),
+            "size": len(data),
+            "resume_offset": resume_offset,
+            "resume_line": resume_line,
+            "tail_hash": hashlib.md5(data[resume_offset:]).hexdigest()
+        }
+        return self._plan_chunks(path, record, chunks, old_ids, base_hash), None
+
+    def _plan_appended(self, file_path: Path, existing: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        追加快速路径：从续读位置读取并重新分块
+
+        Args:
+            file_path: 文件路径
+            existing: 文件记录
+
+        Returns:
+            写入计划；续读位置之后的旧内容已变化（不是纯追加）时返回 None
+        """
+        offset = existing["resume_offset"]
+        old_tail_size = existing["size"] - offset
+        if old_tail_size < 0:
+            return None
+
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            tail = f.read()
+
+        if hashlib.md5(tail[:old_tail_size]).hexdigest() != existing["tail_hash"]:
+            return None
+
+        path = str(file_path)
+        line_base = existing["resume_line"]
+        chunks, resume_rel = self._chunk_lines(self._decode(tail).split('\n'), path, line_base)
+        resume_offset = offset + self._line_offset(tail, resume_rel)
+
+        # 续读位置之前的块不受追加影响，只对比之后的块
+        old_ids = self._get_chunk_ids(path, min_start_line=line_base + 1)
+        record = {
+            # 无法廉价计算全文 hash，使用链式指纹；之后的完整索引会按 chunk 对比
+            "hash": hashlib.md5(existing["hash"].encode('utf-8') + tail[old_tail_size:]).hexdigest(),
+            "mtime": int(file_path.stat().st_mtime),
+            "size": offset + len(tail),
+            "resume_offset": resume_offset,
+            "resume_line": line_base + resume_rel,
+            "tail_hash": hashlib.md5(tail[resume_offset - offset:]).hexdigest()
+        }
+        plan = self._plan_chunks(path, record, chunks, old_ids, existing["hash"])
+        plan["appended"] = True
+        return plan
+
+    def _plan_chunks(
+        self,
+        path: str,
+        record: Dict[str, Any],
+        chunks: List[Dict[str, Any]],
+        old_ids: Optional[set],
+        base_hash: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        按 chunk ID 差异计算写入计划
+
+        Args:
+            path: 文件路径
+            record: 文件记录字段
+            chunks: 新分块
+            old_ids: 参与对比的旧 chunk ID（None 表示删除该文件全部旧块）
+            base_hash: 计算差异时索引中的文件 hash（无记录为 None）
+
+        Returns:
+            写入计划（path, record, chunks 为新增块, vanished 为消失的块 ID，
+            vanished 为 None 表示删除该文件全部旧块）
+        """
+        if old_ids is None:
+            new_chunks = chunks
+            vanished = None
+        else:
+            new_chunks = [chunk for chunk in chunks if chunk["id"] not in old_ids]
+            vanished = old_ids - {chunk["id"] for chunk in chunks}
+
+        return {
+            "path": path,
+            "record": record,
+            "chunks": new_chunks,
+            "vanished": vanished,
+            "embeddings": [],
+            "all_chunks": chunks,
+            "base_hash": base_hash,
+        }
+
+    def _embed_plans(self, plans: List[Dict[str, Any]]) -> None:
+        """
+        为一组写入计划的新增块生成向量（一次批量调用，在写事务外执行）
+
+        已配置 embedding 但生成失败时，有新增块的计划标记 error 并放弃写入：
+        文件记录不前进，下次索引时这些块仍是新增块，会重新生成向量。
+        """
+        chunks = [chunk for plan in plans for chunk in plan["chunks"]]
+        try:
+            embeddings = self._embed_chunks(chunks)
+            if embeddings and len(embeddings) != len(chunks):
+                raise ValueError(f"向量数与分块数不符: {len(embeddings)} != {len(chunks)}")
+        except Exception as e:
+            logger.warning(f"生成向量失败: {len(chunks)} chunks, error={e}")
+            for plan in plans:
+                if plan["chunks"]:
+                    plan["error"] = f"生成向量失败: {e}"
+            return
+        if not embeddings:
+            return
+
+        offset = 0
+        for plan in plans:
+            count = len(plan["chunks"])
+            plan["embeddings"] = embeddings[offset:offset + count]
+            offset += count
+
+    @staticmethod
+    def _failed_plan_result(plan: Dict[str, Any]) -> Dict[str, Any]:
+        """放弃写入的计划对应的索引结果"""
+        return {
+            "success": False,
+            "error": plan["error"],
+            "chunks_added": 0
+        }
+
+    def _rediff_plan(self, plan: Dict[str, Any]) -> bool:
+        """
+        计划过期（准备后该文件已被其他写入更新）时按当前索引重新对比
+
+        需在写事务内调用。文件在准备之后又有变化时放弃（计划内容可能比
+        其他写入更旧）；追加计划依赖旧的续读位置，无法重新对比；重新对比
+        后的新增块缺少已生成的向量时也放弃（不在事务内调用 embedding）。
+
+        Returns:
+            计划是否仍可写入
+        """
+        record = plan["record"]
+        try:
+            stat = Path(plan["path"]).stat()
+        except OSError:
+            return False
+        if stat.st_size != record["size"] or int(stat.st_mtime) != record["mtime"]:
+            return False
+
+        if plan["vanished"] is None:
+            # 全量替换：删除该文件全部旧块后重建，不依赖旧块
+            return True
+        if plan.get("appended"):
+            return False
+
+        chunks = plan["all_chunks"]
+        old_ids = self._get_chunk_ids(plan["path"])
+        new_chunks = [chunk for chunk in chunks if chunk["id"] not in old_ids]
+
+        if self.embedding_queue is not None or self.embedding_provider is not None:
+            vectors = {
+                chunk["id"]: embedding
+                for chunk, embedding in zip(plan["chunks"], plan["embeddings"])
+            }
+            if any(chunk["id"] not in vectors for chunk in new_chunks):
+                return False
+            plan["embeddings"] = [vectors[chunk["id"]] for chunk in new_chunks]
+
+        plan["chunks"] = new_chunks
+        plan["vanished"] = old_ids - {chunk["id"] for chunk in chunks}
+        return True
+
+    def _apply_chunks(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        在写事务中执行写入计划
+
+        写入前在事务内重新读取文件记录：索引已是计划中的内容时跳过；
+        准备之后被其他写入更新过时重新对比，无法重新对比则跳过（保留
+        其他写入的结果）。
+
+        Args:
+            plan: _plan_chunks 生成、_embed_plans 补充向量后的写入计划
+
+        Returns:
+            dict: 索引结果统计
+        """
+        path = plan["path"]
+        record = plan["record"]
+
+        with self._transaction():
+            current = self._get_file_record(path)
+            current_hash = current["hash"] if current else None
+            if current_hash == record["hash"]:
+                return {"success": True, "updated": False, "chunks_added": 0}
+            if current_hash != plan["base_hash"] and not self._rediff_plan(plan):
+                logger.debug(f"写入计划已过期，跳过: {path}")
+                return {"success": True, "updated": False, "chunks_added": 0}
+            new_chunks = plan["chunks"]
+            vanished = plan["vanished"]
+            embeddings = plan["embeddings"]
 
-        with self._lock:
             # 更新文件记录
-            self._upsert_file_record(
-                path=str(file_path),
-                source="memory",
-                hash=file_hash,
-                mtime=mtime,
-                size=size
-            )
+            self._upsert_file_record(path=path, source="memory", **record)
+
+            # 更新分片时间范围（按 since_days 搜索时用于跳过旧分片）
+            update_shard_time_range(self.db, path)
 
             # 删除旧的 chunks
-            self._delete_chunks(str(file_path))
+            if vanished is None:
+                chunks_removed = self.db.execute(
+                    "SELECT COUNT(*) FROM chunks WHERE path = ?", (path,)
+                ).fetchone()[0]
+                self._delete_chunks(path)
+            else:
+                chunks_removed = len(vanished)
+                self._delete_chunk_ids(list(vanished))
 
             # 添加新的 chunks
-            for chunk in chunks:
-                self._add_chunk(chunk)
-                chunks_added += 1
+            self._add_chunks(new_chunks)
 
-        return {
+            if embeddings:
+                self._insert_embeddings(new_chunks, embeddings)
+
+            if self.embedding_queue is not None:
+                self.embedding_queue.write_cache(self.db)
+
+        self._notify_change(path)
+        result = {
             "success": True,
             "updated": True,
-            "chunks_added": chunks_added
+            "chunks_added": len(new_chunks),
+            "chunks_removed": chunks_removed
         }
+        if plan.get("appended"):
+            result["appended"] = True
+        return result
 
     def search(
         self,
@@ -174,14 +740,77 @@ class MemoryIndexer:
 
         query = query.strip()
 
+        # 结果缓存：键包含本索引的文件标识和索引代数，写入后自动失效
+        cache = get_search_result_cache()
+        cache_key = self._search_cache_key(query, max_results, source_filter) if cache.enabled else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return [dict(result) for result in cached]
+
+        results = self._search_uncached(query, max_results, source_filter)
+        if cache_key is not None:
+            cache.put(cache_key, tuple(dict(result) for result in results))
+        return results
+
+    def _search_cache_key(
+        self,
+        query: str,
+        max_results: int,
+        source_filter: Optional[List[str]]
+    ) -> Optional[tuple]:
+        """
+        构造搜索结果缓存键
+
+        内存数据库和未提交的写事务中不使用缓存。
+
+        Returns:
+            缓存键，不可缓存时返回 None
+        """
+        if self._transaction_depth or str(self.db_path) == ":memory:":
+            return None
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        generation = (
+            (str(self.db_path), (stat.st_dev, stat.st_ino), read_index_generation(self.db)),
+        )
+        return make_search_cache_key(
+            "memory_indexer",
+            query,
+            generation,
+            max_results=max_results,
+            source_filter=source_filter
+        )
+
+    def _search_uncached(
+        self,
+        query: str,
+        max_results: int,
+        source_filter: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """执行搜索（不经过结果缓存）"""
         # 如果 FTS 不可用，使用简单的 LIKE 搜索
         if not self.fts_available:
             return self._search_like(query, max_results, source_filter)
 
+        # 中文查询改写为 CJK 影子表的 MATCH 表达式
+        if self.cjk_available and contains_cjk(query):
+            match_query = build_cjk_match(query)
+            if match_query:
+                return self._search_fts(
+                    match_query, max_results, source_filter, fts_table=CJK_FTS_TABLE
+                )
+
         # 使用 FTS5 搜索
-        results = self._search_fts(query, max_results, source_filter)
+        try:
+            results = self._search_fts(query, max_results, source_filter)
+        except sqlite3.OperationalError:
+            # 查询包含 FTS5 语法字符（如 "-"、":"）
+            results = []
 
-        # 如果 FTS 搜索没有结果（比如中文文本），回退到 LIKE 搜索
+        # 如果 FTS 搜索没有结果，回退到 LIKE 搜索
         if not results:
             results = self._search_like(query, max_results, source_filter)
 
@@ -191,6 +820,18 @@ class MemoryIndexer:
         """计算内容的 hash 值"""
         return hashlib.md5(content.encode('utf-8')).hexdigest()
 
+    def _decode(self, data: bytes) -> str:
+        """解码文件内容（统一换行符为 \\n，与行号/字节偏移一致）"""
+        return data.decode('utf-8').replace('\r\n', '\n')
+
+    @staticmethod
+    def _line_offset(data: bytes, line: int) -> int:
+        """第 line 行（0-based）的起始字节偏移"""
+        offset = 0
+        for _ in range(line):
+            offset = data.index(b'\n', offset) + 1
+        return offset
+
     def _chunk_content(
         self,
         content: str,
@@ -215,50 +856,75 @@ class MemoryIndexer:
         if not lines or (len(lines) == 1 and not lines[0]):
             return []
 
+        chunks, _ = self._chunk_lines(lines, file_path)
+        return chunks
+
+    def _chunk_lines(
+        self,
+        lines: List[str],
+        file_path: str,
+        line_base: int = 0
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        按固定行窗口（带重叠）分块
+
+        窗口起点只取决于行号，文件追加内容时之前的完整窗口保持不变，
+        只有最后一个窗口需要重新计算。
+
+        Args:
+            lines: 文本行
+            file_path: 文件路径
+            line_base: 第一行的行号偏移（0-based，追加索引时使用）
+
+        Returns:
+            (分块列表, 最后一个窗口的起始行（相对 lines）)
+        """
         chunks = []
 
         start_line = 0
+        last_start = 0
         chunk_size = self.chunk_size
         overlap = self.chunk_overlap
+        now = int(datetime.now().timestamp())
 
         while start_line < len(lines):
             end_line = min(start_line + chunk_size, len(lines))
+            last_start = start_line
 
             # 提取文本块
-            chunk_lines = lines[start_line:end_line]
-            chunk_text = '\n'.join(chunk_lines)
+            chunk_text = '\n'.join(lines[start_line:end_line])
 
             # 跳过空块
-            if not chunk_text or not chunk_text.strip():
-                start_line = end_line - overlap if end_line < len(lines) else len(lines)
-                continue
-
-            # 计算块的 hash
-            chunk_hash = self._compute_hash(chunk_text)
-
-            # 生成唯一 ID
-            chunk_id = f"{file_path}:{start_line+1}:{end_line}:{chunk_hash}"
-
-            chunks.append({
-                "id": chunk_id,
-                "path": file_path,
-                "source": "memory",
-                "start_line": start_line + 1,  # 转换为 1-based
-                "end_line": end_line,
-                "hash": chunk_hash,
-                "text": chunk_text,
-                "updated_at": int(datetime.now().timestamp())
-            })
+            if chunk_text and chunk_text.strip():
+                # 计算块的 hash
+                chunk_hash = self._compute_hash(chunk_text)
+                first_line = line_base + start_line + 1  # 转换为 1-based
+                last_line = line_base + end_line
+
+                # 生成唯一 ID
+                chunk_id = f"{file_path}:{first_line}:{last_line}:{chunk_hash}"
+
+                chunks.append({
+                    "id": chunk_id,
+                    "path": file_path,
+                    "source": "memory",
+                    "start_line": first_line,
+                    "end_line": last_line,
+                    "hash": chunk_hash,
+                    "text": chunk_text,
+                    "updated_at": now
+                })
 
             # 移动到下一个块（带重叠）
             start_line = end_line - overlap if end_line < len(lines) else len(lines)
 
-        return chunks
+        return chunks, last_start
 
     def _get_file_record(self, path: str) -> Optional[Dict[str, Any]]:
         """获取文件记录"""
         cursor = self.db.execute(
-            "SELECT path, source, hash, mtime, size FROM files WHERE path = ?",
+            "SELECT path, source, hash, mtime, size, resume_offset, resume_line, tail_hash "
+            "FROM files WHERE path = ?",
             (path,)
         )
         row = cursor.fetchone()
@@ -268,75 +934,168 @@ class MemoryIndexer:
                 "source": row[1],
                 "hash": row[2],
                 "mtime": row[3],
-                "size": row[4]
+                "size": row[4],
+                "resume_offset": row[5],
+                "resume_line": row[6],
+                "tail_hash": row[7]
             }
         return None
 
+    def _get_chunk_ids(self, path: str, min_start_line: int = 0) -> set:
+        """获取文件的 chunk ID（可限定起始行）"""
+        cursor = self.db.execute(
+            "SELECT id FROM chunks WHERE path = ? AND start_line >= ?",
+            (path, min_start_line)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
     def _upsert_file_record(
         self,
         path: str,
         source: str,
         hash: str,
         mtime: int,
-        size: int
+        size: int,
+        resume_offset: int = 0,
+        resume_line: int = 0,
+        tail_hash: str = ""
     ) -> None:
         """插入或更新文件记录"""
         self.db.execute("""
-            INSERT INTO files (path, source, hash, mtime, size)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO files (path, source, hash, mtime, size, resume_offset, resume_line, tail_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(path) DO UPDATE SET
                 source=excluded.source,
                 hash=excluded.hash,
                 mtime=excluded.mtime,
-                size=excluded.size
-        """, (path, source, hash, mtime, size))
+                size=excluded.size,
+                resume_offset=excluded.resume_offset,
+                resume_line=excluded.resume_line,
+                tail_hash=excluded.tail_hash
+        """, (path, source, hash, mtime, size, resume_offset, resume_line, tail_hash))
 
     def _delete_chunks(self, path: str) -> None:
         """删除文件的所有 chunks"""
-        # 删除 FTS 表中的记录
-        if self.fts_available:
+        # 删除向量并为常驻矩阵 / ANN 索引打墓碑
+        if self._has_vector_table():
+            chunk_ids = [
+                row[0] for row in self.db.execute("SELECT id FROM chunks WHERE path = ?", (path,))
+            ]
+            try:
+                self.db.execute(
+                    "DELETE FROM chunk_vectors WHERE chunk_id IN (SELECT id FROM chunks WHERE path = ?)",
+                    (path,)
+                )
+                forget_chunks(self.db, chunk_ids)
+            except sqlite3.Error as e:
+                # 例如 sqlite-vec 虚拟表在未加载扩展的连接上不可写
+                logger.warning(f"删除向量失败: {path}, error={e}")
+
+        # 删除 FTS 表中的记录（按 rowid 删除，避免扫描 UNINDEXED 列）
+        for table in self._fts_tables():
             self.db.execute(
-                f"DELETE FROM {DEFAULT_FTS_TABLE} WHERE path = ?",
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM chunks WHERE path = ?)",
                 (path,)
             )
 
         # 删除 chunks 表中的记录
         self.db.execute("DELETE FROM chunks WHERE path = ?", (path,))
 
+    def _delete_chunk_ids(self, chunk_ids: List[str]) -> None:
+        """删除指定的 chunks（及其 FTS 记录和向量）"""
+        if not chunk_ids:
+            return
+
+        params = [(chunk_id,) for chunk_id in chunk_ids]
+
+        if self._has_vector_table():
+            try:
+                self.db.executemany("DELETE FROM chunk_vectors WHERE chunk_id = ?", params)
+                forget_chunks(self.db, chunk_ids)
+            except sqlite3.Error as e:
+                logger.warning(f"删除向量失败: {len(chunk_ids)} chunks, error={e}")
+
+        for table in self._fts_tables():
+            self.db.executemany(
+                f"DELETE FROM {table} WHERE rowid = (SELECT rowid FROM chunks WHERE id = ?)",
+                params
+            )
+
+        self.db.executemany("DELETE FROM chunks WHERE id = ?", params)
+
+    def _embed_chunks(self, chunks: List[Dict[str, Any]]) -> List[List[float]]:
+        """为新增块生成向量（未配置 embedding provider 时跳过，编码失败时抛出异常）"""
+        if not chunks:
+            return []
+
+        texts = [chunk["text"] for chunk in chunks]
+        if self.embedding_queue is not None:
+            # 经 embedding_cache 去重后批量编码，新向量在写事务中写回缓存
+            return self.embedding_queue.encode(texts, cache_db=self.db)
+        if self.embedding_provider is not None:
+            return self.embedding_provider.encode(texts)
+        return []
+
+    def _insert_embeddings(self, chunks: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        """写入新增块的向量"""
+        if self._vector_engine is None or self._vector_engine.dims != len(embeddings[0]):
+            self._vector_engine = VectorSearchEngine(
+                self.db, dims=len(embeddings[0]), use_sqlite_vec=False
+            )
+            self._vector_engine.ensure_vector_tables()
+
+        self._vector_engine.insert_vectors(
+            [(chunk["id"], embedding) for chunk, embedding in zip(chunks, embeddings)]
+        )
+
+    def _has_vector_table(self) -> bool:
+        """是否已创建 chunk_vectors 表"""
+        cursor = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunk_vectors'"
+        )
+        return cursor.fetchone() is not None
+
     def _add_chunk(self, chunk: Dict[str, Any]) -> None:
         """添加一个文本块"""
+        self._add_chunks([chunk])
+
+    def _add_chunks(self, chunks: List[Dict[str, Any]]) -> None:
+        """批量添加文本块（executemany）"""
+        if not chunks:
+            return
+
         # 添加到 chunks 表
-        self.db.execute("""
+        self.db.executemany("""
             INSERT INTO chunks (id, path, source, start_line, end_line, hash, text, updated_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            chunk["id"],
-            chunk["path"],
-            chunk["source"],
-            chunk["start_line"],
-            chunk["end_line"],
-            chunk["hash"],
-            chunk["text"],
-            chunk["updated_at"]
-        ))
-
-        # 添加到 FTS 表
-        if self.fts_available:
-            self.db.execute(f"""
-                INSERT INTO {DEFAULT_FTS_TABLE} (rowid, text, id, path, source, start_line, end_line)
-                VALUES (
-                    (SELECT rowid FROM chunks WHERE id = ?),
-                    ?, ?, ?, ?, ?, ?
-                )
-            """, (
-                chunk["id"],
-                chunk["text"],
+        """, [
+            (
                 chunk["id"],
                 chunk["path"],
                 chunk["source"],
                 chunk["start_line"],
-                chunk["end_line"]
-            ))
+                chunk["end_line"],
+                chunk["hash"],
+                chunk["text"],
+                chunk["updated_at"]
+            )
+            for chunk in chunks
+        ])
+
+        # 添加到 FTS 表
+        if self.fts_available:
+            self.db.executemany(f"""
+                INSERT INTO {DEFAULT_FTS_TABLE} (rowid, text, id, path, source, start_line, end_line)
+                SELECT rowid, text, id, path, source, start_line, end_line
+                FROM chunks WHERE id = ?
+            """, [(chunk["id"],) for chunk in chunks])
+
+        # 添加到 CJK 影子表
+        if self.cjk_available:
+            self.db.executemany(f"""
+                INSERT INTO {CJK_FTS_TABLE} (rowid, text)
+                VALUES ((SELECT rowid FROM chunks WHERE id = ?), ?)
+            """, [(chunk["id"], segment_cjk(chunk["text"])) for chunk in chunks])
 
     def _search_like(
         self,
@@ -376,16 +1135,18 @@ class MemoryIndexer:
         self,
         query: str,
         max_results: int,
-        source_filter: Optional[List[str]]
+        source_filter: Optional[List[str]],
+        fts_table: str = DEFAULT_FTS_TABLE
     ) -> List[Dict[str, Any]]:
-        """使用 FTS5 搜索"""
+        """使用 FTS5 搜索（score 为按最佳结果归一化的 bm25 相关度）"""
         # 构建查询 - 使用 format 避免与 SQL 占位符冲突
         sql = """
-            SELECT chunks.id, chunks.path, chunks.source, chunks.start_line, chunks.end_line, chunks.text
+            SELECT chunks.id, chunks.path, chunks.source, chunks.start_line, chunks.end_line, chunks.text,
+                   bm25({fts_table})
             FROM {fts_table}
             JOIN chunks ON chunks.rowid = {fts_table}.rowid
             WHERE {fts_table} MATCH ?
-        """.format(fts_table=DEFAULT_FTS_TABLE)
+        """.format(fts_table=fts_table)
         params = [query]
 
         if source_filter:
@@ -393,12 +1154,13 @@ class MemoryIndexer:
             sql += " AND chunks.source IN ({})".format(placeholders)
             params.extend(source_filter)
 
-        sql += " ORDER BY bm25({}) LIMIT ?".format(DEFAULT_FTS_TABLE)
+        sql += " ORDER BY bm25({}) LIMIT ?".format(fts_table)
         params.append(max_results)
 
-        cursor = self.db.execute(sql, params)
+        rows = self.db.execute(sql, params).fetchall()
+        scores = normalize_scores([bm25_relevance(row[6]) for row in rows], method="max")
         results = []
-        for row in cursor.fetchall():
+        for row, score in zip(rows, scores):
             results.append({
                 "id": row[0],
                 "path": row[1],
@@ -406,7 +1168,8 @@ class MemoryIndexer:
                 "start_line": row[3],
                 "end_line": row[4],
                 "text": row[5],
-                "score": 1.0  # BM25 分数可以后续添加
+                "bm25": row[6],
+                "score": score
             })
 
         return results
@@ -431,7 +1194,12 @@ class MemoryIndexer:
             "chunk_count": chunk_count,
             "fts_available": self.fts_available,
             "fts_count": fts_count,
-            "fts_error": self.fts_error
+            "fts_error": self.fts_error,
+            "index_generation": read_index_generation(self.db),
+            "result_cache": get_search_result_cache().get_stats(),
+            "embedding_queue": (
+                self.embedding_queue.get_status() if self.embedding_queue is not None else None
+            )
         }
 
     def close(self) -> None:
@@ -453,13 +1221,22 @@ class MemoryWatcher:
     记忆文件监听器
 
     监控 memory/ 目录的文件变更，自动触发索引更新
+
+    start() 启动事件监听线程（inotify，不可用时回退到 stat 扫描）；
+    同一文件在 debounce_seconds 内的连续事件合并为一次，由单个后台
+    工作线程通过 wait_for_changes() / process_due_changes() 批量索引。
     """
 
+    # 持续写入的文件最多延迟 debounce_seconds * 该倍数后强制索引
+    MAX_DEBOUNCE_FACTOR = 5
+
     def __init__(
         self,
         indexer: MemoryIndexer,
         watch_paths: List[Path],
-        debounce_seconds: float = 1.5
+        debounce_seconds: float = 1.5,
+        backend: str = "auto",
+        scan_interval: float = 5.0
     ):
         """
         初始化监听器
@@ -468,13 +1245,21 @@ class MemoryWatcher:
             indexer: 索引管理器实例
             watch_paths: 要监听的路径列表
             debounce_seconds: 防抖秒数
+            backend: 事件源（auto、inotify 或 poll）
+            scan_interval: poll 事件源的扫描间隔（秒）
         """
         self.indexer = indexer
         self.watch_paths = watch_paths
         self.debounce_seconds = debounce_seconds
-        self._dirty_files = set()
+        self.backend = backend
+        self.scan_interval = scan_interval
+        # path -> (首次事件时间, 最近事件时间)
+        self._dirty_files: Dict[Path, Tuple[float, float]] = {}
+        self._cond = threading.Condition()
         self._running = False
+        self._stopping = False
         self._thread = None
+        self._source = None
 
     def _is_watch_path(self, path: Path) -> bool:
         """检查路径是否在监听范围内"""
@@ -487,27 +1272,93 @@ class MemoryWatcher:
         return False
 
     def on_file_changed(self, path: Path) -> None:
-        """文件变更回调"""
-        if self._is_watch_path(path):
-            self._dirty_files.add(path)
-            logger.debug(f"检测到文件变更: {path}")
+        """文件变更回调（同一文件的连续事件合并，防抖窗口顺延）"""
+        if not self._is_watch_path(path):
+            return
+
+        now = time.monotonic()
+        with self._cond:
+            first_seen, _ = self._dirty_files.get(path, (now, now))
+            self._dirty_files[path] = (first_seen, now)
+            self._cond.notify_all()
+        logger.debug(f"检测到文件变更: {path}")
+
+    def _due_time(self, first_seen: float, last_seen: float) -> float:
+        return min(
+            last_seen + self.debounce_seconds,
+            first_seen + self.debounce_seconds * self.MAX_DEBOUNCE_FACTOR
+        )
+
+    def wait_for_changes(self, timeout: Optional[float] = None) -> bool:
+        """
+        阻塞直到有文件度过防抖窗口
+
+        Args:
+            timeout: 最长等待秒数，None 表示一直等待（stop() 会唤醒）
+
+        Returns:
+            是否有待处理的变更
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._stopping:
+                now = time.monotonic()
+                due = min(
+                    (self._due_time(*times) for times in self._dirty_files.values()),
+                    default=None
+                )
+                if due is not None and due <= now:
+                    return True
+
+                wait = None if due is None else due - now
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+            return False
+
+    def process_due_changes(self) -> Dict[str, Any]:
+        """处理已度过防抖窗口的变更"""
+        now = time.monotonic()
+        with self._cond:
+            due = [
+                path for path, times in self._dirty_files.items()
+                if self._due_time(*times) <= now
+            ]
+            for path in due:
+                del self._dirty_files[path]
+        return self._process_paths(due)
 
     def process_changes(self) -> Dict[str, Any]:
-        """处理所有变更"""
+        """处理所有变更（忽略防抖窗口）"""
+        with self._cond:
+            paths = list(self._dirty_files)
+            self._dirty_files.clear()
+        return self._process_paths(paths)
+
+    def _process_paths(self, paths: List[Path]) -> Dict[str, Any]:
+        """索引一批文件，已删除的文件从索引移除"""
         results = {
             "processed": 0,
             "failed": 0,
             "files": []
         }
 
-        if not self._dirty_files:
+        if not paths:
             return results
 
-        logger.info(f"MemoryWatcher: 处理 {len(self._dirty_files)} 个文件变更")
+        logger.info(f"MemoryWatcher: 处理 {len(paths)} 个文件变更")
 
-        for file_path in list(self._dirty_files):
+        for file_path in paths:
             try:
-                result = self.indexer.index_file(file_path)
+                if not file_path.exists():
+                    self.indexer.remove_file(file_path)
+                    result = {"success": True, "removed": True}
+                else:
+                    result = self.indexer.index_file(file_path)
+
                 if result["success"]:
                     results["processed"] += 1
                     logger.debug(
@@ -522,12 +1373,10 @@ class MemoryWatcher:
                     "path": str(file_path),
                     "success": result["success"],
                     "chunks_added": result.get("chunks_added", 0),
+                    "removed": result.get("removed", False),
                     "error": result.get("error")
                 })
 
-                # 已处理，从集合中移除
-                self._dirty_files.discard(file_path)
-
             except Exception as e:
                 results["failed"] += 1
                 logger.error(f"处理文件失败: {file_path}, error={e}")
@@ -545,13 +1394,50 @@ class MemoryWatcher:
 
         return results
 
+    def _event_loop(self) -> None:
+        """事件监听循环：把事件源报告的变更送入防抖队列"""
+        source = self._source
+        while self._running:
+            try:
+                for path in source.read():
+                    self.on_file_changed(path)
+            except Exception as e:
+                logger.error(f"MemoryWatcher 事件读取错误: {e}")
+                time.sleep(self.scan_interval)
+
     def start(self) -> None:
-        """启动监听（需要外部触发 process_changes）"""
+        """启动事件监听线程（索引由 process_due_changes 的调用方执行）"""
+        if self._running:
+            return
+
         logger.info(f"MemoryWatcher 启动，监听路径: {[str(p) for p in self.watch_paths]}")
+        self._source = create_event_source(
+            self.watch_paths,
+            backend=self.backend,
+            scan_interval=self.scan_interval
+        )
+        logger.info(f"MemoryWatcher 事件源: {type(self._source).__name__}")
+        self._stopping = False
         self._running = True
+        self._thread = threading.Thread(
+            target=self._event_loop,
+            daemon=True,
+            name="MemoryWatcher-events",
+        )
+        self._thread.start()
 
     def stop(self) -> None:
-        """停止监听"""
+        """停止监听（唤醒等待中的工作线程）"""
         logger.info("MemoryWatcher 停止")
-        self._running = False
-        self._dirty_files.clear()
+        with self._cond:
+            self._running = False
+            self._stopping = True
+            self._dirty_files.clear()
+            self._cond.notify_all()
+
+        if self._source is not None:
+            self._source.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self._source = None
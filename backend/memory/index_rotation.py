@@ -5,7 +5,9 @@
 搜索时同时使用所有索引文件
 """
 
+import json
 import os
+import re
 import sqlite3
 import time
 import logging
@@ -23,6 +25,112 @@ DEFAULT_INDEX_PREFIX = "memory"    # 索引文件前缀
 INDEX_DIR = Path("memory/.index")  # 索引目录
 
 
+# 记忆文件路径中的日期 (memory/YYYY-MM-DD.md)
+_PATH_DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+# meta 表中存储分片时间范围的键
+SHARD_TIME_RANGE_KEY = "time_range"
+
+
+def extract_path_date(path: str) -> Optional[str]:
+    """
+    从文件路径中提取日期
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        YYYY-MM-DD 格式日期，无日期时返回 None
+    """
+    match = _PATH_DATE_PATTERN.search(path)
+    return match.group(1) if match else None
+
+
+def _merge_time_range(time_range: Optional[Dict[str, Any]], path: str) -> Dict[str, Any]:
+    """将一个文件路径合并到时间范围"""
+    time_range = dict(time_range or {"min_date": None, "max_date": None, "undated": False})
+    path_date = extract_path_date(path)
+    if path_date is None:
+        time_range["undated"] = True
+    else:
+        if time_range["min_date"] is None or path_date < time_range["min_date"]:
+            time_range["min_date"] = path_date
+        if time_range["max_date"] is None or path_date > time_range["max_date"]:
+            time_range["max_date"] = path_date
+    return time_range
+
+
+def read_shard_time_range(db: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+    """
+    读取分片的时间范围
+
+    优先读取 meta 表中由 MemoryIndexer 维护的记录；旧索引没有记录时
+    从 files 表推算（只读，不回写）。
+
+    Args:
+        db: 索引数据库连接
+
+    Returns:
+        {"min_date", "max_date", "undated"}，无法确定时返回 None
+    """
+    try:
+        row = db.execute(
+            "SELECT value FROM meta WHERE key = ?", (SHARD_TIME_RANGE_KEY,)
+        ).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+    except (sqlite3.Error, ValueError):
+        pass
+
+    try:
+        time_range = None
+        for (path,) in db.execute("SELECT path FROM files"):
+            time_range = _merge_time_range(time_range, path)
+        return time_range
+    except sqlite3.Error:
+        return None
+
+
+def update_shard_time_range(db: sqlite3.Connection, path: str) -> None:
+    """
+    将新索引的文件合并到分片时间范围（范围只扩不缩，删除文件不影响正确性）
+
+    Args:
+        db: 索引数据库连接（可写）
+        path: 被索引的文件路径
+    """
+    stored = db.execute(
+        "SELECT 1 FROM meta WHERE key = ?", (SHARD_TIME_RANGE_KEY,)
+    ).fetchone() is not None
+    current = read_shard_time_range(db)
+    updated = _merge_time_range(current, path)
+    # 旧索引首次写入时即使范围未变也要落盘，避免每次都回退扫描 files 表
+    if updated != current or not stored:
+        db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (SHARD_TIME_RANGE_KEY, json.dumps(updated))
+        )
+
+
+def shard_may_contain_since(time_range: Optional[Dict[str, Any]], cutoff_date: str) -> bool:
+    """
+    分片是否可能包含截止日期之后的结果
+
+    与搜索结果的时间过滤一致：无日期的文件总是保留。
+
+    Args:
+        time_range: 分片时间范围（None 表示未知）
+        cutoff_date: 截止日期 (YYYY-MM-DD)
+
+    Returns:
+        False 表示可以跳过该分片
+    """
+    if time_range is None or time_range.get("undated"):
+        return True
+    max_date = time_range.get("max_date")
+    return max_date is None or max_date >= cutoff_date
+
+
 def _get_config():
     """获取索引轮换配置"""
     try:
@@ -0,0 +1,531 @@
+"""
+记忆文件行级倒排索引
+
+为 v1 memory_search 工具提供持久化的行级索引，避免每次查询都遍历目录、
+打开并逐行读取全部记忆文件：
+- line_files: 记忆文件（类型、日志日期、mtime/size 指纹）
+- lines: 文件的每一行（原样保存，用于正则校验和上下文）
+- lines_fts: lines 的 FTS5 trigram 外部内容索引
+
+查询时从正则中提取必须出现的字面片段：三个字符及以上的片段用 trigram
+MATCH 取候选行，更短的片段用 LIKE 过滤，最后用原正则逐行校验（没有
+必需片段的正则，如 a|b，直接校验候选文件在索引中的所有行）。
+since_days 直接按索引中记录的日期裁剪每日日志，不访问磁盘。
+
+索引通过 MemoryIndexer 的变更通知（由 MemoryWatcher 驱动）增量更新；
+未接入变更通知时，每次查询前按 (mtime, size) 对账一次（只 stat，
+不读取未变化的文件）。
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import re._parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+
+from .schema import configure_index_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+# 记忆文件分类（与 memory_search 的搜索范围一致）
+LONG_TERM_FILES = ["MEMORY.md", "AGENTS.md", "CLAUDE.md", "USER.md", "SOUL.md"]
+BANK_DIR = "bank"
+DAILY_LOG_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}\.md")
+MEMORY_KINDS = ("long_term", "bank", "daily")
+
+# 索引文件位置（相对记忆目录，隐藏目录不会触发 MemoryWatcher）
+LINE_INDEX_PATH = Path(".index") / "lines.db"
+
+# trigram MATCH 要求的最短片段
+MIN_TRIGRAM_LENGTH = 3
+
+# 候选文件的总行数不超过该值时（如 since_days 裁剪后）直接逐行过滤，
+# 不走 trigram：高频词的 MATCH 结果集很大，而小范围扫描可以提前结束
+DIRECT_SCAN_MAX_LINES = 20000
+
+_KIND_RANK = {kind: rank for rank, kind in enumerate(MEMORY_KINDS)}
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS line_files (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        kind TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        sort_key TEXT NOT NULL,
+        file_date TEXT,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        line_count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_line_files_kind ON line_files(kind, file_date);
+    CREATE INDEX IF NOT EXISTS idx_line_files_order ON line_files(rank, sort_key);
+    CREATE TABLE IF NOT EXISTS lines (
+        id INTEGER PRIMARY KEY,
+        file_id INTEGER NOT NULL,
+        line_no INTEGER NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_lines_file_line ON lines(file_id, line_no);
+"""
+
+_FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS lines_fts USING fts5(
+        text, content='lines', content_rowid='id', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS lines_ai AFTER INSERT ON lines BEGIN
+        INSERT INTO lines_fts(rowid, text) VALUES (new.id, new.text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS lines_ad AFTER DELETE ON lines BEGIN
+        INSERT INTO lines_fts(lines_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END;
+"""
+
+
+def classify_memory_file(rel_path: Path) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    判断文件属于哪类记忆
+
+    Args:
+        rel_path: 相对记忆目录的路径
+
+    Returns:
+        (类型, 排序键, 日志日期)；不在搜索范围内时返回 None
+    """
+    parts = rel_path.parts
+    if not parts or any(part.startswith('.') for part in parts):
+        return None
+
+    name = parts[-1]
+    if len(parts) == 1:
+        if name in LONG_TERM_FILES:
+            return "long_term", f"{LONG_TERM_FILES.index(name):02d}", None
+        if DAILY_LOG_PATTERN.match(name):
+            # 日志按日期倒序
+            inverted = 99999999 - int(name[:10].replace("-", ""))
+            try:
+                file_date = date.fromisoformat(name[:10]).isoformat()
+            except ValueError:
+                file_date = None
+            return "daily", f"{inverted:08d}", file_date
+        return None
+
+    if parts[0] == BANK_DIR and fnmatch(name, "*.md"):
+        return "bank", rel_path.as_posix(), None
+    return None
+
+
+def _is_foldable(char: str) -> bool:
+    """字符的大小写折叠在 re.IGNORECASE 与 SQLite 之间是否一致"""
+    return char.isascii() or char.lower() == char.upper()
+
+
+def extract_required_literals(pattern: str, flags: int = 0) -> Optional[List[str]]:
+    """
+    提取正则匹配时必须出现的字面片段
+
+    只分析顶层序列：连续的字面字符组成一个片段，遇到其他结构（分组、
+    重复、字符类、锚点等）即断开。顶层是分支（a|b）时没有必需片段。
+
+    Args:
+        pattern: 正则表达式
+        flags: 编译标志
+
+    Returns:
+        片段列表（可能为空）；无法解析时返回 None
+    """
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except Exception:
+        return None
+
+    fragments = []
+    current: List[str] = []
+
+    def flush():
+        if current:
+            fragments.append("".join(current))
+            current.clear()
+
+    for op, av in parsed:
+        char = chr(av) if op is _sre_parse.LITERAL else None
+        if char is not None and char != "\n" and _is_foldable(char):
+            current.append(char)
+        else:
+            flush()
+    flush()
+    return fragments
+
+
+def _quote_match(fragment: str) -> str:
+    return '"' + fragment.replace('"', '""') + '"'
+
+
+def _escape_like(fragment: str) -> str:
+    return fragment.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class LineIndex:
+    """
+    记忆目录的行级索引
+
+    线程安全；写入使用显式事务，读取与写入共享同一连接（由锁串行化）。
+    """
+
+    def __init__(self, memory_dir: Path, db_path: Optional[Path] = None):
+        """
+        初始化行级索引
+
+        Args:
+            memory_dir: 记忆目录
+            db_path: 索引文件路径（默认 memory_dir/.index/lines.db）
+        """
+        self.memory_dir = Path(memory_dir)
+        self.root = self.memory_dir.resolve()
+        self.db_path = Path(db_path) if db_path else self.memory_dir / LINE_INDEX_PATH
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._attached = False
+        self._synced = False
+
+        self.db = sqlite3.connect(
+            str(self.db_path), isolation_level=None, check_same_thread=False
+        )
+        configure_index_connection(self.db)
+        self.db.executescript(_SCHEMA)
+        try:
+            self.db.executescript(_FTS_SCHEMA)
+            self.trigram_available = True
+        except sqlite3.OperationalError as e:
+            # SQLite < 3.34 没有 trigram 分词器，只用 LIKE 过滤
+            logger.info(f"trigram 分词器不可用，行级索引只使用 LIKE: {e}")
+            self.trigram_available = False
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.db.rollback()
+                raise
+            else:
+                self.db.commit()
+
+    # ------------------------------------------------------------------
+    # 更新
+    # ------------------------------------------------------------------
+
+    def attach(self, indexer) -> None:
+        """
+        订阅 MemoryIndexer 的变更通知
+
+        接入后查询不再对账磁盘（首次查询前仍会对账一次）。
+
+        Args:
+            indexer: MemoryIndexer 实例
+        """
+        indexer.add_change_listener(self.update_path)
+        self._attached = True
+
+    def detach(self, indexer) -> None:
+        """
+        取消订阅变更通知
+
+        Args:
+            indexer: MemoryIndexer 实例
+        """
+        indexer.remove_change_listener(self.update_path)
+        self._attached = False
+
+    def _relative(self, path: Path) -> Optional[Path]:
+        try:
+            return Path(path).resolve().relative_to(self.root)
+        except ValueError:
+            return None
+
+    def update_path(self, path: Path) -> None:
+        """
+        按文件当前状态更新索引（文件已删除时移除）
+
+        Args:
+            path: 文件路径
+        """
+        rel_path = self._relative(path)
+        if rel_path is None or classify_memory_file(rel_path) is None:
+            return
+        full_path = self.root / rel_path
+        try:
+            with self._transaction():
+                if full_path.is_file():
+                    self._index_file(rel_path, full_path.stat())
+                else:
+                    self._remove_file(rel_path.as_posix())
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"更新行级索引失败 {path}: {e}")
+
+    def _scan(self) -> Dict[str, Tuple[Path, os.stat_result]]:
+        """列出记忆目录中属于搜索范围的文件（只 stat）"""
+        found = {}
+        if not self.root.is_dir():
+            return found
+
+        candidates = [Path(entry.name) for entry in os.scandir(self.root) if entry.is_file()]
+        bank_dir = self.root / BANK_DIR
+        if bank_dir.is_dir():
+            for dirpath, dirnames, filenames in os.walk(bank_dir):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                base = Path(dirpath).relative_to(self.root)
+                candidates.extend(base / name for name in filenames)
+
+        for rel_path in candidates:
+            if classify_memory_file(rel_path) is None:
+                continue
+            try:
+                found[rel_path.as_posix()] = (rel_path, (self.root / rel_path).stat())
+            except OSError:
+                continue
+        return found
+
+    def sync(self) -> Dict[str, int]:
+        """
+        与磁盘对账：重新索引 (mtime, size) 变化的文件，移除已删除的文件
+
+        Returns:
+            dict: indexed / removed / files
+        """
+        with self._lock:
+            on_disk = self._scan()
+            known = {
+                row[0]: (row[1], row[2])
+                for row in self.db.execute("SELECT path, mtime_ns, size FROM line_files")
+            }
+            stats = {"indexed": 0, "removed": 0, "files": len(on_disk)}
+
+            with self._transaction():
+                for key in known.keys() - on_disk.keys():
+                    self._remove_file(key)
+                    stats["removed"] += 1
+                for key, (rel_path, stat) in on_disk.items():
+                    if known.get(key) != (stat.st_mtime_ns, stat.st_size):
+                        self._index_file(rel_path, stat)
+                        stats["indexed"] += 1
+
+            self._synced = True
+            return stats
+
+    def _index_file(self, rel_path: Path, stat: os.stat_result) -> None:
+        """重新写入单个文件的所有行（调用方持有事务）"""
+        kind, sort_key, file_date = classify_memory_file(rel_path)
+        key = rel_path.as_posix()
+        try:
+            with open(self.root / rel_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except (OSError, UnicodeDecodeError) as e:
+            # 与正则扫描一致：无法读取的文件不产生结果
+            logger.debug(f"读取记忆文件失败 {key}: {e}")
+            lines = []
+
+        self._remove_file(key)
+        cursor = self.db.execute(
+            "INSERT INTO line_files "
+            "(path, kind, rank, sort_key, file_date, mtime_ns, size, line_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, kind, _KIND_RANK[kind], sort_key, file_date,
+             stat.st_mtime_ns, stat.st_size, len(lines))
+        )
+        file_id = cursor.lastrowid
+        self.db.executemany(
+            "INSERT INTO lines (file_id, line_no, text) VALUES (?, ?, ?)",
+            [(file_id, line_no, text) for line_no, text in enumerate(lines, start=1)]
+        )
+
+    def _remove_file(self, key: str) -> None:
+        """删除单个文件的记录和所有行（调用方持有事务）"""
+        row = self.db.execute("SELECT id FROM line_files WHERE path = ?", (key,)).fetchone()
+        if row is None:
+            return
+        self.db.execute("DELETE FROM lines WHERE file_id = ?", (row[0],))
+        self.db.execute("DELETE FROM line_files WHERE id = ?", (row[0],))
+
+    def ensure_fresh(self) -> None:
+        """查询前确保索引与磁盘一致（已接入变更通知时只对账一次）"""
+        if not (self._attached and self._synced):
+            self.sync()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def _file_filter(self, memory_type: str, since_days: Optional[int]) -> Tuple[str, list]:
+        """构造文件过滤条件（类型 + 日志日期）"""
+        kinds = list(MEMORY_KINDS) if memory_type == "all" else [memory_type]
+        clauses = [f"f.kind IN ({', '.join('?' * len(kinds))})"]
+        params: list = list(kinds)
+        if since_days is not None and "daily" in kinds:
+            cutoff = (date.today() - timedelta(days=since_days - 1)).isoformat()
+            clauses.append("(f.kind != 'daily' OR (f.file_date IS NOT NULL AND f.file_date >= ?))")
+            params.append(cutoff)
+        return " AND ".join(clauses), params
+
+    def list_files(self, memory_type: str = "all", since_days: Optional[int] = None) -> List[Path]:
+        """
+        按类型和时间范围列出文件（不访问磁盘）
+
+        Args:
+            memory_type: all / long_term / daily / bank
+            since_days: 最近 N 天的每日日志
+
+        Returns:
+            文件路径列表（按搜索顺序）
+        """
+        where, params = self._file_filter(memory_type, since_days)
+        with self._lock:
+            rows = self.db.execute(
+                f"SELECT f.path FROM line_files f WHERE {where} ORDER BY f.rank, f.sort_key",
+                params
+            ).fetchall()
+        return [self.memory_dir / row[0] for row in rows]
+
+    def search(
+        self,
+        query_pattern: re.Pattern,
+        entity_patterns: Optional[List[re.Pattern]] = None,
+        memory_type: str = "all",
+        since_days: Optional[int] = None,
+        max_results: int = 10,
+        context_lines: int = 2
+    ) -> List[Dict[str, Any]]:
+        """
+        搜索匹配行
+
+        结果与逐文件正则扫描一致：长期记忆、bank、每日日志（新到旧）的
+        顺序，同一文件内按行号。
+
+        Args:
+            query_pattern: 编译后的查询正则
+            entity_patterns: 实体过滤（任一命中即可）
+            memory_type: all / long_term / daily / bank
+            since_days: 最近 N 天的每日日志
+            max_results: 最大结果数
+            context_lines: 上下文行数
+
+        Returns:
+            结果列表（content, path, line_number, score）
+        """
+        self.ensure_fresh()
+
+        where, params = self._file_filter(memory_type, since_days)
+        literals = extract_required_literals(query_pattern.pattern, query_pattern.flags) or []
+        long_fragments = [f for f in literals if len(f) >= MIN_TRIGRAM_LENGTH]
+
+        with self._lock:
+            candidate_lines = self.db.execute(
+                f"SELECT COALESCE(SUM(f.line_count), 0) FROM line_files f WHERE {where}", params
+            ).fetchone()[0]
+
+        if long_fragments and self.trigram_available and candidate_lines > DIRECT_SCAN_MAX_LINES:
+            where += " AND l.id IN (SELECT rowid FROM lines_fts WHERE lines_fts MATCH ?)"
+            params.append(" AND ".join(_quote_match(f) for f in long_fragments))
+        else:
+            for fragment in literals:
+                where += " AND l.text LIKE ? ESCAPE '\\'"
+                params.append(f"%{_escape_like(fragment)}%")
+
+        sql = (
+            "SELECT l.file_id, f.path, l.line_no, l.text FROM lines l "
+            "JOIN line_files f ON f.id = l.file_id "
+            f"WHERE {where} ORDER BY f.rank, f.sort_key, l.line_no"
+        )
+
+        results = []
+        with self._lock:
+            for file_id, path, line_no, text in self.db.execute(sql, params):
+                if not query_pattern.search(text):
+                    continue
+                if entity_patterns and not any(p.search(text) for p in entity_patterns):
+                    continue
+                results.append({
+                    "content": self._context(file_id, line_no, context_lines),
+                    "path": str(Path(path)),
+                    "line_number": line_no,
+                    "score": 1.0
+                })
+                if len(results) >= max_results:
+                    break
+        return results
+
+    def _context(self, file_id: int, line_no: int, context_lines: int) -> str:
+        rows = self.db.execute(
+            "SELECT text FROM lines WHERE file_id = ? AND line_no BETWEEN ? AND ? "
+            "ORDER BY line_no",
+            (file_id, line_no - context_lines, line_no + context_lines)
+        ).fetchall()
+        return "".join(row[0] for row in rows).strip()
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取索引状态"""
+        with self._lock:
+            files = self.db.execute("SELECT COUNT(*) FROM line_files").fetchone()[0]
+            lines = self.db.execute("SELECT COUNT(*) FROM lines").fetchone()[0]
+        return {
+            "db_path": str(self.db_path),
+            "files": files,
+            "lines": lines,
+            "trigram_available": self.trigram_available,
+            "attached": self._attached,
+            "synced": self._synced
+        }
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self.db.close()
+
+
+# 进程级注册表（按记忆目录）
+_line_indexes: Dict[Path, LineIndex] = {}
+_line_indexes_lock = threading.Lock()
+
+
+def get_line_index(memory_dir: Path) -> LineIndex:
+    """
+    获取记忆目录对应的行级索引（进程内共享）
+
+    Args:
+        memory_dir: 记忆目录
+
+    Returns:
+        LineIndex 实例
+    """
+    key = Path(memory_dir).resolve()
+    with _line_indexes_lock:
+        index = _line_indexes.get(key)
+        if index is None:
+            index = LineIndex(memory_dir)
+            _line_indexes[key] = index
+        return index
+
+
+def reset_line_indexes() -> None:
+    """关闭并清空所有行级索引（用于测试）"""
+    with _line_indexes_lock:
+        for index in _line_indexes.values():
+            try:
+                index.close()
+            except sqlite3.Error:
+                pass
+        _line_indexes.clear()
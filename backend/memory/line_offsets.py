@@ -0,0 +1,266 @@
+"""
+记忆文件行偏移索引
+
+memory_get 按行号读取长日志或 MEMORY.md 时，原实现读入整个文件再在
+Python 中切片。这里为每个文件维护一个行首字节偏移表：
+- 首次按行号读取时扫描一次文件建立偏移表，写入 sidecar 文件
+  （记忆目录下 .index/offsets/，隐藏目录不会触发 MemoryWatcher）
+- sidecar 和进程内缓存都记录文件的 (mtime, size) 指纹，文件变化后重建
+- 读取时通过 mmap 定位到目标行的字节范围，只解码需要的部分；
+  有字符数上限时只解码上限对应的字节前缀
+
+行按 '\\n' 切分，返回文本中的 '\\r\\n' 和 '\\r' 统一转换为 '\\n'
+（与文本模式 open() 的结果一致）。
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# sidecar 目录（相对记忆目录）
+OFFSETS_DIR = Path(".index") / "offsets"
+
+# sidecar 文件头: 魔数, mtime_ns, size, 行数
+_HEADER = struct.Struct("<4sqqQ")
+_MAGIC = b"LOF1"
+
+# 进程内缓存的文件数
+DEFAULT_OFFSET_CACHE_FILES = 64
+
+# UTF-8 单个字符最多 4 字节
+_MAX_CHAR_BYTES = 4
+
+
+def _fingerprint(stat: os.stat_result) -> Tuple[int, int]:
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _scan_offsets(buf) -> array:
+    """扫描换行符，返回每行行首的字节偏移"""
+    offsets = array("Q", [0])
+    size = len(buf)
+    pos = buf.find(b"\n")
+    while pos != -1:
+        if pos + 1 < size:
+            offsets.append(pos + 1)
+        pos = buf.find(b"\n", pos + 1)
+    if size == 0:
+        return array("Q")
+    return offsets
+
+
+def _decode(buf, start: int, end: int, max_chars: Optional[int]) -> Tuple[str, bool]:
+    """
+    解码 buf[start:end]，最多 max_chars 个字符
+
+    Returns:
+        (文本, 是否还有未返回的内容)
+    """
+    cut = end
+    if max_chars is not None:
+        limit = start + (max_chars + 1) * _MAX_CHAR_BYTES
+        if limit < end:
+            cut = limit
+            # 退回到字符边界
+            while cut > start and (buf[cut] & 0xC0) == 0x80:
+                cut -= 1
+
+    text = bytes(buf[start:cut]).decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    if max_chars is not None and len(text) > max_chars:
+        return text[:max_chars], True
+    return text, cut < end
+
+
+class LineOffsetIndex:
+    """
+    记忆目录的行偏移索引
+
+    使用方式:
+        index = get_line_offset_index(Path("memory"))
+        text, truncated = index.read_text(path, line_start=100, line_end=150)
+    """
+
+    def __init__(
+        self,
+        memory_dir: Path,
+        cache_files: int = DEFAULT_OFFSET_CACHE_FILES
+    ):
+        """
+        初始化行偏移索引
+
+        Args:
+            memory_dir: 记忆目录
+            cache_files: 进程内缓存的偏移表个数
+        """
+        self.memory_dir = Path(memory_dir)
+        self.sidecar_dir = self.memory_dir / OFFSETS_DIR
+        self.cache_files = cache_files
+        self._cache: "OrderedDict[str, Tuple[Tuple[int, int], array]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _sidecar_path(self, path: Path) -> Path:
+        key = str(Path(path).resolve())
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return self.sidecar_dir / f"{digest}-{Path(path).name}.off"
+
+    def _load_sidecar(self, sidecar: Path, fingerprint: Tuple[int, int]) -> Optional[array]:
+        try:
+            data = sidecar.read_bytes()
+        except OSError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+
+        magic, mtime_ns, size, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC or (mtime_ns, size) != fingerprint:
+            return None
+
+        offsets = array("Q")
+        offsets.frombytes(data[_HEADER.size:])
+        if len(offsets) != count:
+            return None
+        return offsets
+
+    def _save_sidecar(self, sidecar: Path, fingerprint: Tuple[int, int], offsets: array) -> None:
+        try:
+            sidecar.parent.mkdir(parents=True, exist_ok=True)
+            tmp = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, fingerprint[0], fingerprint[1], len(offsets)))
+                f.write(offsets.tobytes())
+            os.replace(tmp, sidecar)
+        except OSError as e:
+            logger.debug(f"行偏移 sidecar 写入失败 {sidecar}: {e}")
+
+    def get_offsets(self, path: Path, buf=None) -> array:
+        """
+        获取文件的行首偏移表（按需构建）
+
+        Args:
+            path: 记忆文件路径
+            buf: 已映射的文件内容（可选，避免重复打开）
+
+        Returns:
+            每行行首的字节偏移（空文件为空表）
+        """
+        path = Path(path)
+        stat = path.stat()
+        fingerprint = _fingerprint(stat)
+        key = str(path.resolve())
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self._cache.move_to_end(key)
+                return entry[1]
+
+        sidecar = self._sidecar_path(path)
+        offsets = self._load_sidecar(sidecar, fingerprint)
+        if offsets is None:
+            if buf is not None:
+                offsets = _scan_offsets(buf)
+            else:
+                with open(path, "rb") as f:
+                    offsets = _scan_offsets(f.read())
+            self.builds += 1
+            self._save_sidecar(sidecar, fingerprint, offsets)
+
+        with self._lock:
+            self._cache[key] = (fingerprint, offsets)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_files:
+                self._cache.popitem(last=False)
+        return offsets
+
+    def read_text(
+        self,
+        path: Path,
+        line_start: Optional[int] = None,
+        line_end: Optional[int] = None,
+        max_chars: Optional[int] = None
+    ) -> Tuple[str, bool]:
+        """
+        读取文件的行范围
+
+        不指定行号时不构建偏移表，只读取 max_chars 对应的字节前缀。
+
+        Args:
+            path: 记忆文件路径
+            line_start: 起始行号（从1开始，包含），None 表示从头开始
+            line_end: 结束行号（包含），None 表示到文件末尾
+            max_chars: 最多返回的字符数，None 表示不限制
+
+        Returns:
+            (文本, 是否因 max_chars 截断)
+
+        Raises:
+            OSError: 文件读取失败
+            UnicodeDecodeError: 文件不是 UTF-8 编码
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return "", False
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                start, end = 0, len(buf)
+                if line_start is not None or line_end is not None:
+                    offsets = self.get_offsets(path, buf)
+                    first = (line_start or 1) - 1
+                    if first >= len(offsets):
+                        return "", False
+                    start = offsets[first]
+                    if line_end is not None and line_end < len(offsets):
+                        end = offsets[line_end]
+                return _decode(buf, start, end, max_chars)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存统计"""
+        with self._lock:
+            return {"cached_files": len(self._cache), "builds": self.builds}
+
+
+# 进程内共享实例（按记忆目录）
+_offset_indexes: Dict[Path, LineOffsetIndex] = {}
+_offset_indexes_lock = threading.Lock()
+
+
+def get_line_offset_index(memory_dir: Path) -> LineOffsetIndex:
+    """
+    获取记忆目录对应的行偏移索引（进程内共享）
+
+    Args:
+        memory_dir: 记忆目录
+
+    Returns:
+        LineOffsetIndex 实例
+    """
+    key = Path(memory_dir).resolve()
+    with _offset_indexes_lock:
+        index = _offset_indexes.get(key)
+        if index is None:
+            index = LineOffsetIndex(memory_dir)
+            _offset_indexes[key] = index
+        return index
+
+
+def reset_line_offset_indexes() -> None:
+    """清空所有行偏移索引（用于测试）"""
+    with _offset_indexes_lock:
+        _offset_indexes.clear()
@@ -0,0 +1,231 @@
+"""
+记忆搜索结果缓存
+
+同一会话内、以及同一用户的不同会话之间，Agent 经常重复几乎相同的
+记忆搜索。这里在 memory_search_v2 和 MemoryIndexer.search 之前加一层
+进程内 LRU 缓存：
+
+- 缓存键包含归一化后的查询、过滤条件、权重，以及每个分片的
+  (文件标识, 索引代数)
+- 索引代数由 MemoryIndexer 在每次写事务提交时递增（存于 meta 表，
+  其他进程的写入同样可见），任一分片变化后旧键自然不再命中，
+  无需按时间过期
+- 按条目数和估算字节数双重限制，超出时淘汰最久未使用的条目
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+# 默认上限
+DEFAULT_RESULT_CACHE_ENTRIES = 1024
+DEFAULT_RESULT_CACHE_BYTES = 16 * 1024 * 1024
+
+
+def normalize_query(query: str, casefold: bool = True) -> str:
+    """
+    归一化查询（合并空白，默认忽略大小写）
+
+    FTS5 unicode61/trigram 分词和 LIKE 都不区分大小写，
+    仅空白或大小写不同的查询视为同一查询。向量检索直接对原始
+    查询做 embedding，结果区分大小写，此时应传 casefold=False。
+
+    Args:
+        query: 原始查询
+        casefold: 是否忽略大小写
+
+    Returns:
+        归一化后的查询
+    """
+    query = " ".join((query or "").split())
+    return query.casefold() if casefold else query
+
+
+def _freeze(value: Any) -> Hashable:
+    """把列表、字典等参数转换为可哈希的值"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+def make_search_cache_key(
+    namespace: str,
+    query: str,
+    generations: Tuple,
+    case_sensitive: bool = False,
+    **params: Any
+) -> Tuple:
+    """
+    构造搜索结果缓存键
+
+    Args:
+        namespace: 调用方（区分不同的结果格式）
+        query: 查询文本
+        generations: 各分片的 (路径, 文件标识, 索引代数)
+        case_sensitive: 查询是否区分大小写（使用向量或混合检索时为 True）
+        **params: 过滤条件、权重等影响结果的参数
+
+    Returns:
+        可哈希的缓存键
+    """
+    return (
+        namespace,
+        normalize_query(query, casefold=not case_sensitive),
+        _freeze(params),
+        tuple(generations)
+    )
+
+
+def _estimate_size(value: Any) -> int:
+    """估算缓存值占用的字节数"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SearchResultCache:
+    """
+    进程内搜索结果 LRU 缓存
+
+    按条目数和估算字节数双重限制；缓存值由调用方保证不被修改
+    （字符串，或取出后复制的结果列表）。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_RESULT_CACHE_ENTRIES,
+        max_bytes: int = DEFAULT_RESULT_CACHE_BYTES
+    ):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数（0 表示禁用）
+            max_bytes: 最大字节数（0 表示禁用）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        查找结果（命中时移到最近使用端）
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的结果，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        写入结果，超出上限时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            value: 搜索结果（None 不缓存）
+        """
+        if not self.enabled or value is None:
+            return
+
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存（计数保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# 全局实例
+_result_cache: Optional[SearchResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_search_result_cache() -> SearchResultCache:
+    """
+    获取搜索结果缓存实例（首次调用时按配置创建）
+
+    Returns:
+        SearchResultCache: 搜索结果缓存
+    """
+    global _result_cache
+
+    with _result_cache_lock:
+        if _result_cache is None:
+            max_entries = DEFAULT_RESULT_CACHE_ENTRIES
+            max_bytes = DEFAULT_RESULT_CACHE_BYTES
+            try:
+                from config import get_config
+                cache_config = get_config().memory.search.result_cache
+                if cache_config.enabled:
+                    max_entries = cache_config.max_entries
+                    max_bytes = cache_config.max_mb * 1024 * 1024
+                else:
+                    max_entries = max_bytes = 0
+            except Exception:
+                pass
+            _result_cache = SearchResultCache(max_entries, int(max_bytes))
+        return _result_cache
+
+
+def reset_search_result_cache() -> None:
+    """重置全局缓存（测试用）"""
+    global _result_cache
+
+    with _result_cache_lock:
+        _result_cache = None
@@ -6,9 +6,13 @@
 支持索引轮换：当索引文件超过一定大小时，自动创建新的索引文件
 """
 
+import uuid
 from pathlib import Path
 from typing import Optional
 
+from .cjk import CJK_FTS_TABLE, CJK_SEGMENT_VERSION, segment_cjk
+from .vector_format import VECTOR_FORMAT_VERSION, encode_vector
+
 
 # 数据库文件路径
 DEFAULT_INDEX_PATH = "memory/.index/memory.db"
@@ -16,6 +20,33 @@ DEFAULT_INDEX_PATH = "memory/.index/memory.db"
 # 索引轮换相关
 DEFAULT_MAX_INDEX_SIZE_MB = 50.0  # 单个索引文件最大大小（MB）
 
+# 连接参数
+INDEX_CACHE_SIZE_KB = 16384              # 每个连接的页缓存（KB）
+INDEX_MMAP_SIZE = 256 * 1024 * 1024      # 内存映射读取上限（字节）
+INDEX_BUSY_TIMEOUT_MS = 5000             # 写锁等待时间（毫秒）
+
+# FTS5 默认 automerge 级别（批量导入时临时设为 0）
+FTS_DEFAULT_AUTOMERGE = 4
+
+# meta 表中的索引代数键（每次写入递增，用于搜索结果缓存失效）
+INDEX_GENERATION_KEY = "index_generation"
+
+# meta 表中的索引标识键（建库时生成的随机 ID，删除重建后会变化）
+INDEX_ID_KEY = "index_id"
+
+# 向量表（BLOB 存储）。rowid 由 AUTOINCREMENT 分配、永不复用，
+# 常驻向量矩阵据此按 rowid 增量刷新
+CHUNK_VECTORS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS chunk_vectors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chunk_id TEXT NOT NULL UNIQUE,
+        embedding BLOB NOT NULL,
+        dims INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE
+    );
+"""
+
 
 def get_default_index_path() -> Path:
     """
@@ -56,6 +87,10 @@ def ensure_memory_index_schema(
             value TEXT NOT NULL
         );
     """)
+    db.execute(
+        "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+        (INDEX_ID_KEY, uuid.uuid4().hex)
+    )
 
     # 创建 files 表（文件元数据）
     db.execute("""
@@ -64,7 +99,10 @@ def ensure_memory_index_schema(
             source TEXT NOT NULL DEFAULT 'memory',
             hash TEXT NOT NULL,
             mtime INTEGER NOT NULL,
-            size INTEGER NOT NULL
+            size INTEGER NOT NULL,
+            resume_offset INTEGER NOT NULL DEFAULT 0,
+            resume_line INTEGER NOT NULL DEFAULT 0,
+            tail_hash TEXT NOT NULL DEFAULT ''
         );
     """)
 
@@ -89,7 +127,7 @@ def ensure_memory_index_schema(
             provider TEXT NOT NULL,
             model TEXT NOT NULL,
             content_hash TEXT NOT NULL,
-            embedding TEXT NOT NULL,
+            embedding BLOB NOT NULL,
             dims INTEGER,
             updated_at INTEGER NOT NULL,
             PRIMARY KEY (provider, model, content_hash)
@@ -123,16 +161,185 @@ def ensure_memory_index_schema(
             fts_available = False
             fts_error = str(e)
 
+    # 创建 CJK 影子表（预分词文本，使中文查询也能走倒排索引）
+    cjk_available = False
+    if fts_available:
+        try:
+            db.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {CJK_FTS_TABLE} USING fts5(
+                    text,
+                    tokenize = 'unicode61'
+                );
+            """)
+            cjk_available = True
+        except Exception:
+            cjk_available = False
+
     # 确保必要的列存在（用于版本升级）
     _ensure_column(db, "files", "source", "TEXT NOT NULL DEFAULT 'memory'")
     _ensure_column(db, "chunks", "source", "TEXT NOT NULL DEFAULT 'memory'")
+    # 追加索引的续读位置：最后一个未定型分块的起始字节 / 行号及其后内容的 hash
+    _ensure_column(db, "files", "resume_offset", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(db, "files", "resume_line", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(db, "files", "tail_hash", "TEXT NOT NULL DEFAULT ''")
+
+    # 一次性迁移：文本向量 -> 二进制向量
+    migrate_vector_storage(db)
+
+    # 一次性迁移：向量表 rowid 改为 AUTOINCREMENT
+    migrate_vector_rowids(db)
+
+    # 为已有分块补建 CJK 影子文本
+    if cjk_available:
+        backfill_cjk_index(db)
 
     return {
         "fts_available": fts_available,
-        "fts_error": fts_error
+        "fts_error": fts_error,
+        "cjk_available": cjk_available
     }
 
 
+def backfill_cjk_index(db, force: bool = False) -> int:
+    """
+    按 chunks 表重建 CJK 影子表
+
+    只在分词方案版本变化（包括首次创建）时执行，完成后在 meta 表记录版本。
+
+    Args:
+        db: sqlite3 数据库连接
+        force: 忽略 meta 记录，强制重建
+
+    Returns:
+        写入的行数
+    """
+    row = db.execute("SELECT value FROM meta WHERE key = 'cjk_segment'").fetchone()
+    if row and row[0] == str(CJK_SEGMENT_VERSION) and not force:
+        return 0
+
+    db.execute(f"DELETE FROM {CJK_FTS_TABLE}")
+    rows = db.execute("SELECT rowid, text FROM chunks").fetchall()
+    db.executemany(
+        f"INSERT INTO {CJK_FTS_TABLE} (rowid, text) VALUES (?, ?)",
+        [(rowid, segment_cjk(text)) for rowid, text in rows]
+    )
+    db.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('cjk_segment', ?)",
+        (str(CJK_SEGMENT_VERSION),)
+    )
+    db.commit()
+    return len(rows)
+
+
+def migrate_vector_storage(db, dtype: str = "float32", force: bool = False) -> dict:
+    """
+    将旧版逗号分隔文本格式的向量迁移为二进制格式
+
+    迁移完成后在 meta 表记录 vector_format 版本，之后不再重复扫描。
+    迁移前后读取端都同时兼容两种格式。
+
+    Args:
+        db: sqlite3 数据库连接
+        dtype: 二进制存储精度 (float32, float16)
+        force: 忽略 meta 记录，强制重新检查
+
+    Returns:
+        dict: 每张表迁移的行数
+    """
+    migrated = {"chunk_vectors": 0, "embedding_cache": 0}
+
+    row = db.execute("SELECT value FROM meta WHERE key = 'vector_format'").fetchone()
+    if row and row[0] == str(VECTOR_FORMAT_VERSION) and not force:
+        return migrated
+
+    tables = {
+        name: sql or ""
+        for name, sql in db.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='table' "
+            "AND name IN ('chunk_vectors', 'embedding_cache')"
+        ).fetchall()
+    }
+
+    # sqlite-vec 虚拟表自行管理存储，无需迁移
+    if "chunk_vectors" in tables and "vec0" not in tables["chunk_vectors"]:
+        migrated["chunk_vectors"] = _migrate_text_vectors(db, "chunk_vectors", "chunk_id", dtype)
+    if "embedding_cache" in tables:
+        migrated["embedding_cache"] = _migrate_text_vectors(
+            db, "embedding_cache", "rowid", dtype
+        )
+
+    db.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('vector_format', ?)",
+        (str(VECTOR_FORMAT_VERSION),)
+    )
+    db.commit()
+
+    return migrated
+
+
+def migrate_vector_rowids(db) -> bool:
+    """
+    将旧版向量表（chunk_id 为主键，rowid 可复用）重建为 AUTOINCREMENT 表
+
+    旧表删除最大 rowid 的行后再插入会复用同一个 rowid，常驻向量矩阵
+    无法从 MAX(rowid) / COUNT(*) 发现这种变化。重建时保留原 rowid，
+    已加载的矩阵仍然有效。
+
+    Args:
+        db: sqlite3 数据库连接
+
+    Returns:
+        是否执行了重建
+    """
+    row = db.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name='chunk_vectors'"
+    ).fetchone()
+    sql = (row[0] or "") if row else ""
+    # 不存在、已是新表或 sqlite-vec 虚拟表时无需迁移
+    if not row or "AUTOINCREMENT" in sql.upper() or "vec0" in sql:
+        return False
+
+    db.execute("SAVEPOINT migrate_vector_rowids")
+    try:
+        db.execute("ALTER TABLE chunk_vectors RENAME TO chunk_vectors_legacy")
+        db.execute("DROP INDEX IF EXISTS idx_chunk_vectors_updated")
+        db.execute(CHUNK_VECTORS_TABLE_SQL)
+        db.execute("""
+            INSERT INTO chunk_vectors (id, chunk_id, embedding, dims, updated_at)
+            SELECT rowid, chunk_id, embedding, dims, updated_at
+            FROM chunk_vectors_legacy ORDER BY rowid
+        """)
+        db.execute("DROP TABLE chunk_vectors_legacy")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chunk_vectors_updated ON chunk_vectors(updated_at);"
+        )
+    except Exception:
+        db.execute("ROLLBACK TO migrate_vector_rowids")
+        db.execute("RELEASE migrate_vector_rowids")
+        raise
+    db.execute("RELEASE migrate_vector_rowids")
+    return True
+
+
+def _migrate_text_vectors(db, table: str, key_column: str, dtype: str) -> int:
+    """将表中 typeof(embedding) = 'text' 的行转换为二进制格式"""
+    rows = db.execute(
+        f"SELECT {key_column}, embedding FROM {table} WHERE typeof(embedding) = 'text'"
+    ).fetchall()
+
+    updates = []
+    for key, text in rows:
+        try:
+            values = [float(x) for x in text.split(',')] if text else []
+        except ValueError:
+            # 损坏的数据保持原样，读取端会忽略
+            continue
+        updates.append((encode_vector(values, dtype), key))
+
+    db.executemany(f"UPDATE {table} SET embedding = ? WHERE {key_column} = ?", updates)
+    return len(updates)
+
+
 def _ensure_column(db, table: str, column: str, definition: str) -> None:
     """确保表中存在指定的列"""
     try:
@@ -173,12 +380,17 @@ def get_index_db_path(agent_id: Optional[str] = None, base_path: Optional[str] =
     return path
 
 
-def open_index_db(path: Optional[Path] = None, **kwargs) -> 'sqlite3.Connection':
+def open_index_db(
+    path: Optional[Path] = None,
+    read_only: bool = False,
+    **kwargs
+) -> 'sqlite3.Connection':
     """
     打开索引数据库连接
 
     Args:
         path: 数据库文件路径，为 None 时使用默认路径
+        read_only: 以只读模式打开（不获取写锁，文件不存在时报错）
         **kwargs: 传递给 sqlite3.connect 的参数
 
     Returns:
@@ -189,4 +401,114 @@ def open_index_db(path: Optional[Path] = None, **kwargs) -> 'sqlite3.Connection'
     if path is None:
         path = get_index_db_path()
 
-    return sqlite3.connect(path, **kwargs)
+    if read_only:
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        db = sqlite3.connect(uri, uri=True, **kwargs)
+    else:
+        db = sqlite3.connect(path, **kwargs)
+
+    configure_index_connection(db, read_only=read_only)
+    return db
+
+
+def configure_index_connection(db, read_only: bool = False) -> None:
+    """
+    设置索引连接的 PRAGMA
+
+    可写连接启用 WAL 日志（读写互不阻塞，提交只需顺序写 WAL）并使用
+    synchronous=NORMAL；所有连接设置页缓存和 mmap 读取。
+
+    Args:
+        db: 数据库连接
+        read_only: 是否为只读连接（只读连接不能修改日志模式）
+    """
+    import sqlite3
+
+    try:
+        if not read_only:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(f"PRAGMA cache_size=-{INDEX_CACHE_SIZE_KB}")
+        db.execute(f"PRAGMA mmap_size={INDEX_MMAP_SIZE}")
+        db.execute(f"PRAGMA busy_timeout={INDEX_BUSY_TIMEOUT_MS}")
+    except sqlite3.Error:
+        # 例如内存数据库或文件系统不支持 WAL，保持默认设置
+        pass
+
+
+def bump_index_generation(db, key: str = INDEX_GENERATION_KEY) -> None:
+    """
+    递增索引代数
+
+    应在写事务内调用，与数据变更一起提交；读取端看到新代数时
+    一定也能看到对应的数据。
+
+    Args:
+        db: 数据库连接
+        key: meta 表中的代数键
+    """
+    db.execute(
+        "INSERT INTO meta (key, value) VALUES (?, '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+        (key,)
+    )
+
+
+def read_index_generation(db, key: str = INDEX_GENERATION_KEY) -> int:
+    """
+    读取索引代数
+
+    Args:
+        db: 数据库连接
+        key: meta 表中的代数键
+
+    Returns:
+        索引代数，从未写入过（或旧版索引没有 meta 表）时返回 0
+    """
+    import sqlite3
+
+    try:
+        row = db.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def read_index_id(db) -> Optional[str]:
+    """
+    读取索引标识
+
+    持久化的派生数据（如 ANN 索引文件）记录该标识，数据库被删除重建后
+    标识不同，据此判断派生数据是否属于当前数据库。
+
+    Args:
+        db: 数据库连接
+
+    Returns:
+        索引标识，没有 meta 表或尚未生成时返回 None
+    """
+    import sqlite3
+
+    try:
+        row = db.execute(
+            "SELECT value FROM meta WHERE key = ?", (INDEX_ID_KEY,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def set_fts_automerge(db, fts_table: str = "chunks_fts", level: int = FTS_DEFAULT_AUTOMERGE) -> None:
+    """
+    设置 FTS5 automerge 级别
+
+    批量导入时设为 0 可避免每次提交都合并 b-tree 段，导入完成后恢复并 optimize。
+
+    Args:
+        db: 数据库连接
+        fts_table: FTS 表名
+        level: automerge 级别（0 表示禁用）
+    """
+    db.execute(f"INSERT INTO {fts_table}({fts_table}, rank) VALUES('automerge', ?)", (level,))
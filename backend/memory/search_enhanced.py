@@ -6,61 +6,157 @@ Memory Search 文件引用增强
 
 import sqlite3
 import json
-from typing import List, Dict, Any, Optional
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from pathlib import Path
 import logging
 
 from backend.models.filestore import FileRef, FileCategory
-from backend.memory.schema import open_index_db, get_index_db_path
+from backend.memory.schema import (
+    bump_index_generation,
+    get_index_db_path,
+    open_index_db,
+    read_index_generation,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# 每条 IN (...) 查询的 chunk ID 数（低于 SQLite 绑定参数上限）
+LOOKUP_BATCH_SIZE = 500
+
+# 每个索引按 chunk 缓存的引用列表数上限
+DEFAULT_REF_CACHE_ENTRIES = 10000
+
+# meta 表中文件引用的写入代数键
+FILE_REFS_GENERATION_KEY = "file_refs_generation"
+
+
 class FileRefIndex:
     """
     文件引用索引管理器
 
-    管理记忆块与文件引用的关联关系
+    管理记忆块与文件引用的关联关系。
+
+    查询路径针对一整页搜索结果优化：
+    - 批量查询：一次 IN (...) 查询取回整页结果的引用
+    - 覆盖索引：(chunk_id, created_at DESC, id, ...) 和 (file_id, category, chunk_id)，
+      查询只读索引不回表，也不需要额外排序
+    - 按 chunk 缓存：chunk ID 包含内容 hash（path:start:end:hash），
+      同一 chunk 的引用解析一次后缓存在进程内 LRU 中；
+      引用写入时递增 meta 表中的代数，其他连接的写入也会使缓存失效
     """
 
-    def __init__(self, db_path: Optional[Path] = None):
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        cache_entries: int = DEFAULT_REF_CACHE_ENTRIES
+    ):
         """
         初始化文件引用索引
 
         Args:
             db_path: 数据库路径，默认使用记忆索引数据库
+            cache_entries: 按 chunk 缓存的引用列表数上限（0 表示禁用缓存）
         """
         if db_path is None:
             db_path = get_index_db_path()
 
         self.db_path = db_path
+        self.cache_entries = cache_entries
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._identity: Optional[Tuple[int, int]] = None
+        self._cache: "OrderedDict[str, Tuple[FileRef, ...]]" = OrderedDict()
+        self._cache_generation: Optional[int] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
         self._ensure_schema()
 
     def _ensure_schema(self):
         """确保数据库 schema 已创建"""
-        db = open_index_db(self.db_path)
-        try:
-            # 创建文件引用表
-            db.execute("""
-                CREATE TABLE IF NOT EXISTS chunk_file_refs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chunk_id TEXT NOT NULL,
-                    file_id TEXT NOT NULL,
-                    category TEXT NOT NULL,
-                    metadata TEXT,
-                    created_at INTEGER NOT NULL,
-                    FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE,
-                    UNIQUE(chunk_id, file_id, category)
-                );
-            """)
-
-            # 创建索引
-            db.execute("CREATE INDEX IF NOT EXISTS idx_chunk_file_refs_chunk_id ON chunk_file_refs(chunk_id);")
-            db.execute("CREATE INDEX IF NOT EXISTS idx_chunk_file_refs_file_id ON chunk_file_refs(file_id);")
+        with self._connection():
+            pass
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> None:
+        """创建文件引用表和覆盖索引（删除被覆盖索引取代的旧单列索引）"""
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+        # 创建文件引用表
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_file_refs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chunk_id TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                metadata TEXT,
+                created_at INTEGER NOT NULL,
+                FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE,
+                UNIQUE(chunk_id, file_id, category)
+            );
+        """)
+
+        # 创建索引
+        db.execute("DROP INDEX IF EXISTS idx_chunk_file_refs_chunk_id;")
+        db.execute("DROP INDEX IF EXISTS idx_chunk_file_refs_file_id;")
+        db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chunk_file_refs_chunk_cover
+            ON chunk_file_refs(chunk_id, created_at DESC, id, file_id, category, metadata);
+        """)
+        db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chunk_file_refs_file_category
+            ON chunk_file_refs(file_id, category, chunk_id);
+        """)
+
+        db.commit()
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        借用长连接（串行使用）
 
-            db.commit()
-        finally:
-            db.close()
+        数据库文件被替换（inode 变化）后重新打开并清空缓存。
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.db_path)
+                identity = (stat.st_dev, stat.st_ino)
+            except OSError:
+                identity = None
+
+            if self._db is None or identity is None or identity != self._identity:
+                self.close()
+                self._db = open_index_db(self.db_path, check_same_thread=False)
+                self._create_schema(self._db)
+                stat = os.stat(self.db_path)
+                self._identity = (stat.st_dev, stat.st_ino)
+
+            yield self._db
+
+    def _sync_cache(self, db: sqlite3.Connection) -> None:
+        """引用代数变化（本连接或其他连接写入）时清空缓存"""
+        generation = read_index_generation(db, FILE_REFS_GENERATION_KEY)
+        if generation != self._cache_generation:
+            self._cache.clear()
+            self._cache_generation = generation
+
+    def _cache_put(self, chunk_id: str, refs: Tuple[FileRef, ...]) -> None:
+        if self.cache_entries <= 0:
+            return
+        self._cache[chunk_id] = refs
+        self._cache.move_to_end(chunk_id)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
 
     def add_file_refs_to_chunk(
         self,
@@ -80,9 +176,7 @@ class FileRefIndex:
         if not file_refs:
             return 0
 
-        db = open_index_db(self.db_path)
-        try:
-            import time
+        with self._connection() as db:
             now = int(time.time())
 
             count = 0
@@ -103,10 +197,10 @@ class FileRefIndex:
                 except Exception as e:
                     logger.warning(f"添加文件引用失败: {e}")
 
+            if count:
+                bump_index_generation(db, FILE_REFS_GENERATION_KEY)
             db.commit()
             return count
-        finally:
-            db.close()
 
     def get_file_refs_for_chunk(self, chunk_id: str) -> List[FileRef]:
         """
@@ -116,38 +210,17 @@ class FileRefIndex:
             chunk_id: 记忆块 ID
 
         Returns:
-            FileRef 列表
+            FileRef 列表（按添加时间倒序）
         """
-        db = open_index_db(self.db_path)
-        try:
-            cursor = db.execute("""
-                SELECT file_id, category, metadata
-                FROM chunk_file_refs
-                WHERE chunk_id = ?
-                ORDER BY created_at DESC
-            """, (chunk_id,))
-
-            refs = []
-            for row in cursor.fetchall():
-                file_id, category, metadata_json = row
-                try:
-                    metadata = json.loads(metadata_json) if metadata_json else {}
-                    refs.append(FileRef(
-                        file_id=file_id,
-                        category=FileCategory(category),
-                        metadata=metadata
-                    ))
-                except Exception as e:
-                    logger.warning(f"解析文件引用失败: {e}")
-
-            return refs
-        finally:
-            db.close()
+        return self.get_file_refs_for_chunks([chunk_id])[chunk_id]
 
     def get_file_refs_for_chunks(self, chunk_ids: List[str]) -> Dict[str, List[FileRef]]:
         """
         批量获取记忆块的文件引用
 
+        已缓存的 chunk 直接返回，其余的每 LOOKUP_BATCH_SIZE 个用一次
+        IN (...) 查询取回。返回的 FileRef 对象在调用之间共享，不应修改。
+
         Args:
             chunk_ids: 记忆块 ID 列表
 
@@ -157,20 +230,48 @@ class FileRefIndex:
         if not chunk_ids:
             return {}
 
-        db = open_index_db(self.db_path)
-        try:
-            placeholders = ','.join(['?' for _ in chunk_ids])
+        result: Dict[str, List[FileRef]] = {}
+        with self._connection() as db:
+            self._sync_cache(db)
+
+            missing = []
+            for chunk_id in dict.fromkeys(chunk_ids):
+                cached = self._cache.get(chunk_id)
+                if cached is None:
+                    missing.append(chunk_id)
+                    continue
+                self._cache.move_to_end(chunk_id)
+                result[chunk_id] = list(cached)
+            self.cache_hits += len(result)
+            self.cache_misses += len(missing)
+
+            if missing:
+                fetched = self._fetch_file_refs(db, missing)
+                for chunk_id in missing:
+                    refs = tuple(fetched.get(chunk_id, ()))
+                    self._cache_put(chunk_id, refs)
+                    result[chunk_id] = list(refs)
+
+        return result
+
+    def _fetch_file_refs(
+        self,
+        db: sqlite3.Connection,
+        chunk_ids: List[str]
+    ) -> Dict[str, List[FileRef]]:
+        """从数据库批量读取并解析文件引用（只读覆盖索引）"""
+        fetched: Dict[str, List[FileRef]] = {}
+        for start in range(0, len(chunk_ids), LOOKUP_BATCH_SIZE):
+            batch = chunk_ids[start:start + LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
             cursor = db.execute(f"""
                 SELECT chunk_id, file_id, category, metadata
                 FROM chunk_file_refs
                 WHERE chunk_id IN ({placeholders})
-                ORDER BY chunk_id, created_at DESC
-            """, chunk_ids)
+                ORDER BY chunk_id, created_at DESC, id
+            """, batch)
 
-            result = {chunk_id: [] for chunk_id in chunk_ids}
-
-            for row in cursor.fetchall():
-                chunk_id, file_id, category, metadata_json = row
+            for chunk_id, file_id, category, metadata_json in cursor:
                 try:
                     metadata = json.loads(metadata_json) if metadata_json else {}
                     ref = FileRef(
@@ -178,14 +279,12 @@ class FileRefIndex:
                         category=FileCategory(category),
                         metadata=metadata
                     )
-                    if chunk_id in result:
-                        result[chunk_id].append(ref)
                 except Exception as e:
                     logger.warning(f"解析文件引用失败: {e}")
+                    continue
+                fetched.setdefault(chunk_id, []).append(ref)
 
-            return result
-        finally:
-            db.close()
+        return fetched
 
     def search_chunks_by_file_ref(
         self,
@@ -202,8 +301,7 @@ class FileRefIndex:
         Returns:
             记忆块 ID 列表
         """
-        db = open_index_db(self.db_path)
-        try:
+        with self._connection() as db:
             if category:
                 cursor = db.execute("""
                     SELECT DISTINCT chunk_id
@@ -218,8 +316,6 @@ class FileRefIndex:
                 """, (file_id,))
 
             return [row[0] for row in cursor.fetchall()]
-        finally:
-            db.close()
 
     def remove_file_refs_for_chunk(self, chunk_id: str) -> int:
         """
@@ -231,16 +327,40 @@ class FileRefIndex:
         Returns:
             删除的引用数量
         """
-        db = open_index_db(self.db_path)
-        try:
+        with self._connection() as db:
             cursor = db.execute("""
                 DELETE FROM chunk_file_refs
                 WHERE chunk_id = ?
             """, (chunk_id,))
+            if cursor.rowcount:
+                bump_index_generation(db, FILE_REFS_GENERATION_KEY)
             db.commit()
             return cursor.rowcount
-        finally:
-            db.close()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取按 chunk 缓存的统计"""
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.cache_entries,
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        """关闭连接并清空缓存"""
+        with self._lock:
+            if self._db is not None:
+                try:
+                    self._db.close()
+                except sqlite3.Error:
+                    pass
+            self._db = None
+            self._identity = None
+            self._cache.clear()
+            self._cache_generation = None
 
 
 class FileRefSearchResult:
@@ -365,8 +485,8 @@ def enhance_search_results_with_file_refs(
             for r in results
         ]
 
-    # 批量获取文件引用
-    index = FileRefIndex(db_path)
+    # 批量获取文件引用（共享索引实例：长连接 + 按 chunk 缓存）
+    index = get_file_ref_index(db_path)
     file_refs_map = index.get_file_refs_for_chunks(chunk_ids)
 
     # 构建增强结果
@@ -473,7 +593,7 @@ class FileRefMemorySearcher:
             index: 文件引用索引实例
         """
         self.db_path = db_path or get_index_db_path()
-        self.file_ref_index = index or FileRefIndex(self.db_path)
+        self.file_ref_index = index or get_file_ref_index(self.db_path)
 
     def search_with_file_refs(
         self,
@@ -500,7 +620,7 @@ class FileRefMemorySearcher:
         from backend.memory.tools.memory_search_v2 import (
             _search_hybrid, _search_fts
         )
-        from backend.memory import create_embedding_provider
+        from backend.memory import get_embedding_provider
 
         # 打开数据库
         db = open_index_db(self.db_path)
@@ -508,7 +628,7 @@ class FileRefMemorySearcher:
         try:
             # 尝试使用混合搜索
             try:
-                provider = create_embedding_provider(provider="auto")
+                provider = get_embedding_provider(provider="auto")
                 embedding = provider.encode_batch([query])[0]
                 embedding_dims = len(embedding)
 
@@ -576,10 +696,43 @@ class FileRefMemorySearcher:
         )
 
 
+# 全局实例（按数据库文件共享）
+_file_ref_indexes: Dict[str, FileRefIndex] = {}
+_file_ref_indexes_lock = threading.Lock()
+
+
 # 便捷函数
 def get_file_ref_index(db_path: Optional[Path] = None) -> FileRefIndex:
-    """获取文件引用索引实例"""
-    return FileRefIndex(db_path)
+    """
+    获取文件引用索引实例
+
+    同一数据库文件共享一个实例（长连接和按 chunk 的引用缓存）。
+
+    Args:
+        db_path: 数据库路径，默认使用记忆索引数据库
+
+    Returns:
+        FileRefIndex: 文件引用索引
+    """
+    if db_path is None:
+        db_path = get_index_db_path()
+    key = str(Path(db_path).resolve())
+
+    with _file_ref_indexes_lock:
+        index = _file_ref_indexes.get(key)
+        if index is None:
+            index = FileRefIndex(db_path)
+            _file_ref_indexes[key] = index
+        return index
+
+
+def reset_file_ref_indexes() -> None:
+    """关闭并清空所有共享的文件引用索引（测试用）"""
+    with _file_ref_indexes_lock:
+        indexes = list(_file_ref_indexes.values())
+        _file_ref_indexes.clear()
+    for index in indexes:
+        index.close()
 
 
 def create_file_ref_searcher(db_path: Optional[Path] = None) -> FileRefMemorySearcher:
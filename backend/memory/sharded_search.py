@@ -0,0 +1,459 @@
+"""
+分片并行搜索
+
+索引轮换后会产生多个分片文件 (memory.db, memory-1.db, ...)。
+ShardedSearchExecutor 为每个分片维护有界的只读连接池，在线程池中并发
+查询各分片，用堆合并各分片的 top-k，并在给定 since_days 时利用分片时间
+范围元数据跳过不可能命中的旧分片。
+"""
+
+import heapq
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .index_rotation import read_shard_time_range, shard_may_contain_since
+from .schema import open_index_db, read_index_generation
+from .vector_search import (
+    DEFAULT_ANN_MIN_VECTORS,
+    DEFAULT_ANN_NPROBE,
+    HybridSearchEngine,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 默认配置
+DEFAULT_MAX_WORKERS = 8            # 并发查询的分片数
+DEFAULT_CONNECTIONS_PER_SHARD = 2  # 每个分片的只读连接上限
+
+
+def _file_identity(path: Path) -> Tuple[int, int]:
+    """文件标识 (st_dev, st_ino)，文件被替换时变化"""
+    stat = path.stat()
+    return stat.st_dev, stat.st_ino
+
+
+def _file_signature(path: Path) -> Tuple:
+    """文件内容签名（含 WAL 文件），用于缓存失效"""
+    signature = []
+    for candidate in (path, path.with_name(path.name + "-wal")):
+        try:
+            stat = candidate.stat()
+            signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class ShardConnection:
+    """
+    分片只读连接
+
+    同一时刻只被一个线程持有，附带按维度缓存的混合搜索引擎，
+    常驻向量矩阵通过 vector_search 的进程级注册表在连接间共享。
+    """
+
+    def __init__(self, path: Path, identity: Tuple[int, int]):
+        """
+        打开分片连接
+
+        Args:
+            path: 分片文件路径
+            identity: 打开时的文件标识
+        """
+        self.path = path
+        self.identity = identity
+        self.db = open_index_db(path, read_only=True, check_same_thread=False)
+        self._engines: Dict[Tuple, HybridSearchEngine] = {}
+        self._tables: Optional[Tuple[int, frozenset]] = None
+
+    def tables(self) -> frozenset:
+        """
+        分片中已创建的表名
+
+        按 schema_version 缓存：写入方建表或删表时版本号递增，
+        未变化时只需一次 PRAGMA 读取，不再扫描 sqlite_master。
+        """
+        version = self.db.execute("PRAGMA schema_version").fetchone()[0]
+        cached = self._tables
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        tables = frozenset(
+            row[0] for row in self.db.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')"
+            )
+        )
+        self._tables = (version, tables)
+        return tables
+
+    def get_hybrid_engine(
+        self,
+        dims: int,
+        ann_min_vectors: Optional[int] = DEFAULT_ANN_MIN_VECTORS,
+        ann_nprobe: int = DEFAULT_ANN_NPROBE
+    ) -> HybridSearchEngine:
+        """
+        获取绑定到本连接的混合搜索引擎
+
+        Args:
+            dims: 向量维度
+            ann_min_vectors: 向量数达到该值后使用 IVF 近似搜索（None 表示禁用）
+            ann_nprobe: IVF 查询时探测的列表数
+
+        Returns:
+            混合搜索引擎
+        """
+        key = (dims, ann_min_vectors, ann_nprobe)
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = HybridSearchEngine(
+                self.db,
+                dims=dims,
+                use_sqlite_vec=False,
+                ann_min_vectors=ann_min_vectors,
+                ann_nprobe=ann_nprobe
+            )
+            self._engines[key] = engine
+        return engine
+
+    def close(self) -> None:
+        """关闭连接"""
+        try:
+            self.db.close()
+        except sqlite3.Error:
+            pass
+
+
+class ShardPool:
+    """单个分片的有界只读连接池"""
+
+    def __init__(self, path: Path, max_connections: int = DEFAULT_CONNECTIONS_PER_SHARD):
+        """
+        初始化连接池
+
+        Args:
+            path: 分片文件路径
+            max_connections: 最大连接数
+        """
+        self.path = path
+        self.max_connections = max(1, max_connections)
+        self._idle: List[ShardConnection] = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._time_range_cache: Optional[Tuple[Tuple, Optional[Dict[str, Any]]]] = None
+
+    @contextmanager
+    def connection(self) -> Iterator[ShardConnection]:
+        """
+        借出一个连接（池满时等待归还）
+
+        文件被替换（inode 变化）后，旧连接在借出时丢弃并重新打开。
+        """
+        identity = _file_identity(self.path)
+        conn = None
+
+        with self._cond:
+            while True:
+                stale = [c for c in self._idle if c.identity != identity]
+                for c in stale:
+                    self._idle.remove(c)
+                    self._created -= 1
+                    c.close()
+
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.max_connections:
+                    self._created += 1
+                    break
+                self._cond.wait()
+
+        if conn is None:
+            try:
+                conn = ShardConnection(self.path, identity)
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        try:
+            yield conn
+        finally:
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def time_range(self) -> Optional[Dict[str, Any]]:
+        """分片时间范围（按文件签名缓存）"""
+        signature = _file_signature(self.path)
+        cached = self._time_range_cache
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with self.connection() as conn:
+            time_range = read_shard_time_range(conn.db)
+        self._time_range_cache = (signature, time_range)
+        return time_range
+
+    def generation(self) -> Tuple[Tuple[int, int], int]:
+        """
+        分片当前的文件标识和索引代数
+
+        Returns:
+            ((st_dev, st_ino), 索引代数)
+        """
+        with self.connection() as conn:
+            return conn.identity, read_index_generation(conn.db)
+
+    def close(self) -> None:
+        """关闭所有空闲连接"""
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._created -= len(self._idle)
+            self._idle.clear()
+
+
+class ShardedSearchExecutor:
+    """
+    分片并行搜索执行器
+
+    使用方式:
+        executor = get_sharded_search_executor()
+        results = executor.search(index_paths, search_shard, limit=10, since_days=7)
+
+    search_shard(conn) 接收 ShardConnection，返回带 score 和 id 的结果列表。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        connections_per_shard: int = DEFAULT_CONNECTIONS_PER_SHARD
+    ):
+        """
+        初始化执行器
+
+        Args:
+            max_workers: 线程池大小
+            connections_per_shard: 每个分片的只读连接上限
+        """
+        self.max_workers = max(1, max_workers)
+        self.connections_per_shard = connections_per_shard
+        self._pools: Dict[str, ShardPool] = {}
+        # 调用方传入的绝对路径 -> 连接池（避免每次查询都 resolve 路径）
+        self._pool_aliases: Dict[str, ShardPool] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def get_pool(self, path: Path) -> ShardPool:
+        """获取分片的连接池"""
+        alias = str(path)
+        pool = self._pool_aliases.get(alias)
+        if pool is not None:
+            return pool
+
+        key = str(Path(path).resolve())
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ShardPool(Path(key), self.connections_per_shard)
+                self._pools[key] = pool
+            if Path(path).is_absolute():
+                self._pool_aliases[alias] = pool
+            return pool
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="memory-shard"
+                )
+            return self._executor
+
+    def select_shards(
+        self,
+        index_paths: List[Path],
+        since_days: Optional[int] = None
+    ) -> List[ShardPool]:
+        """
+        选出需要查询的分片
+
+        Args:
+            index_paths: 所有分片路径
+            since_days: 时间范围（最近 N 天），None 表示不过滤
+
+        Returns:
+            分片连接池列表
+        """
+        cutoff_date = None
+        if since_days:
+            cutoff_date = (datetime.now() - timedelta(days=since_days)).strftime("%Y-%m-%d")
+
+        pools = []
+        for path in index_paths:
+            if not Path(path).exists():
+                continue
+            pool = self.get_pool(path)
+            if cutoff_date is not None:
+                try:
+                    time_range = pool.time_range()
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"读取分片时间范围失败 {Path(path).name}: {e}")
+                    time_range = None
+                if not shard_may_contain_since(time_range, cutoff_date):
+                    continue
+            pools.append(pool)
+        return pools
+
+    def index_generations(self, index_paths: List[Path]) -> Tuple:
+        """
+        读取各分片的索引代数（用于搜索结果缓存键）
+
+        文件被替换（inode 变化）时标识随之变化，即使代数碰巧相同也不会误命中。
+
+        Args:
+            index_paths: 所有分片路径
+
+        Returns:
+            存在的分片的 (路径, 文件标识, 索引代数) 元组
+        """
+        generations = []
+        for path in index_paths:
+            if not Path(path).exists():
+                continue
+            identity, generation = self.get_pool(path).generation()
+            generations.append((str(path), identity, generation))
+        return tuple(generations)
+
+    def _search_shard(
+        self,
+        pool: ShardPool,
+        search_fn: Callable[[ShardConnection], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """在单个分片上执行搜索，失败时返回空列表"""
+        try:
+            with pool.connection() as conn:
+                results = search_fn(conn)
+        except Exception as e:
+            logger.warning(f"搜索索引 {pool.path.name} 失败: {e}")
+            return []
+
+        for result in results:
+            result["_index_file"] = pool.path.name
+        results.sort(key=lambda r: r.get("score", 0), reverse=True)
+        return results
+
+    def search(
+        self,
+        index_paths: List[Path],
+        search_fn: Callable[[ShardConnection], List[Dict[str, Any]]],
+        limit: int,
+        since_days: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        并发搜索所有分片并合并结果
+
+        Args:
+            index_paths: 所有分片路径
+            search_fn: 单分片搜索函数
+            limit: 合并后的最大结果数
+            since_days: 时间范围（最近 N 天），用于跳过旧分片
+
+        Returns:
+            按 score 降序、按 id 去重的结果列表
+        """
+        pools = self.select_shards(index_paths, since_days)
+        if not pools:
+            return []
+
+        if len(pools) == 1:
+            shard_results = [self._search_shard(pools[0], search_fn)]
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(self._search_shard, pool, search_fn) for pool in pools]
+            shard_results = [future.result() for future in futures]
+
+        return merge_top_k(shard_results, limit)
+
+    def close(self) -> None:
+        """关闭线程池和所有连接"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            pools, self._pools = list(self._pools.values()), {}
+            self._pool_aliases = {}
+        if executor is not None:
+            executor.shutdown(wait=True)
+        for pool in pools:
+            pool.close()
+
+
+def merge_top_k(shard_results: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+    """
+    堆合并各分片已按 score 降序排列的结果
+
+    Args:
+        shard_results: 各分片的结果列表
+        limit: 最大结果数
+
+    Returns:
+        合并后的结果（按 id 去重，保留分数最高者）
+    """
+    merged = []
+    seen_ids = set()
+    for result in heapq.merge(*shard_results, key=lambda r: r.get("score", 0), reverse=True):
+        chunk_id = result.get("id")
+        if not chunk_id or chunk_id in seen_ids:
+            continue
+        seen_ids.add(chunk_id)
+        merged.append(result)
+        if len(merged) >= limit:
+            break
+    return merged
+
+
+# 全局实例
+_executor: Optional[ShardedSearchExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_sharded_search_executor() -> ShardedSearchExecutor:
+    """
+    获取分片搜索执行器实例（首次调用时按配置创建）
+
+    Returns:
+        ShardedSearchExecutor: 分片搜索执行器
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            max_workers = DEFAULT_MAX_WORKERS
+            connections_per_shard = DEFAULT_CONNECTIONS_PER_SHARD
+            try:
+                from config import get_config
+                rotation = get_config().memory.index_rotation
+                max_workers = rotation.search_workers
+                connections_per_shard = rotation.connections_per_shard
+            except Exception:
+                pass
+            _executor = ShardedSearchExecutor(max_workers, connections_per_shard)
+        return _executor
+
+
+def reset_sharded_search_executor() -> None:
+    """关闭并重置全局执行器（测试用）"""
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.close()
@@ -16,6 +16,7 @@ from .memory_get import (
     MemoryGetInput,
     memory_get,
     memory_get_tool,
+    iter_recent_logs,
     MEMORY_DIR,
 )
 
@@ -38,7 +39,6 @@ from .memory_search_v2 import (
     memory_search_v2,
     memory_search_v2_tool,
     _search_fts,
-    _get_chunk_context,
     _format_results_v2,
     MEMORY_DIR,
 )
@@ -53,6 +53,7 @@ __all__ = [
     "MemoryGetInput",
     "memory_get",
     "memory_get_tool",
+    "iter_recent_logs",
     # memory_retain
     "MemoryRetainInput",
     "memory_retain",
@@ -67,6 +68,5 @@ __all__ = [
     "memory_search_v2",
     "memory_search_v2_tool",
     "_search_fts",
-    "_get_chunk_context",
     "_format_results_v2",
 ]
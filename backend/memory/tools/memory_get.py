@@ -8,12 +8,14 @@ import os
 import re
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterator, Optional, List
 
 from pydantic import BaseModel, Field, field_validator, model_validator
 
 from langchain_core.tools import StructuredTool
 
+from backend.memory.line_offsets import get_line_offset_index
+
 
 # 记忆目录路径
 MEMORY_DIR = Path("memory")
@@ -154,61 +156,72 @@ def memory_get(
     if not full_path.exists():
         return f"❌ 文件不存在: {file_path}\n\n可用的记忆文件:\n{_list_memory_files()}"
 
-    # 读取文件内容
+    # 读取文件内容（按行偏移索引定位行范围，只解码 max_length 以内的部分）
     try:
-        with open(full_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        content, truncated = get_line_offset_index(MEMORY_DIR).read_text(
+            full_path,
+            line_start=line_start,
+            line_end=line_end,
+            max_chars=max_length or None
+        )
     except Exception as e:
         return f"❌ 读取文件失败: {e}"
 
-    # 处理行号范围
-    if line_start is not None or line_end is not None:
-        start = (line_start or 1) - 1  # 转换为索引（从0开始）
-        end = line_end or len(lines)
-        lines = lines[start:end]
-
-    # 合并内容
-    content = ''.join(lines)
-
     # 处理最大长度限制
-    if max_length and len(content) > max_length:
-        content = content[:max_length]
+    if truncated:
         content += f"\n\n... (内容已截断，共 {len(content)} 字符)"
 
     return content
 
 
-def _get_recent_logs(days: int, max_length: Optional[int]) -> str:
-    """获取最近几天的日志文件内容"""
+def iter_recent_logs(days: int, max_length: Optional[int] = None) -> Iterator[str]:
+    """
+    逐个生成最近几天的日志内容（按日期倒序）
+
+    每个日志只解码剩余额度内的部分，达到 max_length 后停止，
+    不再打开更早的日志文件。
+
+    Args:
+        days: 最近天数
+        max_length: 最大总字符数，None 表示不限制
+
+    Yields:
+        带日期标题的日志内容
+    """
     today = date.today()
-    logs = []
+    offset_index = get_line_offset_index(MEMORY_DIR)
     total_chars = 0
 
     for i in range(days):
         log_date = today - timedelta(days=i)
         log_file = MEMORY_DIR / log_date.strftime("%Y-%m-%d.md")
 
-        if log_file.exists():
-            try:
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
+        if not log_file.exists():
+            continue
+
+        # 添加文件头
+        header = f"\n## {log_date.strftime('%Y-%m-%d')}\n\n"
+        remaining = max_length - total_chars if max_length else None
+
+        try:
+            content, truncated = offset_index.read_text(log_file, max_chars=remaining)
+        except Exception as e:
+            yield f"{header}❌ 读取失败: {e}"
+            continue
 
-                    # 添加文件头
-                    header = f"\n## {log_date.strftime('%Y-%m-%d')}\n\n"
-                    full_content = header + content
+        # 检查长度限制
+        if remaining is not None and (truncated or len(header) + len(content) > remaining):
+            if remaining > 0:
+                yield header + content + "\n... (已截断)"
+            return
 
-                    # 检查长度限制
-                    if max_length and total_chars + len(full_content) > max_length:
-                        remaining = max_length - total_chars
-                        if remaining > 0:
-                            logs.append(header + content[:remaining] + "\n... (已截断)")
-                        break
+        yield header + content
+        total_chars += len(header) + len(content)
 
-                    logs.append(full_content)
-                    total_chars += len(full_content)
 
-            except Exception as e:
-                logs.append(f"\n## {log_date.strftime('%Y-%m-%d')}\n\n❌ 读取失败: {e}")
+def _get_recent_logs(days: int, max_length: Optional[int]) -> str:
+    """获取最近几天的日志文件内容"""
+    logs = list(iter_recent_logs(days, max_length))
 
     if not logs:
         return f"❌ 最近 {days} 天没有找到日志文件\n\n{_list_memory_files()}"
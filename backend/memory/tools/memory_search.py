@@ -4,7 +4,9 @@
 搜索用户记忆文件，支持关键词、实体、时间范围过滤
 """
 
+import logging
 import re
+import sqlite3
 from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Optional, List, Dict, Any
@@ -13,6 +15,11 @@ from pydantic import BaseModel, Field, field_validator
 
 from langchain_core.tools import StructuredTool
 
+from backend.memory.line_index import LONG_TERM_FILES, get_line_index
+
+
+logger = logging.getLogger(__name__)
+
 
 # 记忆目录路径
 MEMORY_DIR = Path("memory")
@@ -117,11 +124,6 @@ def memory_search(
         >>> memory_search("@Python", memory_type="bank")  # 搜索 bank 中 @Python 标记
         >>> memory_search("decorator", since_days=7)  # 搜索最近7天
     """
-    results = []
-
-    # 确定要搜索的文件列表
-    files_to_search = _get_files_to_search(memory_type, since_days)
-
     # 编译查询正则
     try:
         query_pattern = re.compile(query, re.IGNORECASE | re.MULTILINE)
@@ -133,6 +135,61 @@ def memory_search(
     if entities:
         entity_patterns = [re.compile(re.escape(e), re.IGNORECASE) for e in entities]
 
+    # 优先使用行级索引，索引不可用时回退到逐文件正则扫描
+    results = _search_line_index(
+        query_pattern, entity_patterns, memory_type, since_days, max_results, context_lines
+    )
+    if results is None:
+        results = _scan_files(
+            query_pattern, entity_patterns, memory_type, since_days, max_results, context_lines
+        )
+
+    # 限制结果数量
+    results = results[:max_results]
+
+    # 格式化输出
+    return _format_results(results, query, entities, memory_type)
+
+
+def _search_line_index(
+    query_pattern: re.Pattern,
+    entity_patterns: Optional[List[re.Pattern]],
+    memory_type: str,
+    since_days: Optional[int],
+    max_results: int,
+    context_lines: int
+) -> Optional[List[Dict[str, Any]]]:
+    """通过行级索引搜索，索引不可用时返回 None"""
+    if not MEMORY_DIR.exists():
+        return None
+    try:
+        return get_line_index(MEMORY_DIR).search(
+            query_pattern,
+            entity_patterns,
+            memory_type=memory_type,
+            since_days=since_days,
+            max_results=max_results,
+            context_lines=context_lines
+        )
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"行级索引不可用，回退到正则扫描: {e}")
+        return None
+
+
+def _scan_files(
+    query_pattern: re.Pattern,
+    entity_patterns: Optional[List[re.Pattern]],
+    memory_type: str,
+    since_days: Optional[int],
+    max_results: int,
+    context_lines: int
+) -> List[Dict[str, Any]]:
+    """逐文件正则扫描"""
+    results = []
+
+    # 确定要搜索的文件列表
+    files_to_search = _get_files_to_search(memory_type, since_days)
+
     # 搜索每个文件
     for file_path in files_to_search:
         file_results = _search_file(
@@ -147,11 +204,7 @@ def memory_search(
         if len(results) >= max_results:
             break
 
-    # 限制结果数量
-    results = results[:max_results]
-
-    # 格式化输出
-    return _format_results(results, query, entities, memory_type)
+    return results
 
 
 def _get_files_to_search(memory_type: str, since_days: Optional[int]) -> List[Path]:
@@ -165,14 +218,7 @@ def _get_files_to_search(memory_type: str, since_days: Optional[int]) -> List[Pa
     # 根据类型确定文件
     if memory_type in ["all", "long_term"]:
         # 长期记忆文件
-        long_term_files = [
-            "MEMORY.md",
-            "AGENTS.md",
-            "CLAUDE.md",
-            "USER.md",
-            "SOUL.md"
-        ]
-        for filename in long_term_files:
+        for filename in LONG_TERM_FILES:
             file_path = memory_dir / filename
             if file_path.exists():
                 files.append(file_path)
@@ -5,6 +5,7 @@
 支持语义搜索、相关性评分、来源过滤等高级功能
 """
 
+import logging
 import sqlite3
 from datetime import date, datetime, timedelta
 from pathlib import Path
@@ -16,13 +17,24 @@ from langchain_core.tools import StructuredTool
 
 from backend.memory import (
     HybridSearchEngine,
-    create_embedding_provider,
+    get_embedding_provider,
+    embed_query,
     ensure_memory_index_schema,
-    open_index_db,
     get_index_db_path,
     DEFAULT_INDEX_PATH,
 )
+from backend.memory.cjk import CJK_FTS_TABLE, build_cjk_match, contains_cjk
+from backend.memory.index_rotation import extract_path_date
+from backend.memory.result_cache import get_search_result_cache, make_search_cache_key
+from backend.memory.sharded_search import ShardConnection, get_sharded_search_executor
+from backend.memory.vector_search import (
+    DEFAULT_ANN_MIN_VECTORS,
+    DEFAULT_ANN_NPROBE,
+    bm25_relevance,
+    normalize_scores,
+)
 
+logger = logging.getLogger(__name__)
 
 # 记忆目录路径
 MEMORY_DIR = Path("memory")
@@ -188,182 +200,215 @@ def memory_search_v2(
     if not any(p.exists() for p in index_paths):
         return "❌ 搜索索引尚未创建。请先运行索引建立。"
 
-    all_results = []
-    has_vectors = False
+    executor = get_sharded_search_executor()
+
+    # 结果缓存：键包含各分片的索引代数，任一分片写入后自动失效
+    cache = get_search_result_cache()
+    cache_key = None
+    if cache.enabled:
+        cache_key = make_search_cache_key(
+            "memory_search_v2",
+            query,
+            executor.index_generations(index_paths),
+            # 混合检索对原始查询做 embedding，大小写不同的查询结果不同
+            case_sensitive=use_hybrid,
+            max_results=max_results,
+            min_score=min_score,
+            source=source,
+            use_hybrid=use_hybrid,
+            vector_weight=vector_weight,
+            text_weight=text_weight,
+            context_lines=context_lines,
+            entities=entities,
+            since_days=since_days,
+            # 时间过滤的结果随日期变化
+            today=date.today().isoformat() if since_days else None
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _format_cached_results(
+                cached, query, min_score, source, use_hybrid, entities, since_days
+            )
+
     embedding_dims = 0
     query_embedding = None
 
     # 创建 embedding provider（只需一次）
     if use_hybrid:
         try:
-            provider = create_embedding_provider(provider="auto")
-            query_embedding = provider.encode_batch([query])[0]
+            provider = get_embedding_provider(provider="auto")
+            # 优先通道：不排在后台索引的批量嵌入之后
+            query_embedding = embed_query(provider, query)
             embedding_dims = len(query_embedding)
         except Exception as e:
-            # Embedding 失败，回退到 FTS only
+            # Embedding 失败，回退到 FTS only（降级结果不写入缓存）
             use_hybrid = False
             embedding_dims = 0
+            cache_key = None
+
+    ann_min_vectors, ann_nprobe = _get_ann_settings()
+
+    def search_shard(conn: ShardConnection) -> List[Dict[str, Any]]:
+        """在单个分片上搜索（只读连接，不产生写事务）"""
+        tables = conn.tables()
+        if "chunks" not in tables:
+            return []
+
+        if use_hybrid and "chunk_vectors" in tables and embedding_dims > 0:
+            # 使用混合搜索
+            engine = conn.get_hybrid_engine(embedding_dims, ann_min_vectors, ann_nprobe)
+            return _search_hybrid(
+                engine,
+                query,
+                query_embedding,
+                max_results,
+                min_score,
+                source,
+                vector_weight,
+                text_weight,
+                context_lines
+            )
 
-    # 遍历所有索引文件进行搜索
-    for index_path in index_paths:
-        if not index_path.exists():
-            continue
+        # 仅使用 FTS 搜索
+        return _search_fts(
+            conn.db, query, max_results, min_score, source,
+            use_cjk_index=CJK_FTS_TABLE in tables,
+            use_fts_index="chunks_fts" in tables
+        )
 
-        try:
-            # 打开索引数据库
-            db = open_index_db(index_path)
+    # 并发搜索所有分片，堆合并并按 id 去重；since_days 可跳过旧分片
+    results = executor.search(
+        index_paths,
+        search_shard,
+        limit=max_results * 2,
+        since_days=since_days
+    )
 
-            # 检查是否已创建 schema
-            cursor = db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='chunks'"
-            )
-            if cursor.fetchone() is None:
-                db.close()
-                continue
-
-            # 检查是否有向量表
-            if not has_vectors:
-                cursor = db.execute(
-                    "SELECT name FROM sqlite_master WHERE type='table' AND name='chunks_vec'"
-                )
-                has_vectors = cursor.fetchone() is not None
-
-            if use_hybrid and has_vectors and embedding_dims > 0:
-                # 使用混合搜索
-                results = _search_hybrid(
-                    db,
-                    query,
-                    query_embedding,
-                    embedding_dims,
-                    max_results,
-                    min_score,
-                    source,
-                    vector_weight,
-                    text_weight
-                )
-            else:
-                # 仅使用 FTS 搜索
-                results = _search_fts(
-                    db,
-                    query,
-                    max_results,
-                    min_score,
-                    source
-                )
-
-            # 标记结果来源索引
-            for result in results:
-                result["_index_file"] = index_path.name
-
-            all_results.extend(results)
-            db.close()
+    found = bool(results)
+    if found:
+        # 应用后处理过滤器
+        results = _apply_filters(
+            results,
+            entities=entities,
+            since_days=since_days,
+            max_results=max_results
+        )
 
-        except Exception as e:
-            logger.warning(f"搜索索引 {index_path.name} 失败: {e}")
-            continue
+    # 缓存过滤后的结果而不是格式化文本（输出中回显调用方的原始查询）
+    cached = (found, tuple(results))
+    if cache_key is not None:
+        cache.put(cache_key, cached)
 
-    if not all_results:
-        return "❌ 未找到相关结果。"
+    # 格式化结果
+    return _format_cached_results(
+        cached, query, min_score, source, use_hybrid, entities, since_days
+    )
 
-    # 按分数排序并去重（按 id）
-    seen_ids = set()
-    unique_results = []
-    for r in sorted(all_results, key=lambda x: x.get("score", 0), reverse=True):
-        chunk_id = r.get("id")
-        if chunk_id and chunk_id not in seen_ids:
-            seen_ids.add(chunk_id)
-            unique_results.append(r)
 
-    # 限制结果数量
-    results = unique_results[:max_results * 2]
-
-    # 应用后处理过滤器
-    results = _apply_filters(
-        results,
-        entities=entities,
-        since_days=since_days,
-        max_results=max_results
-    )
+def _format_cached_results(
+    cached: tuple,
+    query: str,
+    min_score: float,
+    source: str,
+    use_hybrid: bool,
+    entities: Optional[List[str]],
+    since_days: Optional[int]
+) -> str:
+    """
+    格式化（可能来自缓存的）搜索结果
 
-    # 格式化结果
-    return _format_results_v2(results, query, min_score, source, use_hybrid, entities, since_days)
+    Args:
+        cached: (各分片是否有任何命中, 过滤后的结果)
+        query: 搜索查询
+        min_score: 最小分数
+        source: 来源过滤
+        use_hybrid: 是否使用混合搜索
+        entities: 实体过滤
+        since_days: 时间范围
+
+    Returns:
+        格式化的搜索结果
+    """
+    found, results = cached
+    if not found:
+        return "❌ 未找到相关结果。"
+    return _format_results_v2(
+        list(results), query, min_score, source, use_hybrid, entities, since_days
+    )
 
 
 def _search_hybrid(
-    db: sqlite3.Connection,
+    engine: HybridSearchEngine,
     query: str,
     query_embedding: List[float],
-    dims: int,
     max_results: int,
     min_score: float,
     source: str,
     vector_weight: float,
-    text_weight: float
+    text_weight: float,
+    context_lines: int = 2
 ) -> List[Dict[str, Any]]:
     """
     使用混合搜索引擎
 
+    查询向量只作为参数传入，不写入 chunk_vectors。
+
     Args:
-        db: 数据库连接
+        engine: 绑定到分片只读连接的混合搜索引擎
         query: 查询文本
         query_embedding: 查询向量
-        dims: 向量维度
         max_results: 最大结果数
         min_score: 最小分数
         source: 来源过滤
         vector_weight: 向量权重
         text_weight: 文本权重
+        context_lines: 上下文行数
 
     Returns:
         搜索结果列表
     """
-    # 创建混合搜索引擎
-    engine = HybridSearchEngine(
-        db,
-        dims=dims,
+    source_filter = None if source == "all" else [source]
+    # 引擎按需扩大候选数，分数低于 min_score 后提前结束
+    results = engine.search(
+        query=query,
+        query_embedding=query_embedding,
+        limit=max_results,
+        source_filter=source_filter,
         fts_weight=text_weight,
         vec_weight=vector_weight,
-        use_sqlite_vec=False  # 使用 JSON 存储回退
+        min_score=min_score
     )
 
-    # 确保向量表存在
-    engine.ensure_vector_tables()
-
-    # 插入查询向量（临时）
-    query_id = "__query__"
-    engine.insert_vector(query_id, query_embedding)
-
-    try:
-        # 执行混合搜索
-        source_filter = None if source == "all" else [source]
-        results = engine.search(
-            query=query,
-            query_embedding=query_embedding,
-            limit=max_results * 4,  # 获取更多候选结果
-            source_filter=source_filter
+    # 过滤低分结果
+    filtered_results = [
+        r for r in results
+        if r.get("score", 0) >= min_score
+    ][:max_results]
+
+    # 为每个结果添加上下文
+    for result in filtered_results:
+        result["context"] = _get_context_from_text(
+            result.get("text", ""),
+            result.get("start_line", 1),
+            context_lines
         )
 
-        # 过滤低分结果
-        filtered_results = [
-            r for r in results
-            if r.get("score", 0) >= min_score
-        ][:max_results]
+    return filtered_results
 
-        # 为每个结果添加上下文
-        for result in filtered_results:
-            chunk_id = result.get("id")
-            if chunk_id:
-                context = _get_chunk_context(db, chunk_id, context_lines)
-                result["context"] = context
 
-        return filtered_results
+def _get_ann_settings() -> tuple:
+    """
+    获取 ANN 索引配置
 
-    finally:
-        # 清理查询向量
-        try:
-            engine.delete_by_path("")  # 删除临时向量
-        except:
-            pass
+    Returns:
+        (ann_min_vectors, ann_nprobe)，禁用时 ann_min_vectors 为 None
+    """
+    try:
+        from config import get_config
+        ann = get_config().memory.search.ann
+        return (ann.min_vectors if ann.enabled else None), ann.nprobe
+    except Exception:
+        return DEFAULT_ANN_MIN_VECTORS, DEFAULT_ANN_NPROBE
 
 
 def _search_fts(
@@ -371,38 +416,67 @@ def _search_fts(
     query: str,
     max_results: int,
     min_score: float,
-    source: str
+    source: str,
+    use_cjk_index: bool = False,
+    use_fts_index: bool = False
 ) -> List[Dict[str, Any]]:
     """
     使用 FTS 搜索（回退方案）
 
+    有倒排索引时按 bm25 排序，分数为相对最佳结果的相关度（最佳结果为 1），
+    低于 min_score 后停止读取；都没有时退回 LIKE 全表扫描，按查询词出现
+    次数粗略评分。
+
     Args:
         db: 数据库连接
         query: 查询文本
         max_results: 最大结果数
         min_score: 最小分数
         source: 来源过滤
+        use_cjk_index: 是否使用 CJK 影子表（中英文查询均可）
+        use_fts_index: 是否可以使用 chunks_fts（仅用于不含中文的查询）
 
     Returns:
         搜索结果列表
     """
-    # 使用 LIKE 搜索（支持中文）
-    like_query = f"%{query}%"
-
-    # 构建基础 SQL
-    sql = """
-        SELECT
-            c.id,
-            c.path,
-            c.source,
-            c.start_line,
-            c.end_line,
-            c.text
-        FROM chunks c
-        WHERE c.text LIKE ?
-    """
-
-    params = [like_query]
+    fts_table = None
+    match_query = None
+    if use_cjk_index:
+        fts_table, match_query = CJK_FTS_TABLE, build_cjk_match(query)
+    elif use_fts_index and not contains_cjk(query):
+        fts_table, match_query = "chunks_fts", build_cjk_match(query)
+
+    if match_query:
+        # 倒排索引（查询词之间为 AND）
+        sql = f"""
+            SELECT
+                c.id,
+                c.path,
+                c.source,
+                c.start_line,
+                c.end_line,
+                c.text,
+                bm25({fts_table})
+            FROM {fts_table}
+            JOIN chunks c ON c.rowid = {fts_table}.rowid
+            WHERE {fts_table} MATCH ?
+        """
+        params = [match_query]
+    else:
+        # 使用 LIKE 搜索（支持中文）
+        sql = """
+            SELECT
+                c.id,
+                c.path,
+                c.source,
+                c.start_line,
+                c.end_line,
+                c.text,
+                NULL
+            FROM chunks c
+            WHERE c.text LIKE ?
+        """
+        params = [f"%{query}%"]
 
     # 添加来源过滤
     if source != "all":
@@ -410,71 +484,44 @@ def _search_fts(
         params.append(source)
 
     # 限制结果数
+    if match_query:
+        sql += f" ORDER BY bm25({fts_table})"
     sql += f" LIMIT {max_results * 2}"
 
-    cursor = db.execute(sql, params)
-    rows = cursor.fetchall()
+    rows = db.execute(sql, params).fetchall()
+    if match_query:
+        # 按本次查询的最佳结果归一化；结果按 bm25 排序，分数单调不增
+        scores = normalize_scores([bm25_relevance(row[6]) for row in rows], method="max")
+    else:
+        # 没有索引时的粗略评分（基于各查询词的匹配次数）
+        terms = query.lower().split()
+        scores = [
+            min(1.0, sum(row[5].lower().count(term) for term in terms) / 10.0)
+            for row in rows
+        ]
 
     results = []
-    for row in rows:
-        chunk_id, path, source, start_line, end_line, text = row
-
-        # 简单的相关性评分（基于匹配次数）
-        match_count = text.lower().count(query.lower())
-        score = min(1.0, match_count / 10.0)
-
-        if score >= min_score:
-            results.append({
-                "id": chunk_id,
-                "path": path,
-                "source": source,
-                "start_line": start_line,
-                "end_line": end_line,
-                "text": text,
-                "score": score,
-                "context": _get_context_from_text(text, start_line, 2)
-            })
-
-    return results[:max_results]
-
-
-def _get_chunk_context(
-    db: sqlite3.Connection,
-    chunk_id: str,
-    context_lines: int
-) -> str:
-    """
-    获取 chunk 的上下文
-
-    Args:
-        db: 数据库连接
-        chunk_id: chunk ID
-        context_lines: 上下文行数
-
-    Returns:
-        上下文文本
-    """
-    cursor = db.execute(
-        "SELECT start_line, end_line, text FROM chunks WHERE id = ?",
-        (chunk_id,)
-    )
-    row = cursor.fetchone()
-
-    if row is None:
-        return ""
-
-    start_line, end_line, text = row
-    lines = text.split('\n')
-
-    # 简单的上下文提取（取前 context_lines 和后 context_lines 行）
-    context_start = max(0, context_lines)
-    context_end = min(len(lines), len(lines) - context_lines)
+    for row, score in zip(rows, scores):
+        if score < min_score:
+            if match_query:
+                break
+            continue
 
-    if context_start >= context_end:
-        return text
+        chunk_id, path, source, start_line, end_line, text, rank = row
+        results.append({
+            "id": chunk_id,
+            "path": path,
+            "source": source,
+            "start_line": start_line,
+            "end_line": end_line,
+            "text": text,
+            "score": score,
+            "context": _get_context_from_text(text, start_line, 2)
+        })
+        if len(results) >= max_results:
+            break
 
-    context_lines_list = lines[context_start:context_end]
-    return '\n'.join(context_lines_list)
+    return results
 
 
 def _get_context_from_text(text: str, start_line: int, context_lines: int) -> str:
@@ -554,14 +601,10 @@ def _is_result_recent(result: Dict[str, Any], cutoff_date: str) -> bool:
     Returns:
         是否在截止日期之后
     """
-    path = result.get("path", "")
-
     # 从文件路径中提取日期 (格式: memory/YYYY-MM-DD.md)
-    import re
-    date_match = re.search(r'(\d{4}-\d{2}-\d{2})', path)
+    result_date = extract_path_date(result.get("path", ""))
 
-    if date_match:
-        result_date = date_match.group(1)
+    if result_date:
         return result_date >= cutoff_date
 
     return True  # 如果无法解析日期，默认保留
@@ -0,0 +1,300 @@
+"""
+向量压缩
+
+为常驻内存的向量矩阵提供有损压缩，降低大语料在 CPU 主机上的内存占用：
+- 降维: PCA（按样本主成分）或随机正交投影，投影到 target_dims 维
+- 量化: int8 标量量化（逐维对称缩放）或乘积量化 PQ（每个子空间 256 个
+  码字，每个向量 m 字节）
+- 非对称打分: 查询向量只做投影不做量化，直接与压缩码计算近似内积
+
+近似分数只用于选出候选，最终由调用方用原始向量精确重排。
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+logger = logging.getLogger(__name__)
+
+
+REDUCTION_METHODS = ("none", "pca", "random")
+QUANTIZATION_METHODS = ("none", "int8", "pq")
+
+# PQ 每个子空间的码字数（uint8 编码）
+PQ_CENTROIDS = 256
+PQ_TRAIN_ITERATIONS = 15
+# 码本训练的最大样本数（每个码字约 32 个样本已足够）
+PQ_TRAIN_SAMPLE = PQ_CENTROIDS * 32
+
+# 编码/打分的分块行数：解码后的 float32 块保持在 CPU 缓存内
+SCORE_BLOCK_ROWS = 4096
+
+
+def _kmeans(data: "np.ndarray", k: int, iterations: int, rng) -> "np.ndarray":
+    """欧氏 k-means（PQ 码本训练）"""
+    centroids = data[rng.choice(data.shape[0], k, replace=False)].copy()
+    for _ in range(iterations):
+        # ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2，||x||^2 对 argmin 无影响
+        distances = (centroids ** 2).sum(axis=1) - 2.0 * data @ centroids.T
+        assign = np.argmin(distances, axis=1)
+        counts = np.bincount(assign, minlength=k)
+        # 逐维 bincount 求簇内和（比 np.add.at 快一个数量级）
+        sums = np.stack(
+            [np.bincount(assign, weights=data[:, d], minlength=k) for d in range(data.shape[1])],
+            axis=1
+        )
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # 空簇重新随机取样
+        empty = ~filled
+        if empty.any():
+            centroids[empty] = data[rng.choice(data.shape[0], int(empty.sum()))]
+    return centroids.astype(np.float32)
+
+
+class VectorCompressor:
+    """
+    降维 + 量化压缩器
+
+    使用方式:
+        compressor = VectorCompressor(1536, reduction="pca", target_dims=256, quantization="int8")
+        compressor.fit(sample)                 # 预归一化的样本向量
+        codes = compressor.encode(vectors)
+        scores = compressor.score(query, codes)  # 近似内积
+    """
+
+    def __init__(
+        self,
+        dims: int,
+        reduction: str = "pca",
+        target_dims: Optional[int] = 256,
+        quantization: str = "int8",
+        pq_subvectors: int = 32,
+        seed: int = 0
+    ):
+        """
+        初始化压缩器
+
+        Args:
+            dims: 原始向量维度
+            reduction: 降维方法 (none, pca, random)
+            target_dims: 降维后的维度（None 或不小于 dims 时不降维）
+            quantization: 量化方法 (none, int8, pq)
+            pq_subvectors: PQ 子空间数（每个向量的字节数）
+            seed: 随机种子
+        """
+        if not HAS_NUMPY:
+            raise ImportError("numpy is required. Install with: pip install numpy")
+        if reduction not in REDUCTION_METHODS:
+            raise ValueError(f"Unknown reduction: {reduction}. Choose from: {', '.join(REDUCTION_METHODS)}")
+        if quantization not in QUANTIZATION_METHODS:
+            raise ValueError(
+                f"Unknown quantization: {quantization}. Choose from: {', '.join(QUANTIZATION_METHODS)}"
+            )
+
+        self.dims = dims
+        self.reduction = reduction
+        if reduction == "none" or not target_dims or target_dims >= dims:
+            self.reduction = "none"
+            target_dims = dims
+        self.target_dims = target_dims
+        self.quantization = quantization
+        self.pq_subvectors = pq_subvectors
+        self._rng = np.random.default_rng(seed)
+
+        self._mean: Optional["np.ndarray"] = None
+        self._projection: Optional["np.ndarray"] = None
+        self._score_scale = 1.0
+        self._int8_scale: Optional["np.ndarray"] = None
+        self._codebooks: Optional["np.ndarray"] = None
+        self.is_fitted = False
+
+    # ------------------------------------------------------------------
+    # 训练
+    # ------------------------------------------------------------------
+
+    def fit(self, sample: "np.ndarray") -> "VectorCompressor":
+        """
+        用样本向量训练投影和量化参数
+
+        Args:
+            sample: 样本向量 [n, dims]（预归一化）
+
+        Returns:
+            self
+        """
+        sample = np.asarray(sample, dtype=np.float32)
+        if sample.ndim != 2 or sample.shape[1] != self.dims or sample.shape[0] == 0:
+            raise ValueError(f"Sample must have shape [n, {self.dims}]")
+
+        if self.reduction == "pca":
+            self._mean = sample.mean(axis=0)
+            # 主成分 = 中心化样本的右奇异向量
+            _, _, vt = np.linalg.svd(sample - self._mean, full_matrices=False)
+            components = vt[:self.target_dims]
+            if components.shape[0] < self.target_dims:
+                # 样本数少于目标维度时用随机正交方向补齐
+                extra = self._random_orthonormal(self.target_dims - components.shape[0])
+                components = np.vstack([components, extra.T])
+            self._projection = components.T.astype(np.float32)
+        elif self.reduction == "random":
+            self._projection = self._random_orthonormal(self.target_dims)
+            # 随机正交投影保留 target_dims/dims 的能量，按比例还原内积尺度
+            self._score_scale = self.dims / self.target_dims
+
+        projected = self.project(sample)
+
+        if self.quantization == "int8":
+            scale = np.abs(projected).max(axis=0) / 127.0
+            scale[scale == 0] = 1.0
+            self._int8_scale = scale.astype(np.float32)
+        elif self.quantization == "pq":
+            self._fit_pq(projected)
+
+        self.is_fitted = True
+        return self
+
+    def _random_orthonormal(self, columns: int) -> "np.ndarray":
+        gaussian = self._rng.standard_normal((self.dims, columns)).astype(np.float32)
+        q, _ = np.linalg.qr(gaussian)
+        return q[:, :columns].astype(np.float32)
+
+    def _fit_pq(self, projected: "np.ndarray") -> None:
+        # 子空间数需整除维度：取不超过配置值的最大约数
+        m = max(1, min(self.pq_subvectors, self.target_dims))
+        while self.target_dims % m:
+            m -= 1
+        self.pq_subvectors = m
+        sub_dims = self.target_dims // m
+        if projected.shape[0] > PQ_TRAIN_SAMPLE:
+            projected = projected[self._rng.choice(projected.shape[0], PQ_TRAIN_SAMPLE, replace=False)]
+        k = min(PQ_CENTROIDS, projected.shape[0])
+
+        codebooks = np.zeros((m, k, sub_dims), dtype=np.float32)
+        for j in range(m):
+            codebooks[j] = _kmeans(
+                projected[:, j * sub_dims:(j + 1) * sub_dims], k, PQ_TRAIN_ITERATIONS, self._rng
+            )
+        self._codebooks = codebooks
+
+    # ------------------------------------------------------------------
+    # 编码与打分
+    # ------------------------------------------------------------------
+
+    def project(self, vectors: "np.ndarray") -> "np.ndarray":
+        """降维（PCA 先去均值）"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.reduction == "none":
+            return vectors
+        if self._mean is not None:
+            vectors = vectors - self._mean
+        return vectors @ self._projection
+
+    def encode(self, vectors: "np.ndarray") -> "np.ndarray":
+        """
+        压缩向量
+
+        Args:
+            vectors: 向量 [n, dims]（预归一化）
+
+        Returns:
+            压缩码：int8 [n, target_dims]、uint8 [n, m] 或 float32 [n, target_dims]
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if self.quantization == "int8":
+            dtype, width = np.int8, self.target_dims
+        elif self.quantization == "pq":
+            dtype, width = np.uint8, self.pq_subvectors
+        else:
+            dtype, width = np.float32, self.target_dims
+
+        codes = np.empty((vectors.shape[0], width), dtype=dtype)
+        for start in range(0, vectors.shape[0], SCORE_BLOCK_ROWS):
+            block = self.project(vectors[start:start + SCORE_BLOCK_ROWS])
+            codes[start:start + block.shape[0]] = self._quantize(block)
+        return codes
+
+    def _quantize(self, projected: "np.ndarray") -> "np.ndarray":
+        if self.quantization == "int8":
+            return np.clip(np.rint(projected / self._int8_scale), -127, 127).astype(np.int8)
+        if self.quantization == "pq":
+            m = self.pq_subvectors
+            sub_dims = self.target_dims // m
+            codes = np.empty((projected.shape[0], m), dtype=np.uint8)
+            for j in range(m):
+                sub = projected[:, j * sub_dims:(j + 1) * sub_dims]
+                codebook = self._codebooks[j]
+                distances = (codebook ** 2).sum(axis=1) - 2.0 * sub @ codebook.T
+                codes[:, j] = np.argmin(distances, axis=1)
+            return codes
+        return projected
+
+    def score(self, query: "np.ndarray", codes: "np.ndarray") -> "np.ndarray":
+        """
+        非对称近似内积（查询不量化）
+
+        Args:
+            query: 查询向量 [dims]（预归一化）
+            codes: encode 返回的压缩码
+
+        Returns:
+            近似内积 [n]
+        """
+        query = np.asarray(query, dtype=np.float32)
+        # q·x = q·(x - mean) + q·mean：查询本身不去均值，补上 q·mean
+        projected = query @ self._projection if self._projection is not None else query
+        offset = float(query @ self._mean) if self._mean is not None else 0.0
+
+        if self.quantization == "pq":
+            m = self.pq_subvectors
+            sub_dims = self.target_dims // m
+            # 查找表: 每个子空间的每个码字与查询子向量的内积
+            table = np.einsum("mkd,md->mk", self._codebooks, projected.reshape(m, sub_dims)).ravel()
+            offsets = np.arange(m, dtype=np.intp) * self._codebooks.shape[1]
+            scores = np.empty(codes.shape[0], dtype=np.float32)
+            for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+                block = codes[start:start + SCORE_BLOCK_ROWS]
+                scores[start:start + block.shape[0]] = table[block + offsets].sum(axis=1)
+        else:
+            weights = projected * self._int8_scale if self.quantization == "int8" else projected
+            scores = np.empty(codes.shape[0], dtype=np.float32)
+            for start in range(0, codes.shape[0], SCORE_BLOCK_ROWS):
+                block = codes[start:start + SCORE_BLOCK_ROWS]
+                scores[start:start + block.shape[0]] = block.astype(np.float32, copy=False) @ weights
+
+        return scores * self._score_scale + offset
+
+    @property
+    def code_bytes(self) -> int:
+        """每个向量的压缩码字节数"""
+        if self.quantization == "int8":
+            return self.target_dims
+        if self.quantization == "pq":
+            return self.pq_subvectors
+        return self.target_dims * 4
+
+    @property
+    def nbytes(self) -> int:
+        """投影矩阵和码本占用的字节数"""
+        arrays = [self._mean, self._projection, self._int8_scale, self._codebooks]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def describe(self) -> Dict[str, Any]:
+        """压缩配置摘要"""
+        return {
+            "dims": self.dims,
+            "reduction": self.reduction,
+            "target_dims": self.target_dims,
+            "quantization": self.quantization,
+            "pq_subvectors": self.pq_subvectors if self.quantization == "pq" else None,
+            "code_bytes": self.code_bytes,
+            "fitted": self.is_fitted,
+        }
@@ -0,0 +1,140 @@
+"""
+向量存储格式
+
+向量以带版本头的二进制 BLOB 存储：
+
+    +-------+---------+-------+------------------------------+
+    | "BV"  | version | dtype | 小端序 float32/float16 数据  |
+    +-------+---------+-------+------------------------------+
+      2字节    1字节    1字节
+
+头部 4 字节，保证数据区按 float32 对齐，读取时可直接 numpy.frombuffer，
+无需逐元素解析。旧版逗号分隔的文本格式仍可读取（迁移过渡期）。
+"""
+
+import array
+import struct
+import sys
+from typing import List, Union
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+VECTOR_FORMAT_VERSION = 1
+
+_MAGIC = b"BV"
+_HEADER_SIZE = 4
+
+# dtype 名称 -> (头部编码, struct 格式字符, 字节数)
+_DTYPES = {
+    "float32": (b"f", "f", 4),
+    "float16": (b"e", "e", 2),
+}
+_DTYPE_BY_CODE = {code: name for name, (code, _, _) in _DTYPES.items()}
+
+StoredVector = Union[bytes, memoryview, str]
+
+
+def encode_vector(embedding, dtype: str = "float32") -> bytes:
+    """
+    编码向量为二进制 BLOB
+
+    Args:
+        embedding: 向量（列表或 numpy 数组）
+        dtype: 存储精度 (float32, float16)
+
+    Returns:
+        二进制数据
+    """
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unknown vector dtype: {dtype}. Choose from: {', '.join(_DTYPES)}")
+
+    code, fmt, _ = _DTYPES[dtype]
+    header = _MAGIC + bytes([VECTOR_FORMAT_VERSION]) + code
+
+    if HAS_NUMPY:
+        data = np.asarray(embedding, dtype="<f4" if dtype == "float32" else "<f2").tobytes()
+    else:
+        values = list(embedding)
+        data = struct.pack(f"<{len(values)}{fmt}", *values)
+
+    return header + data
+
+
+def is_binary_vector(value: StoredVector) -> bool:
+    """判断存储值是否为二进制格式"""
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:2]) == _MAGIC
+
+
+def _parse_header(value: StoredVector) -> str:
+    """校验头部并返回 dtype 名称"""
+    if len(value) < _HEADER_SIZE or bytes(value[:2]) != _MAGIC:
+        raise ValueError("Invalid vector blob header")
+
+    version = value[2]
+    if version != VECTOR_FORMAT_VERSION:
+        raise ValueError(f"Unsupported vector format version: {version}")
+
+    dtype = _DTYPE_BY_CODE.get(bytes(value[3:4]))
+    if dtype is None:
+        raise ValueError(f"Unknown vector dtype code: {bytes(value[3:4])!r}")
+
+    return dtype
+
+
+def decode_vector_array(value: StoredVector) -> "np.ndarray":
+    """
+    解码向量为 float32 numpy 数组（零拷贝读取二进制数据）
+
+    Args:
+        value: 存储值（二进制 BLOB 或旧版文本）
+
+    Returns:
+        float32 数组
+    """
+    if isinstance(value, str):
+        if not value:
+            return np.zeros(0, dtype=np.float32)
+        return np.array(value.split(','), dtype=np.float32)
+
+    dtype = _parse_header(value)
+    array_ = np.frombuffer(value, dtype="<f4" if dtype == "float32" else "<f2", offset=_HEADER_SIZE)
+    return array_.astype(np.float32, copy=False)
+
+
+def decode_vector(value: StoredVector) -> List[float]:
+    """
+    解码向量为 Python 列表
+
+    Args:
+        value: 存储值（二进制 BLOB 或旧版文本）
+
+    Returns:
+        向量
+
+    Raises:
+        ValueError: 数据格式错误
+    """
+    if isinstance(value, str):
+        if not value:
+            return []
+        return [float(x) for x in value.split(',')]
+
+    if HAS_NUMPY:
+        return decode_vector_array(value).tolist()
+
+    dtype = _parse_header(value)
+    _, fmt, size = _DTYPES[dtype]
+    data = memoryview(value)[_HEADER_SIZE:]
+
+    if dtype == "float32":
+        values = array.array("f", bytes(data))
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values.tolist()
+
+    return list(struct.unpack(f"<{len(data) // size}{fmt}", data))
@@ -4,9 +4,14 @@
 提供向量相似度计算和混合搜索功能
 """
 
+import array
+import logging
 import math
+import os
 import sqlite3
+import threading
 import time
+from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
 
 try:
@@ -21,6 +26,34 @@ try:
 except ImportError:
     HAS_SQLITE_VEC = False
 
+from .vector_format import encode_vector, decode_vector, decode_vector_array
+from .vector_compression import VectorCompressor
+from .cjk import CJK_FTS_TABLE, build_cjk_match, contains_cjk, has_cjk_index
+from .schema import CHUNK_VECTORS_TABLE_SQL, migrate_vector_rowids, read_index_id
+
+logger = logging.getLogger(__name__)
+
+
+# ANN 默认配置
+DEFAULT_ANN_MIN_VECTORS = 50000  # 向量数达到该值后使用 ANN 索引
+DEFAULT_ANN_NPROBE = 16          # 每次查询探测的倒排列表数
+ANN_INDEX_SUFFIX = ".ivf.npz"    # ANN 索引文件后缀（与索引数据库同目录）
+
+# 向量压缩默认配置（默认关闭）
+DEFAULT_COMPRESSION = {
+    "enabled": False,
+    "reduction": "pca",
+    "target_dims": 256,
+    "quantization": "int8",
+    "pq_subvectors": 32,
+    "rerank_factor": 4,
+    "min_train_vectors": 1024,
+}
+
+# 混合搜索候选数：从 limit 开始按倍数扩大，直到 top-k 稳定或低于阈值
+HYBRID_FANOUT_FACTOR = 2
+HYBRID_MAX_CANDIDATES = 512
+
 
 def cosine_similarity(a: List[float], b: List[float]) -> float:
     """
@@ -58,7 +91,7 @@ def normalize_scores(scores: List[float], method: str = "minmax") -> List[float]
 
     Args:
         scores: 分数列表
-        method: 归一化方法 (minmax, sigmoid, softmax)
+        method: 归一化方法 (minmax, max, sigmoid, softmax)
 
     Returns:
         归一化后的分数列表
@@ -66,6 +99,14 @@ def normalize_scores(scores: List[float], method: str = "minmax") -> List[float]
     if not scores:
         return []
 
+    if method == "max":
+        # 按最大值缩放：最佳结果为 1，其余保持与最佳结果的相对比例
+        # （适合非负的 BM25 相关度，弱匹配不会像 minmax 那样被拉到 0）
+        max_score = max(scores)
+        if max_score <= 0:
+            return [0.0] * len(scores)
+        return [max(0.0, s) / max_score for s in scores]
+
     if method == "minmax":
         # Min-max 归一化
         min_score = min(scores)
@@ -123,6 +164,1113 @@ def combine_scores(
     ]
 
 
+def bm25_relevance(rank: Optional[float]) -> float:
+    """
+    将 SQLite bm25() 的返回值转换为相关度
+
+    bm25() 越小（越负）越相关，这里取相反数并截断到非负。
+
+    Args:
+        rank: bm25() 返回值（None 表示未匹配）
+
+    Returns:
+        相关度（>= 0）
+    """
+    if rank is None:
+        return 0.0
+    return max(0.0, -float(rank))
+
+
+def _db_file_path(db: sqlite3.Connection) -> Optional[str]:
+    """获取连接对应的主数据库文件路径（内存数据库返回 None）"""
+    try:
+        for row in db.execute("PRAGMA database_list").fetchall():
+            if row[1] == "main":
+                return row[2] or None
+    except sqlite3.Error:
+        pass
+    return None
+
+
+class VectorMatrix:
+    """
+    常驻内存的向量矩阵
+
+    将 chunk_vectors 中的向量加载为预归一化的 float32 矩阵，
+    并维护 chunk_id -> 行号 的映射。每个索引文件只加载一次，
+    之后按 rowid 增量刷新；检测到删除时只标记失效行，失效行过多时压缩。
+
+    搜索 = 一次矩阵-向量乘法 + argpartition 取 top-k，
+    来源过滤通过布尔掩码完成。
+    """
+
+    # 失效行占比超过该阈值时压缩矩阵
+    COMPACT_RATIO = 0.25
+
+    def __init__(self, dims: int):
+        """
+        初始化向量矩阵
+
+        Args:
+            dims: 向量维度
+        """
+        if not HAS_NUMPY:
+            raise ImportError("numpy is required. Install with: pip install numpy")
+
+        self.dims = dims
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        """清空矩阵状态"""
+        self._matrix = np.zeros((0, self.dims), dtype=np.float32)
+        self._rowids = np.zeros(0, dtype=np.int64)
+        self._source_codes = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._chunk_ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._source_code_of: Dict[str, int] = {}
+        self._max_rowid = 0
+        self._sequence = 0
+        # 已加载数据所属数据库的标识（meta.index_id）
+        self._db_id: Optional[str] = None
+        self._live_count = 0
+        # 数据库中存在但不参与搜索的行数（chunks 已删除但向量残留等）
+        self._masked_count = 0
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    # ------------------------------------------------------------------
+    # 加载与增量刷新
+    # ------------------------------------------------------------------
+
+    def refresh(self, db: sqlite3.Connection) -> None:
+        """
+        与数据库同步
+
+        Args:
+            db: SQLite 数据库连接
+        """
+        with self._lock:
+            row = db.execute("SELECT MAX(rowid), COUNT(*) FROM chunk_vectors").fetchone()
+            max_rowid = row[0] or 0
+            count = row[1] or 0
+            sequence = _vector_sequence(db)
+
+            # 数据库被删除重建（标识变化）时新 rowid 可能与已加载的重叠，全量重新加载
+            db_id = read_index_id(db)
+            if db_id != self._db_id:
+                if self._size or self._max_rowid:
+                    self._reset()
+                self._db_id = db_id
+
+            if sequence is not None:
+                # AUTOINCREMENT 表的 rowid 不复用：新行的 rowid 一定大于已加载的
+                # 最大 rowid；MAX(rowid) 下降只说明末尾的行被删除。
+                # 序列号回退说明表被删除后重建，全量重新加载
+                if sequence < self._sequence:
+                    self._reset()
+                self._sequence = sequence
+            elif max_rowid < self._max_rowid:
+                # 旧版表被重建（rowid 回退），全量重新加载
+                self._reset()
+
+            if max_rowid > self._max_rowid:
+                self._load_rows(db, self._max_rowid)
+                self._max_rowid = max_rowid
+
+            if count != self._live_count + self._masked_count:
+                self._sync_deletions(db, count)
+
+            if self._size and (self._size - self._live_count) > self._size * self.COMPACT_RATIO:
+                self._compact()
+
+    def _load_rows(self, db: sqlite3.Connection, after_rowid: int) -> None:
+        """加载 rowid 大于 after_rowid 的向量行"""
+        cursor = db.execute("""
+            SELECT cv.rowid, cv.chunk_id, c.source, cv.embedding
+            FROM chunk_vectors cv
+            LEFT JOIN chunks c ON c.id = cv.chunk_id
+            WHERE cv.rowid > ?
+            ORDER BY cv.rowid
+        """, (after_rowid,))
+
+        rowids = []
+        chunk_ids = []
+        sources = []
+        vectors = []
+        for rowid, chunk_id, source, embedding in cursor:
+            vector = _parse_vector(embedding)
+            if vector.shape[0] != self.dims:
+                # 维度不符的行保留占位（不参与搜索），保持行数与数据库一致
+                vector = np.zeros(self.dims, dtype=np.float32)
+                source = None
+            rowids.append(rowid)
+            chunk_ids.append(chunk_id)
+            sources.append(source)
+            vectors.append(vector)
+
+        if not rowids:
+            return
+
+        block = np.vstack(vectors).astype(np.float32, copy=False)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        block /= norms
+
+        self._append(block, rowids, chunk_ids, sources)
+
+    def _append(
+        self,
+        block: "np.ndarray",
+        rowids: List[int],
+        chunk_ids: List[str],
+        sources: List[Optional[str]]
+    ) -> None:
+        """追加一批已归一化的向量"""
+        n = block.shape[0]
+        self._ensure_capacity(self._size + n)
+
+        start = self._size
+        end = start + n
+        self._matrix[start:end] = self._encode_block(block)
+        self._rowids[start:end] = rowids
+        self._source_codes[start:end] = [self._source_code(s) for s in sources]
+        self._alive[start:end] = True
+
+        for offset, chunk_id in enumerate(chunk_ids):
+            # INSERT OR REPLACE 会产生新的 rowid，旧行作废
+            old_row = self._row_of.get(chunk_id)
+            if old_row is not None and self._alive[old_row]:
+                self._alive[old_row] = False
+                self._live_count -= 1
+            self._row_of[chunk_id] = start + offset
+
+        self._chunk_ids.extend(chunk_ids)
+        self._size = end
+        self._live_count += n
+
+    def _encode_block(self, block: "np.ndarray") -> "np.ndarray":
+        """转换为矩阵中存储的行格式（精确矩阵直接存储归一化向量）"""
+        return block
+
+    def _ensure_capacity(self, needed: int) -> None:
+        """按倍增策略扩容，避免每次增量刷新都复制整个矩阵"""
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, 1024)
+
+        matrix = np.zeros((new_capacity,) + self._matrix.shape[1:], dtype=self._matrix.dtype)
+        matrix[:self._size] = self._matrix[:self._size]
+        rowids = np.zeros(new_capacity, dtype=np.int64)
+        rowids[:self._size] = self._rowids[:self._size]
+        source_codes = np.zeros(new_capacity, dtype=np.int32)
+        source_codes[:self._size] = self._source_codes[:self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+
+        self._matrix = matrix
+        self._rowids = rowids
+        self._source_codes = source_codes
+        self._alive = alive
+
+    def _source_code(self, source: Optional[str]) -> int:
+        """来源字符串 -> 整数编码（无对应 chunk 的向量编码为 -1）"""
+        if source is None:
+            return -1
+        code = self._source_code_of.get(source)
+        if code is None:
+            code = len(self._source_code_of)
+            self._source_code_of[source] = code
+        return code
+
+    def _sync_deletions(self, db: sqlite3.Connection, count: int) -> None:
+        """标记已从数据库删除的行"""
+        existing = np.fromiter(
+            (row[0] for row in db.execute("SELECT rowid FROM chunk_vectors")),
+            dtype=np.int64
+        )
+        rows = np.arange(self._size)
+        removed = rows[self._alive[:self._size] & ~np.isin(self._rowids[:self._size], existing)]
+
+        for row in removed:
+            self._alive[row] = False
+            chunk_id = self._chunk_ids[row]
+            if self._row_of.get(chunk_id) == row:
+                del self._row_of[chunk_id]
+
+        self._live_count -= len(removed)
+        self._masked_count = max(0, count - self._live_count)
+
+    def _compact(self) -> "np.ndarray":
+        """移除失效行，返回保留的原行号"""
+        keep = np.flatnonzero(self._alive[:self._size])
+
+        self._matrix = self._matrix[keep].copy()
+        self._rowids = self._rowids[keep].copy()
+        self._source_codes = self._source_codes[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._chunk_ids = [self._chunk_ids[i] for i in keep]
+        self._row_of = {chunk_id: i for i, chunk_id in enumerate(self._chunk_ids)}
+        self._size = len(keep)
+        self._live_count = self._size
+        return keep
+
+    def mark_deleted(self, chunk_ids: List[str], removed_from_db: bool = False) -> int:
+        """
+        将指定 chunk 标记为失效（墓碑）
+
+        Args:
+            chunk_ids: 块 ID 列表
+            removed_from_db: 向量行是否已从 chunk_vectors 删除；
+                为 False 时表示仅 chunks 表中已不存在，向量行仍残留
+
+        Returns:
+            实际标记的行数
+        """
+        marked = 0
+        with self._lock:
+            for chunk_id in chunk_ids:
+                row = self._row_of.pop(chunk_id, None)
+                if row is not None and self._alive[row]:
+                    self._alive[row] = False
+                    self._live_count -= 1
+                    marked += 1
+            if not removed_from_db:
+                self._masked_count += marked
+        return marked
+
+    def memory_bytes(self) -> int:
+        """常驻数组占用的字节数（含预留容量）"""
+        return sum(
+            a.nbytes for a in (self._matrix, self._rowids, self._source_codes, self._alive)
+        )
+
+    # ------------------------------------------------------------------
+    # 搜索
+    # ------------------------------------------------------------------
+
+    def _candidate_mask(self, source_filter: Optional[List[str]]) -> "np.ndarray":
+        """参与搜索的行：存活、有对应 chunk，且满足来源过滤"""
+        mask = self._alive[:self._size]
+        if source_filter:
+            codes = [self._source_code_of[s] for s in source_filter if s in self._source_code_of]
+            return mask & np.isin(self._source_codes[:self._size], codes)
+        return mask & (self._source_codes[:self._size] >= 0)
+
+    def top_k(
+        self,
+        query_embedding: List[float],
+        k: int,
+        source_filter: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        计算 top-k 最相似的块
+
+        Args:
+            query_embedding: 查询向量
+            k: 返回数量
+            source_filter: 来源过滤
+
+        Returns:
+            [(chunk_id, score), ...]，按分数降序
+        """
+        with self._lock:
+            if k <= 0 or self._size == 0:
+                return []
+
+            query = _normalize_query(query_embedding)
+            mask = self._candidate_mask(source_filter)
+
+            n_candidates = int(np.count_nonzero(mask))
+            if n_candidates == 0:
+                return []
+
+            # 全量乘法 + 掩码，比先按候选行取子矩阵（需要复制）更快
+            scores = self._matrix[:self._size] @ query
+            scores[~mask] = -np.inf
+
+            k = min(k, n_candidates)
+            if k < self._size:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(self._size)
+            top = top[np.argsort(-scores[top], kind="stable")]
+
+            return [(self._chunk_ids[row], float(scores[row])) for row in top]
+
+
+def _vector_sequence(db: sqlite3.Connection) -> Optional[int]:
+    """chunk_vectors 的 AUTOINCREMENT 序列号（旧版表或尚未插入过行时返回 None）"""
+    try:
+        row = db.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'chunk_vectors'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def _normalize_query(query_embedding: List[float]) -> "np.ndarray":
+    """查询向量 -> 归一化的 float32 数组"""
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(query))
+    if norm > 0:
+        query = query / norm
+    return query
+
+
+def _parse_vector(embedding) -> "np.ndarray":
+    """解析存储的向量为 float32 数组（格式错误时返回空数组）"""
+    try:
+        return decode_vector_array(embedding)
+    except ValueError:
+        return np.zeros(0, dtype=np.float32)
+
+
+# 每个索引文件一个常驻矩阵
+_vector_matrices: Dict[Tuple[str, int], VectorMatrix] = {}
+_vector_matrices_lock = threading.Lock()
+
+
+def get_vector_matrix(db: sqlite3.Connection, dims: int) -> VectorMatrix:
+    """
+    获取索引文件对应的常驻向量矩阵
+
+    文件数据库按 (路径, 维度) 共享同一个矩阵；内存数据库每次返回新实例。
+
+    Args:
+        db: SQLite 数据库连接
+        dims: 向量维度
+
+    Returns:
+        VectorMatrix 实例
+    """
+    path = _db_file_path(db)
+    if path is None:
+        return VectorMatrix(dims)
+
+    key = (path, dims)
+    with _vector_matrices_lock:
+        matrix = _vector_matrices.get(key)
+        if matrix is None:
+            matrix = VectorMatrix(dims)
+            _vector_matrices[key] = matrix
+        return matrix
+
+
+def clear_vector_matrices() -> None:
+    """清空所有常驻向量矩阵"""
+    with _vector_matrices_lock:
+        _vector_matrices.clear()
+        _quantized_matrices.clear()
+
+
+class QuantizedVectorMatrix(VectorMatrix):
+    """
+    压缩存储的常驻向量矩阵
+
+    内存受限时代替 VectorMatrix：向量经 VectorCompressor 降维并量化后常驻，
+    每个向量只占 code_bytes 字节（如 PCA-256 + int8 为 256 字节，原始
+    1536 维 float32 为 6144 字节）。
+
+    - 向量数达到 min_train_vectors 之前按原始 float32 存储并精确搜索；
+      达到后用存活向量的样本训练压缩器，并将已有行转换为压缩码
+    - 查询时用非对称打分（查询向量不量化）选出 k * rerank_factor 个候选，
+      再由 vector_loader 读取候选的原始向量精确重排
+    - 压缩器不持久化，进程重启后随矩阵重新加载时重新训练
+    """
+
+    # 训练压缩器的最大样本数
+    TRAIN_SAMPLE = 20000
+
+    def __init__(
+        self,
+        dims: int,
+        reduction: str = DEFAULT_COMPRESSION["reduction"],
+        target_dims: Optional[int] = DEFAULT_COMPRESSION["target_dims"],
+        quantization: str = DEFAULT_COMPRESSION["quantization"],
+        pq_subvectors: int = DEFAULT_COMPRESSION["pq_subvectors"],
+        rerank_factor: int = DEFAULT_COMPRESSION["rerank_factor"],
+        min_train_vectors: int = DEFAULT_COMPRESSION["min_train_vectors"],
+        seed: int = 0
+    ):
+        """
+        初始化压缩矩阵
+
+        Args:
+            dims: 原始向量维度
+            reduction: 降维方法 (none, pca, random)
+            target_dims: 降维后的维度
+            quantization: 量化方法 (none, int8, pq)
+            pq_subvectors: PQ 子空间数
+            rerank_factor: 精确重排的候选倍数
+            min_train_vectors: 开始压缩的最少向量数
+            seed: 训练随机种子
+        """
+        self.settings = {
+            "reduction": reduction,
+            "target_dims": target_dims,
+            "quantization": quantization,
+            "pq_subvectors": pq_subvectors,
+        }
+        self.rerank_factor = max(1, rerank_factor)
+        self.min_train_vectors = max(1, min_train_vectors)
+        self._seed = seed
+        self._rng = np.random.default_rng(seed)
+        super().__init__(dims)
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._compressor: Optional[VectorCompressor] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self._compressor is not None
+
+    def refresh(self, db: sqlite3.Connection) -> None:
+        """与数据库同步，向量数足够时训练压缩器"""
+        with self._lock:
+            super().refresh(db)
+            if not self.is_trained and self._live_count >= self.min_train_vectors:
+                self.train()
+
+    def _encode_block(self, block: "np.ndarray") -> "np.ndarray":
+        if self._compressor is None:
+            return block
+        return self._compressor.encode(block)
+
+    def train(self) -> None:
+        """训练压缩器，并把已有的 float32 行转换为压缩码"""
+        with self._lock:
+            if self.is_trained:
+                return
+            rows = np.flatnonzero(self._alive[:self._size])
+            if rows.size == 0:
+                return
+
+            sample_rows = rows
+            if rows.size > self.TRAIN_SAMPLE:
+                sample_rows = np.sort(self._rng.choice(rows, self.TRAIN_SAMPLE, replace=False))
+
+            compressor = VectorCompressor(self.dims, seed=self._seed, **self.settings)
+            compressor.fit(self._matrix[sample_rows])
+
+            codes = compressor.encode(self._matrix[:self._size])
+            storage = np.zeros((self._matrix.shape[0],) + codes.shape[1:], dtype=codes.dtype)
+            storage[:self._size] = codes
+            self._matrix = storage
+            self._compressor = compressor
+
+            logger.info(
+                f"向量压缩完成: vectors={self._size}, {compressor.describe()}, "
+                f"resident={self.memory_bytes() / 1024 / 1024:.1f}MB"
+            )
+
+    def memory_bytes(self) -> int:
+        compressor_bytes = self._compressor.nbytes if self._compressor is not None else 0
+        return super().memory_bytes() + compressor_bytes
+
+    def top_k(
+        self,
+        query_embedding: List[float],
+        k: int,
+        source_filter: Optional[List[str]] = None,
+        vector_loader=None
+    ) -> List[Tuple[str, float]]:
+        """
+        近似打分 + 精确重排的 top-k（未训练时精确搜索）
+
+        Args:
+            query_embedding: 查询向量
+            k: 返回数量
+            source_filter: 来源过滤
+            vector_loader: 按 chunk_id 列表读取原始向量的函数，
+                返回 {chunk_id: 向量}；None 时直接返回近似分数
+
+        Returns:
+            [(chunk_id, score), ...]，按分数降序
+        """
+        with self._lock:
+            if not self.is_trained:
+                return super().top_k(query_embedding, k, source_filter)
+
+            if k <= 0 or self._size == 0:
+                return []
+
+            query = _normalize_query(query_embedding)
+            mask = self._candidate_mask(source_filter)
+            n_candidates = int(np.count_nonzero(mask))
+            if n_candidates == 0:
+                return []
+
+            scores = self._compressor.score(query, self._matrix[:self._size])
+            scores[~mask] = -np.inf
+
+            n_rerank = k * self.rerank_factor if vector_loader is not None else k
+            n_rerank = min(n_rerank, n_candidates)
+            top = np.argpartition(-scores, n_rerank - 1)[:n_rerank]
+            candidates = [(self._chunk_ids[row], float(scores[row])) for row in top]
+
+        if vector_loader is None:
+            candidates.sort(key=lambda item: item[1], reverse=True)
+            return candidates
+
+        vectors = vector_loader([chunk_id for chunk_id, _ in candidates])
+        reranked = []
+        for chunk_id, approx in candidates:
+            vector = vectors.get(chunk_id)
+            if vector is None or vector.shape[0] != self.dims:
+                reranked.append((chunk_id, approx))
+                continue
+            norm = float(np.linalg.norm(vector))
+            reranked.append((chunk_id, float(vector @ query) / norm if norm > 0 else 0.0))
+        reranked.sort(key=lambda item: item[1], reverse=True)
+        return reranked[:k]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """压缩配置和内存占用"""
+        with self._lock:
+            return {
+                "vectors": self._live_count,
+                "trained": self.is_trained,
+                "compression": self._compressor.describe() if self._compressor else None,
+                "rerank_factor": self.rerank_factor,
+                "memory_bytes": self.memory_bytes(),
+                "float32_bytes": self._size * self.dims * 4,
+            }
+
+
+# 每个索引文件一个压缩矩阵
+_quantized_matrices: Dict[Tuple[str, int], QuantizedVectorMatrix] = {}
+
+
+def get_compression_settings() -> Dict[str, Any]:
+    """
+    读取 memory.search.compression 配置（缺失时使用默认值）
+
+    Returns:
+        压缩配置字典，包含 enabled 字段
+    """
+    settings = dict(DEFAULT_COMPRESSION)
+    try:
+        from config import get_config
+        compression = get_config().memory.search.compression
+        settings.update({key: getattr(compression, key) for key in DEFAULT_COMPRESSION})
+    except Exception:
+        pass
+    return settings
+
+
+def get_quantized_matrix(
+    db: sqlite3.Connection,
+    dims: int,
+    settings: Optional[Dict[str, Any]] = None
+) -> QuantizedVectorMatrix:
+    """
+    获取索引文件对应的压缩矩阵
+
+    文件数据库按 (路径, 维度) 共享；配置变化时重新创建。
+
+    Args:
+        db: SQLite 数据库连接
+        dims: 向量维度
+        settings: 压缩配置（None 表示读取配置文件）
+
+    Returns:
+        QuantizedVectorMatrix 实例
+    """
+    settings = settings or get_compression_settings()
+    kwargs = {key: settings[key] for key in DEFAULT_COMPRESSION if key != "enabled"}
+
+    path = _db_file_path(db)
+    if path is None:
+        return QuantizedVectorMatrix(dims, **kwargs)
+
+    key = (path, dims)
+    with _vector_matrices_lock:
+        matrix = _quantized_matrices.get(key)
+        if matrix is None or (
+            {**matrix.settings, "rerank_factor": matrix.rerank_factor,
+             "min_train_vectors": matrix.min_train_vectors} != kwargs
+        ):
+            matrix = QuantizedVectorMatrix(dims, **kwargs)
+            _quantized_matrices[key] = matrix
+        return matrix
+
+
+class IVFIndex(VectorMatrix):
+    """
+    IVF-Flat 近似最近邻索引
+
+    在 VectorMatrix 的基础上，用球面 k-means 将向量划分到 nlist 个倒排列表，
+    查询时只对最相近的 nprobe 个列表内的向量精确打分。
+
+    - 新增向量按 rowid 增量同步并分配到最近的质心
+    - 删除的 chunk 以墓碑形式标记，压缩时才真正移除
+    - 向量数相对上次训练增长 RETRAIN_GROWTH 倍后重新训练质心
+    - 可持久化为索引数据库旁的 .ivf.npz 文件（记录数据库标识和 AUTOINCREMENT
+      序列号，数据库被删除重建后不再加载）
+    """
+
+    FORMAT_VERSION = 2
+
+    # 少于该数量时不训练，直接精确搜索
+    MIN_TRAIN_VECTORS = 1024
+    # 训练采样：每个列表的样本数
+    TRAIN_SAMPLES_PER_LIST = 64
+    TRAIN_ITERATIONS = 10
+    RETRAIN_GROWTH = 2.0
+    # 累计多少变更后自动保存
+    AUTOSAVE_CHANGES = 5000
+
+    def __init__(
+        self,
+        dims: int,
+        nlist: Optional[int] = None,
+        nprobe: int = DEFAULT_ANN_NPROBE,
+        path: Optional[Path] = None,
+        seed: int = 0
+    ):
+        """
+        初始化 IVF 索引
+
+        Args:
+            dims: 向量维度
+            nlist: 倒排列表数（None 表示按 sqrt(N) 自动选择）
+            nprobe: 查询时探测的列表数
+            path: 持久化文件路径（None 表示不持久化）
+            seed: 训练随机种子
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.path = Path(path) if path else None
+        self._rng = np.random.default_rng(seed)
+        super().__init__(dims)
+
+    def _reset(self) -> None:
+        """清空索引状态"""
+        super()._reset()
+        self._centroids: Optional["np.ndarray"] = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists: List["np.ndarray"] = []
+        self._trained_size = 0
+        self._unsaved_changes = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    # ------------------------------------------------------------------
+    # 增量维护
+    # ------------------------------------------------------------------
+
+    def refresh(self, db: sqlite3.Connection) -> None:
+        """与数据库同步，并在需要时（重新）训练质心"""
+        with self._lock:
+            super().refresh(db)
+
+            if self._live_count >= self.MIN_TRAIN_VECTORS and (
+                not self.is_trained
+                or self._live_count >= self._trained_size * self.RETRAIN_GROWTH
+            ):
+                self.train()
+
+    def _ensure_capacity(self, needed: int) -> None:
+        old_capacity = self._matrix.shape[0]
+        super()._ensure_capacity(needed)
+        if self._matrix.shape[0] != old_capacity:
+            assign = np.zeros(self._matrix.shape[0], dtype=np.int32)
+            assign[:self._size] = self._assign[:self._size]
+            self._assign = assign
+
+    def _append(self, block, rowids, chunk_ids, sources) -> None:
+        start = self._size
+        super()._append(block, rowids, chunk_ids, sources)
+        self._unsaved_changes += len(rowids)
+
+        if self.is_trained:
+            rows = np.arange(start, self._size)
+            self._assign[start:self._size] = self._nearest_centroids(block)
+            self._add_to_lists(rows)
+
+    def _sync_deletions(self, db: sqlite3.Connection, count: int) -> None:
+        live_before = self._live_count
+        super()._sync_deletions(db, count)
+        self._unsaved_changes += live_before - self._live_count
+
+    def mark_deleted(self, chunk_ids: List[str], removed_from_db: bool = False) -> int:
+        marked = super().mark_deleted(chunk_ids, removed_from_db)
+        self._unsaved_changes += marked
+        return marked
+
+    def _compact(self) -> "np.ndarray":
+        keep = super()._compact()
+        self._assign = self._assign[keep].copy()
+        if self.is_trained:
+            self._rebuild_lists()
+        return keep
+
+    def _nearest_centroids(self, vectors: "np.ndarray", batch: int = 65536) -> "np.ndarray":
+        """返回每个向量最近的质心编号（分批计算，限制临时内存）"""
+        result = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], batch):
+            scores = vectors[start:start + batch] @ self._centroids.T
+            result[start:start + batch] = np.argmax(scores, axis=1)
+        return result
+
+    def _add_to_lists(self, rows: "np.ndarray") -> None:
+        """将行追加到对应的倒排列表"""
+        assign = self._assign[rows]
+        order = np.argsort(assign, kind="stable")
+        rows = rows[order]
+        assign = assign[order]
+        boundaries = np.flatnonzero(np.diff(assign)) + 1
+        for group in np.split(np.arange(len(rows)), boundaries):
+            if group.size == 0:
+                continue
+            c = assign[group[0]]
+            self._lists[c] = np.concatenate([self._lists[c], rows[group]])
+
+    def _rebuild_lists(self) -> None:
+        """根据分配结果重建全部倒排列表"""
+        nlist = self._centroids.shape[0]
+        assign = self._assign[:self._size]
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=nlist)
+        self._lists = np.split(order, np.cumsum(counts)[:-1])
+
+    def train(self) -> None:
+        """用当前存活向量训练质心（球面 k-means）并重建倒排列表"""
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            n = rows.size
+            if n == 0:
+                return
+
+            nlist = self.nlist or int(math.sqrt(n))
+            nlist = max(1, min(nlist, 4096, n))
+
+            sample_size = min(n, nlist * self.TRAIN_SAMPLES_PER_LIST)
+            sample = self._matrix[self._rng.choice(rows, sample_size, replace=False)]
+            centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+
+            for _ in range(self.TRAIN_ITERATIONS):
+                self._centroids = centroids
+                assign = self._nearest_centroids(sample)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, sample)
+                counts = np.bincount(assign, minlength=nlist)
+
+                # 空列表重新随机取样
+                empty = counts == 0
+                if empty.any():
+                    sums[empty] = sample[self._rng.choice(sample_size, int(empty.sum()))]
+
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                centroids = (sums / norms).astype(np.float32)
+
+            self._centroids = centroids
+            self._assign[:self._size] = self._nearest_centroids(self._matrix[:self._size])
+            self._rebuild_lists()
+            self._trained_size = self._live_count
+            # 训练代价最高，确保下次 save_if_dirty 一定落盘
+            self._unsaved_changes += self.AUTOSAVE_CHANGES
+
+            logger.info(f"IVF 索引训练完成: vectors={n}, nlist={nlist}")
+
+    # ------------------------------------------------------------------
+    # 搜索
+    # ------------------------------------------------------------------
+
+    def top_k(
+        self,
+        query_embedding: List[float],
+        k: int,
+        source_filter: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """近似 top-k（未训练时回退到精确搜索）"""
+        with self._lock:
+            if not self.is_trained:
+                return super().top_k(query_embedding, k, source_filter)
+
+            if k <= 0 or self._size == 0:
+                return []
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(query))
+            if norm > 0:
+                query = query / norm
+
+            nprobe = min(self.nprobe, len(self._lists))
+            centroid_scores = self._centroids @ query
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+            rows = np.concatenate([self._lists[c] for c in probe])
+            mask = self._alive[rows]
+            codes = self._source_codes[rows]
+            if source_filter:
+                wanted = [self._source_code_of[s] for s in source_filter if s in self._source_code_of]
+                mask &= np.isin(codes, wanted)
+            else:
+                mask &= codes >= 0
+            rows = rows[mask]
+            if rows.size == 0:
+                return []
+
+            scores = self._matrix[rows] @ query
+            k = min(k, rows.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+
+            return [(self._chunk_ids[rows[i]], float(scores[i])) for i in top]
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def save(self, path: Optional[Path] = None) -> None:
+        """
+        保存索引（先写临时文件再原子替换）
+
+        Args:
+            path: 保存路径（默认使用初始化时的 path）
+        """
+        path = Path(path) if path else self.path
+        if path is None:
+            return
+
+        with self._lock:
+            size = self._size
+            sources = sorted(self._source_code_of, key=self._source_code_of.get)
+            arrays = {
+                "meta": np.array([
+                    self.FORMAT_VERSION, self.dims, self._max_rowid,
+                    self._trained_size, self._masked_count, self._sequence
+                ], dtype=np.int64),
+                "db_id": np.frombuffer((self._db_id or "").encode("utf-8"), dtype=np.uint8),
+                "matrix": self._matrix[:size],
+                "rowids": self._rowids[:size],
+                "source_codes": self._source_codes[:size],
+                "alive": self._alive[:size],
+                "assign": self._assign[:size],
+                "chunk_ids": np.frombuffer("\0".join(self._chunk_ids).encode("utf-8"), dtype=np.uint8),
+                "sources": np.frombuffer("\0".join(sources).encode("utf-8"), dtype=np.uint8),
+            }
+            if self.is_trained:
+                arrays["centroids"] = self._centroids
+
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+            self._unsaved_changes = 0
+
+    def save_if_dirty(self, min_changes: Optional[int] = None) -> bool:
+        """累计变更达到阈值时保存，返回是否保存"""
+        threshold = self.AUTOSAVE_CHANGES if min_changes is None else min_changes
+        if self.path is None or self._unsaved_changes == 0 or self._unsaved_changes < threshold:
+            return False
+        self.save()
+        return True
+
+    def load(self, path: Optional[Path] = None, db: Optional[sqlite3.Connection] = None) -> bool:
+        """
+        从文件加载索引
+
+        Args:
+            path: 文件路径（默认使用初始化时的 path）
+            db: 索引数据库连接（提供时校验索引文件属于该数据库）
+
+        Returns:
+            是否加载成功（文件不存在、版本或维度不符、数据库标识不符或
+            序列号回退时返回 False）
+        """
+        path = Path(path) if path else self.path
+        if path is None or not path.exists():
+            return False
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                version, dims, max_rowid, trained_size, masked_count, sequence = data["meta"].tolist()
+                if version != self.FORMAT_VERSION or dims != self.dims:
+                    return False
+                db_id = data["db_id"].tobytes().decode("utf-8") or None
+
+                if db is not None:
+                    current_sequence = _vector_sequence(db)
+                    if db_id != read_index_id(db) or (current_sequence or 0) < sequence:
+                        logger.info(f"ANN 索引文件不属于当前数据库，忽略: {path}")
+                        return False
+
+                with self._lock:
+                    self._reset()
+                    size = data["rowids"].shape[0]
+                    self._ensure_capacity(size)
+                    self._matrix[:size] = data["matrix"]
+                    self._rowids[:size] = data["rowids"]
+                    self._source_codes[:size] = data["source_codes"]
+                    self._alive[:size] = data["alive"]
+                    self._assign[:size] = data["assign"]
+                    self._size = size
+
+                    chunk_ids = data["chunk_ids"].tobytes().decode("utf-8")
+                    self._chunk_ids = chunk_ids.split("\0") if size else []
+                    sources = data["sources"].tobytes().decode("utf-8")
+                    self._source_code_of = {
+                        name: code for code, name in enumerate(sources.split("\0")) if sources
+                    }
+                    self._row_of = {
+                        chunk_id: row for row, chunk_id in enumerate(self._chunk_ids)
+                        if self._alive[row]
+                    }
+                    self._live_count = int(self._alive[:size].sum())
+                    self._max_rowid = max_rowid
+                    self._sequence = sequence
+                    self._db_id = db_id
+                    self._trained_size = trained_size
+                    self._masked_count = masked_count
+
+                    if "centroids" in data.files:
+                        self._centroids = data["centroids"]
+                        self._rebuild_lists()
+        except Exception as e:
+            logger.warning(f"加载 ANN 索引失败 {path}: {e}")
+            self._reset()
+            return False
+
+        return True
+
+
+def get_ann_index_path(db_path) -> Path:
+    """ANN 索引文件路径：memory-1.db -> memory-1.ivf.npz"""
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.stem + ANN_INDEX_SUFFIX)
+
+
+# 每个索引文件一个 ANN 索引
+_ann_indexes: Dict[Tuple[str, int], IVFIndex] = {}
+
+
+def get_ann_index(
+    db: sqlite3.Connection,
+    dims: int,
+    nlist: Optional[int] = None,
+    nprobe: int = DEFAULT_ANN_NPROBE
+) -> IVFIndex:
+    """
+    获取索引文件对应的 ANN 索引（首次访问时从 .ivf.npz 加载）
+
+    Args:
+        db: SQLite 数据库连接
+        dims: 向量维度
+        nlist: 倒排列表数（None 表示自动）
+        nprobe: 查询时探测的列表数
+
+    Returns:
+        IVFIndex 实例
+    """
+    path = _db_file_path(db)
+    if path is None:
+        return IVFIndex(dims, nlist=nlist, nprobe=nprobe)
+
+    key = (path, dims)
+    with _vector_matrices_lock:
+        index = _ann_indexes.get(key)
+        if index is None:
+            index = IVFIndex(dims, nlist=nlist, nprobe=nprobe, path=get_ann_index_path(path))
+            index.load(db=db)
+            _ann_indexes[key] = index
+        index.nprobe = nprobe
+        return index
+
+
+def forget_chunks(db: sqlite3.Connection, chunk_ids: List[str]) -> None:
+    """
+    为已删除的块在常驻矩阵和 ANN 索引中打墓碑
+
+    调用方应已从 chunk_vectors 删除对应向量行。
+
+    Args:
+        db: SQLite 数据库连接
+        chunk_ids: 已删除的块 ID 列表
+    """
+    if not chunk_ids:
+        return
+
+    path = _db_file_path(db)
+    if path is None:
+        return
+
+    with _vector_matrices_lock:
+        targets = [
+            index for (p, _), index in (
+                list(_vector_matrices.items())
+                + list(_quantized_matrices.items())
+                + list(_ann_indexes.items())
+            )
+            if p == path
+        ]
+
+    for index in targets:
+        index.mark_deleted(chunk_ids, removed_from_db=True)
+
+
+def sync_ann_index(db: sqlite3.Connection, dims: Optional[int] = None) -> Optional[IVFIndex]:
+    """
+    将新增向量同步到已存在的 ANN 索引
+
+    仅处理已加载或已持久化的 ANN 索引，不会为小索引主动创建。应在写事务
+    提交之后调用；累计变更达到 AUTOSAVE_CHANGES 时才重写索引文件。
+
+    Args:
+        db: SQLite 数据库连接
+        dims: 向量维度（None 表示从 chunk_vectors 推断）
+
+    Returns:
+        同步后的 IVFIndex，不存在时返回 None
+    """
+    path = _db_file_path(db)
+    if path is None or not HAS_NUMPY:
+        return None
+
+    if dims is None:
+        with _vector_matrices_lock:
+            loaded = [d for (p, d) in _ann_indexes if p == path]
+        if loaded:
+            dims = loaded[0]
+        elif get_ann_index_path(path).exists():
+            try:
+                row = db.execute("SELECT dims FROM chunk_vectors LIMIT 1").fetchone()
+            except sqlite3.Error:
+                return None
+            dims = row[0] if row else None
+
+    if dims is None:
+        return None
+
+    with _vector_matrices_lock:
+        loaded = (path, dims) in _ann_indexes
+    if not loaded and not get_ann_index_path(path).exists():
+        return None
+
+    index = get_ann_index(db, dims)
+    index.refresh(db)
+    index.save_if_dirty()
+    return index
+
+
+def clear_ann_indexes() -> None:
+    """清空所有已加载的 ANN 索引（不删除文件）"""
+    with _vector_matrices_lock:
+        _ann_indexes.clear()
+
+
 class VectorSearchEngine:
     """
     向量搜索引擎
@@ -134,7 +1282,11 @@ class VectorSearchEngine:
         self,
         db: sqlite3.Connection,
         dims: int,
-        use_sqlite_vec: bool = True
+        use_sqlite_vec: bool = True,
+        vector_dtype: str = "float32",
+        ann_min_vectors: Optional[int] = DEFAULT_ANN_MIN_VECTORS,
+        ann_nprobe: int = DEFAULT_ANN_NPROBE,
+        compression: Optional[Dict[str, Any]] = None
     ):
         """
         初始化向量搜索引擎
@@ -143,10 +1295,21 @@ class VectorSearchEngine:
             db: SQLite 数据库连接
             dims: 向量维度
             use_sqlite_vec: 是否尝试使用 sqlite-vec
+            vector_dtype: 回退存储的向量精度 (float32, float16)
+            ann_min_vectors: 向量数达到该值后使用 IVF 近似搜索（None 表示禁用）
+            ann_nprobe: IVF 查询时探测的列表数
+            compression: 常驻矩阵压缩配置（None 表示读取 memory.search.compression；
+                启用时代替精确矩阵和 IVF 索引）
         """
         self.db = db
         self.dims = dims
+        self.vector_dtype = vector_dtype
+        self.ann_min_vectors = ann_min_vectors
+        self.ann_nprobe = ann_nprobe
+        self.compression = compression if compression is not None else get_compression_settings()
         self.use_sqlite_vec = use_sqlite_vec and HAS_SQLITE_VEC
+        self._matrix: Optional[VectorMatrix] = None
+        self._refresh_token: Optional[Tuple[int, int]] = None
 
         # 尝试加载 sqlite-vec
         self._vec_loaded = False
@@ -167,6 +1330,13 @@ class VectorSearchEngine:
         else:
             self._ensure_json_table()
 
+    def has_vector_table(self) -> bool:
+        """向量表是否存在（只读检查，不创建）"""
+        row = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunk_vectors'"
+        ).fetchone()
+        return row is not None
+
     def _ensure_vec_table(self) -> None:
         """创建 sqlite-vec 表"""
         # 使用 sqlite-vec 虚拟表
@@ -178,16 +1348,9 @@ class VectorSearchEngine:
         """.format(dims=self.dims))
 
     def _ensure_json_table(self) -> None:
-        """创建 JSON 存储表（回退方案）"""
-        self.db.execute("""
-            CREATE TABLE IF NOT EXISTS chunk_vectors (
-                chunk_id TEXT PRIMARY KEY,
-                embedding TEXT NOT NULL,
-                dims INTEGER NOT NULL,
-                updated_at INTEGER NOT NULL,
-                FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE
-            );
-        """)
+        """创建 BLOB 存储表（回退方案），旧版表迁移为 AUTOINCREMENT rowid"""
+        self.db.execute(CHUNK_VECTORS_TABLE_SQL)
+        migrate_vector_rowids(self.db)
 
         # 创建索引
         self.db.execute("CREATE INDEX IF NOT EXISTS idx_chunk_vectors_updated ON chunk_vectors(updated_at);")
@@ -208,6 +1371,31 @@ class VectorSearchEngine:
         else:
             self._insert_json(chunk_id, embedding)
 
+    def insert_vectors(self, items: List[Tuple[str, List[float]]]) -> None:
+        """
+        批量插入向量
+
+        Args:
+            items: (chunk_id, embedding) 列表
+        """
+        for _, embedding in items:
+            if len(embedding) != self.dims:
+                raise ValueError(f"Embedding dimension mismatch: {len(embedding)} != {self.dims}")
+
+        if self._vec_loaded:
+            for chunk_id, embedding in items:
+                self._insert_vec(chunk_id, embedding)
+            return
+
+        now = int(time.time())
+        self.db.executemany("""
+            INSERT OR REPLACE INTO chunk_vectors (chunk_id, embedding, dims, updated_at)
+            VALUES (?, ?, ?, ?)
+        """, [
+            (chunk_id, encode_vector(embedding, self.vector_dtype), self.dims, now)
+            for chunk_id, embedding in items
+        ])
+
     def _insert_vec(self, chunk_id: str, embedding: List[float]) -> None:
         """使用 sqlite-vec 插入"""
         # sqlite-vec 使用特殊的插入语法
@@ -217,14 +1405,14 @@ class VectorSearchEngine:
         )
 
     def _insert_json(self, chunk_id: str, embedding: List[float]) -> None:
-        """使用 JSON 插入"""
-        embedding_str = ",".join(str(x) for x in embedding)
+        """以二进制格式插入"""
+        embedding_blob = encode_vector(embedding, self.vector_dtype)
         now = int(time.time())
 
         self.db.execute("""
             INSERT OR REPLACE INTO chunk_vectors (chunk_id, embedding, dims, updated_at)
             VALUES (?, ?, ?, ?)
-        """, (chunk_id, embedding_str, self.dims, now))
+        """, (chunk_id, embedding_blob, self.dims, now))
 
     def search(
         self,
@@ -302,7 +1490,103 @@ class VectorSearchEngine:
         limit: int,
         source_filter: Optional[List[str]]
     ) -> List[Dict[str, Any]]:
-        """使用纯 Python 搜索"""
+        """使用常驻向量矩阵搜索（无 numpy 时回退到逐行扫描）"""
+        if not HAS_NUMPY:
+            return self._search_json_scan(query_embedding, limit, source_filter)
+
+        # data_version 反映其他连接的提交，total_changes 反映本连接的写入；
+        # 两者均未变化时跳过刷新探测
+        token = (self.db.execute("PRAGMA data_version").fetchone()[0], self.db.total_changes)
+        if token != self._refresh_token or self._matrix is None:
+            self._matrix = self._select_index()
+            self._matrix.refresh(self.db)
+            if isinstance(self._matrix, IVFIndex):
+                self._matrix.save_if_dirty()
+            self._refresh_token = token
+
+        # 候选中可能有 chunks 表已删除的块，不足时扩大 k 重试
+        k = limit
+        while True:
+            if isinstance(self._matrix, QuantizedVectorMatrix):
+                # 压缩码近似打分，候选用原始向量精确重排
+                candidates = self._matrix.top_k(
+                    query_embedding, k, source_filter, vector_loader=self._load_vectors
+                )
+            else:
+                candidates = self._matrix.top_k(query_embedding, k, source_filter)
+            rows = self._fetch_chunks([chunk_id for chunk_id, _ in candidates])
+
+            results = []
+            missing = []
+            for chunk_id, score in candidates:
+                row = rows.get(chunk_id)
+                if row is None:
+                    missing.append(chunk_id)
+                    continue
+                path, source, start_line, end_line, text = row
+                results.append({
+                    "id": chunk_id,
+                    "path": path,
+                    "source": source,
+                    "start_line": start_line,
+                    "end_line": end_line,
+                    "text": text,
+                    "score": score,
+                    "distance": 1.0 - score
+                })
+
+            if not missing or len(candidates) < k:
+                return results[:limit]
+
+            self._matrix.mark_deleted(missing)
+            k = limit + len(missing)
+
+    def _select_index(self) -> VectorMatrix:
+        """按配置和语料规模选择压缩矩阵、精确矩阵或 IVF 近似索引"""
+        if self.compression.get("enabled"):
+            return get_quantized_matrix(self.db, self.dims, self.compression)
+
+        use_ann = False
+        if self.ann_min_vectors is not None:
+            count = self.db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
+            use_ann = count >= self.ann_min_vectors
+
+        if use_ann:
+            return get_ann_index(self.db, self.dims, nprobe=self.ann_nprobe)
+        return get_vector_matrix(self.db, self.dims)
+
+    def _load_vectors(self, chunk_ids: List[str]) -> Dict[str, "np.ndarray"]:
+        """批量读取原始向量（用于压缩矩阵的精确重排）"""
+        if not chunk_ids:
+            return {}
+
+        placeholders = ', '.join(['?'] * len(chunk_ids))
+        cursor = self.db.execute(
+            f"SELECT chunk_id, embedding FROM chunk_vectors WHERE chunk_id IN ({placeholders})",
+            chunk_ids
+        )
+        return {chunk_id: _parse_vector(embedding) for chunk_id, embedding in cursor.fetchall()}
+
+    def _fetch_chunks(self, chunk_ids: List[str]) -> Dict[str, Tuple]:
+        """批量获取块内容"""
+        if not chunk_ids:
+            return {}
+
+        placeholders = ', '.join(['?'] * len(chunk_ids))
+        cursor = self.db.execute(f"""
+            SELECT id, path, source, start_line, end_line, text
+            FROM chunks
+            WHERE id IN ({placeholders})
+        """, chunk_ids)
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def _search_json_scan(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        source_filter: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """使用纯 Python 逐行扫描搜索"""
         # 获取所有向量
         sql = """
             SELECT
@@ -329,10 +1613,10 @@ class VectorSearchEngine:
         # 计算相似度
         results = []
         for row in cursor.fetchall():
-            chunk_id, path, source, start_line, end_line, text, embedding_str = row
+            chunk_id, path, source, start_line, end_line, text, embedding_value = row
 
-            # 解析向量
-            embedding = [float(x) for x in embedding_str.split(',')]
+            # 解析向量（兼容旧版文本格式）
+            embedding = decode_vector(embedding_value)
 
             # 计算余弦相似度
             similarity = cosine_similarity(query_embedding, embedding)
@@ -353,6 +1637,50 @@ class VectorSearchEngine:
 
         return results[:limit]
 
+    def score_chunks(
+        self,
+        query_embedding: List[float],
+        chunk_ids: List[str]
+    ) -> Dict[str, float]:
+        """
+        计算指定块与查询向量的余弦相似度
+
+        用于补全混合搜索中只被 FTS 召回的块的向量分数。
+
+        Args:
+            query_embedding: 查询向量
+            chunk_ids: 块 ID 列表
+
+        Returns:
+            {chunk_id: 相似度}，没有向量的块不在结果中
+        """
+        if not chunk_ids or not self.has_vector_table():
+            return {}
+
+        placeholders = ', '.join(['?'] * len(chunk_ids))
+        try:
+            rows = self.db.execute(
+                f"SELECT chunk_id, embedding FROM chunk_vectors WHERE chunk_id IN ({placeholders})",
+                chunk_ids
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.debug(f"读取块向量失败: {e}")
+            return {}
+
+        scores = {}
+        for chunk_id, value in rows:
+            try:
+                if self._vec_loaded:
+                    # sqlite-vec 存储为无头部的 float32
+                    embedding = array.array('f', bytes(value)).tolist()
+                else:
+                    embedding = decode_vector(value)
+            except (ValueError, TypeError):
+                continue
+            if len(embedding) == self.dims:
+                scores[chunk_id] = cosine_similarity(query_embedding, embedding)
+        return scores
+
     def delete_by_path(self, path: str) -> None:
         """删除路径的所有向量"""
         if self._vec_loaded:
@@ -381,8 +1709,11 @@ class HybridSearchEngine:
         fts_table: str = "chunks_fts",
         fts_weight: float = 0.3,
         vec_weight: float = 0.7,
-        normalize_method: str = "minmax",
-        use_sqlite_vec: bool = True
+        normalize_method: str = "max",
+        use_sqlite_vec: bool = True,
+        ann_min_vectors: Optional[int] = DEFAULT_ANN_MIN_VECTORS,
+        ann_nprobe: int = DEFAULT_ANN_NPROBE,
+        compression: Optional[Dict[str, Any]] = None
     ):
         """
         初始化混合搜索引擎
@@ -393,8 +1724,11 @@ class HybridSearchEngine:
             fts_table: FTS 表名
             fts_weight: FTS 权重
             vec_weight: 向量权重
-            normalize_method: 归一化方法
+            normalize_method: BM25 相关度的归一化方法（默认按最佳结果缩放）
             use_sqlite_vec: 是否尝试使用 sqlite-vec
+            ann_min_vectors: 向量数达到该值后使用 IVF 近似搜索（None 表示禁用）
+            ann_nprobe: IVF 查询时探测的列表数
+            compression: 常驻矩阵压缩配置（None 表示读取配置文件）
         """
         self.db = db
         self.dims = dims
@@ -402,39 +1736,94 @@ class HybridSearchEngine:
         self.fts_weight = fts_weight
         self.vec_weight = vec_weight
         self.normalize_method = normalize_method
+        self._has_cjk_index = False
 
         # 创建向量搜索引擎
-        self.vec_engine = VectorSearchEngine(db, dims=dims, use_sqlite_vec=use_sqlite_vec)
+        self.vec_engine = VectorSearchEngine(
+            db,
+            dims=dims,
+            use_sqlite_vec=use_sqlite_vec,
+            ann_min_vectors=ann_min_vectors,
+            ann_nprobe=ann_nprobe,
+            compression=compression
+        )
 
     def search(
         self,
         query: str,
         query_embedding: List[float],
         limit: int = 10,
-        source_filter: Optional[List[str]] = None
+        source_filter: Optional[List[str]] = None,
+        fts_weight: Optional[float] = None,
+        vec_weight: Optional[float] = None,
+        min_score: float = 0.0
     ) -> List[Dict[str, Any]]:
         """
         混合搜索
 
+        FTS 分数为 bm25() 相关度按本次查询归一化的结果，向量分数为余弦
+        相似度，两者用 combine_scores 加权融合。候选数从 limit 开始按倍数
+        扩大：两路候选中未取到的块的融合分数不会超过 (FTS 末位分数,
+        向量末位分数) 的加权和，当第 limit 个结果不低于这个上界、或上界
+        已低于 min_score 时停止扩大。
+
+        查询向量只作为参数参与计算，不写入数据库。
+
         Args:
             query: 文本查询 (用于 FTS)
             query_embedding: 查询向量 (用于向量搜索)
             limit: 返回结果数量
             source_filter: 来源过滤
+            fts_weight: 本次查询的 FTS 权重（None 使用实例默认值）
+            vec_weight: 本次查询的向量权重（None 使用实例默认值）
+            min_score: 最小融合分数，低于此值的结果不返回
 
         Returns:
-            搜索结果列表
+            搜索结果列表（按 score 降序）
         """
-        # FTS 搜索
-        fts_results = self._search_fts(query, limit * 2, source_filter)
+        fts_weight = self.fts_weight if fts_weight is None else fts_weight
+        vec_weight = self.vec_weight if vec_weight is None else vec_weight
+        total = fts_weight + vec_weight
+        if total <= 0:
+            fts_weight, vec_weight = self.fts_weight, self.vec_weight
+            total = fts_weight + vec_weight
+        fts_weight, vec_weight = fts_weight / total, vec_weight / total
+
+        # 向量表不存在时仅使用 FTS（FTS 分数不再按权重折算）
+        has_vectors = self.vec_engine.has_vector_table()
+        if not has_vectors:
+            fts_weight, vec_weight = 1.0, 0.0
+        fan_out = max(1, limit)
+
+        while True:
+            fts_results = self._search_fts(query, fan_out, source_filter)
+            vec_results = (
+                self.vec_engine.search(query_embedding, fan_out, source_filter)
+                if has_vectors else []
+            )
+            combined = self._combine_results(
+                query, query_embedding, fts_results, vec_results, fts_weight, vec_weight
+            )
 
-        # 向量搜索
-        vec_results = self.vec_engine.search(query_embedding, limit * 2, source_filter)
+            fts_done = len(fts_results) < fan_out
+            vec_done = not has_vectors or len(vec_results) < fan_out
+            if (fts_done and vec_done) or fan_out >= HYBRID_MAX_CANDIDATES:
+                break
 
-        # 合并结果
-        combined = self._combine_results(fts_results, vec_results, limit)
+            # 未取到的块的分数上界
+            bound = 0.0
+            if not fts_done and fts_results:
+                bound += fts_weight * fts_results[-1]["fts_score"]
+            if not vec_done and vec_results:
+                bound += vec_weight * max(0.0, vec_results[-1]["score"])
+            if bound < min_score:
+                break
+            if len(combined) >= limit and combined[limit - 1]["score"] >= bound:
+                break
 
-        return combined
+            fan_out = min(fan_out * HYBRID_FANOUT_FACTOR, HYBRID_MAX_CANDIDATES)
+
+        return [r for r in combined if r["score"] >= min_score][:limit]
 
     def _search_fts(
         self,
@@ -442,27 +1831,45 @@ class HybridSearchEngine:
         limit: int,
         source_filter: Optional[List[str]]
     ) -> List[Dict[str, Any]]:
-        """FTS 搜索"""
+        """
+        FTS 搜索（中文查询改写后走 CJK 影子表）
+
+        结果按 bm25 排序，fts_score 为按最佳结果归一化的相关度。
+        """
+        fts_table, match_query = self._resolve_fts_query(query)
         sql = """
             SELECT chunks.id, chunks.path, chunks.source,
-                   chunks.start_line, chunks.end_line, chunks.text
+                   chunks.start_line, chunks.end_line, chunks.text,
+                   bm25({fts_table})
             FROM {fts_table}
             JOIN chunks ON chunks.rowid = {fts_table}.rowid
             WHERE {fts_table} MATCH ?
-        """.format(fts_table=self.fts_table)
-        params = [query]
+        """.format(fts_table=fts_table)
+        params = [match_query]
 
         if source_filter:
             placeholders = ', '.join(['?'] * len(source_filter))
             sql += " AND chunks.source IN ({})".format(placeholders)
             params.extend(source_filter)
 
-        sql += " LIMIT ?"
+        sql += " ORDER BY bm25({}) LIMIT ?".format(fts_table)
         params.append(limit)
 
-        cursor = self.db.execute(sql, params)
+        try:
+            rows = self.db.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            # 查询包含 FTS5 语法字符（如 "-"、":"），按普通词重试
+            quoted = build_cjk_match(query)
+            if not quoted or quoted == match_query:
+                return []
+            params[0] = quoted
+            rows = self.db.execute(sql, params).fetchall()
+
+        relevances = normalize_scores(
+            [bm25_relevance(row[6]) for row in rows], method=self.normalize_method
+        )
         results = []
-        for row in cursor.fetchall():
+        for row, relevance in zip(rows, relevances):
             results.append({
                 "id": row[0],
                 "path": row[1],
@@ -470,84 +1877,109 @@ class HybridSearchEngine:
                 "start_line": row[3],
                 "end_line": row[4],
                 "text": row[5],
-                "fts_score": 0.0,  # 稍后填充
+                "bm25": row[6],
+                "fts_score": relevance,
                 "vec_score": 0.0
             })
 
         return results
 
+    def _fts_relevance(self, query: str, chunk_ids: List[str]) -> Dict[str, float]:
+        """计算指定块的 bm25 相关度（未匹配的块不在结果中）"""
+        if not chunk_ids:
+            return {}
+
+        fts_table, match_query = self._resolve_fts_query(query)
+        placeholders = ', '.join(['?'] * len(chunk_ids))
+        sql = """
+            SELECT chunks.id, bm25({fts_table})
+            FROM {fts_table}
+            JOIN chunks ON chunks.rowid = {fts_table}.rowid
+            WHERE {fts_table} MATCH ? AND chunks.id IN ({placeholders})
+        """.format(fts_table=fts_table, placeholders=placeholders)
+        try:
+            rows = self.db.execute(sql, [match_query] + list(chunk_ids)).fetchall()
+        except sqlite3.OperationalError:
+            return {}
+        return {chunk_id: bm25_relevance(rank) for chunk_id, rank in rows}
+
+    def _resolve_fts_query(self, query: str) -> Tuple[str, str]:
+        """选择 FTS 表并生成 MATCH 表达式"""
+        if contains_cjk(query):
+            if not self._has_cjk_index:
+                self._has_cjk_index = has_cjk_index(self.db)
+            match_query = build_cjk_match(query) if self._has_cjk_index else None
+            if match_query:
+                return CJK_FTS_TABLE, match_query
+        return self.fts_table, query
+
     def _combine_results(
         self,
+        query: str,
+        query_embedding: List[float],
         fts_results: List[Dict[str, Any]],
         vec_results: List[Dict[str, Any]],
-        limit: int
+        fts_weight: float,
+        vec_weight: float
     ) -> List[Dict[str, Any]]:
         """
         合并 FTS 和向量结果
 
-        使用 Reciprocal Rank Fusion (RRF) 算法
-        """
-        # 创建结果映射
-        result_map = {}
-
-        # 处理 FTS 结果
-        for rank, result in enumerate(fts_results):
-            chunk_id = result["id"]
-            if chunk_id not in result_map:
-                result_map[chunk_id] = result.copy()
-                result_map[chunk_id]["fts_score"] = 0.0
-                result_map[chunk_id]["vec_score"] = 0.0
+        只出现在一路候选中的块，另一路分数按需补算（FTS 用 bm25，
+        向量用余弦相似度），保证融合分数与候选数无关。
 
-            # RRF 分数: 1 / (k + rank)，k 通常为 60
-            k = 60
-            result_map[chunk_id]["fts_score"] = 1.0 / (k + rank + 1)
-
-        # 处理向量结果
-        for rank, result in enumerate(vec_results):
-            chunk_id = result["id"]
-            if chunk_id not in result_map:
-                result_map[chunk_id] = {
+        Returns:
+            全部候选，按 score 降序
+        """
+        result_map: Dict[str, Dict[str, Any]] = {}
+        relevances = {}
+        for result in fts_results:
+            result_map[result["id"]] = result.copy()
+            relevances[result["id"]] = bm25_relevance(result["bm25"])
+
+        vec_scores = {}
+        for result in vec_results:
+            vec_scores[result["id"]] = max(0.0, result["score"])
+            if result["id"] not in result_map:
+                result_map[result["id"]] = {
                     "id": result["id"],
                     "path": result["path"],
                     "source": result["source"],
                     "start_line": result["start_line"],
                     "end_line": result["end_line"],
                     "text": result["text"],
-                    "fts_score": 0.0,
-                    "vec_score": 0.0
                 }
 
-            # 向量分数使用余弦相似度 + RRF
-            k = 60
-            vec_rrf = 1.0 / (k + rank + 1)
-            result_map[chunk_id]["vec_score"] = vec_rrf
-
-        # 归一化分数
-        fts_scores = [r["fts_score"] for r in result_map.values()]
-        vec_scores = [r["vec_score"] for r in result_map.values()]
-
-        if fts_scores:
-            fts_normalized = normalize_scores(fts_scores, method=self.normalize_method)
-        else:
-            fts_normalized = []
-
-        if vec_scores:
-            vec_normalized = normalize_scores(vec_scores, method=self.normalize_method)
-        else:
-            vec_normalized = []
+        # 补算缺失的一路分数
+        if vec_results:
+            missing_vec = [cid for cid in result_map if cid not in vec_scores]
+            for chunk_id, score in self.vec_engine.score_chunks(query_embedding, missing_vec).items():
+                vec_scores[chunk_id] = max(0.0, score)
+        if fts_results:
+            missing_fts = [cid for cid in result_map if cid not in relevances]
+            relevances.update(self._fts_relevance(query, missing_fts))
 
-        # 组合分数
+        # BM25 相关度按本次查询归一化（未匹配的块为 0）
         results = list(result_map.values())
-        for i, result in enumerate(results):
-            result["combined_score"] = (
-                result["fts_score"] * self.fts_weight +
-                result["vec_score"] * self.vec_weight
-            )
-            result["score"] = result["combined_score"]  # 主要分数
+        fts_scores = normalize_scores(
+            [relevances.get(r["id"], 0.0) for r in results], method=self.normalize_method
+        )
+        for result, fts_score in zip(results, fts_scores):
+            result["fts_score"] = fts_score
+            result["vec_score"] = vec_scores.get(result["id"], 0.0)
+
+        combined = combine_scores(
+            [r["fts_score"] for r in results],
+            [r["vec_score"] for r in results],
+            fts_weight=fts_weight,
+            vec_weight=vec_weight
+        )
+        for result, score in zip(results, combined):
+            result["combined_score"] = score
+            result["score"] = score  # 主要分数
 
-        # 排序并限制结果
         results.sort(key=lambda x: x["combined_score"], reverse=True)
-        return results[:limit]
+        return results
 
     def ensure_vector_tables(self) -> None:
         """确保向量表已创建"""
@@ -560,3 +1992,4 @@ class HybridSearchEngine:
     def delete_by_path(self, path: str) -> None:
         """删除路径的所有向量"""
         self.vec_engine.delete_by_path(path)
+
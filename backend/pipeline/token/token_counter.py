@@ -45,11 +45,14 @@ class TikTokenCounter(TokenCounter):
         """
         self.model = model
         self._tokenizer = None
+        # Don't retry a failed encoding load on every call: tiktoken
+        # serializes loads behind a global lock
+        self._load_failed = False
 
     @property
     def tokenizer(self):
-        """Lazy load tokenizer."""
-        if self._tokenizer is None:
+        """Lazy load tokenizer (None if the encoding could not be loaded)."""
+        if self._tokenizer is None and not self._load_failed:
             try:
                 import tiktoken
                 # Try to get encoding for model
@@ -63,16 +66,21 @@ class TikTokenCounter(TokenCounter):
                     "tiktoken is required for token counting. "
                     "Install with: pip install tiktoken"
                 )
+            except Exception:
+                # Encoding download failed (e.g. offline host)
+                self._load_failed = True
         return self._tokenizer
 
     def count_tokens(self, text: str) -> int:
         """Count tokens using tiktoken."""
         try:
-            tokens = self.tokenizer.encode(text)
-            return len(tokens)
+            tokenizer = self.tokenizer
+            if tokenizer is not None:
+                return len(tokenizer.encode(text))
         except Exception:
-            # Fallback to approximate count
-            return len(text) // 4
+            pass
+        # Fallback to approximate count
+        return len(text) // 4
 
 
 class AnthropicTokenCounter(TokenCounter):
@@ -146,6 +146,9 @@ class MemoryFlushConfig(BaseModel):
     llm_model: str = Field(default="glm-4.7-flash", description="LLM 提取模型")
     llm_timeout: int = Field(default=30, description="LLM 超时（秒）")
     compaction_keep_recent: int = Field(default=10, description="压缩对话时保留最近的消息数量")
+    background: bool = Field(default=True, description="是否在后台线程中提取并写入记忆")
+    background_workers: int = Field(default=2, description="后台同时执行的提取任务数")
+    background_max_pending: int = Field(default=16, description="后台排队 + 执行中的任务上限")
 
 
 class MemorySearchChunkingConfig(BaseModel):
@@ -170,6 +173,52 @@ class MemorySearchHybridConfig(BaseModel):
     text_weight: float = Field(default=0.3, description="文本搜索权重")
 
 
+class MemorySearchAnnConfig(BaseModel):
+    """记忆搜索近似最近邻 (IVF) 配置"""
+
+    enabled: bool = Field(default=True, description="是否启用 ANN 索引")
+    min_vectors: int = Field(default=50000, description="向量数达到该值后使用 ANN 索引")
+    nprobe: int = Field(default=16, description="每次查询探测的倒排列表数")
+
+
+class MemorySearchCompressionConfig(BaseModel):
+    """记忆搜索向量压缩配置"""
+
+    enabled: bool = Field(default=False, description="是否压缩常驻向量矩阵")
+    reduction: str = Field(default="pca", description="降维方法 (none, pca, random)")
+    target_dims: int = Field(default=256, description="降维后的维度")
+    quantization: str = Field(default="int8", description="量化方法 (none, int8, pq)")
+    pq_subvectors: int = Field(default=32, description="PQ 子空间数（每个向量的字节数）")
+    rerank_factor: int = Field(default=4, description="精确重排的候选倍数")
+    min_train_vectors: int = Field(default=1024, description="开始压缩的最少向量数")
+
+
+class MemorySearchEmbeddingQueueConfig(BaseModel):
+    """记忆搜索嵌入队列配置"""
+
+    flush_interval_ms: int = Field(default=50, description="未攒满一批时的最长等待（毫秒）")
+    max_concurrent_batches: int = Field(default=2, description="最大并发批次数")
+    max_pending: int = Field(default=10000, description="排队文本数上限（背压阈值）")
+
+
+class MemorySearchRuntimeConfig(BaseModel):
+    """本地嵌入模型运行时配置"""
+
+    preload: bool = Field(default=True, description="API 启动时预加载嵌入模型")
+    backend: str = Field(default="torch", description="推理后端 (torch, onnx)")
+    quantize: bool = Field(default=False, description="ONNX 后端使用动态 int8 量化模型")
+    batch_window_ms: float = Field(default=5.0, description="微批窗口（毫秒）")
+    max_batch_size: int = Field(default=64, description="单次前向计算的最大文本数")
+
+
+class MemorySearchResultCacheConfig(BaseModel):
+    """记忆搜索结果缓存配置"""
+
+    enabled: bool = Field(default=True, description="是否启用搜索结果缓存")
+    max_entries: int = Field(default=1024, description="最大缓存条目数")
+    max_mb: float = Field(default=16.0, description="缓存占用上限（MB）")
+
+
 class MemorySearchConfig(BaseModel):
     """Memory Search 配置"""
 
@@ -189,6 +238,26 @@ class MemorySearchConfig(BaseModel):
         default_factory=MemorySearchHybridConfig,
         description="混合搜索配置"
     )
+    ann: MemorySearchAnnConfig = Field(
+        default_factory=MemorySearchAnnConfig,
+        description="近似最近邻索引配置"
+    )
+    compression: MemorySearchCompressionConfig = Field(
+        default_factory=MemorySearchCompressionConfig,
+        description="向量压缩配置"
+    )
+    embedding_queue: MemorySearchEmbeddingQueueConfig = Field(
+        default_factory=MemorySearchEmbeddingQueueConfig,
+        description="嵌入队列配置"
+    )
+    result_cache: MemorySearchResultCacheConfig = Field(
+        default_factory=MemorySearchResultCacheConfig,
+        description="搜索结果缓存配置"
+    )
+    runtime: MemorySearchRuntimeConfig = Field(
+        default_factory=MemorySearchRuntimeConfig,
+        description="本地嵌入模型运行时配置"
+    )
 
 
 class MemoryWatcherConfig(BaseModel):
@@ -199,8 +268,15 @@ class MemoryWatcherConfig(BaseModel):
         default_factory=lambda: ["./memory"],
         description="监听的路径列表"
     )
-    debounce_seconds: float = Field(default=2.0, description="防抖秒数")
-    check_interval_seconds: float = Field(default=5.0, description="检查间隔秒数")
+    debounce_seconds: float = Field(default=0.5, description="防抖秒数")
+    check_interval_seconds: float = Field(
+        default=5.0,
+        description="检查间隔秒数（stat 扫描回退的扫描间隔）"
+    )
+    backend: str = Field(
+        default="auto",
+        description="事件源: auto（优先 inotify）、inotify、poll（stat 扫描）"
+    )
 
 
 class MemoryIndexRotationConfig(BaseModel):
@@ -210,6 +286,8 @@ class MemoryIndexRotationConfig(BaseModel):
     max_size_mb: float = Field(default=50.0, description="单个索引文件最大大小（MB）")
     index_prefix: str = Field(default="memory", description="索引文件前缀")
     index_dir: str = Field(default="memory/.index", description="索引目录")
+    search_workers: int = Field(default=8, description="并发搜索的分片数")
+    connections_per_shard: int = Field(default=2, description="每个分片的只读连接上限")
 
 
 class MemoryConfig(BaseModel):
@@ -259,6 +337,12 @@ class APIConfig(BaseModel):
     workers: int = Field(default=1, description="工作进程数")
     reload: bool = Field(default=False, description="是否自动重载")
     cors_origins: list[str] = Field(default_factory=lambda: ["http://localhost:3000"], description="CORS 允许的源")
+    agent_sync_workers: int = Field(default=16, description="异步 Agent 调用中同步工具和后处理的线程数")
+    agent_pool_size: int = Field(default=8, description="按 (模型, API Key, 配置) 复用的 Agent 实例数上限")
+    agent_pool_warmup_models: list[str] = Field(default_factory=list, description="启动时预构建的 Agent 模型列表")
+    checkpoint_backend: str = Field(default="sqlite", description="对话检查点存储: sqlite（存储目录下持久化）或 memory")
+    checkpoint_keep_per_thread: int = Field(default=20, description="每个对话保留的最近检查点数（0 表示不清理）")
+    checkpoint_hot_threads: int = Field(default=256, description="内存中缓存最新检查点的对话数")
 
 
 class Config(BaseModel):
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+动态 Agent 构建耗时基准测试
+
+请求指定 model / api_key 时每个请求需要一个对应的 BAAgent，对比：
+- rebuild: 每次完整构建（BAAgent.__new__ + __init__，改造前的做法）
+- derive: 从默认 Agent 派生（实例池未命中时的构建路径）
+- pool hit: 实例池命中
+
+用法:
+    python scripts/benchmark_agent_pool.py
+    python scripts/benchmark_agent_pool.py --requests 50
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.api.services.ba_agent import BAAgentService
+
+
+def timed(func, requests: int):
+    """执行 requests 次，返回每次耗时（毫秒）"""
+    durations = []
+    for i in range(requests):
+        start = time.perf_counter()
+        agent = func(i)
+        durations.append((time.perf_counter() - start) * 1000)
+        if agent is not None and agent.memory_watcher is not None:
+            agent.shutdown()
+    return durations
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="动态 Agent 构建耗时基准测试")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--model", default="claude-sonnet-4-5-20250929")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+
+    service = BAAgentService()
+    start = time.perf_counter()
+    service.initialize()
+    print(f"默认 Agent 初始化: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    config = service._request_agent_config(args.model)
+    modes = [
+        ("rebuild", lambda i: service._build_standalone_agent(config, f"sk-{i}")),
+        ("derive", lambda i: service.agent.derive(config, f"sk-{i}")),
+        ("pool hit", lambda i: service._create_agent_for_request(args.model, "sk-same")),
+    ]
+
+    print(f"{args.requests} 次请求，单次构建耗时 (ms)")
+    print(f"{'mode':>10} {'mean':>9} {'p50':>9} {'max':>9}")
+    for name, func in modes:
+        durations = timed(func, args.requests)
+        if name == "pool hit":
+            # 第一次为未命中
+            durations = durations[1:]
+        print(f"{name:>10} {statistics.mean(durations):>9.3f} {statistics.median(durations):>9.3f} "
+              f"{max(durations):>9.3f}")
+
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Agent 流式查询首字节时间基准测试
+
+用本地桩 LLM（首字延迟 + 逐字输出，首轮请求一次同步工具）对比：
+- query: BAAgentService.query，整个多轮工具循环结束后才有响应
+- stream: BAAgentService.stream_query，记录首个事件（首字节）、首个工具事件、
+  首个 token 和 final 事件的时间
+
+用法:
+    python scripts/benchmark_agent_stream.py
+    python scripts/benchmark_agent_stream.py --llm-delay 1.0 --tool-delay 2.0 --runs 5
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, List
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+
+from backend.agents.agent import BAAgent
+from backend.api.services.ba_agent import BAAgentService
+
+
+REPLY = "本月 GMV 为 42 万，环比增长 12%，主要来自新客。"
+
+
+class StubChatModel(BaseChatModel):
+    """桩 LLM：首字延迟后逐字输出，首轮请求一次 lookup 工具调用"""
+
+    delay: float = 0.5
+    token_interval: float = 0.01
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        if not isinstance(messages[-1], ToolMessage):
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": "lookup", "args": {"query": "gmv"}, "id": "call_1"}],
+            )
+        return AIMessage(content=REPLY)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.delay + self.token_interval * len(REPLY))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.delay + self.token_interval * len(REPLY))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        await asyncio.sleep(self.delay)
+        message = self._message(messages)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": "lookup", "args": '{"query": "gmv"}', "id": "call_1", "index": 0}],
+            ))
+            return
+        for char in message.content:
+            await asyncio.sleep(self.token_interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=char))
+
+
+TOOL_DELAY = {"seconds": 1.0}
+
+
+@tool
+def lookup(query: str) -> str:
+    """同步工具（模拟 SQL 查询）"""
+    time.sleep(TOOL_DELAY["seconds"])
+    return f"{query}=42"
+
+
+async def measure(service: BAAgentService, runs: int) -> dict:
+    """分别测量 query 和 stream_query 的各阶段时间（取平均，单位秒）"""
+    query_total = []
+    marks = {"first_byte": [], "tool_start": [], "first_token": [], "final": []}
+
+    for i in range(runs):
+        start = time.perf_counter()
+        await service.query(f"问题{i}")
+        query_total.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        seen = {}
+        async for event in service.stream_query(f"问题{i}"):
+            elapsed = time.perf_counter() - start
+            seen.setdefault("first_byte", elapsed)
+            if event["event"] == "tool_start":
+                seen.setdefault("tool_start", elapsed)
+            elif event["event"] == "token":
+                seen.setdefault("first_token", elapsed)
+            elif event["event"] == "final":
+                seen["final"] = elapsed
+        for key in marks:
+            marks[key].append(seen.get(key, float("nan")))
+
+    average = lambda values: sum(values) / len(values)
+    return {"query": average(query_total), **{k: average(v) for k, v in marks.items()}}
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Agent 流式查询首字节时间基准测试")
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="桩 LLM 首字延迟（秒）")
+    parser.add_argument("--tool-delay", type=float, default=1.0, help="同步工具耗时（秒）")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+    TOOL_DELAY["seconds"] = args.tool_delay
+
+    agent = BAAgent(tools=[lookup], system_prompt="基准测试助手")
+    agent.llm = StubChatModel(delay=args.llm_delay)
+    agent._monitoring_enabled = False
+    service = BAAgentService(model_name="stub")
+    service._ba_agent = agent
+
+    stats = asyncio.run(measure(service, args.runs))
+
+    print(f"LLM 首字 {args.llm_delay}s × 2 轮 + 同步工具 {args.tool_delay}s，{args.runs} 次平均")
+    print(f"{'':>14} {'first byte(s)':>14} {'tool_start(s)':>14} {'first token(s)':>15} {'complete(s)':>12}")
+    print(f"{'query':>14} {stats['query']:>14.3f} {'-':>14} {'-':>15} {stats['query']:>12.3f}")
+    print(f"{'query/stream':>14} {stats['first_byte']:>14.3f} {stats['tool_start']:>14.3f} "
+          f"{stats['first_token']:>15.3f} {stats['final']:>12.3f}")
+
+    agent.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+ANN 向量搜索基准测试
+
+对比 IVF 近似索引与常驻矩阵精确搜索：
+- exact: VectorMatrix 全量矩阵-向量乘法
+- ivf: IVFIndex 只扫描 nprobe 个倒排列表
+
+报告训练耗时、单次查询延迟以及 recall@k（以精确搜索结果为基准）。
+数据为带噪声的聚类向量，近似真实嵌入的分布。
+
+用法:
+    python scripts/benchmark_ann_search.py
+    python scripts/benchmark_ann_search.py --sizes 100000 1000000 --nprobe 8 16 32
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.memory.schema import ensure_memory_index_schema
+from backend.memory.vector_format import encode_vector
+from backend.memory.vector_search import IVFIndex, VectorMatrix, VectorSearchEngine
+
+
+def build_index(db_path: Path, size: int, dims: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """生成包含 size 个聚类向量的索引文件，返回聚类中心"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dims)).astype(np.float32)
+    db = sqlite3.connect(db_path)
+    ensure_memory_index_schema(db, fts_enabled=False)
+    VectorSearchEngine(db, dims=dims, use_sqlite_vec=False).ensure_vector_tables()
+
+    batch = 10000
+    now = int(time.time())
+    for start in range(0, size, batch):
+        end = min(start + batch, size)
+        labels = rng.integers(0, clusters, end - start)
+        vectors = centers[labels] + 1.0 * rng.standard_normal((end - start, dims)).astype(np.float32)
+
+        db.executemany(
+            "INSERT INTO chunks (id, path, source, start_line, end_line, hash, text, updated_at) "
+            "VALUES (?, ?, 'memory', 1, 1, '', ?, ?)",
+            [(f"c{i}", f"memory/{i % 365}.md", f"chunk {i}", now) for i in range(start, end)]
+        )
+        db.executemany(
+            "INSERT INTO chunk_vectors (chunk_id, embedding, dims, updated_at) VALUES (?, ?, ?, ?)",
+            [(f"c{i}", encode_vector(vec), dims, now)
+             for i, vec in zip(range(start, end), vectors)]
+        )
+    db.commit()
+    db.close()
+    return centers
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="ANN 向量搜索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>10} {'index':>10} {'build(ms)':>10} {'query(ms)':>10} {f'recall@{args.k}':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            db_path = Path(tmp) / f"bench-{size}.db"
+            centers = build_index(db_path, size, args.dims, args.clusters)
+            db = sqlite3.connect(db_path)
+
+            rng = np.random.default_rng(1)
+            queries = centers[rng.integers(0, args.clusters, args.queries)]
+            queries = queries + 1.0 * rng.standard_normal(queries.shape).astype(np.float32)
+            queries = [q.tolist() for q in queries]
+
+            start = time.perf_counter()
+            exact = VectorMatrix(args.dims)
+            exact.refresh(db)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            truth = [{c for c, _ in exact.top_k(q, args.k)} for q in queries]
+            query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{size:>10} {'exact':>10} {build_ms:>10.0f} {query_ms:>10.2f} {1.0:>10.3f}")
+
+            start = time.perf_counter()
+            ivf = IVFIndex(args.dims)
+            ivf.refresh(db)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            for nprobe in args.nprobe:
+                ivf.nprobe = nprobe
+                start = time.perf_counter()
+                found = [{c for c, _ in ivf.top_k(q, args.k)} for q in queries]
+                query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+                recall = sum(len(t & f) for t, f in zip(truth, found)) / (args.k * len(queries))
+                print(f"{size:>10} {f'ivf/{nprobe}':>10} {build_ms:>10.0f} {query_ms:>10.2f} {recall:>10.3f}")
+
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
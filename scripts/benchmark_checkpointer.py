@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+对话检查点存储基准测试
+
+模拟 N 个对话、每个对话若干轮（每轮写入 input / agent / tools 三个检查点，
+消息列表逐轮增长），对比：
+- memory: MemorySaver（改造前，保存全部检查点，常驻内存）
+- sqlite: BoundedSqliteSaver（WAL 持久化，每个对话保留最近 K 个检查点，LRU 热线程缓存）
+
+每种存储在独立子进程中运行，报告：
+- 写入后的 Python 堆内存（tracemalloc）和进程 RSS 增量
+- 每轮检查点写入耗时（p50 / p99）
+- 继续已有对话时读取最新检查点的耗时
+- 数据库文件大小
+
+用法:
+    python scripts/benchmark_checkpointer.py
+    python scripts/benchmark_checkpointer.py --conversations 10000 --turns 3 --keep 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.memory import MemorySaver
+
+from backend.agents.checkpointer import BoundedSqliteSaver
+
+
+STEPS_PER_TURN = ("input", "agent", "tools")
+
+
+def rss_mb() -> float:
+    """当前进程 RSS（MB，仅 Linux 的 /proc 可用时精确）"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_saver(backend: str, db_path: Path, keep: int, hot: int):
+    if backend == "memory":
+        return MemorySaver()
+    saver = BoundedSqliteSaver.open(db_path, keep_checkpoints=keep, hot_threads=hot)
+    saver.setup()
+    return saver
+
+
+def run_turn(saver, thread_id: str, messages: list, turn: int, parent_id):
+    """写入一轮对话的检查点，返回 (最新 checkpoint_id, 耗时秒)"""
+    start = time.perf_counter()
+    for step, source in enumerate(STEPS_PER_TURN):
+        if source == "input":
+            messages.append(HumanMessage(content=f"第 {turn} 轮问题：上个月各渠道的 GMV 和转化率分别是多少？"))
+        else:
+            messages.append(AIMessage(content=f"第 {turn} 轮 {source} 输出：" + "渠道数据分析结果。" * 20))
+        checkpoint = empty_checkpoint()
+        checkpoint["id"] = str(uuid6())
+        checkpoint["channel_values"] = {"messages": list(messages), "conversation_id": thread_id}
+        checkpoint["channel_versions"] = {"messages": turn * 3 + step + 1}
+        config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+        if parent_id:
+            config["configurable"]["checkpoint_id"] = parent_id
+        saved = saver.put(
+            config, checkpoint, {"source": "loop", "step": turn * 3 + step}, checkpoint["channel_versions"]
+        )
+        parent_id = saved["configurable"]["checkpoint_id"]
+    return parent_id, time.perf_counter() - start
+
+
+def worker(backend: str, args, queue) -> None:
+    """在子进程中运行一种存储"""
+    tmp_dir = Path(tempfile.mkdtemp(prefix="ba-checkpoint-bench-"))
+    db_path = tmp_dir / "agent_checkpoints.db"
+
+    rss_before = rss_mb()
+    tracemalloc.start()
+    saver = make_saver(backend, db_path, args.keep, args.hot)
+
+    turn_latencies = []
+    for turn in range(args.turns):
+        for conv in range(args.conversations):
+            thread_id = f"conv_{conv}"
+            # 以检查点内容重建消息列表（与 Agent 继续对话时相同）
+            previous = saver.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+            messages = list(previous.checkpoint["channel_values"]["messages"]) if previous else []
+            parent_id = previous.config["configurable"]["checkpoint_id"] if previous else None
+            _, elapsed = run_turn(saver, thread_id, messages, turn, parent_id)
+            turn_latencies.append(elapsed * 1000)
+
+    heap_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+    rss_delta = rss_mb() - rss_before
+
+    # 继续对话时读取最新检查点：最近活跃的对话（热）和最早的对话（冷）
+    read_ms = {}
+    for label, conv in (("hot", args.conversations - 1), ("cold", 0)):
+        config = {"configurable": {"thread_id": f"conv_{conv}", "checkpoint_ns": ""}}
+        start = time.perf_counter()
+        saver.get_tuple(config)
+        read_ms[label] = (time.perf_counter() - start) * 1000
+
+    db_mb = 0.0
+    if backend == "sqlite":
+        saver.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db_mb = db_path.stat().st_size / 1024 / 1024
+        saver.close()
+
+    turn_latencies.sort()
+    queue.put({
+        "backend": backend,
+        "heap_mb": heap_mb,
+        "rss_mb": rss_delta,
+        "db_mb": db_mb,
+        "p50": statistics.median(turn_latencies),
+        "p99": turn_latencies[int(len(turn_latencies) * 0.99) - 1],
+        "hot_read": read_ms["hot"],
+        "cold_read": read_ms["cold"],
+    })
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="对话检查点存储基准测试")
+    parser.add_argument("--conversations", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--keep", type=int, default=20, help="每个对话保留的检查点数")
+    parser.add_argument("--hot", type=int, default=256, help="热线程缓存数")
+    args = parser.parse_args()
+
+    results = []
+    for backend in ("memory", "sqlite"):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=worker, args=(backend, args, queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise SystemExit(f"{backend} 基准测试子进程失败 (exit={process.exitcode})")
+        results.append(queue.get())
+
+    print(f"{args.conversations} 个对话 × {args.turns} 轮（每轮 {len(STEPS_PER_TURN)} 个检查点），"
+          f"sqlite 保留 {args.keep} 个/对话，热缓存 {args.hot} 个对话")
+    print(f"{'backend':>8} {'heap(MB)':>9} {'RSS+(MB)':>9} {'db(MB)':>8} "
+          f"{'turn p50(ms)':>13} {'turn p99(ms)':>13} {'hot read(ms)':>13} {'cold read(ms)':>14}")
+    for r in results:
+        print(f"{r['backend']:>8} {r['heap_mb']:>9.1f} {r['rss_mb']:>9.1f} {r['db_mb']:>8.1f} "
+              f"{r['p50']:>13.3f} {r['p99']:>13.3f} {r['hot_read']:>13.3f} {r['cold_read']:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
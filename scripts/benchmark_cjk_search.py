@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+中文全文搜索基准测试
+
+在合成中文语料（默认 10 万个 chunk）上对比：
+- like: chunks.text LIKE '%q%' 全表扫描
+- fts: CJK 影子表 (bigram) MATCH 查询（另测 bm25 排序）
+
+报告取前 N 条与统计全部命中两种情况下的平均延迟。LIKE 取前 N 条在
+高频词上可以很快提前结束，但低频词和统计全部命中都必须扫描整张表。
+
+用法:
+    python scripts/benchmark_cjk_search.py
+    python scripts/benchmark_cjk_search.py --chunks 100000 --repeat 20
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.memory.cjk import CJK_FTS_TABLE, build_cjk_match, segment_cjk
+from backend.memory.schema import ensure_memory_index_schema
+
+# 业务词汇（查询目标）混入随机生成的词表，词频服从 Zipf 分布
+BUSINESS_WORDS = [
+    "数据", "分析", "用户", "留存", "转化率", "异常", "检测", "报表", "渠道", "订单",
+    "营收", "同比", "环比", "下降", "增长", "活跃", "新增", "流失", "漏斗", "指标",
+    "复购", "客单价", "库存", "供应链", "广告", "投放", "预算", "区域", "门店", "会员",
+]
+QUERIES = ["转化率", "异常检测", "客单价下降", "供应链", "会员复购", "数据", "漏"]
+
+
+def build_vocabulary(size: int, rng: random.Random) -> list:
+    """随机生成 2~3 字的中文词表，业务词汇分布在不同词频段"""
+    words = [
+        "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.choice((2, 2, 3))))
+        for _ in range(size)
+    ]
+    step = max(1, size // len(BUSINESS_WORDS))
+    for i, word in enumerate(BUSINESS_WORDS):
+        words[i * step] = word
+    return words
+
+
+def build_index(db_path: Path, chunks: int, words_per_chunk: int, seed: int = 0) -> None:
+    """生成中文 chunk 并写入 chunks 和 CJK 影子表"""
+    rng = random.Random(seed)
+    vocabulary = build_vocabulary(5000, rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    db = sqlite3.connect(db_path)
+    ensure_memory_index_schema(db)
+    now = int(time.time())
+
+    batch = 10000
+    for start in range(0, chunks, batch):
+        rows = []
+        for i in range(start, min(start + batch, chunks)):
+            text = "，".join(
+                "".join(rng.choices(vocabulary, weights, k=3)) for _ in range(words_per_chunk // 3)
+            ) + "。"
+            rows.append((i + 1, f"c{i}", f"memory/{i % 365}.md", text, now))
+        db.executemany(
+            "INSERT INTO chunks (rowid, id, path, source, start_line, end_line, hash, text, updated_at) "
+            "VALUES (?, ?, ?, 'memory', 1, 1, '', ?, ?)",
+            rows
+        )
+        db.executemany(
+            f"INSERT INTO {CJK_FTS_TABLE} (rowid, text) VALUES (?, ?)",
+            [(row[0], segment_cjk(row[3])) for row in rows]
+        )
+    db.execute(f"INSERT INTO {CJK_FTS_TABLE}({CJK_FTS_TABLE}) VALUES('optimize')")
+    db.commit()
+    db.close()
+
+
+def time_query(db: sqlite3.Connection, sql: str, param: str, repeat: int) -> tuple:
+    """返回 (平均毫秒, 命中数)"""
+    hits = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        hits = len(db.execute(sql, (param,)).fetchall())
+    return (time.perf_counter() - start) * 1000 / repeat, hits
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="中文全文搜索基准测试")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=30, help="每个 chunk 的词数")
+    parser.add_argument("--limit", type=int, default=20, help="每次查询返回的结果数")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    like_sql = f"SELECT id FROM chunks WHERE text LIKE ? LIMIT {args.limit}"
+    like_count_sql = "SELECT COUNT(*) FROM chunks WHERE text LIKE ?"
+    fts_sql = (
+        f"SELECT chunks.id FROM {CJK_FTS_TABLE} "
+        f"JOIN chunks ON chunks.rowid = {CJK_FTS_TABLE}.rowid "
+        f"WHERE {CJK_FTS_TABLE} MATCH ? LIMIT {args.limit}"
+    )
+    ranked_sql = fts_sql.replace(" LIMIT", f" ORDER BY bm25({CJK_FTS_TABLE}) LIMIT")
+    fts_count_sql = f"SELECT COUNT(*) FROM {CJK_FTS_TABLE} WHERE {CJK_FTS_TABLE} MATCH ?"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cjk.db"
+        start = time.perf_counter()
+        build_index(db_path, args.chunks, args.words)
+        print(f"构建 {args.chunks} chunks: {time.perf_counter() - start:.1f}s\n")
+
+        db = sqlite3.connect(db_path)
+        print(f"{'query':>10} {'matches':>8} {'like':>8} {'fts':>8} {'fts-bm25':>9} "
+              f"{'like-count':>11} {'fts-count':>10}   (ms)")
+        for query in QUERIES:
+            match = build_cjk_match(query)
+            like_ms, _ = time_query(db, like_sql, f"%{query}%", args.repeat)
+            fts_ms, _ = time_query(db, fts_sql, match, args.repeat)
+            ranked_ms, _ = time_query(db, ranked_sql, match, args.repeat)
+            like_count_ms, _ = time_query(db, like_count_sql, f"%{query}%", args.repeat)
+            fts_count_ms, _ = time_query(db, fts_count_sql, match, args.repeat)
+            matches = db.execute(fts_count_sql, (match,)).fetchone()[0]
+            print(f"{query:>10} {matches:>8} {like_ms:>8.2f} {fts_ms:>8.2f} {ranked_ms:>9.2f} "
+                  f"{like_count_ms:>11.2f} {fts_count_ms:>10.2f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+文件引用查询基准测试
+
+在 5 万行 chunk_file_refs 上为 1000 条搜索结果获取文件引用，对比：
+- legacy: 旧实现（每次调用重新打开连接并执行建表语句，单列索引 + 回表）
+- per-chunk: 每个结果单独查询（缓存关闭）
+- bulk-cold: 批量 IN (...) 查询 + 覆盖索引（缓存关闭）
+- bulk-warm: 批量查询，按 chunk 缓存全部命中
+- enhance: enhance_search_results_with_file_refs 端到端（缓存命中）
+
+用法:
+    python scripts/benchmark_file_refs.py
+    python scripts/benchmark_file_refs.py --rows 50000 --results 1000 --repeat 20
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.memory.schema import open_index_db
+from backend.memory.search_enhanced import (
+    FileRefIndex,
+    enhance_search_results_with_file_refs,
+    get_file_ref_index,
+)
+from backend.models.filestore import FileCategory, FileRef
+
+CATEGORIES = [c.value for c in FileCategory]
+
+
+def build_refs(db_path: Path, rows: int, chunks: int, seed: int = 0) -> list:
+    """写入 rows 行引用，分布在 chunks 个 chunk 上，返回 chunk ID 列表"""
+    rng = random.Random(seed)
+    chunk_ids = [f"memory/{i % 365}.md:{i}:{i + 20}:{i:032x}" for i in range(chunks)]
+    FileRefIndex(db_path, cache_entries=0).close()
+
+    db = sqlite3.connect(db_path)
+    now = int(time.time())
+    seen = set()
+    batch = []
+    while len(seen) < rows:
+        key = (rng.choice(chunk_ids), f"file_{rng.randrange(rows)}", rng.choice(CATEGORIES))
+        if key in seen:
+            continue
+        seen.add(key)
+        batch.append(key + (json.dumps({"title": "报表"}), now - rng.randrange(86400)))
+    db.executemany(
+        "INSERT INTO chunk_file_refs (chunk_id, file_id, category, metadata, created_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        batch
+    )
+    db.commit()
+    db.close()
+    return chunk_ids
+
+
+def make_legacy_copy(db_path: Path, legacy_path: Path) -> None:
+    """复制数据库并换回旧的单列索引"""
+    shutil.copy(db_path, legacy_path)
+    db = sqlite3.connect(legacy_path)
+    db.execute("DROP INDEX idx_chunk_file_refs_chunk_cover")
+    db.execute("DROP INDEX idx_chunk_file_refs_file_category")
+    db.execute("CREATE INDEX idx_chunk_file_refs_chunk_id ON chunk_file_refs(chunk_id)")
+    db.execute("CREATE INDEX idx_chunk_file_refs_file_id ON chunk_file_refs(file_id)")
+    db.commit()
+    db.close()
+
+
+def legacy_lookup(db_path: Path, chunk_ids: list) -> dict:
+    """旧实现：构造 FileRefIndex 时建表，查询时重新打开连接"""
+    db = open_index_db(db_path)
+    db.execute("CREATE TABLE IF NOT EXISTS chunk_file_refs (id INTEGER PRIMARY KEY)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_chunk_file_refs_chunk_id ON chunk_file_refs(chunk_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_chunk_file_refs_file_id ON chunk_file_refs(file_id)")
+    db.commit()
+    db.close()
+
+    db = open_index_db(db_path)
+    placeholders = ",".join("?" * len(chunk_ids))
+    result = {chunk_id: [] for chunk_id in chunk_ids}
+    for chunk_id, file_id, category, metadata in db.execute(
+        f"SELECT chunk_id, file_id, category, metadata FROM chunk_file_refs "
+        f"WHERE chunk_id IN ({placeholders}) ORDER BY chunk_id, created_at DESC",
+        chunk_ids
+    ):
+        result[chunk_id].append(FileRef(
+            file_id=file_id, category=FileCategory(category), metadata=json.loads(metadata)
+        ))
+    db.close()
+    return result
+
+
+def timed(fn, repeat: int) -> float:
+    """平均毫秒"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="文件引用查询基准测试")
+    parser.add_argument("--rows", type=int, default=50000, help="引用行数")
+    parser.add_argument("--chunks", type=int, default=20000, help="chunk 数")
+    parser.add_argument("--results", type=int, default=1000, help="每页结果数")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "memory.db"
+        legacy_path = Path(tmp) / "legacy.db"
+        chunk_ids = build_refs(db_path, args.rows, args.chunks)
+        make_legacy_copy(db_path, legacy_path)
+
+        page = random.Random(1).sample(chunk_ids, args.results)
+        results = [{"id": chunk_id, "path": "memory/x.md", "text": "..."} for chunk_id in page]
+
+        uncached = FileRefIndex(db_path, cache_entries=0)
+        cached = get_file_ref_index(db_path)
+        refs = sum(len(v) for v in cached.get_file_refs_for_chunks(page).values())
+        assert refs == sum(len(v) for v in legacy_lookup(legacy_path, page).values())
+
+        print(f"{args.rows} 行引用, {args.results} 条结果 (共 {refs} 个引用)\n")
+        rows = [
+            ("legacy", lambda: legacy_lookup(legacy_path, page)),
+            ("per-chunk", lambda: [uncached.get_file_refs_for_chunk(c) for c in page]),
+            ("bulk-cold", lambda: uncached.get_file_refs_for_chunks(page)),
+            ("bulk-warm", lambda: cached.get_file_refs_for_chunks(page)),
+            ("enhance", lambda: enhance_search_results_with_file_refs(results, db_path)),
+        ]
+        for name, fn in rows:
+            print(f"{name:>10}: {timed(fn, args.repeat):8.2f} ms")
+        print(f"\n缓存: {cached.get_cache_stats()}")
+
+        uncached.close()
+        cached.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+线程状态摘要基准测试
+
+对话已有 50 / 500 / 5000 条消息时，对比每轮调用中用于日志、token 统计和
+Memory Flush 判断的额外开销：
+- get_state: 改造前调用前后各一次 get_state（反序列化整个对话历史）
+- count: 改造前对完整消息列表计数 token 两次（_get_total_tokens + _check_and_flush）
+- before: 上述两项之和（改造前每轮的额外开销）
+- summary: 改造后读取/增量更新/校验线程摘要的开销
+- turn: 改造后一次完整调用的耗时（桩 LLM，不含网络）
+
+用法:
+    python scripts/benchmark_thread_summary.py
+    python scripts/benchmark_thread_summary.py --sizes 50 500 5000 --repeat 20
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from backend.agents.agent import BAAgent
+
+
+class StubChatModel(BaseChatModel):
+    """桩 LLM：立即返回固定回答"""
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="本月 GMV 为 42 万。"))])
+
+
+def timed_ms(func, repeat: int) -> float:
+    """执行 repeat 次，返回耗时中位数（毫秒）"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def seed_history(agent: BAAgent, conversation_id: str, size: int) -> None:
+    """写入 size 条历史消息并同步摘要"""
+    messages = []
+    for i in range(size // 2):
+        messages.append(HumanMessage(content=f"第 {i} 个问题：上个月各渠道的 GMV 和转化率分别是多少？"))
+        messages.append(AIMessage(content="渠道数据分析结果。" * 20))
+    config = {"configurable": {"thread_id": conversation_id}}
+    agent.agent.update_state(config, {"messages": messages})
+    agent.invoke("预热", conversation_id=conversation_id)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="线程状态摘要基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+
+    agent = BAAgent(tools=[], system_prompt="基准测试助手")
+    agent.llm = StubChatModel()
+    agent._monitoring_enabled = False
+    agent.memory_flush = None
+
+    print(f"每项取 {args.repeat} 次中位数 (ms)")
+    print(f"{'messages':>9} {'get_state':>10} {'count':>8} {'before':>8} {'summary':>9} {'turn':>8}")
+    for size in args.sizes:
+        conversation_id = f"conv_{size}"
+        seed_history(agent, conversation_id, size)
+        config = {"configurable": {"thread_id": conversation_id}}
+        messages = list(agent.agent.get_state(config).values["messages"])
+        new = [HumanMessage(content="新问题"), AIMessage(content="新回答")]
+        after = messages + new
+
+        get_state_ms = timed_ms(lambda: agent.agent.get_state(config), args.repeat)
+        count_ms = timed_ms(lambda: agent.token_counter.count_messages(messages), args.repeat)
+        before_ms = 2 * get_state_ms + 2 * count_ms
+
+        store = agent.thread_summaries
+        durations = []
+        for _ in range(args.repeat):
+            # 恢复到本轮之前的计数（不计时）
+            store.invalidate(conversation_id)
+            store.sync(conversation_id, messages, agent.token_counter)
+            start = time.perf_counter()
+            store.get(conversation_id)
+            store.record(conversation_id, new, agent.token_counter)
+            store.sync(conversation_id, after, agent.token_counter)
+            durations.append((time.perf_counter() - start) * 1000)
+        summary_ms = statistics.median(durations)
+        turn_ms = timed_ms(lambda: agent.invoke("继续", conversation_id=conversation_id), args.repeat)
+
+        print(f"{len(messages):>9} {get_state_ms:>10.3f} {count_ms:>8.3f} {before_ms:>8.3f} "
+              f"{summary_ms:>9.3f} {turn_ms:>8.3f}")
+
+    agent.shutdown()
+
+
+if __name__ == "__main__":
+    main()
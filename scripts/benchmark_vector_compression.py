@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+向量压缩基准测试
+
+对比常驻矩阵的精确搜索与压缩存储（QuantizedVectorMatrix）：
+- exact: VectorMatrix float32 全量矩阵
+- pca+int8 / random+int8 / pca+pq: 降维 + 量化后的非对称打分
+  （no-rerank 为近似分数直接取 top-k，rerank 为 k * rerank_factor 个候选用原始向量精确重排）
+
+报告常驻内存、训练耗时、单次查询延迟以及 recall@k（以精确搜索结果为基准）。
+数据为低秩聚类向量加噪声，近似真实嵌入的分布。
+
+用法:
+    python scripts/benchmark_vector_compression.py
+    python scripts/benchmark_vector_compression.py --size 200000 --dims 1536 --target-dims 256
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.memory.schema import ensure_memory_index_schema
+from backend.memory.vector_format import encode_vector
+from backend.memory.vector_search import QuantizedVectorMatrix, VectorMatrix, VectorSearchEngine
+
+
+def make_vectors(rng, n: int, basis: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """从聚类中心生成低秩向量"""
+    rank, dims = basis.shape
+    latent = centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, rank))
+    return (latent @ basis + 0.1 * rng.standard_normal((n, dims))).astype(np.float32)
+
+
+def build_index(db_path: Path, size: int, dims: int, rank: int, clusters: int, seed: int = 0):
+    """生成包含 size 个向量的索引文件，返回 (basis, centers)"""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((rank, dims)).astype(np.float32) / np.sqrt(rank)
+    centers = rng.standard_normal((clusters, rank)).astype(np.float32)
+
+    db = sqlite3.connect(db_path)
+    ensure_memory_index_schema(db, fts_enabled=False)
+    VectorSearchEngine(db, dims=dims, use_sqlite_vec=False).ensure_vector_tables()
+
+    batch = 10000
+    now = int(time.time())
+    for start in range(0, size, batch):
+        end = min(start + batch, size)
+        vectors = make_vectors(rng, end - start, basis, centers)
+        db.executemany(
+            "INSERT INTO chunks (id, path, source, start_line, end_line, hash, text, updated_at) "
+            "VALUES (?, ?, 'memory', 1, 1, '', ?, ?)",
+            [(f"c{i}", f"memory/{i % 365}.md", f"chunk {i}", now) for i in range(start, end)]
+        )
+        db.executemany(
+            "INSERT INTO chunk_vectors (chunk_id, embedding, dims, updated_at) VALUES (?, ?, ?, ?)",
+            [(f"c{i}", encode_vector(vec), dims, now)
+             for i, vec in zip(range(start, end), vectors)]
+        )
+    db.commit()
+    db.close()
+    return basis, centers
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="向量压缩基准测试")
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--rank", type=int, default=128, help="数据的有效维度")
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--target-dims", type=int, default=256)
+    parser.add_argument("--pq-subvectors", type=int, default=64)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    configs = [
+        ("pca+int8", {"reduction": "pca", "quantization": "int8"}),
+        ("random+int8", {"reduction": "random", "quantization": "int8"}),
+        ("pca+pq", {"reduction": "pca", "quantization": "pq"}),
+        ("int8", {"reduction": "none", "quantization": "int8"}),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        print(f"生成 {args.size} x {args.dims} 向量...")
+        basis, centers = build_index(db_path, args.size, args.dims, args.rank, args.clusters)
+        db = sqlite3.connect(db_path)
+        loader = VectorSearchEngine(db, dims=args.dims, use_sqlite_vec=False)._load_vectors
+
+        rng = np.random.default_rng(1)
+        queries = [q.tolist() for q in make_vectors(rng, args.queries, basis, centers)]
+
+        print(f"{'index':>22} {'resident(MB)':>13} {'build(ms)':>10} {'query(ms)':>10} "
+              f"{f'recall@{args.k}':>10}")
+
+        start = time.perf_counter()
+        exact = VectorMatrix(args.dims)
+        exact.refresh(db)
+        build_ms = (time.perf_counter() - start) * 1000
+        exact_mb = exact.memory_bytes() / 1024 / 1024
+
+        start = time.perf_counter()
+        truth = [{c for c, _ in exact.top_k(q, args.k)} for q in queries]
+        query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"{'exact':>22} {exact_mb:>13.1f} {build_ms:>10.0f} {query_ms:>10.2f} {1.0:>10.3f}")
+        del exact
+
+        for name, settings in configs:
+            start = time.perf_counter()
+            matrix = QuantizedVectorMatrix(
+                args.dims,
+                target_dims=args.target_dims,
+                pq_subvectors=args.pq_subvectors,
+                rerank_factor=args.rerank_factor,
+                **settings
+            )
+            matrix.refresh(db)
+            build_ms = (time.perf_counter() - start) * 1000
+            resident_mb = matrix.memory_bytes() / 1024 / 1024
+
+            for label, vector_loader in (("no-rerank", None), ("rerank", loader)):
+                start = time.perf_counter()
+                found = [
+                    {c for c, _ in matrix.top_k(q, args.k, vector_loader=vector_loader)}
+                    for q in queries
+                ]
+                query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+                recall = sum(len(t & f) for t, f in zip(truth, found)) / (args.k * len(queries))
+                print(f"{f'{name}/{label}':>22} {resident_mb:>13.1f} {build_ms:>10.0f} "
+                      f"{query_ms:>10.2f} {recall:>10.3f}")
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+向量搜索基准测试
+
+对比 VectorSearchEngine 的两条 JSON 存储搜索路径：
+- scan: 逐行解码向量 + 纯 Python cosine_similarity（旧实现）
+- matrix: 常驻 float32 矩阵 + 矩阵-向量乘法 + argpartition
+
+用法:
+    python scripts/benchmark_vector_search.py
+    python scripts/benchmark_vector_search.py --sizes 10000 100000 1000000 --dims 256
+"""
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.memory.schema import ensure_memory_index_schema
+from backend.memory.vector_format import encode_vector
+from backend.memory.vector_search import VectorSearchEngine, clear_vector_matrices
+
+
+def build_index(db_path: Path, size: int, dims: int, seed: int = 0) -> None:
+    """生成包含 size 个随机向量的索引文件"""
+    rng = np.random.default_rng(seed)
+    db = sqlite3.connect(db_path)
+    ensure_memory_index_schema(db, fts_enabled=False)
+    VectorSearchEngine(db, dims=dims, use_sqlite_vec=False).ensure_vector_tables()
+
+    batch = 10000
+    now = int(time.time())
+    for start in range(0, size, batch):
+        end = min(start + batch, size)
+        vectors = rng.standard_normal((end - start, dims)).astype(np.float32)
+        sources = ["memory" if i % 4 else "sessions" for i in range(start, end)]
+
+        db.executemany(
+            "INSERT INTO chunks (id, path, source, start_line, end_line, hash, text, updated_at) "
+            "VALUES (?, ?, ?, 1, 1, '', ?, ?)",
+            [(f"c{i}", f"memory/{i % 365}.md", sources[i - start], f"chunk {i}", now)
+             for i in range(start, end)]
+        )
+        db.executemany(
+            "INSERT INTO chunk_vectors (chunk_id, embedding, dims, updated_at) VALUES (?, ?, ?, ?)",
+            [(f"c{i}", encode_vector(vec), dims, now)
+             for i, vec in zip(range(start, end), vectors)]
+        )
+    db.commit()
+    db.close()
+
+
+def time_search(engine: VectorSearchEngine, method, query, repeat: int) -> float:
+    """返回单次搜索的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        method(query, 10, ["memory"])
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="向量搜索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--scan-limit", type=int, default=100000,
+        help="超过该规模时跳过逐行扫描（耗时过长）"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'chunks':>10} {'dims':>6} {'load(ms)':>10} {'matrix(ms)':>11} {'scan(ms)':>10} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            db_path = Path(tmp) / f"bench-{size}.db"
+            build_index(db_path, size, args.dims)
+            clear_vector_matrices()
+
+            db = sqlite3.connect(db_path)
+            engine = VectorSearchEngine(db, dims=args.dims, use_sqlite_vec=False)
+            query = rng.standard_normal(args.dims).astype(np.float32).tolist()
+
+            # 首次搜索包含矩阵加载
+            start = time.perf_counter()
+            engine.search(query, limit=10)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            matrix_ms = time_search(engine, engine._search_json, query, args.repeat)
+
+            if size <= args.scan_limit:
+                scan_ms = time_search(engine, engine._search_json_scan, query, 1)
+                scan_str = f"{scan_ms:>10.1f}"
+                speedup = f"{scan_ms / matrix_ms:>7.0f}x"
+            else:
+                scan_str = f"{'skipped':>10}"
+                speedup = f"{'-':>8}"
+
+            print(f"{size:>10} {args.dims:>6} {load_ms:>10.1f} {matrix_ms:>11.2f} {scan_str} {speedup}")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
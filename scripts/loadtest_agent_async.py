@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Agent 并发负载测试
+
+用本地桩 LLM（固定延迟，首轮请求一次同步工具调用）模拟 N 个并发对话，
+对比两种调用方式在同一个事件循环上的表现：
+- blocking: 协程内直接调用 BAAgent.invoke（改造前 BAAgentService.query 的做法）
+- async: BAAgentService.query -> BAAgent.ainvoke（LLM 走 ainvoke，同步工具走有界执行器）
+
+报告总耗时、吞吐、单请求延迟 p50/p95 以及事件循环心跳的最大延迟
+（心跳延迟反映事件循环被阻塞的程度，即同一进程内其他请求的排队时间）。
+
+用法:
+    python scripts/loadtest_agent_async.py
+    python scripts/loadtest_agent_async.py --conversations 100 --llm-delay 0.5
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, List
+
+# 添加项目路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from backend.agents.agent import BAAgent
+from backend.agents.sync_executor import get_agent_sync_executor, reset_agent_sync_executor
+from backend.api.services.ba_agent import BAAgentService
+
+
+class StubChatModel(BaseChatModel):
+    """桩 LLM：固定延迟，首轮请求一次 lookup 工具调用"""
+
+    delay: float = 0.2
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        if not isinstance(messages[-1], ToolMessage):
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": "lookup", "args": {"query": "gmv"}, "id": "call_1"}],
+            )
+        else:
+            message = AIMessage(content=f"结果: {messages[-1].content}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.delay)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return self._respond(messages)
+
+
+TOOL_DELAY = 0.02
+
+
+@tool
+def lookup(query: str) -> str:
+    """同步工具（模拟 SQL 查询）"""
+    time.sleep(TOOL_DELAY)
+    return f"{query}=42"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_load(mode: str, agent: BAAgent, conversations: int) -> dict:
+    """并发执行 conversations 个对话，返回统计"""
+    service = BAAgentService(model_name="stub")
+    service._ba_agent = agent
+    lags: List[float] = []
+    latencies: List[float] = []
+
+    async def heartbeat():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    async def one(i: int):
+        # 所有对话同时到达：延迟从批次开始计，包含在事件循环上的排队时间
+        if mode == "blocking":
+            result = agent.invoke(f"问题{i}", conversation_id=f"{mode}_{i}")
+        else:
+            result = await service.query(f"问题{i}")
+        latencies.append(time.perf_counter() - batch_start)
+        if not result.get("success", True):
+            raise RuntimeError(result.get("error"))
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    batch_start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(conversations)])
+    elapsed = time.perf_counter() - batch_start
+    beat.cancel()
+
+    return {
+        "elapsed": elapsed,
+        "throughput": conversations / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max_lag": max(lags) if lags else elapsed,
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Agent 并发负载测试")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="桩 LLM 单次调用延迟（秒）")
+    parser.add_argument("--modes", default="blocking,async")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "loadtest-key")
+
+    agent = BAAgent(tools=[lookup], system_prompt="负载测试助手")
+    agent.llm = StubChatModel(delay=args.llm_delay)
+    agent._monitoring_enabled = False
+
+    print(f"{args.conversations} 个并发对话，每个对话 2 次 LLM 调用 ({args.llm_delay}s) + 1 次同步工具")
+    print(f"{'mode':>10} {'total(s)':>9} {'conv/s':>8} {'p50(s)':>8} {'p95(s)':>8} {'loop lag(ms)':>13}")
+
+    for mode in args.modes.split(","):
+        reset_agent_sync_executor()
+        stats = asyncio.run(run_load(mode, agent, args.conversations))
+        print(f"{mode:>10} {stats['elapsed']:>9.2f} {stats['throughput']:>8.1f} "
+              f"{stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['max_lag'] * 1000:>13.1f}")
+        if mode == "async":
+            status = get_agent_sync_executor().get_status()
+            print(f"{'':>10} 同步执行器: {status['completed']} 个任务, max_workers={status['max_workers']}")
+
+    agent.shutdown()
+    reset_agent_sync_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+测试 Agent 流式查询端点
+"""
+
+import asyncio
+import json
+from typing import Any, List
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from backend.agents.agent import BAAgent
+from backend.api.main import app
+from backend.api.routes import agent as agent_routes
+from backend.api.services.ba_agent import BAAgentService
+from backend.api.state import get_app_state
+
+
+class StreamingStubModel(BaseChatModel):
+    """按字符流式输出固定回复的桩 LLM"""
+
+    reply: str = "分析完成"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        for char in self.reply:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=char))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """注入桩 Agent 的测试客户端"""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key-123")
+    agent = BAAgent(tools=[], system_prompt="测试助手")
+    agent.llm = StreamingStubModel()
+    agent._monitoring_enabled = False
+
+    service = BAAgentService(model_name="stub")
+    service._ba_agent = agent
+
+    app_state = get_app_state()
+    previous = app_state.get("agent_service")
+    app_state["agent_service"] = service
+    yield TestClient(app)
+    app_state["agent_service"] = previous
+    agent.shutdown()
+
+
+def _parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestAgentQueryStream:
+    """测试 /agent/query/stream"""
+
+    def test_sse_stream(self, client):
+        with client.stream("POST", "/api/v1/agent/query/stream", json={"message": "你好"}) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            body = "".join(response.iter_text())
+
+        events = _parse_sse(body)
+        names = [name for name, _ in events]
+        assert names[0] == "start"
+        assert names[-1] == "final"
+        assert "node" in names
+
+        conversation_id = events[0][1]["conversation_id"]
+        text = "".join(data["text"] for name, data in events if name == "token")
+        final = events[-1][1]["data"]
+        assert text == "分析完成"
+        assert final["conversation_id"] == conversation_id
+        assert "分析完成" in final["response"]
+        assert "duration_ms" in final and "metadata" in final
+
+    def test_ndjson_stream(self, client):
+        with client.stream(
+            "POST", "/api/v1/agent/query/stream?format=ndjson", json={"message": "你好"}
+        ) as response:
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            events = [json.loads(line) for line in response.iter_lines() if line]
+
+        assert events[0]["event"] == "start"
+        assert events[-1]["event"] == "final"
+        assert "分析完成" in events[-1]["data"]["response"]
+
+    def test_invalid_format(self, client):
+        response = client.post("/api/v1/agent/query/stream?format=xml", json={"message": "你好"})
+        assert response.status_code == 422
+
+
+class TestStreamDisconnect:
+    """测试客户端断开时取消生产者"""
+
+    def test_disconnect_cancels_producer(self, monkeypatch):
+        monkeypatch.setattr(agent_routes, "STREAM_DISCONNECT_POLL_SECONDS", 0.01)
+        state = {"cancelled": False}
+
+        class DisconnectingRequest:
+            async def is_disconnected(self):
+                return True
+
+        async def events():
+            yield {"event": "start"}
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+            yield {"event": "final"}
+
+        async def run():
+            stream = agent_routes._stream_until_disconnect(DisconnectingRequest(), events(), "ndjson")
+            return [chunk async for chunk in stream]
+
+        chunks = asyncio.run(asyncio.wait_for(run(), 2))
+        assert [json.loads(c)["event"] for c in chunks] == ["start"]
+        assert state["cancelled"]
+
+    def test_keepalive_while_idle(self, monkeypatch):
+        monkeypatch.setattr(agent_routes, "STREAM_DISCONNECT_POLL_SECONDS", 0.01)
+        monkeypatch.setattr(agent_routes, "STREAM_KEEPALIVE_SECONDS", 0.02)
+
+        class ConnectedRequest:
+            async def is_disconnected(self):
+                return False
+
+        async def events():
+            await asyncio.sleep(0.1)
+            yield {"event": "final"}
+
+        async def run():
+            stream = agent_routes._stream_until_disconnect(ConnectedRequest(), events(), "sse")
+            return [chunk async for chunk in stream]
+
+        chunks = asyncio.run(run())
+        assert ": keep-alive\n\n" in chunks
+        assert chunks[-1].startswith("event: final\n")
@@ -0,0 +1,125 @@
+"""
+CJK 分词与查询改写测试
+"""
+
+from backend.memory.cjk import (
+    CJK_FTS_TABLE,
+    build_cjk_match,
+    contains_cjk,
+    segment_cjk,
+)
+from backend.memory.index import MemoryIndexer
+from backend.memory.vector_search import HybridSearchEngine
+
+
+class TestSegment:
+    """测试影子文本分词"""
+
+    def test_contains_cjk(self):
+        assert contains_cjk("GMV 异常")
+        assert contains_cjk("カタカナ")
+        assert not contains_cjk("plain text")
+        assert not contains_cjk("")
+
+    def test_segment_bigrams(self):
+        assert segment_cjk("数据分析").split() == ["数据", "据分", "分析", "析"]
+
+    def test_segment_mixed(self):
+        tokens = segment_cjk("GMV异常检测，完成v2").split()
+        assert tokens == ["GMV", "异常", "常检", "检测", "测", "，", "完成", "成", "v2"]
+
+    def test_segment_non_cjk_unchanged(self):
+        assert segment_cjk("hello world") == "hello world"
+
+
+class TestBuildMatch:
+    """测试查询改写"""
+
+    def test_phrase_of_bigrams(self):
+        assert build_cjk_match("数据分析") == '"数据 据分 分析"'
+
+    def test_single_char_prefix(self):
+        assert build_cjk_match("析") == '"析"*'
+
+    def test_mixed_terms_and(self):
+        assert build_cjk_match("GMV 异常") == '"GMV" AND "异常"'
+
+    def test_fts_syntax_escaped(self):
+        assert build_cjk_match('a-b "中文" OR') == '"a" AND "b" AND "中文" AND "OR"'
+
+    def test_empty(self):
+        assert build_cjk_match("，。！") is None
+        assert build_cjk_match("") is None
+
+
+class TestCJKIndex:
+    """测试中文查询走影子表"""
+
+    def _indexer(self, tmp_path, texts):
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        for i, text in enumerate(texts):
+            (memory_dir / f"{i}.md").write_text(text, encoding="utf-8")
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+        indexer.index_directory(memory_dir)
+        return indexer, memory_dir
+
+    def test_search_substrings(self, tmp_path):
+        indexer, _ = self._indexer(tmp_path, ["今天完成了数据分析报告", "用户留存下降"])
+
+        assert indexer.cjk_available
+        for query in ["数据分析", "据分", "报告", "告", "今"]:
+            results = indexer.search(query)
+            assert [r["text"] for r in results] == ["今天完成了数据分析报告"], query
+        assert indexer.search("分析用户") == []
+
+        indexer.close()
+
+    def test_search_does_not_scan_chunks(self, tmp_path):
+        indexer, _ = self._indexer(tmp_path, ["数据分析"])
+
+        # 中文查询不应回退到 LIKE
+        indexer._search_like = None
+        assert len(indexer.search("数据")) == 1
+
+        indexer.close()
+
+    def test_shadow_rows_follow_chunks(self, tmp_path):
+        indexer, memory_dir = self._indexer(tmp_path, ["数据分析", "用户留存"])
+        count = lambda: indexer.db.execute(f"SELECT COUNT(*) FROM {CJK_FTS_TABLE}").fetchone()[0]
+        assert count() == 2
+
+        (memory_dir / "0.md").write_text("渠道转化", encoding="utf-8")
+        indexer.index_directory(memory_dir)
+        assert count() == 2
+        assert indexer.search("数据") == []
+        assert len(indexer.search("转化")) == 1
+
+        (memory_dir / "1.md").unlink()
+        indexer.index_directory(memory_dir)
+        assert count() == 1
+
+        indexer.close()
+
+    def test_backfill_existing_index(self, tmp_path):
+        db_path = tmp_path / "legacy.db"
+        indexer = MemoryIndexer(db_path=db_path)
+        (tmp_path / "a.md").write_text("历史数据", encoding="utf-8")
+        indexer.index_file(tmp_path / "a.md")
+        # 模拟旧索引：没有影子表和版本记录
+        indexer.db.execute(f"DROP TABLE {CJK_FTS_TABLE}")
+        indexer.db.execute("DELETE FROM meta WHERE key = 'cjk_segment'")
+        indexer.close()
+
+        indexer = MemoryIndexer(db_path=db_path)
+        assert len(indexer.search("数据")) == 1
+        indexer.close()
+
+    def test_hybrid_engine_uses_cjk_table(self, tmp_path):
+        indexer, _ = self._indexer(tmp_path, ["数据分析报告", "other text"])
+        engine = HybridSearchEngine(indexer.db, dims=2, use_sqlite_vec=False)
+
+        results = engine._search_fts("分析", 10, None)
+
+        assert [r["text"] for r in results] == ["数据分析报告"]
+        indexer.close()
@@ -4,6 +4,8 @@
 
 import os
 import sqlite3
+import threading
+import time
 import pytest
 from typing import List
 from unittest.mock import Mock, patch, MagicMock
@@ -14,10 +16,16 @@ from backend.memory.embedding import (
     OpenAIEmbeddingProvider,
     LocalEmbeddingProvider,
     FallbackEmbeddingProvider,
+    EmbeddingLRUCache,
+    EmbeddingQueue,
     create_embedding_provider,
+    embed_query,
+    get_embedding_queue,
+    reset_embedding_queues,
     HAS_ZHIPU,
     HAS_OPENAI
 )
+from backend.memory.schema import ensure_memory_index_schema
 
 
 class TestEmbeddingProvider:
@@ -39,10 +47,25 @@ class TestEmbeddingProvider:
         embedding = [0.1, 0.2, 0.3, -0.4]
 
         serialized = provider._serialize_embedding(embedding)
-        assert serialized == "0.1,0.2,0.3,-0.4"
+        assert isinstance(serialized, bytes)
+        assert len(serialized) == 4 + 4 * len(embedding)
 
         parsed = provider._parse_embedding(serialized)
-        assert parsed == embedding
+        assert parsed == pytest.approx(embedding)
+
+    def test_parse_legacy_text_embedding(self):
+        """测试解析旧版文本格式"""
+        provider = MockProvider(model="test")
+        assert provider._parse_embedding("0.1,0.2,0.3,-0.4") == [0.1, 0.2, 0.3, -0.4]
+
+    def test_serialize_float16(self):
+        """测试 float16 存储"""
+        provider = MockProvider(model="test")
+        provider.vector_dtype = "float16"
+        serialized = provider._serialize_embedding([0.5, -1.0])
+
+        assert len(serialized) == 4 + 2 * 2
+        assert provider._parse_embedding(serialized) == [0.5, -1.0]
 
     def test_encode_empty_list(self):
         """测试编码空列表"""
@@ -127,6 +150,40 @@ class TestEmbeddingProvider:
         # 确保没有调用实际的编码方法
         assert provider.encode_call_count == 0
 
+    def test_partial_cache_hit(self, tmp_path):
+        """测试部分命中时只编码未命中的文本，并按输入顺序返回"""
+        db = sqlite3.connect(tmp_path / "cache.db")
+        ensure_memory_index_schema(db)
+        provider = RecordingProvider(model="test", cache_db=db)
+        first = provider.encode(["b", "d"])
+
+        # 新实例没有 LRU，只能从 SQLite 命中
+        provider = RecordingProvider(model="test", cache_db=db)
+        result = provider.encode(["a", "b", "c", "d", "a"])
+
+        assert provider.texts == ["a", "c"]
+        assert result[1] == first[0]
+        assert result[3] == first[1]
+        assert result[0] == result[4] == [1.0, 97.0]
+        status = provider.get_status()["cache"]
+        assert status["sqlite_hits"] == 2
+        assert status["sqlite_misses"] == 2
+
+    def test_memory_cache_tier(self, tmp_path):
+        """测试热点文本由进程内 LRU 命中，不再查询 SQLite"""
+        db = sqlite3.connect(tmp_path / "cache.db")
+        ensure_memory_index_schema(db)
+        provider = RecordingProvider(model="test", cache_db=db)
+
+        provider.encode_single("hot query")
+        for _ in range(3):
+            assert provider.encode_single("hot query") == [9.0, 104.0]
+
+        assert provider.texts == ["hot query"]
+        status = provider.get_status()["cache"]
+        assert status["memory"]["hits"] == 3
+        assert status["sqlite_hits"] == 0
+
         db.close()
 
 
@@ -348,7 +405,7 @@ class TestIntegration:
 
         # 第二次编码相同文本（应该从缓存读取）
         result2 = provider.encode(texts)
-        assert result2 == result1
+        assert result2 == [pytest.approx(emb) for emb in result1]
         assert provider.encode_call_count == 1  # 只调用了一次
 
         # 获取维度
@@ -399,6 +456,201 @@ class TestEdgeCases:
         assert provider.encode_call_count == 3
 
 
+class TestEmbeddingLRUCache:
+    """测试进程内 LRU 缓存"""
+
+    def test_evicts_by_entries(self):
+        cache = EmbeddingLRUCache(max_entries=2, max_bytes=1 << 20)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        assert cache.get("a") == [1.0]
+        cache.put("c", [3.0])
+
+        # b 最久未使用，被淘汰
+        assert cache.get("b") is None
+        assert cache.get("a") == [1.0]
+        assert cache.get("c") == [3.0]
+        stats = cache.get_stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+        assert stats["hits"] == 3
+        assert stats["misses"] == 1
+
+    def test_evicts_by_bytes(self):
+        vector = [0.0] * 16
+        entry_bytes = 4 + 4 * 16  # 头部 + float32
+        cache = EmbeddingLRUCache(max_entries=100, max_bytes=entry_bytes * 3)
+        for i in range(5):
+            cache.put(str(i), vector)
+
+        stats = cache.get_stats()
+        assert stats["entries"] == 3
+        assert stats["bytes"] <= entry_bytes * 3
+        assert stats["evictions"] == 2
+
+    def test_disabled(self):
+        cache = EmbeddingLRUCache(max_entries=0)
+        cache.put("a", [1.0])
+        assert cache.get("a") is None
+
+
+class TestEmbeddingQueue:
+    """测试嵌入工作队列"""
+
+    def test_encode_in_batches(self):
+        """测试按批大小打包"""
+        provider = MockProvider(model="test", batch_size=2)
+        queue = EmbeddingQueue(provider)
+
+        result = queue.encode([f"text {i}" for i in range(5)])
+
+        assert len(result) == 5
+        assert provider.encode_call_count == 3
+        assert queue.get_status()["encoded"] == 5
+        queue.close()
+
+    def test_preferred_batch_size(self):
+        """测试提供商单次请求上限"""
+        provider = MockProvider(model="test", batch_size=100)
+        provider.preferred_batch_size = 16
+
+        assert EmbeddingQueue(provider).batch_size == 16
+
+    def test_deduplicates_texts(self):
+        """测试相同文本只编码一次"""
+        provider = RecordingProvider(model="test")
+        queue = EmbeddingQueue(provider)
+
+        result = queue.encode(["a", "b", "a", "a"])
+
+        assert result[0] == result[2] == result[3]
+        assert sorted(provider.texts) == ["a", "b"]
+        assert queue.get_status()["deduplicated"] == 2
+        queue.close()
+
+    def test_deduplicates_against_cache(self, tmp_path):
+        """测试与 embedding_cache 去重，并批量写回"""
+        db = sqlite3.connect(tmp_path / "test.db")
+        ensure_memory_index_schema(db)
+        provider = RecordingProvider(model="test")
+        queue = EmbeddingQueue(provider)
+
+        first = queue.encode(["a", "b"], cache_db=db)
+        assert queue.write_cache(db) == 2
+        assert queue.get_status()["unsaved_cache_writes"] == 0
+
+        # 新队列只能从 embedding_cache 命中
+        provider2 = RecordingProvider(model="test")
+        queue2 = EmbeddingQueue(provider2)
+        second = queue2.encode(["a", "b", "c"], cache_db=db)
+
+        assert second[:2] == first
+        assert provider2.texts == ["c"]
+        assert queue2.get_status()["cache_hits"] == 2
+        queue.close()
+        queue2.close()
+
+    def test_flush_on_timeout(self):
+        """测试未攒满一批时超时派发"""
+        provider = MockProvider(model="test", batch_size=100)
+        queue = EmbeddingQueue(provider, flush_interval=0.05)
+
+        futures = queue.submit(["a", "b"])
+
+        assert [f.result(timeout=2.0) for f in futures] == [[0.1, 0.2, 0.3]] * 2
+        assert provider.encode_call_count == 1
+        queue.close()
+
+    def test_flush_on_size(self):
+        """测试攒满一批后立即派发"""
+        provider = MockProvider(model="test", batch_size=2)
+        queue = EmbeddingQueue(provider, flush_interval=30.0)
+
+        futures = queue.submit(["a", "b", "c"])
+
+        futures[0].result(timeout=2.0)
+        futures[1].result(timeout=2.0)
+        assert not futures[2].done()
+        queue.flush()
+        assert futures[2].done()
+        queue.close()
+
+    def test_failed_batch(self):
+        """测试批次失败时 Future 抛出异常"""
+        queue = EmbeddingQueue(MockProvider(model="test", fail=True))
+
+        with pytest.raises(RuntimeError):
+            queue.encode(["a"])
+        assert queue.get_status()["failed_batches"] == 1
+        queue.close()
+
+    def test_backpressure(self):
+        """测试排队数达到上限时 submit 阻塞"""
+        provider = BlockingProvider(model="test")
+        queue = EmbeddingQueue(provider, batch_size=1, max_concurrent_batches=1, max_pending=1)
+        queue.submit(["a"])
+        assert provider.started.wait(2.0)
+        queue.submit(["b"])
+
+        submitted = threading.Event()
+        thread = threading.Thread(target=lambda: (queue.submit(["c"]), submitted.set()))
+        thread.start()
+        assert not submitted.wait(0.2)
+
+        provider.release.set()
+        assert submitted.wait(2.0)
+        thread.join()
+        queue.flush()
+        queue.close()
+
+    def test_priority_lane_not_blocked_by_bulk(self):
+        """测试查询向量不排在批量编码之后"""
+        provider = BlockingProvider(model="test")
+        queue = EmbeddingQueue(provider, batch_size=1, max_concurrent_batches=1)
+        futures = queue.submit([f"bulk {i}" for i in range(5)])
+        assert provider.started.wait(2.0)
+
+        start = time.monotonic()
+        assert queue.encode_query("query") == [1.0, 0.0]
+        assert time.monotonic() - start < 1.0
+        assert not futures[-1].done()
+
+        provider.release.set()
+        assert all(f.result(timeout=2.0) for f in futures)
+        queue.close()
+
+    def test_indexer_uses_queue(self, tmp_path):
+        """测试 MemoryIndexer 通过队列生成向量并写回缓存"""
+        from backend.memory.index import MemoryIndexer
+
+        reset_embedding_queues()
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        (memory_dir / "a.md").write_text("same text", encoding="utf-8")
+        (memory_dir / "b.md").write_text("same text", encoding="utf-8")
+        provider = RecordingProvider(model="test")
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", embedding_provider=provider)
+
+        try:
+            assert indexer.embedding_queue is get_embedding_queue(provider)
+            stats = indexer.index_directory(memory_dir)
+
+            assert stats["vectors"] == 2
+            assert provider.texts == ["same text"]
+            cached = indexer.db.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+            assert cached == 1
+        finally:
+            indexer.close()
+            reset_embedding_queues()
+
+    def test_embed_query_duck_typed_provider(self):
+        """测试非 EmbeddingProvider 实现直接调用 encode_single"""
+        stub = Mock()
+        stub.encode_single.return_value = [0.5]
+
+        assert embed_query(stub, "q") == [0.5]
+
+
 # Mock provider for testing
 class MockProvider(EmbeddingProvider):
     """模拟提供商用于测试"""
@@ -417,3 +669,31 @@ class MockProvider(EmbeddingProvider):
 
         # 返回固定 3 维向量
         return [[0.1, 0.2, 0.3] for _ in texts]
+
+
+class RecordingProvider(EmbeddingProvider):
+    """记录被编码文本的提供商"""
+
+    def __init__(self, model: str, **kwargs):
+        super().__init__(model=model, **kwargs)
+        self.texts = []
+
+    def _encode_batch(self, texts: List[str]) -> List[List[float]]:
+        self.texts.extend(texts)
+        return [[float(len(text)), float(ord(text[0]))] for text in texts]
+
+
+class BlockingProvider(EmbeddingProvider):
+    """批量文本阻塞直到 release，查询文本立即返回"""
+
+    def __init__(self, model: str, **kwargs):
+        super().__init__(model=model, **kwargs)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def _encode_batch(self, texts: List[str]) -> List[List[float]]:
+        if texts[0] == "query":
+            return [[1.0, 0.0]]
+        self.started.set()
+        self.release.wait(5.0)
+        return [[0.0, 1.0] for _ in texts]
@@ -0,0 +1,191 @@
+"""
+本地嵌入模型运行时测试
+"""
+
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from backend.memory import embedding_runtime as runtime_module
+from backend.memory.embedding import (
+    LocalEmbeddingProvider,
+    get_embedding_provider,
+    reset_embedding_providers,
+    warm_up_embedding_provider,
+)
+from backend.memory.embedding_runtime import (
+    EmbeddingRuntime,
+    get_embedding_runtime,
+    get_runtime_metrics,
+    reset_embedding_runtimes,
+)
+
+
+class FakeModel:
+    """记录每次前向计算的批大小"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def encode(self, texts, convert_to_numpy=True, show_progress_bar=False):
+        self.batches.append(len(texts))
+        time.sleep(self.delay)
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+@pytest.fixture(autouse=True)
+def fresh_runtimes():
+    reset_embedding_runtimes()
+    reset_embedding_providers()
+    yield
+    reset_embedding_runtimes()
+    reset_embedding_providers()
+
+
+def _runtime(model=None, **kwargs):
+    runtime = EmbeddingRuntime("fake-model", **kwargs)
+    runtime._model = model or FakeModel()
+    runtime._active_backend = "torch"
+    return runtime
+
+
+class TestMicroBatching:
+    """测试并发请求合并"""
+
+    def test_concurrent_requests_share_batches(self):
+        model = FakeModel(delay=0.02)
+        runtime = _runtime(model, batch_window_ms=50, max_batch_size=64)
+        results = {}
+
+        def worker(i):
+            results[i] = runtime.encode(["x" * i, "y"])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 每个请求拿回自己的向量
+        assert all(results[i] == [[float(i), 1.0], [1.0, 1.0]] for i in range(1, 9))
+        assert sum(model.batches) == 16
+        assert len(model.batches) < 8
+
+        metrics = runtime.get_metrics()
+        assert metrics["requests"] == 8
+        assert metrics["texts"] == 16
+        assert metrics["batches"] == len(model.batches)
+        assert metrics["batch_latency_ms"]["max"] >= 20
+        runtime.close()
+
+    def test_max_batch_size_splits_forward(self):
+        model = FakeModel()
+        runtime = _runtime(model, batch_window_ms=0, max_batch_size=4)
+        assert len(runtime.encode([str(i) for i in range(10)])) == 10
+        assert model.batches == [4, 4, 2]
+        runtime.close()
+
+    def test_failure_propagates_to_callers(self):
+        class Broken:
+            def encode(self, *args, **kwargs):
+                raise RuntimeError("OOM")
+
+        runtime = _runtime(Broken(), batch_window_ms=0)
+        with pytest.raises(RuntimeError, match="OOM"):
+            runtime.encode(["a"])
+        assert runtime.get_metrics()["failed_batches"] == 1
+        # 推理线程仍可继续服务
+        runtime._model = FakeModel()
+        assert runtime.encode(["ab"]) == [[2.0, 1.0]]
+        runtime.close()
+
+
+class TestLoading:
+    """测试模型加载"""
+
+    def test_load_once_and_records_time(self, monkeypatch):
+        runtime = EmbeddingRuntime("fake-model")
+        calls = []
+
+        def slow_load():
+            calls.append(1)
+            time.sleep(0.05)
+            return FakeModel(), "torch"
+
+        monkeypatch.setattr(runtime, "_load_model", slow_load)
+        threads = [threading.Thread(target=runtime.load) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert calls == [1]
+        assert runtime.get_metrics()["load_seconds"] >= 0.05
+
+    def test_onnx_falls_back_without_onnxruntime(self, monkeypatch):
+        created = []
+
+        class FakeSentenceTransformer(FakeModel):
+            def __init__(self, name, device=None, **kwargs):
+                super().__init__()
+                created.append((name, device, kwargs))
+
+        monkeypatch.setitem(
+            sys.modules, "sentence_transformers",
+            types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer)
+        )
+        monkeypatch.setattr(runtime_module, "HAS_ONNXRUNTIME", False)
+
+        runtime = EmbeddingRuntime("fake-model", device="cpu", backend="onnx", quantize=True)
+        runtime.load()
+        assert created == [("fake-model", "cpu", {})]
+        assert runtime.get_metrics()["backend"] == "torch"
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Unknown backend"):
+            EmbeddingRuntime("fake-model", backend="tensorrt")
+
+
+class TestSharedRuntime:
+    """测试进程级共享"""
+
+    def test_runtime_shared_per_model(self):
+        first = get_embedding_runtime("fake-model", backend="torch")
+        assert get_embedding_runtime("fake-model", backend="torch") is first
+        assert get_embedding_runtime("other-model", backend="torch") is not first
+
+    def test_local_providers_share_model(self):
+        a = LocalEmbeddingProvider(model="fake-model")
+        b = LocalEmbeddingProvider(model="fake-model")
+        assert a.runtime is b.runtime
+
+        model = FakeModel()
+        a.runtime._model = model
+        assert b._encode_batch(["abc"]) == [[3.0, 1.0]]
+        assert model.batches == [1]
+        assert b.get_status()["runtime"]["texts"] == 1
+
+    def test_get_embedding_provider_singleton(self, monkeypatch):
+        monkeypatch.delenv("ZHIPUAI_API_KEY", raising=False)
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+        provider = get_embedding_provider("auto")
+        assert isinstance(provider, LocalEmbeddingProvider)
+        assert get_embedding_provider("local") is provider
+        assert get_embedding_provider("local", model="other-model") is not provider
+
+    def test_warm_up_loads_model(self, monkeypatch):
+        monkeypatch.delenv("ZHIPUAI_API_KEY", raising=False)
+        monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+        provider = get_embedding_provider("local", model="fake-model")
+        monkeypatch.setattr(provider.runtime, "_load_model", lambda: (FakeModel(), "torch"))
+
+        status = warm_up_embedding_provider("local", model="fake-model")
+        assert status["runtime"]["loaded"] is True
+        assert status["runtime"]["texts"] == 1
+        assert get_runtime_metrics()[0]["model"] == "fake-model"
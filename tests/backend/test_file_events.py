@@ -0,0 +1,133 @@
+"""
+文件变更事件源测试
+"""
+
+import os
+import time
+
+import pytest
+
+from backend.memory.file_events import (
+    HAS_INOTIFY,
+    InotifyEventSource,
+    StatScanEventSource,
+    create_event_source,
+)
+
+
+def _read_until(source, expected, timeout=3.0):
+    """读取事件直到收集到 expected 中的所有路径或超时"""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not expected <= seen:
+        seen.update(source.read(timeout=0.2))
+    return seen
+
+
+class TestStatScanEventSource:
+    """测试 stat 扫描回退"""
+
+    def test_detects_create_modify_delete(self, tmp_path):
+        existing = tmp_path / "old.md"
+        existing.write_text("old")
+        source = StatScanEventSource([tmp_path], interval=0.05)
+
+        created = tmp_path / "new.md"
+        created.write_text("new")
+        os.utime(existing, ns=(0, 0))
+        assert set(source.read()) == {created, existing}
+
+        created.unlink()
+        assert source.read() == [created]
+        assert source.read() == []
+
+        source.close()
+
+    def test_ignores_hidden_and_other_files(self, tmp_path):
+        source = StatScanEventSource([tmp_path], interval=0.05)
+        hidden = tmp_path / ".index"
+        hidden.mkdir()
+        (hidden / "memory.md").write_text("x")
+        (tmp_path / "notes.txt").write_text("x")
+
+        assert source.read() == []
+
+        source.close()
+
+    def test_close_wakes_reader(self, tmp_path):
+        source = StatScanEventSource([tmp_path], interval=60)
+        source.close()
+
+        start = time.monotonic()
+        assert source.read() == []
+        assert time.monotonic() - start < 1.0
+
+
+@pytest.mark.skipif(not HAS_INOTIFY, reason="inotify 不可用")
+class TestInotifyEventSource:
+    """测试 inotify 事件源"""
+
+    def test_reports_file_changes(self, tmp_path):
+        source = InotifyEventSource([tmp_path])
+        target = tmp_path / "2026-10-16.md"
+        target.write_text("hello")
+
+        assert target in _read_until(source, {target})
+
+        target.unlink()
+        assert target in _read_until(source, {target})
+
+        source.close()
+
+    def test_watches_new_subdirectories(self, tmp_path):
+        source = InotifyEventSource([tmp_path])
+        subdir = tmp_path / "2026" / "10"
+        subdir.mkdir(parents=True)
+        first = subdir / "a.md"
+        first.write_text("a")
+
+        # 目录创建与文件写入之间的竞态由 _add_tree 补齐
+        assert first in _read_until(source, {first})
+
+        second = subdir / "b.md"
+        second.write_text("b")
+        assert second in _read_until(source, {second})
+
+        source.close()
+
+    def test_ignores_hidden_directories(self, tmp_path):
+        hidden = tmp_path / ".index"
+        hidden.mkdir()
+        source = InotifyEventSource([tmp_path])
+
+        (hidden / "memory.md").write_text("x")
+        (tmp_path / "notes.txt").write_text("x")
+
+        assert source.read(timeout=0.2) == []
+
+        source.close()
+
+    def test_idle_read_blocks_until_timeout(self, tmp_path):
+        source = InotifyEventSource([tmp_path])
+
+        start = time.monotonic()
+        assert source.read(timeout=0.2) == []
+        assert time.monotonic() - start >= 0.15
+
+        source.close()
+
+
+class TestCreateEventSource:
+    """测试事件源选择"""
+
+    def test_poll_backend(self, tmp_path):
+        source = create_event_source([tmp_path], backend="poll", scan_interval=1.0)
+        assert isinstance(source, StatScanEventSource)
+        assert source.interval == 1.0
+        source.close()
+
+    def test_auto_backend(self, tmp_path):
+        source = create_event_source([tmp_path])
+        expected = InotifyEventSource if HAS_INOTIFY else StatScanEventSource
+        assert isinstance(source, expected)
+        source.close()
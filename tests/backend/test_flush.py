@@ -2,6 +2,7 @@
 Memory Flush 测试
 """
 
+import threading
 import time
 from pathlib import Path
 import pytest
@@ -10,7 +11,8 @@ from backend.memory.flush import (
     RetainFormatter,
     MemoryExtractor,
     MemoryFlushConfig,
-    MemoryFlush
+    MemoryFlush,
+    MemoryFlushWorker
 )
 
 
@@ -416,3 +418,140 @@ class TestEdgeCases:
         # MemoryExtractor 提取的是完整的消息内容
         assert "第一次flush的长消息" in content or "flush的长消息" in content
         assert "第二次flush的长消息" in content or "flush的长消息" in content
+
+
+class BlockingExtractor(MemoryExtractor):
+    """在 release 之前阻塞的提取器，记录并发数"""
+
+    def __init__(self, fail: bool = False):
+        super().__init__()
+        self.release = threading.Event()
+        self.fail = fail
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def extract_from_messages(self, messages):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls.append([m["content"] for m in messages])
+        try:
+            self.release.wait(5)
+            if self.fail:
+                raise RuntimeError("LLM 不可用")
+            return [m["content"] for m in messages]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class TestSnapshot:
+    """测试消息缓存快照"""
+
+    def test_take_and_restore_keeps_order(self):
+        flush = MemoryFlush()
+        flush.add_message("user", "a")
+        flush.add_message("user", "b")
+
+        snapshot = flush.take_snapshot()
+        assert [m["content"] for m in snapshot] == ["a", "b"]
+        assert flush.message_buffer == []
+
+        flush.add_message("user", "c")
+        flush.restore_snapshot(snapshot)
+        assert [m["content"] for m in flush.message_buffer] == ["a", "b", "c"]
+
+    def test_skipped_flush_keeps_buffer(self):
+        config = MemoryFlushConfig(soft_threshold=100, reserve=50, min_memory_count=5)
+        flush = MemoryFlush(config=config)
+        flush.add_message("user", "记住：测试")
+
+        assert flush.check_and_flush(200)["flushed"] is False
+        assert len(flush.message_buffer) == 1
+
+
+class TestMemoryFlushWorker:
+    """测试后台 Memory Flush 执行器"""
+
+    def _make_flush(self, tmp_path, extractor):
+        config = MemoryFlushConfig(soft_threshold=100, reserve=50, min_memory_count=1)
+        flush = MemoryFlush(config=config, memory_path=tmp_path, extractor=extractor)
+        flush.add_message("user", "记住：后台写入")
+        return flush
+
+    def test_submit_does_not_block(self, tmp_path):
+        extractor = BlockingExtractor()
+        flush = self._make_flush(tmp_path, extractor)
+        worker = MemoryFlushWorker()
+
+        future = worker.submit(flush, cycle=0, current_tokens=200)
+        assert future is not None and not future.done()
+        # 快照已取走，新消息不进入本次提取
+        assert flush.message_buffer == []
+        flush.add_message("user", "记住：下一轮")
+
+        extractor.release.set()
+        result = future.result(timeout=5)
+        assert result["flushed"] is True
+        assert extractor.calls == [["记住：后台写入"]]
+        assert "后台写入" in next(tmp_path.glob("*.md")).read_text(encoding="utf-8")
+        assert [m["content"] for m in flush.message_buffer] == ["记住：下一轮"]
+        assert flush.last_flush_tokens == 200
+        worker.shutdown()
+
+    def test_at_most_once_per_cycle(self, tmp_path):
+        extractor = BlockingExtractor()
+        extractor.release.set()
+        flush = self._make_flush(tmp_path, extractor)
+        worker = MemoryFlushWorker()
+
+        assert worker.submit(flush, cycle=3, current_tokens=200) is not None
+        flush.add_message("user", "记住：同一周期")
+        assert worker.submit(flush, cycle=3, current_tokens=300) is None
+        assert worker.wait(5)
+        assert worker.get_status()["duplicates"] == 1
+        assert len(extractor.calls) == 1
+
+        # 下一个周期正常提交
+        assert worker.submit(flush, cycle=4, current_tokens=300) is not None
+        assert worker.wait(5)
+        assert worker.get_status()["flushed"] == 2
+        worker.shutdown()
+
+    def test_bounded_concurrency(self, tmp_path):
+        extractor = BlockingExtractor()
+        worker = MemoryFlushWorker(max_workers=2, max_pending=3)
+
+        flushes = [self._make_flush(tmp_path, extractor) for _ in range(4)]
+        futures = [worker.submit(f, cycle=0, current_tokens=200) for f in flushes]
+        assert futures[3] is None
+        assert worker.get_status()["rejected"] == 1
+        # 被拒绝的消息留在缓存中
+        assert len(flushes[3].message_buffer) == 1
+
+        # 等两个线程都进入提取后再放行
+        deadline = time.time() + 5
+        while extractor.active < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        extractor.release.set()
+        assert worker.wait(5)
+        assert extractor.max_active == 2
+        assert worker.get_status()["pending"] == 0
+        worker.shutdown()
+
+    def test_failed_flush_restores_snapshot(self, tmp_path):
+        extractor = BlockingExtractor(fail=True)
+        flush = self._make_flush(tmp_path, extractor)
+        worker = MemoryFlushWorker()
+
+        future = worker.submit(flush, cycle=0, current_tokens=200)
+        flush.add_message("user", "记住：失败期间")
+        extractor.release.set()
+
+        assert future.result(timeout=5)["error"] == "LLM 不可用"
+        assert [m["content"] for m in flush.message_buffer] == ["记住：后台写入", "记住：失败期间"]
+        assert worker.get_status()["failed"] == 1
+        assert flush.last_flush_tokens == 0
+        worker.shutdown()
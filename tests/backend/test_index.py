@@ -3,6 +3,7 @@
 """
 
 import os
+import threading
 import sqlite3
 import pytest
 from pathlib import Path
@@ -13,6 +14,8 @@ from backend.memory import (
     MemoryWatcher,
     get_index_db_path,
     ensure_memory_index_schema,
+    migrate_vector_storage,
+    decode_vector,
     DEFAULT_INDEX_PATH
 )
 
@@ -52,6 +55,45 @@ class TestSchema:
 
         db.close()
 
+    def test_migrate_text_vectors(self, tmp_path):
+        """测试文本向量一次性迁移为二进制格式"""
+        db = sqlite3.connect(tmp_path / "legacy.db")
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.execute("""
+            CREATE TABLE chunk_vectors (
+                chunk_id TEXT PRIMARY KEY, embedding TEXT NOT NULL,
+                dims INTEGER NOT NULL, updated_at INTEGER NOT NULL
+            )
+        """)
+        db.execute("""
+            CREATE TABLE embedding_cache (
+                provider TEXT NOT NULL, model TEXT NOT NULL, content_hash TEXT NOT NULL,
+                embedding TEXT NOT NULL, dims INTEGER, updated_at INTEGER NOT NULL,
+                PRIMARY KEY (provider, model, content_hash)
+            )
+        """)
+        db.execute("INSERT INTO chunk_vectors VALUES ('c1', '0.5,-0.25', 2, 0)")
+        db.execute("INSERT INTO embedding_cache VALUES ('p', 'm', 'h', '1.0,2.0,3.0', 3, 0)")
+        db.commit()
+
+        ensure_memory_index_schema(db, fts_enabled=False)
+
+        row = db.execute("SELECT embedding FROM chunk_vectors").fetchone()
+        assert isinstance(row[0], bytes)
+        assert decode_vector(row[0]) == [0.5, -0.25]
+        row = db.execute("SELECT embedding FROM embedding_cache").fetchone()
+        assert decode_vector(row[0]) == [1.0, 2.0, 3.0]
+
+        # 已记录版本，后续不再扫描
+        db.execute(
+            "INSERT INTO chunk_vectors (chunk_id, embedding, dims, updated_at) "
+            "VALUES ('c2', '1.0,1.0', 2, 0)"
+        )
+        assert migrate_vector_storage(db) == {"chunk_vectors": 0, "embedding_cache": 0}
+        assert migrate_vector_storage(db, force=True)["chunk_vectors"] == 1
+
+        db.close()
+
 
 class TestGetIndexPath:
     """测试数据库路径获取"""
@@ -219,6 +261,183 @@ class TestMemoryIndexer:
         # 注意：sqlite3.Connection 在 __exit__ 时不一定是 None，所以这里不检查
 
 
+class TestVectorCleanup:
+    """测试重新索引时清理向量"""
+
+    def test_reindex_removes_stale_vectors(self, tmp_path):
+        """测试文件变更后旧 chunk 的向量被删除并打墓碑"""
+        from backend.memory import VectorSearchEngine
+
+        db_path = tmp_path / "test_index.db"
+        test_file = tmp_path / "note.md"
+        test_file.write_text("old content", encoding="utf-8")
+
+        indexer = MemoryIndexer(db_path=db_path)
+        indexer.index_file(test_file)
+        engine = VectorSearchEngine(indexer.db, dims=2, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+        old_id = indexer.db.execute("SELECT id FROM chunks").fetchone()[0]
+        engine.insert_vector(old_id, [1.0, 0.0])
+        assert engine.search([1.0, 0.0], limit=1)[0]["id"] == old_id
+
+        test_file.write_text("new content", encoding="utf-8")
+        indexer.index_file(test_file)
+
+        count = indexer.db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
+        assert count == 0
+        assert engine.search([1.0, 0.0], limit=1) == []
+        assert len(engine._matrix) == 0
+
+        indexer.close()
+
+
+class _CountingProvider:
+    """记录被编码文本的嵌入提供商替身"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class TestIncrementalIndexing:
+    """测试增量索引"""
+
+    def _rows(self, indexer, path):
+        cursor = indexer.db.execute(
+            "SELECT id, start_line, end_line, text FROM chunks WHERE path = ? ORDER BY start_line",
+            (str(path),)
+        )
+        return cursor.fetchall()
+
+    def _write_lines(self, path, start, end, mode="w"):
+        with open(path, mode, encoding="utf-8") as f:
+            for i in range(start, end):
+                f.write(f"line {i}\n")
+
+    def test_append_fast_path(self, tmp_path):
+        """测试追加内容只重建最后的分块"""
+        log = tmp_path / "2026-10-16.md"
+        self._write_lines(log, 0, 25)
+        provider = _CountingProvider()
+        indexer = MemoryIndexer(
+            db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2,
+            embedding_provider=provider
+        )
+        indexer.index_file(log)
+        before = {row[0] for row in self._rows(indexer, log)}
+        provider.encoded.clear()
+
+        self._write_lines(log, 25, 40, mode="a")
+        result = indexer.index_file(log)
+
+        assert result["appended"] is True
+        after_rows = self._rows(indexer, log)
+        after = {row[0] for row in after_rows}
+        # 前两个完整窗口保留，最后一个窗口被替换
+        assert len(before & after) == 2
+        assert result["chunks_removed"] == len(before - after) == 1
+        assert result["chunks_added"] == len(after - before)
+        # 只为新增块生成向量
+        assert len(provider.encoded) == result["chunks_added"]
+        vectors = indexer.db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
+        assert vectors == len(after)
+
+        # 与完整重建结果一致
+        full = MemoryIndexer(db_path=tmp_path / "full.db", chunk_size=10, chunk_overlap=2)
+        full.index_file(log)
+        assert [row[1:] for row in self._rows(full, log)] == [row[1:] for row in after_rows]
+        full.close()
+        indexer.close()
+
+    def test_embedding_failure_retried_on_next_pass(self, tmp_path):
+        """测试生成向量失败时不写入，恢复后补齐全部向量"""
+        log = tmp_path / "2026-10-16.md"
+        self._write_lines(log, 0, 40)
+
+        class FlakyProvider(_CountingProvider):
+            failing = True
+
+            def encode(self, texts):
+                if self.failing:
+                    raise RuntimeError("provider down")
+                return super().encode(texts)
+
+        provider = FlakyProvider()
+        indexer = MemoryIndexer(
+            db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2,
+            embedding_provider=provider
+        )
+
+        result = indexer.index_file(log)
+        assert result["success"] is False
+        assert indexer.get_status()["chunk_count"] == 0
+        stats = indexer.index_files([log])
+        assert stats["failed"] == 1
+
+        provider.failing = False
+        self._write_lines(log, 40, 50, mode="a")
+        result = indexer.index_file(log)
+
+        assert result["success"] is True
+        chunks = indexer.get_status()["chunk_count"]
+        vectors = indexer.db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
+        assert vectors == chunks == len(self._rows(indexer, log)) > 0
+
+        indexer.close()
+
+    def test_append_without_trailing_newline(self, tmp_path):
+        """测试最后一行未结束时追加"""
+        log = tmp_path / "2026-10-16.md"
+        log.write_text("a\nb\nc", encoding="utf-8")
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", chunk_size=2, chunk_overlap=0)
+        indexer.index_file(log)
+
+        with open(log, "a", encoding="utf-8") as f:
+            f.write("d\ne\n")
+        result = indexer.index_file(log)
+
+        assert result["appended"] is True
+        texts = [row[3] for row in self._rows(indexer, log)]
+        assert texts == ["a\nb", "cd\ne"]
+        indexer.close()
+
+    def test_edit_falls_back_to_chunk_diff(self, tmp_path):
+        """测试非日志文件修改中间内容时按 chunk 对比，只替换变化的块"""
+        doc = tmp_path / "notes.md"
+        self._write_lines(doc, 0, 30)
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=0)
+        indexer.index_file(doc)
+        before = {row[0] for row in self._rows(indexer, doc)}
+
+        lines = doc.read_text(encoding="utf-8").split("\n")
+        lines[15] = "edited line, and the file grew"
+        doc.write_text("\n".join(lines), encoding="utf-8")
+        result = indexer.index_file(doc)
+
+        assert "appended" not in result
+        after = {row[0] for row in self._rows(indexer, doc)}
+        assert result["chunks_added"] == result["chunks_removed"] == 1
+        assert len(before & after) == 2
+        indexer.close()
+
+    def test_full_reindex(self, tmp_path):
+        """测试关闭增量时重建全部分块"""
+        doc = tmp_path / "notes.md"
+        self._write_lines(doc, 0, 30)
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=0)
+        indexer.index_file(doc)
+
+        self._write_lines(doc, 30, 31, mode="a")
+        result = indexer.index_file(doc, incremental=False)
+
+        assert result["chunks_removed"] == 3
+        assert result["chunks_added"] == 4
+        indexer.close()
+
+
 class TestChunking:
     """测试文本分块"""
 
@@ -393,6 +612,89 @@ class TestMemoryWatcher:
         # 脏文件列表应该被清空
         assert len(watcher._dirty_files) == 0
 
+    def test_debounce_coalesces_events(self, tmp_path):
+        """测试防抖窗口内的连续事件合并为一次索引"""
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        test_file = memory_dir / "test.md"
+        test_file.write_text("测试内容")
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+        watcher = MemoryWatcher(indexer=indexer, watch_paths=[memory_dir], debounce_seconds=0.2)
+
+        for _ in range(5):
+            watcher.on_file_changed(test_file)
+
+        # 防抖窗口内不处理
+        assert watcher.wait_for_changes(timeout=0.05) is False
+        assert watcher.process_due_changes()["processed"] == 0
+
+        assert watcher.wait_for_changes(timeout=1.0) is True
+        results = watcher.process_due_changes()
+        assert results["processed"] == 1
+        assert len(watcher._dirty_files) == 0
+
+        indexer.close()
+
+    def test_deleted_file_removed_from_index(self, tmp_path):
+        """测试已删除文件从索引移除"""
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        test_file = memory_dir / "test.md"
+        test_file.write_text("测试内容")
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+        indexer.index_file(test_file)
+        watcher = MemoryWatcher(indexer=indexer, watch_paths=[memory_dir])
+
+        test_file.unlink()
+        watcher.on_file_changed(test_file)
+        results = watcher.process_changes()
+
+        assert results["files"][0]["removed"] is True
+        assert indexer.get_status()["chunk_count"] == 0
+
+        indexer.close()
+
+    @pytest.mark.parametrize("backend", ["auto", "poll"])
+    def test_events_indexed_in_background(self, tmp_path, backend):
+        """测试事件源 + 工作循环在文件写入后自动索引"""
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+        watcher = MemoryWatcher(
+            indexer=indexer,
+            watch_paths=[memory_dir],
+            debounce_seconds=0.05,
+            backend=backend,
+            scan_interval=0.05
+        )
+        watcher.start()
+        try:
+            (memory_dir / "2026-10-16.md").write_text("后台索引测试")
+
+            assert watcher.wait_for_changes(timeout=3.0) is True
+            results = watcher.process_due_changes()
+            assert results["processed"] == 1
+            assert len(indexer.search("后台索引测试")) > 0
+        finally:
+            watcher.stop()
+            indexer.close()
+
+    def test_stop_wakes_waiting_worker(self, tmp_path):
+        """测试 stop() 唤醒阻塞中的工作线程"""
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+        watcher = MemoryWatcher(indexer=indexer, watch_paths=[memory_dir], backend="poll")
+        watcher.start()
+
+        waiter = threading.Thread(target=watcher.wait_for_changes)
+        waiter.start()
+        watcher.stop()
+        waiter.join(timeout=2.0)
+
+        assert not waiter.is_alive()
+        indexer.close()
+
 
 class TestIntegration:
     """集成测试"""
@@ -519,3 +821,282 @@ class TestEdgeCases:
         assert result["chunks_added"] == 0
 
         indexer.close()
+
+
+class TestBulkIndexing:
+    """测试批量事务写入与目录重建"""
+
+    def _make_corpus(self, memory_dir, count, lines=30):
+        memory_dir.mkdir(exist_ok=True)
+        for i in range(count):
+            content = "\n".join(f"file {i} line {j}" for j in range(lines))
+            (memory_dir / f"note-{i}.md").write_text(content, encoding="utf-8")
+
+    def test_wal_mode_and_pragmas(self, tmp_path):
+        """测试可写连接启用 WAL"""
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+
+        assert indexer.db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert indexer.db.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+        indexer.close()
+
+    def test_writes_committed_per_file(self, tmp_path):
+        """测试 index_file 提交后其他连接立即可见"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 1)
+        db_path = tmp_path / "test.db"
+        indexer = MemoryIndexer(db_path=db_path, chunk_size=10, chunk_overlap=2)
+
+        result = indexer.index_file(memory_dir / "note-0.md")
+
+        reader = sqlite3.connect(db_path)
+        count = reader.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        fts_count = reader.execute("SELECT COUNT(*) FROM chunks_fts").fetchone()[0]
+        reader.close()
+        assert count == result["chunks_added"] > 0
+        assert fts_count == count
+        assert not indexer.db.in_transaction
+
+        indexer.close()
+
+    def test_failed_batch_rolls_back(self, tmp_path):
+        """测试事务内异常时回滚"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 1)
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+
+        with pytest.raises(RuntimeError):
+            with indexer._transaction():
+                indexer.index_file(memory_dir / "note-0.md")
+                raise RuntimeError("boom")
+
+        assert indexer.db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0] == 0
+        assert indexer.db.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 0
+
+        indexer.close()
+
+    def test_index_directory(self, tmp_path):
+        """测试索引整个目录，跳过隐藏目录并移除已删除文件"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 5)
+        hidden = memory_dir / ".index"
+        hidden.mkdir()
+        (hidden / "ignored.md").write_text("ignored", encoding="utf-8")
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2)
+
+        stats = indexer.index_directory(memory_dir, batch_size=2)
+        assert stats["files"] == 5
+        assert stats["updated"] == 5
+        assert stats["failed"] == 0
+        assert stats["chunks"] == stats["chunks_added"] > 0
+
+        # 未变化的文件不重新索引，删除的文件从索引移除
+        (memory_dir / "note-0.md").unlink()
+        stats = indexer.index_directory(memory_dir)
+        assert stats["files"] == 4
+        assert stats["updated"] == 0
+        paths = {row[0] for row in indexer.db.execute("SELECT DISTINCT path FROM chunks")}
+        assert str(memory_dir / "note-0.md") not in paths
+        assert len(paths) == 4
+
+        # FTS automerge 在导入结束后恢复
+        assert len(indexer.search("line")) > 0
+
+        indexer.close()
+
+    def test_rebuild_directory(self, tmp_path):
+        """测试清空后整体重建"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 3)
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2)
+        first = indexer.index_directory(memory_dir)
+
+        stats = indexer.index_directory(memory_dir, rebuild=True)
+
+        assert stats["updated"] == 3
+        assert stats["chunks"] == first["chunks"]
+        fts_count = indexer.db.execute("SELECT COUNT(*) FROM chunks_fts").fetchone()[0]
+        assert fts_count == stats["chunks"]
+
+        indexer.close()
+
+    def test_batched_embeddings(self, tmp_path):
+        """测试批量写入向量"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 3)
+        indexer = MemoryIndexer(
+            db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2,
+            embedding_provider=_CountingProvider()
+        )
+
+        stats = indexer.index_directory(memory_dir)
+
+        assert stats["vectors"] == stats["chunks"] > 0
+
+        indexer.close()
+
+    def test_embeds_outside_transaction(self, tmp_path):
+        """测试每批只调用一次 embedding 接口，且调用时没有打开写事务"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 3)
+        calls = []
+
+        class TransactionCheckingProvider(_CountingProvider):
+            def encode(self, texts):
+                calls.append(indexer.db.in_transaction)
+                return super().encode(texts)
+
+        indexer = MemoryIndexer(
+            db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2,
+            embedding_provider=TransactionCheckingProvider()
+        )
+
+        stats = indexer.index_files(sorted(memory_dir.glob("*.md")), batch_size=10)
+
+        assert calls == [False]
+        assert stats["updated"] == 3
+        assert stats["chunks_added"] == indexer.get_status()["chunk_count"]
+
+        indexer.close()
+
+    def test_ann_synced_once_per_batch_after_commit(self, tmp_path, monkeypatch):
+        """测试 ANN 索引每批提交后只同步一次，且不在写事务内"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 3)
+        indexer = MemoryIndexer(
+            db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2,
+            embedding_provider=_CountingProvider()
+        )
+        calls = []
+        monkeypatch.setattr(
+            "backend.memory.index.sync_ann_index",
+            lambda db: calls.append(db.in_transaction)
+        )
+
+        indexer.index_files(sorted(memory_dir.glob("*.md")), batch_size=10)
+        assert calls == [False]
+
+        # 内容未变化：没有提交变更，不同步
+        indexer.index_files(sorted(memory_dir.glob("*.md")), batch_size=10)
+        assert calls == [False]
+
+        indexer.close()
+
+    def test_clear_then_reindex_vectors_visible(self, tmp_path):
+        """测试清空后重建的向量对常驻矩阵可见（rowid 不复用）"""
+        from backend.memory import VectorSearchEngine
+
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 1, lines=5)
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", embedding_provider=_CountingProvider())
+        indexer.index_directory(memory_dir)
+        engine = VectorSearchEngine(indexer.db, dims=2, use_sqlite_vec=False)
+        old_id = engine.search([1.0, 0.0], limit=1)[0]["id"]
+
+        (memory_dir / "note-0.md").write_text("rewritten", encoding="utf-8")
+        indexer.index_directory(memory_dir, rebuild=True)
+
+        results = engine.search([1.0, 0.0], limit=10)
+        assert [r["id"] for r in results] != [old_id]
+        assert [r["text"] for r in results] == ["rewritten"]
+
+        indexer.close()
+
+    def _chunk_ids(self, indexer):
+        return {row[0] for row in indexer.db.execute("SELECT id FROM chunks")}
+
+    def _interleave(self, indexer, concurrent_write):
+        """在事务外准备、生成向量之后、写入之前执行一次并发写入"""
+        original = indexer._embed_plans
+        done = []
+
+        def embed_then_write(plans):
+            original(plans)
+            if not done:
+                done.append(True)
+                concurrent_write()
+
+        indexer._embed_plans = embed_then_write
+
+    def test_duplicate_paths_in_batch(self, tmp_path):
+        """测试同一批内重复的路径只索引一次"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 1)
+        path = memory_dir / "note-0.md"
+        indexer = MemoryIndexer(
+            db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2,
+            embedding_provider=_CountingProvider()
+        )
+
+        stats = indexer.index_files([path, path])
+
+        assert stats["updated"] == 1
+        assert stats["failed"] == 0
+        assert indexer.get_status()["chunk_count"] == stats["chunks_added"] > 0
+
+        indexer.close()
+
+    def test_concurrent_write_same_content(self, tmp_path):
+        """测试准备之后被其他写入索引为相同内容时跳过，不重复插入"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 1)
+        path = memory_dir / "note-0.md"
+        indexer = MemoryIndexer(
+            db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2,
+            embedding_provider=_CountingProvider()
+        )
+        indexer.index_file(path)
+        path.write_text("\n".join(f"changed line {j}" for j in range(30)), encoding="utf-8")
+        self._interleave(indexer, lambda: indexer.index_file(path))
+
+        stats = indexer.index_files([path])
+
+        assert stats["failed"] == 0
+        assert stats["updated"] == 0
+
+        fresh = MemoryIndexer(db_path=tmp_path / "fresh.db", chunk_size=10, chunk_overlap=2)
+        fresh.index_file(path)
+        assert self._chunk_ids(indexer) == self._chunk_ids(fresh)
+        vectors = indexer.db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0]
+        assert vectors == len(self._chunk_ids(fresh))
+
+        fresh.close()
+        indexer.close()
+
+    def test_concurrent_write_rediffs_plan(self, tmp_path):
+        """测试准备之后索引被其他写入改动时按当前索引重新对比"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 1)
+        path = memory_dir / "note-0.md"
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db", chunk_size=10, chunk_overlap=2)
+        indexer.index_file(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\nmore line 1\nmore line 2")
+        self._interleave(indexer, lambda: indexer.remove_file(path))
+
+        stats = indexer.index_files([path])
+
+        assert stats["failed"] == 0
+        assert stats["updated"] == 1
+
+        fresh = MemoryIndexer(db_path=tmp_path / "fresh.db", chunk_size=10, chunk_overlap=2)
+        fresh.index_file(path)
+        assert self._chunk_ids(indexer) == self._chunk_ids(fresh)
+
+        fresh.close()
+        indexer.close()
+
+    def test_time_range_recorded_once(self, tmp_path):
+        """测试无日期文件也会写入分片时间范围，避免每次回退扫描 files 表"""
+        memory_dir = tmp_path / "memory"
+        self._make_corpus(memory_dir, 2)
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+
+        indexer.index_directory(memory_dir)
+
+        row = indexer.db.execute("SELECT value FROM meta WHERE key = 'time_range'").fetchone()
+        assert row is not None
+        assert '"undated": true' in row[0]
+
+        indexer.close()
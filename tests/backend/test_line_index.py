@@ -0,0 +1,182 @@
+"""
+行级倒排索引测试
+"""
+
+import importlib
+import re
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+from backend.memory.index import MemoryIndexer
+from backend.memory import line_index as line_index_module
+from backend.memory.line_index import (
+    LineIndex,
+    classify_memory_file,
+    extract_required_literals,
+)
+
+
+def _daily_name(days_ago: int) -> str:
+    return (date.today() - timedelta(days=days_ago)).strftime("%Y-%m-%d.md")
+
+
+@pytest.fixture
+def memory_dir(tmp_path):
+    """包含长期记忆、bank 和每日日志的记忆目录"""
+    root = tmp_path / "memory"
+    (root / "bank").mkdir(parents=True)
+    (root / "MEMORY.md").write_text("# 长期记忆\nGMV 异常检测规则\n数据口径说明\n", encoding="utf-8")
+    (root / "bank" / "world.md").write_text("- W @Python: decorator 用法\n- B @项目: 完成\n", encoding="utf-8")
+    (root / _daily_name(0)).write_text("今天 GMV 下降\n排查渠道数据\n", encoding="utf-8")
+    (root / _daily_name(30)).write_text("上月 GMV 异常\n", encoding="utf-8")
+    (root / "notes.md").write_text("GMV 不在搜索范围\n", encoding="utf-8")
+    return root
+
+
+def _search(index, query, **kwargs):
+    pattern = re.compile(query, re.IGNORECASE | re.MULTILINE)
+    return index.search(pattern, **kwargs)
+
+
+class TestLiterals:
+    """测试必需字面片段提取"""
+
+    def test_plain_literal(self):
+        assert extract_required_literals("decorator") == ["decorator"]
+
+    def test_regex_breaks_runs(self):
+        assert extract_required_literals(r"decorator.*\w+func") == ["decorator", "func"]
+        assert extract_required_literals("ab?cde") == ["a", "cde"]
+
+    def test_alternation_has_no_literals(self):
+        assert extract_required_literals("foo|bar") == []
+
+    def test_invalid_pattern(self):
+        assert extract_required_literals("[unclosed") is None
+
+
+class TestClassify:
+    """测试记忆文件分类"""
+
+    def test_kinds(self):
+        assert classify_memory_file(Path("MEMORY.md"))[0] == "long_term"
+        assert classify_memory_file(Path("bank/world.md"))[0] == "bank"
+        kind, _, file_date = classify_memory_file(Path("2026-01-02.md"))
+        assert (kind, file_date) == ("daily", "2026-01-02")
+
+    def test_out_of_scope(self):
+        assert classify_memory_file(Path("notes.md")) is None
+        assert classify_memory_file(Path(".index/x.md")) is None
+        assert classify_memory_file(Path("bank/data.txt")) is None
+
+
+class TestLineIndexSearch:
+    """测试索引查询"""
+
+    def test_sync_indexes_in_scope_files(self, memory_dir):
+        index = LineIndex(memory_dir)
+        stats = index.sync()
+        assert stats["files"] == 4
+        assert index.get_status()["files"] == 4
+        index.close()
+
+    def test_trigram_query_order_and_context(self, memory_dir):
+        index = LineIndex(memory_dir)
+        results = _search(index, "gmv", context_lines=1)
+
+        assert [r["path"] for r in results] == ["MEMORY.md", _daily_name(0), _daily_name(30)]
+        assert results[0]["line_number"] == 2
+        assert results[0]["content"] == "# 长期记忆\nGMV 异常检测规则\n数据口径说明"
+        index.close()
+
+    def test_trigram_path_matches_direct_scan(self, memory_dir, monkeypatch):
+        index = LineIndex(memory_dir)
+        queries = ["gmv", "异常检测", r"decorator\s+用法", "下降|完成"]
+        direct = [_search(index, q) for q in queries]
+
+        monkeypatch.setattr(line_index_module, "DIRECT_SCAN_MAX_LINES", 0)
+        assert [_search(index, q) for q in queries] == direct
+        index.close()
+
+    def test_short_and_regex_queries(self, memory_dir):
+        index = LineIndex(memory_dir)
+        assert [r["path"] for r in _search(index, "数据")] == ["MEMORY.md", _daily_name(0)]
+        assert len(_search(index, "下降|完成")) == 2
+        assert _search(index, r"decorator\s+用法")[0]["path"] == str(Path("bank/world.md"))
+        index.close()
+
+    def test_entity_and_type_filters(self, memory_dir):
+        index = LineIndex(memory_dir)
+        results = _search(index, "@", entity_patterns=[re.compile("@python", re.I)],
+                          memory_type="bank")
+        assert len(results) == 1
+        assert "decorator" in results[0]["content"]
+        index.close()
+
+    def test_since_days_prunes_daily_logs(self, memory_dir):
+        index = LineIndex(memory_dir)
+        results = _search(index, "GMV", since_days=7)
+        assert [r["path"] for r in results] == ["MEMORY.md", _daily_name(0)]
+        assert [p.name for p in index.list_files("daily", since_days=7)] == [_daily_name(0)]
+        assert _search(index, "GMV", memory_type="daily", since_days=0) == []
+        index.close()
+
+    def test_max_results(self, memory_dir):
+        index = LineIndex(memory_dir)
+        assert len(_search(index, "GMV", max_results=2)) == 2
+        index.close()
+
+    def test_unattached_index_reconciles_disk(self, memory_dir):
+        index = LineIndex(memory_dir)
+        assert _search(index, "新增内容") == []
+
+        (memory_dir / "MEMORY.md").write_text("新增内容\n", encoding="utf-8")
+        (memory_dir / _daily_name(30)).unlink()
+
+        assert len(_search(index, "新增内容")) == 1
+        assert [r["path"] for r in _search(index, "GMV")] == [_daily_name(0)]
+        index.close()
+
+
+class TestChangeFeed:
+    """测试通过 MemoryIndexer 变更通知更新"""
+
+    def test_attached_index_follows_indexer(self, memory_dir, tmp_path, monkeypatch):
+        indexer = MemoryIndexer(db_path=tmp_path / "index.db")
+        index = LineIndex(memory_dir)
+        index.attach(indexer)
+        assert len(_search(index, "GMV")) == 3
+
+        # 接入后查询不再扫描磁盘
+        def fail_scan():
+            raise AssertionError("attached index should not scan disk")
+        monkeypatch.setattr(index, "_scan", fail_scan)
+
+        new_log = memory_dir / _daily_name(1)
+        new_log.write_text("昨天 GMV 回升\n", encoding="utf-8")
+        indexer.index_file(new_log)
+        assert _daily_name(1) in [r["path"] for r in _search(index, "GMV")]
+
+        new_log.unlink()
+        indexer.remove_file(new_log)
+        assert _daily_name(1) not in [r["path"] for r in _search(index, "GMV")]
+
+        index.detach(indexer)
+        assert indexer._change_listeners == []
+        index.close()
+        indexer.close()
+
+
+class TestMemorySearchTool:
+    """测试 memory_search 使用行级索引"""
+
+    def test_index_matches_regex_scan(self, memory_dir, monkeypatch):
+        ms_module = importlib.import_module("backend.memory.tools.memory_search")
+        monkeypatch.setattr(ms_module, "MEMORY_DIR", memory_dir)
+        for query in ["GMV", "数据", "gmv.*下降", "下降|异常", "@Python"]:
+            pattern = re.compile(query, re.IGNORECASE | re.MULTILINE)
+            indexed = ms_module._search_line_index(pattern, None, "all", 7, 10, 2)
+            scanned = ms_module._scan_files(pattern, None, "all", 7, 10, 2)
+            assert indexed == scanned, query
@@ -0,0 +1,103 @@
+"""
+行偏移索引测试
+"""
+
+import os
+
+import pytest
+
+from backend.memory.line_offsets import (
+    OFFSETS_DIR,
+    LineOffsetIndex,
+    get_line_offset_index,
+    reset_line_offset_indexes,
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    reset_line_offset_indexes()
+    yield
+    reset_line_offset_indexes()
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    path = tmp_path / "2026-01-02.md"
+    path.write_text("".join(f"第{i}行 GMV 数据\n" for i in range(1, 201)), encoding="utf-8")
+    return path
+
+
+def _reference(path, line_start=None, line_end=None):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    start = (line_start or 1) - 1
+    return "".join(lines[start:line_end or len(lines)])
+
+
+class TestReadText:
+    """测试按行范围读取"""
+
+    @pytest.mark.parametrize("line_start,line_end", [
+        (None, None), (1, 1), (1, 10), (100, 150), (None, 5), (195, None), (200, 500), (300, 400),
+    ])
+    def test_matches_readlines(self, tmp_path, log_file, line_start, line_end):
+        index = LineOffsetIndex(tmp_path)
+        text, truncated = index.read_text(log_file, line_start, line_end)
+        assert text == _reference(log_file, line_start, line_end)
+        assert truncated is False
+
+    def test_max_chars_prefix(self, tmp_path, log_file):
+        index = LineOffsetIndex(tmp_path)
+        text, truncated = index.read_text(log_file, line_start=50, max_chars=25)
+        assert text == _reference(log_file, 50)[:25]
+        assert truncated is True
+
+        text, truncated = index.read_text(log_file, 1, 1, max_chars=100)
+        assert (text, truncated) == ("第1行 GMV 数据\n", False)
+
+    def test_crlf_and_missing_trailing_newline(self, tmp_path):
+        path = tmp_path / "MEMORY.md"
+        path.write_bytes("一\r\n二\r\n三".encode("utf-8"))
+        index = LineOffsetIndex(tmp_path)
+        assert index.read_text(path, 2, 3) == ("二\n三", False)
+        assert index.read_text(path) == ("一\n二\n三", False)
+
+    def test_empty_file(self, tmp_path):
+        path = tmp_path / "MEMORY.md"
+        path.write_bytes(b"")
+        assert LineOffsetIndex(tmp_path).read_text(path, 1, 5) == ("", False)
+
+    def test_whole_file_read_skips_offsets(self, tmp_path, log_file):
+        index = LineOffsetIndex(tmp_path)
+        index.read_text(log_file, max_chars=10)
+        assert index.builds == 0
+        assert not (tmp_path / OFFSETS_DIR).exists()
+
+
+class TestSidecar:
+    """测试 sidecar 持久化与失效"""
+
+    def test_reused_across_instances(self, tmp_path, log_file):
+        first = LineOffsetIndex(tmp_path)
+        first.read_text(log_file, 10, 20)
+        assert first.builds == 1
+        assert len(list((tmp_path / OFFSETS_DIR).glob("*.off"))) == 1
+
+        second = LineOffsetIndex(tmp_path)
+        assert second.read_text(log_file, 10, 20)[0] == _reference(log_file, 10, 20)
+        assert second.builds == 0
+
+    def test_invalidated_by_change(self, tmp_path, log_file):
+        index = LineOffsetIndex(tmp_path)
+        index.read_text(log_file, 1, 2)
+
+        log_file.write_text("新的第一行\n新的第二行\n", encoding="utf-8")
+        stat = log_file.stat()
+        os.utime(log_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        assert index.read_text(log_file, 2, 2) == ("新的第二行\n", False)
+        assert index.builds == 2
+
+    def test_shared_per_directory(self, tmp_path):
+        assert get_line_offset_index(tmp_path) is get_line_offset_index(tmp_path / ".")
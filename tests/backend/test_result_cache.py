@@ -0,0 +1,194 @@
+"""
+搜索结果缓存测试
+"""
+
+import importlib
+import sqlite3
+
+import pytest
+
+from backend.memory.index import MemoryIndexer
+from backend.memory.result_cache import (
+    SearchResultCache,
+    get_search_result_cache,
+    make_search_cache_key,
+    normalize_query,
+    reset_search_result_cache,
+)
+from backend.memory.schema import read_index_generation
+from backend.memory.sharded_search import reset_sharded_search_executor
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    reset_search_result_cache()
+    yield
+    reset_search_result_cache()
+
+
+class TestSearchResultCache:
+    """测试 LRU 缓存本身"""
+
+    def test_lru_eviction_and_stats(self):
+        cache = SearchResultCache(max_entries=2, max_bytes=1 << 20)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        assert cache.get("a") == "A"  # a 变为最近使用
+        cache.put("c", "C")           # 淘汰 b
+
+        assert cache.get("b") is None
+        assert cache.get("c") == "C"
+        stats = cache.get_stats()
+        assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1, 1)
+        assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+    def test_byte_limit(self):
+        cache = SearchResultCache(max_entries=100, max_bytes=2000)
+        for i in range(10):
+            cache.put(i, "x" * 500)
+        stats = cache.get_stats()
+        assert stats["bytes"] <= 2000
+        assert stats["entries"] < 10
+        cache.put("huge", "x" * 5000)
+        assert cache.get("huge") is None
+
+    def test_disabled(self):
+        cache = SearchResultCache(max_entries=0)
+        cache.put("a", "A")
+        assert not cache.enabled
+        assert cache.get("a") is None
+
+    def test_key_normalization(self):
+        assert normalize_query("  Python   装饰器 ") == "python 装饰器"
+        key = make_search_cache_key("ns", "Python  GMV", (("a.db", (1, 2), 3),), entities=["@x"])
+        assert key == make_search_cache_key("ns", "python gmv", (("a.db", (1, 2), 3),), entities=("@x",))
+        assert key != make_search_cache_key("ns", "python gmv", (("a.db", (1, 2), 4),), entities=["@x"])
+
+    def test_case_sensitive_key(self):
+        generations = (("a.db", (1, 2), 3),)
+        key = make_search_cache_key("ns", " API  docs", generations, case_sensitive=True)
+        assert key == make_search_cache_key("ns", "API docs", generations, case_sensitive=True)
+        assert key != make_search_cache_key("ns", "api docs", generations, case_sensitive=True)
+        assert normalize_query("API  docs", casefold=False) == "API docs"
+
+
+class TestIndexGeneration:
+    """测试 MemoryIndexer 维护的索引代数"""
+
+    def test_bumped_on_write_only(self, tmp_path):
+        indexer = MemoryIndexer(db_path=tmp_path / "index.db")
+        assert read_index_generation(indexer.db) == 0
+
+        note = tmp_path / "a.md"
+        note.write_text("python decorators", encoding="utf-8")
+        indexer.index_file(note)
+        first = read_index_generation(indexer.db)
+        assert first > 0
+
+        # 内容未变化的重新索引不递增
+        indexer.index_files([note])
+        assert read_index_generation(indexer.db) == first
+
+        indexer.remove_file(note)
+        assert read_index_generation(indexer.db) > first
+        indexer.close()
+
+    def test_legacy_index_without_meta(self):
+        db = sqlite3.connect(":memory:")
+        assert read_index_generation(db) == 0
+        db.close()
+
+
+class TestIndexerSearchCache:
+    """测试 MemoryIndexer.search 结果缓存"""
+
+    def test_hit_until_write(self, tmp_path, monkeypatch):
+        indexer = MemoryIndexer(db_path=tmp_path / "index.db")
+        note = tmp_path / "a.md"
+        note.write_text("python decorators", encoding="utf-8")
+        indexer.index_file(note)
+
+        first = indexer.search("Python")
+        calls = []
+        original = indexer._search_uncached
+        monkeypatch.setattr(
+            indexer, "_search_uncached", lambda *args: calls.append(args) or original(*args)
+        )
+
+        second = indexer.search("python ")
+        assert second == first and calls == []
+        second[0]["text"] = "mutated"
+        assert indexer.search("python")[0]["text"] == "python decorators"
+
+        # 另一个连接（如其他进程的索引器）写入后失效
+        other = MemoryIndexer(db_path=tmp_path / "index.db")
+        extra = tmp_path / "b.md"
+        extra.write_text("python generators", encoding="utf-8")
+        other.index_file(extra)
+        other.close()
+
+        assert len(indexer.search("python")) == 2
+        assert len(calls) == 1
+        assert get_search_result_cache().get_stats()["hits"] == 2
+        indexer.close()
+
+
+class TestMemorySearchV2Cache:
+    """测试 memory_search_v2 结果缓存"""
+
+    def test_hit_skips_embedding_and_invalidates_on_write(self, tmp_path, monkeypatch):
+        search_module = importlib.import_module("backend.memory.tools.memory_search_v2")
+        db_path = tmp_path / "memory.db"
+        indexer = MemoryIndexer(db_path=db_path)
+        note = tmp_path / "a.md"
+        note.write_text("python decorators", encoding="utf-8")
+        indexer.index_file(note)
+
+        embed_calls = []
+
+        class StubProvider:
+            def encode_single(self, text):
+                embed_calls.append(text)
+                return [1.0, 0.0]
+
+        monkeypatch.setattr(
+            "backend.memory.index_rotation.get_all_index_paths", lambda: [db_path]
+        )
+        monkeypatch.setattr(
+            search_module, "get_embedding_provider", lambda **kwargs: StubProvider()
+        )
+        reset_sharded_search_executor()
+
+        first = search_module.memory_search_v2("python", min_score=0.0)
+        assert "a.md" in first
+        assert len(embed_calls) == 1
+
+        # 命中缓存：不再计算查询向量；输出回显本次调用的原始查询
+        cached = search_module.memory_search_v2(" python ", min_score=0.0)
+        assert len(embed_calls) == 1
+        assert cached == first.replace('"python"', '" python "')
+
+        # 混合检索的查询向量区分大小写，大小写不同不命中
+        search_module.memory_search_v2("Python", min_score=0.0)
+        assert len(embed_calls) == 2
+
+        # 纯文本检索忽略大小写
+        text_only = search_module.memory_search_v2("python", min_score=0.0, use_hybrid=False)
+        upper = search_module.memory_search_v2("PYTHON", min_score=0.0, use_hybrid=False)
+        assert upper == text_only.replace('"python"', '"PYTHON"')
+        assert len(embed_calls) == 2
+
+        # 参数不同不命中
+        search_module.memory_search_v2("python", min_score=0.0, max_results=3)
+        assert len(embed_calls) == 3
+
+        # 索引写入后失效
+        extra = tmp_path / "b.md"
+        extra.write_text("python generators", encoding="utf-8")
+        indexer.index_file(extra)
+        refreshed = search_module.memory_search_v2("python", min_score=0.0)
+        assert len(embed_calls) == 4
+        assert "b.md" in refreshed
+
+        indexer.close()
+        reset_sharded_search_executor()
@@ -0,0 +1,275 @@
+"""
+分片并行搜索测试
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.memory import MemoryIndexer
+from backend.memory.index_rotation import (
+    extract_path_date,
+    read_shard_time_range,
+    shard_may_contain_since,
+)
+from backend.memory.sharded_search import ShardedSearchExecutor, merge_top_k
+from backend.memory.vector_search import HAS_NUMPY, VectorSearchEngine
+
+
+def _days_ago(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _build_shard(db_path, rows, vectors=None):
+    """创建分片：rows 为 (id, path, text)，vectors 为 {id: embedding}"""
+    db = sqlite3.connect(db_path)
+    db.execute("""
+        CREATE TABLE chunks (
+            id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            source TEXT NOT NULL,
+            start_line INTEGER NOT NULL,
+            end_line INTEGER NOT NULL,
+            text TEXT NOT NULL
+        );
+    """)
+    db.execute("CREATE TABLE files (path TEXT PRIMARY KEY)")
+    db.execute("CREATE VIRTUAL TABLE chunks_fts USING fts5(text)")
+    db.executemany(
+        "INSERT INTO chunks VALUES (?, ?, 'memory', 1, 1, ?)", rows
+    )
+    db.executemany("INSERT OR IGNORE INTO files VALUES (?)", [(row[1],) for row in rows])
+    db.execute("INSERT INTO chunks_fts (rowid, text) SELECT rowid, text FROM chunks")
+    if vectors:
+        engine = VectorSearchEngine(db, dims=2, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+        for chunk_id, embedding in vectors.items():
+            engine.insert_vector(chunk_id, embedding)
+    db.commit()
+    db.close()
+
+
+def _search_by_text(conn):
+    """按 text 中的数字打分的简单分片搜索"""
+    rows = conn.db.execute("SELECT id, text FROM chunks").fetchall()
+    return [{"id": chunk_id, "score": float(text.split()[-1])} for chunk_id, text in rows]
+
+
+class TestShardTimeRange:
+    """测试分片时间范围元数据"""
+
+    def test_extract_path_date(self):
+        assert extract_path_date("memory/2025-01-02.md") == "2025-01-02"
+        assert extract_path_date("memory/MEMORY.md") is None
+
+    def test_indexer_maintains_time_range(self, tmp_path):
+        """测试 MemoryIndexer 写入时间范围"""
+        indexer = MemoryIndexer(db_path=tmp_path / "memory.db")
+        for name in ["2025-01-05.md", "2025-01-02.md"]:
+            path = tmp_path / name
+            path.write_text("note", encoding="utf-8")
+            indexer.index_file(path)
+
+        time_range = read_shard_time_range(indexer.db)
+        indexer.close()
+
+        assert time_range == {"min_date": "2025-01-02", "max_date": "2025-01-05", "undated": False}
+
+    def test_legacy_shard_falls_back_to_files(self, tmp_path):
+        """测试无 meta 记录时从 files 表推算"""
+        db = sqlite3.connect(":memory:")
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.execute("CREATE TABLE files (path TEXT PRIMARY KEY)")
+        db.executemany("INSERT INTO files VALUES (?)", [("memory/2024-03-01.md",), ("notes.md",)])
+
+        assert read_shard_time_range(db) == {
+            "min_date": "2024-03-01", "max_date": "2024-03-01", "undated": True
+        }
+
+    def test_shard_may_contain_since(self):
+        old = {"min_date": "2020-01-01", "max_date": "2020-02-01", "undated": False}
+        assert not shard_may_contain_since(old, "2021-01-01")
+        assert shard_may_contain_since(old, "2020-01-15")
+        assert shard_may_contain_since(dict(old, undated=True), "2021-01-01")
+        assert shard_may_contain_since(None, "2021-01-01")
+
+
+class TestMergeTopK:
+    """测试堆合并"""
+
+    def test_merge_dedup_and_limit(self):
+        shards = [
+            [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.5}],
+            [{"id": "c", "score": 0.8}, {"id": "a", "score": 0.7}],
+            [],
+        ]
+
+        merged = merge_top_k(shards, limit=3)
+
+        assert [(r["id"], r["score"]) for r in merged] == [("a", 0.9), ("c", 0.8), ("b", 0.5)]
+
+
+class TestShardedSearchExecutor:
+    """测试分片搜索执行器"""
+
+    def test_search_across_shards(self, tmp_path):
+        """测试并发搜索多个分片并合并"""
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"memory-{i}.db"
+            _build_shard(path, [(f"s{i}-{j}", "memory/a.md", f"x {i * 10 + j}") for j in range(3)])
+            paths.append(path)
+        executor = ShardedSearchExecutor(max_workers=3)
+
+        results = executor.search(paths + [tmp_path / "missing.db"], _search_by_text, limit=4)
+        executor.close()
+
+        assert [r["id"] for r in results] == ["s2-2", "s2-1", "s2-0", "s1-2"]
+        assert results[0]["_index_file"] == "memory-2.db"
+
+    def test_failed_shard_is_skipped(self, tmp_path):
+        """测试单个分片失败不影响其他分片"""
+        good = tmp_path / "memory.db"
+        _build_shard(good, [("c1", "memory/a.md", "x 1")])
+        bad = tmp_path / "memory-1.db"
+        sqlite3.connect(bad).close()  # 空数据库，没有 chunks 表
+        executor = ShardedSearchExecutor()
+
+        results = executor.search([good, bad], _search_by_text, limit=5)
+        executor.close()
+
+        assert [r["id"] for r in results] == ["c1"]
+
+    def test_since_days_skips_old_shards(self, tmp_path):
+        """测试 since_days 跳过旧分片"""
+        old = tmp_path / "memory.db"
+        _build_shard(old, [("old", f"memory/{_days_ago(400)}.md", "x 1")])
+        new = tmp_path / "memory-1.db"
+        _build_shard(new, [("new", f"memory/{_days_ago(1)}.md", "x 1")])
+        executor = ShardedSearchExecutor()
+
+        searched = []
+
+        def search_fn(conn):
+            searched.append(conn.path.name)
+            return _search_by_text(conn)
+
+        results = executor.search([old, new], search_fn, limit=5, since_days=30)
+        executor.close()
+
+        assert searched == ["memory-1.db"]
+        assert [r["id"] for r in results] == ["new"]
+
+    def test_connection_pool_is_bounded(self, tmp_path):
+        """测试每个分片的连接数有上限且连接被复用"""
+        path = tmp_path / "memory.db"
+        _build_shard(path, [("c1", "memory/a.md", "x 1")])
+        executor = ShardedSearchExecutor(connections_per_shard=2)
+        pool = executor.get_pool(path)
+
+        opened = set()
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(20):
+                with pool.connection() as conn:
+                    with lock:
+                        opened.add(id(conn))
+                        active.append(conn)
+                        peak.append(len(active))
+                    conn.db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+                    with lock:
+                        active.remove(conn)
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        executor.close()
+
+        assert max(peak) <= 2
+        assert len(opened) <= 2
+
+    def test_reopen_after_file_replaced(self, tmp_path):
+        """测试索引文件被替换后重新打开连接"""
+        path = tmp_path / "memory.db"
+        _build_shard(path, [("old", "memory/a.md", "x 1")])
+        executor = ShardedSearchExecutor()
+        assert [r["id"] for r in executor.search([path], _search_by_text, 5)] == ["old"]
+
+        rebuilt = tmp_path / "rebuilt.db"
+        _build_shard(rebuilt, [("new", "memory/a.md", "x 1")])
+        path.rename(tmp_path / "keep.db")  # 保持旧 inode 存活，避免被复用
+        rebuilt.rename(path)
+
+        assert [r["id"] for r in executor.search([path], _search_by_text, 5)] == ["new"]
+        executor.close()
+
+    def test_tables_cached_until_schema_changes(self, tmp_path):
+        """测试表名探测按 schema_version 缓存，建表后失效"""
+        path = tmp_path / "memory.db"
+        _build_shard(path, [("a", "memory/a.md", "x 1")])
+        executor = ShardedSearchExecutor()
+        probes = []
+
+        def search_fn(conn):
+            probes.append(conn.tables())
+            return []
+
+        executor.search([path], search_fn, 5)
+        executor.search([path], search_fn, 5)
+        assert probes[0] is probes[1]
+        assert "chunk_vectors" not in probes[0]
+
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE chunk_vectors (id TEXT PRIMARY KEY)")
+        db.commit()
+        db.close()
+
+        executor.search([path], search_fn, 5)
+        assert "chunk_vectors" in probes[2]
+        executor.close()
+
+    def test_pool_lookup_reuses_resolved_pool(self, tmp_path):
+        """测试同一文件的不同写法映射到同一个连接池"""
+        path = tmp_path / "memory.db"
+        _build_shard(path, [("a", "memory/a.md", "x 1")])
+        executor = ShardedSearchExecutor()
+
+        pool = executor.get_pool(path)
+        assert executor.get_pool(path) is pool
+        assert executor.get_pool(tmp_path / "." / "memory.db") is pool
+        executor.close()
+
+    @pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+    def test_hybrid_search_does_not_write(self, tmp_path):
+        """测试分片连接上的混合搜索不写入数据库"""
+        path = tmp_path / "memory.db"
+        _build_shard(
+            path,
+            [("chunk1", "memory/a.md", "python programming"), ("chunk2", "memory/b.md", "javascript")],
+            {"chunk1": [1.0, 0.0], "chunk2": [0.0, 1.0]}
+        )
+        executor = ShardedSearchExecutor()
+
+        def search_fn(conn):
+            engine = conn.get_hybrid_engine(2, ann_min_vectors=None)
+            assert conn.get_hybrid_engine(2, ann_min_vectors=None) is engine
+            results = engine.search("python", [1.0, 0.0], limit=5, fts_weight=0.0, vec_weight=1.0)
+            assert conn.db.total_changes == 0
+            with pytest.raises(sqlite3.OperationalError):
+                conn.db.execute("DELETE FROM chunk_vectors")
+            return results
+
+        results = executor.search([path], search_fn, limit=5)
+        executor.close()
+
+        assert results[0]["id"] == "chunk1"
+        db = sqlite3.connect(path)
+        assert db.execute("SELECT COUNT(*) FROM chunk_vectors").fetchone()[0] == 2
+        db.close()
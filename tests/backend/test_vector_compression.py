@@ -0,0 +1,243 @@
+"""
+向量压缩测试
+"""
+
+import sqlite3
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from backend.memory.vector_compression import VectorCompressor
+from backend.memory.vector_format import encode_vector
+from backend.memory.vector_search import (
+    QuantizedVectorMatrix,
+    VectorMatrix,
+    VectorSearchEngine,
+    clear_vector_matrices,
+    forget_chunks,
+    get_quantized_matrix,
+)
+
+
+DIMS = 64
+
+
+def _clustered(n, dims=DIMS, rank=12, clusters=30, seed=0):
+    """低秩聚类向量（近似真实嵌入的分布），已归一化"""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((rank, dims))
+    centers = rng.standard_normal((clusters, rank))
+    latent = centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, rank))
+    vectors = latent @ basis + 0.05 * rng.standard_normal((n, dims))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def _recall(truth, approx, k):
+    """approx 中覆盖 truth 前 k 个的比例"""
+    return sum(len(set(t[:k]) & set(a)) for t, a in zip(truth, approx)) / (k * len(truth))
+
+
+def _create_index(path, vectors):
+    db = sqlite3.connect(path)
+    db.execute("""
+        CREATE TABLE chunks (
+            id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            source TEXT NOT NULL,
+            start_line INTEGER NOT NULL,
+            end_line INTEGER NOT NULL,
+            text TEXT NOT NULL
+        );
+    """)
+    VectorSearchEngine(db, dims=vectors.shape[1], use_sqlite_vec=False).ensure_vector_tables()
+    db.executemany(
+        "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"c{i}", "/t.md", "memory" if i % 2 else "sessions", 1, 2, f"c{i}")
+         for i in range(len(vectors))]
+    )
+    db.executemany(
+        "INSERT INTO chunk_vectors (chunk_id, embedding, dims, updated_at) VALUES (?, ?, ?, 0)",
+        [(f"c{i}", encode_vector(vector), vector.shape[0]) for i, vector in enumerate(vectors)]
+    )
+    db.commit()
+    return db
+
+
+@pytest.fixture(autouse=True)
+def fresh_matrices():
+    clear_vector_matrices()
+    yield
+    clear_vector_matrices()
+
+
+class TestVectorCompressor:
+    """测试降维与量化"""
+
+    @pytest.mark.parametrize("reduction,target_dims,quantization,min_recall", [
+        ("none", None, "int8", 0.95),
+        ("pca", 16, "int8", 0.95),
+        ("pca", 16, "none", 0.95),
+        ("pca", 16, "pq", 0.9),
+        # 随机投影与数据无关，近邻区分度明显低于 PCA
+        ("random", 48, "int8", 0.4),
+    ])
+    def test_candidate_recall(self, reduction, target_dims, quantization, min_recall):
+        """近似分数的前 4k 个候选覆盖精确 top-k（重排前的召回）"""
+        vectors = _clustered(3000)
+        queries = _clustered(30, seed=1)
+        compressor = VectorCompressor(
+            DIMS, reduction=reduction, target_dims=target_dims,
+            quantization=quantization, pq_subvectors=8
+        ).fit(vectors)
+        codes = compressor.encode(vectors)
+
+        truth = [np.argsort(-(vectors @ q))[:10] for q in queries]
+        approx = [np.argsort(-compressor.score(q, codes))[:40] for q in queries]
+        assert _recall(truth, approx, 10) >= min_recall
+
+    def test_scores_approximate_inner_product(self):
+        vectors = _clustered(2000)
+        compressor = VectorCompressor(DIMS, target_dims=16).fit(vectors)
+        scores = compressor.score(vectors[0], compressor.encode(vectors))
+        assert np.abs(scores - vectors @ vectors[0]).max() < 0.1
+
+    def test_code_size(self):
+        vectors = _clustered(1000)
+        int8 = VectorCompressor(DIMS, target_dims=16, quantization="int8").fit(vectors)
+        pq = VectorCompressor(DIMS, target_dims=16, quantization="pq", pq_subvectors=8).fit(vectors)
+
+        assert int8.encode(vectors).nbytes == 1000 * 16
+        assert pq.encode(vectors).nbytes == 1000 * 8
+        assert pq.describe()["code_bytes"] == 8
+
+    def test_pq_subvectors_divide_dims(self):
+        compressor = VectorCompressor(DIMS, target_dims=16, quantization="pq", pq_subvectors=6)
+        compressor.fit(_clustered(500))
+        assert compressor.pq_subvectors == 4
+
+    def test_invalid_method(self):
+        with pytest.raises(ValueError, match="Unknown reduction"):
+            VectorCompressor(DIMS, reduction="umap")
+        with pytest.raises(ValueError, match="Unknown quantization"):
+            VectorCompressor(DIMS, quantization="binary")
+
+
+class TestQuantizedVectorMatrix:
+    """测试压缩常驻矩阵"""
+
+    def _matrix(self, **kwargs):
+        settings = {"target_dims": 16, "min_train_vectors": 500}
+        settings.update(kwargs)
+        return QuantizedVectorMatrix(DIMS, **settings)
+
+    def test_small_corpus_stays_exact(self, tmp_path):
+        vectors = _clustered(100)
+        db = _create_index(tmp_path / "memory.db", vectors)
+        matrix = self._matrix()
+        matrix.refresh(db)
+
+        exact = VectorMatrix(DIMS)
+        exact.refresh(db)
+        assert not matrix.is_trained
+        assert matrix.top_k(vectors[3].tolist(), 5) == exact.top_k(vectors[3].tolist(), 5)
+
+    def test_rerank_returns_exact_scores(self, tmp_path):
+        vectors = _clustered(2000)
+        db = _create_index(tmp_path / "memory.db", vectors)
+        matrix = self._matrix(quantization="pq", pq_subvectors=4)
+        matrix.refresh(db)
+        exact = VectorMatrix(DIMS)
+        exact.refresh(db)
+        engine = VectorSearchEngine(db, dims=DIMS, use_sqlite_vec=False)
+        assert matrix.is_trained
+
+        queries = _clustered(20, seed=2)
+        truth = [[c for c, _ in exact.top_k(q.tolist(), 10)] for q in queries]
+        approx = [[c for c, _ in matrix.top_k(q.tolist(), 10)] for q in queries]
+        reranked = [matrix.top_k(q.tolist(), 10, vector_loader=engine._load_vectors) for q in queries]
+
+        assert _recall(truth, [[c for c, _ in r] for r in reranked], 10) > _recall(truth, approx, 10)
+        expected = dict(exact.top_k(queries[0].tolist(), len(vectors)))
+        for chunk_id, score in reranked[0]:
+            assert score == pytest.approx(expected[chunk_id], abs=1e-5)
+
+    def test_memory_footprint(self, tmp_path):
+        vectors = _clustered(4000)
+        db = _create_index(tmp_path / "memory.db", vectors)
+        matrix = self._matrix()
+        matrix.refresh(db)
+        exact = VectorMatrix(DIMS)
+        exact.refresh(db)
+
+        assert matrix._matrix.dtype == np.int8
+        assert matrix.memory_bytes() < exact.memory_bytes() / 2
+        assert matrix.get_stats()["compression"]["code_bytes"] == 16
+
+    def test_incremental_rows_are_encoded(self, tmp_path):
+        vectors = _clustered(1000)
+        db = _create_index(tmp_path / "memory.db", vectors[:600])
+        matrix = self._matrix()
+        matrix.refresh(db)
+
+        db.executemany(
+            "INSERT INTO chunks VALUES (?, ?, 'memory', 1, 2, ?)",
+            [(f"c{i}", "/t.md", f"c{i}") for i in range(600, 1000)]
+        )
+        db.executemany(
+            "INSERT INTO chunk_vectors (chunk_id, embedding, dims, updated_at) VALUES (?, ?, ?, 0)",
+            [(f"c{i}", encode_vector(vectors[i]), DIMS) for i in range(600, 1000)]
+        )
+        matrix.refresh(db)
+
+        engine = VectorSearchEngine(db, dims=DIMS, use_sqlite_vec=False)
+        assert len(matrix) == 1000
+        assert matrix.top_k(vectors[900].tolist(), 1, vector_loader=engine._load_vectors)[0][0] == "c900"
+
+    def test_source_filter_and_tombstones(self, tmp_path):
+        vectors = _clustered(1000)
+        db = _create_index(tmp_path / "memory.db", vectors)
+        matrix = get_quantized_matrix(db, DIMS, {"target_dims": 16, "min_train_vectors": 500,
+                                                 "reduction": "pca", "quantization": "int8",
+                                                 "pq_subvectors": 32, "rerank_factor": 4})
+        matrix.refresh(db)
+        loader = VectorSearchEngine(db, dims=DIMS, use_sqlite_vec=False)._load_vectors
+
+        results = matrix.top_k(vectors[1].tolist(), 5, ["memory"], vector_loader=loader)
+        assert results[0][0] == "c1"
+        assert all(int(c[1:]) % 2 == 1 for c, _ in results)
+
+        forget_chunks(db, ["c1"])
+        assert "c1" not in [c for c, _ in matrix.top_k(vectors[1].tolist(), 5)]
+
+
+class TestEngineCompression:
+    """测试搜索引擎启用压缩"""
+
+    def test_engine_uses_quantized_matrix(self, tmp_path):
+        vectors = _clustered(1500)
+        db = _create_index(tmp_path / "memory.db", vectors)
+        compression = {
+            "enabled": True,
+            "reduction": "pca",
+            "target_dims": 16,
+            "quantization": "int8",
+            "pq_subvectors": 32,
+            "rerank_factor": 4,
+            "min_train_vectors": 1000,
+        }
+        engine = VectorSearchEngine(db, dims=DIMS, use_sqlite_vec=False, compression=compression)
+        results = engine.search(vectors[7].tolist(), limit=3)
+
+        assert isinstance(engine._matrix, QuantizedVectorMatrix)
+        assert engine._matrix.is_trained
+        assert results[0]["id"] == "c7"
+        assert results[0]["score"] == pytest.approx(1.0, abs=1e-5)
+
+    def test_disabled_by_default(self, tmp_path):
+        db = _create_index(tmp_path / "memory.db", _clustered(10))
+        engine = VectorSearchEngine(db, dims=DIMS, use_sqlite_vec=False,
+                                    compression={"enabled": False})
+        engine.search(_clustered(1)[0].tolist(), limit=3)
+        assert not isinstance(engine._matrix, QuantizedVectorMatrix)
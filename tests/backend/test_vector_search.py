@@ -12,10 +12,19 @@ from backend.memory.vector_search import (
     normalize_scores,
     combine_scores,
     VectorSearchEngine,
+    VectorMatrix,
+    IVFIndex,
     HybridSearchEngine,
+    bm25_relevance,
+    get_vector_matrix,
+    get_ann_index,
+    get_ann_index_path,
+    clear_ann_indexes,
+    sync_ann_index,
     HAS_NUMPY,
     HAS_SQLITE_VEC
 )
+from backend.memory.vector_format import encode_vector, decode_vector, decode_vector_array
 
 
 class TestCosineSimilarity:
@@ -55,6 +64,36 @@ class TestCosineSimilarity:
         assert result == 0.0
 
 
+class TestVectorFormat:
+    """测试向量二进制格式"""
+
+    def test_roundtrip_float32(self):
+        """测试 float32 编解码"""
+        blob = encode_vector([0.1, -2.5, 3.0])
+        assert blob[:2] == b"BV"
+        assert decode_vector(blob) == pytest.approx([0.1, -2.5, 3.0])
+
+    @pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+    def test_decode_array_zero_copy(self):
+        """测试数组解码（memoryview 输入）"""
+        blob = encode_vector([1.0, 2.0])
+        array = decode_vector_array(memoryview(blob))
+        assert array.dtype.name == "float32"
+        assert array.tolist() == [1.0, 2.0]
+
+    def test_legacy_text(self):
+        """测试旧版文本格式"""
+        assert decode_vector("1.5,2.5") == [1.5, 2.5]
+        assert decode_vector("") == []
+
+    def test_invalid_blob(self):
+        """测试无效数据"""
+        with pytest.raises(ValueError):
+            decode_vector(b"xx\x01f")
+        with pytest.raises(ValueError, match="dtype"):
+            encode_vector([1.0], dtype="float64")
+
+
 class TestNormalizeScores:
     """测试分数归一化"""
 
@@ -95,6 +134,17 @@ class TestNormalizeScores:
         result = normalize_scores([], method="minmax")
         assert result == []
 
+    def test_max_normalization(self):
+        """测试按最大值缩放（弱匹配保留相对比例）"""
+        assert normalize_scores([4.0, 2.0, 1.0], method="max") == [1.0, 0.5, 0.25]
+        assert normalize_scores([0.0, 0.0], method="max") == [0.0, 0.0]
+
+    def test_bm25_relevance(self):
+        """测试 bm25() 返回值转换为相关度"""
+        assert bm25_relevance(-3.5) == 3.5
+        assert bm25_relevance(0.2) == 0.0
+        assert bm25_relevance(None) == 0.0
+
     def test_unknown_method(self):
         """测试未知归一化方法"""
         with pytest.raises(ValueError, match="Unknown normalization"):
@@ -176,9 +226,28 @@ class TestVectorSearchEngine:
         cursor = db.execute("SELECT embedding, dims FROM chunk_vectors WHERE chunk_id = ?", ("chunk1",))
         row = cursor.fetchone()
         assert row is not None
-        assert row[0] == "0.1,0.2,0.3"
+        assert isinstance(row[0], bytes)
+        assert decode_vector(row[0]) == pytest.approx([0.1, 0.2, 0.3])
         assert row[1] == 3
 
+    def test_search_legacy_text_rows(self, tmp_path):
+        """测试迁移前的文本格式向量仍可搜索"""
+        db = sqlite3.connect(tmp_path / "test.db")
+        _create_chunks_table(db)
+        engine = VectorSearchEngine(db, dims=2, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+
+        db.execute("INSERT INTO chunks VALUES ('old', '/t.md', 'memory', 1, 2, 'old')")
+        db.execute("INSERT INTO chunks VALUES ('new', '/t.md', 'memory', 3, 4, 'new')")
+        db.execute(
+            "INSERT INTO chunk_vectors (chunk_id, embedding, dims, updated_at) "
+            "VALUES ('old', '1.0,0.0', 2, 0)"
+        )
+        engine.insert_vector("new", [0.0, 1.0])
+
+        assert engine.search([1.0, 0.0], limit=1)[0]["id"] == "old"
+        assert engine._search_json_scan([1.0, 0.0], 1, None)[0]["id"] == "old"
+
     def test_insert_vector_dimension_mismatch(self):
         """测试插入维度不匹配的向量"""
         db = sqlite3.connect(":memory:")
@@ -292,6 +361,356 @@ class TestVectorSearchEngine:
         assert count == 0
 
 
+def _create_chunks_table(db):
+    db.execute("""
+        CREATE TABLE chunks (
+            id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            source TEXT NOT NULL,
+            start_line INTEGER NOT NULL,
+            end_line INTEGER NOT NULL,
+            text TEXT NOT NULL
+        );
+    """)
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+class TestVectorMatrix:
+    """测试常驻向量矩阵"""
+
+    def _setup(self, tmp_path, dims=2):
+        db = sqlite3.connect(tmp_path / "test.db")
+        _create_chunks_table(db)
+        engine = VectorSearchEngine(db, dims=dims, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+        return db, engine
+
+    def test_matches_python_scan(self, tmp_path):
+        """测试矩阵搜索与逐行扫描结果一致"""
+        db, engine = self._setup(tmp_path, dims=3)
+        vectors = {
+            "a": [1.0, 0.0, 0.0],
+            "b": [0.7, 0.7, 0.0],
+            "c": [0.0, 1.0, 0.0],
+            "d": [0.2, 0.1, 0.9],
+        }
+        for chunk_id, vector in vectors.items():
+            db.execute("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                       (chunk_id, "/t.md", "memory", 1, 2, chunk_id))
+            engine.insert_vector(chunk_id, vector)
+
+        query = [0.9, 0.3, 0.1]
+        fast = engine.search(query, limit=3)
+        slow = engine._search_json_scan(query, 3, None)
+
+        assert [r["id"] for r in fast] == [r["id"] for r in slow]
+        for f, s in zip(fast, slow):
+            assert f["score"] == pytest.approx(s["score"], abs=1e-5)
+
+    def test_shared_per_index_file(self, tmp_path):
+        """测试同一索引文件共享矩阵"""
+        db, _ = self._setup(tmp_path)
+        other = sqlite3.connect(tmp_path / "test.db")
+
+        assert get_vector_matrix(db, 2) is get_vector_matrix(other, 2)
+        assert get_vector_matrix(db, 2) is not get_vector_matrix(db, 3)
+
+    def test_incremental_refresh(self, tmp_path):
+        """测试增量刷新新增、替换和删除"""
+        db, engine = self._setup(tmp_path)
+        for chunk_id in ("a", "b"):
+            db.execute("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                       (chunk_id, "/t.md", "memory", 1, 2, chunk_id))
+        engine.insert_vector("a", [1.0, 0.0])
+        engine.insert_vector("b", [0.0, 1.0])
+
+        assert engine.search([1.0, 0.0], limit=1)[0]["id"] == "a"
+        assert len(engine._matrix) == 2
+
+        # 替换已有向量
+        engine.insert_vector("b", [1.0, 0.1])
+        assert len(engine._matrix) == 2
+        results = engine.search([0.0, 1.0], limit=2)
+        assert results[0]["id"] == "b"
+        assert len(engine._matrix) == 2
+
+        # 删除
+        db.execute("DELETE FROM chunk_vectors WHERE chunk_id = 'a'")
+        results = engine.search([1.0, 0.0], limit=10)
+        assert [r["id"] for r in results] == ["b"]
+        assert len(engine._matrix) == 1
+
+    def test_delete_top_then_insert(self, tmp_path):
+        """测试删除最大 rowid 的行后再插入（rowid 不复用，新向量可见）"""
+        db, engine = self._setup(tmp_path)
+        for chunk_id in ("a", "b", "c"):
+            db.execute("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                       (chunk_id, "/t.md", "memory", 1, 2, chunk_id))
+        engine.insert_vector("a", [1.0, 0.0])
+        engine.insert_vector("b", [0.0, 1.0])
+        assert engine.search([0.0, 1.0], limit=1)[0]["id"] == "b"
+
+        db.execute("DELETE FROM chunk_vectors WHERE chunk_id = 'b'")
+        engine.insert_vector("c", [0.0, 1.0])
+        # 同一块的向量被替换（旧行恰好是最大 rowid）
+        engine.insert_vector("a", [0.6, 0.8])
+
+        results = engine.search([0.0, 1.0], limit=10)
+        assert [r["id"] for r in results] == ["c", "a"]
+        assert results[1]["score"] == pytest.approx(0.8, abs=1e-5)
+
+    def test_clear_then_insert(self, tmp_path):
+        """测试清空向量表后再插入"""
+        db, engine = self._setup(tmp_path)
+        for chunk_id in ("a", "b"):
+            db.execute("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                       (chunk_id, "/t.md", "memory", 1, 2, chunk_id))
+        engine.insert_vector("a", [1.0, 0.0])
+        engine.search([1.0, 0.0], limit=1)
+
+        db.execute("DELETE FROM chunk_vectors")
+        engine.insert_vector("b", [1.0, 0.0])
+
+        assert [r["id"] for r in engine.search([1.0, 0.0], limit=10)] == ["b"]
+
+    def test_migrates_legacy_table(self, tmp_path):
+        """测试旧版向量表迁移为 AUTOINCREMENT 并保留 rowid"""
+        db = sqlite3.connect(tmp_path / "test.db")
+        _create_chunks_table(db)
+        db.execute("""
+            CREATE TABLE chunk_vectors (
+                chunk_id TEXT PRIMARY KEY, embedding BLOB NOT NULL,
+                dims INTEGER NOT NULL, updated_at INTEGER NOT NULL
+            )
+        """)
+        db.execute("INSERT INTO chunks VALUES ('a', '/t.md', 'memory', 1, 2, 'a')")
+        db.execute(
+            "INSERT INTO chunk_vectors (rowid, chunk_id, embedding, dims, updated_at) "
+            "VALUES (7, 'a', '1.0,0.0', 2, 0)"
+        )
+
+        engine = VectorSearchEngine(db, dims=2, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+
+        sql = db.execute("SELECT sql FROM sqlite_master WHERE name = 'chunk_vectors'").fetchone()[0]
+        assert "AUTOINCREMENT" in sql
+        assert db.execute("SELECT rowid, chunk_id FROM chunk_vectors").fetchall() == [(7, "a")]
+        assert engine.search([1.0, 0.0], limit=1)[0]["id"] == "a"
+
+    def test_skips_vectors_without_chunks(self, tmp_path):
+        """测试 chunks 表已删除的块不会被返回"""
+        db, engine = self._setup(tmp_path)
+        for chunk_id in ("a", "b"):
+            db.execute("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                       (chunk_id, "/t.md", "memory", 1, 2, chunk_id))
+        engine.insert_vector("a", [1.0, 0.0])
+        engine.insert_vector("b", [0.9, 0.1])
+        engine.search([1.0, 0.0], limit=1)
+
+        db.execute("DELETE FROM chunks WHERE id = 'a'")
+        results = engine.search([1.0, 0.0], limit=1)
+
+        assert [r["id"] for r in results] == ["b"]
+
+    def test_top_k_source_mask(self):
+        """测试来源过滤掩码"""
+        matrix = VectorMatrix(dims=2)
+        db = sqlite3.connect(":memory:")
+        _create_chunks_table(db)
+        engine = VectorSearchEngine(db, dims=2, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+        db.execute("INSERT INTO chunks VALUES ('m', '/m.md', 'memory', 1, 2, 'm')")
+        db.execute("INSERT INTO chunks VALUES ('s', '/s.md', 'sessions', 1, 2, 's')")
+        engine.insert_vector("m", [1.0, 0.0])
+        engine.insert_vector("s", [1.0, 0.0])
+
+        matrix.refresh(db)
+
+        assert [c for c, _ in matrix.top_k([1.0, 0.0], 10, ["sessions"])] == ["s"]
+        assert matrix.top_k([1.0, 0.0], 10, ["unknown"]) == []
+        assert len(matrix.top_k([1.0, 0.0], 10)) == 2
+
+
+def _insert_clustered_vectors(db, engine, n, dims, clusters=20, seed=0):
+    """插入聚类分布的随机向量，返回 (ids, vectors)"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dims))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.1 * rng.standard_normal((n, dims))
+    ids = [f"c{i}" for i in range(n)]
+    db.executemany(
+        "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+        [(chunk_id, "/t.md", "memory" if i % 2 else "sessions", 1, 2, chunk_id)
+         for i, chunk_id in enumerate(ids)]
+    )
+    for chunk_id, vector in zip(ids, vectors):
+        engine.insert_vector(chunk_id, vector.tolist())
+    return ids, vectors
+
+
+@pytest.mark.skipif(not HAS_NUMPY, reason="numpy not installed")
+class TestIVFIndex:
+    """测试 IVF 近似最近邻索引"""
+
+    def _setup(self, tmp_path, n=2000, dims=16, **engine_kwargs):
+        db = sqlite3.connect(tmp_path / "memory.db")
+        _create_chunks_table(db)
+        engine = VectorSearchEngine(db, dims=dims, use_sqlite_vec=False, **engine_kwargs)
+        engine.ensure_vector_tables()
+        ids, vectors = _insert_clustered_vectors(db, engine, n, dims)
+        return db, engine, ids, vectors
+
+    def test_recall_against_exact(self, tmp_path):
+        """测试近似搜索召回率"""
+        db, _, _, vectors = self._setup(tmp_path)
+        exact = VectorMatrix(dims=16)
+        exact.refresh(db)
+        ivf = IVFIndex(dims=16, nprobe=8)
+        ivf.refresh(db)
+
+        assert ivf.is_trained
+        hits = 0
+        for query in vectors[:20]:
+            truth = {c for c, _ in exact.top_k(query.tolist(), 10)}
+            approx = {c for c, _ in ivf.top_k(query.tolist(), 10)}
+            hits += len(truth & approx)
+
+        assert hits / 200 >= 0.9
+
+    def test_source_filter_and_tombstones(self, tmp_path):
+        """测试来源过滤和墓碑"""
+        db, _, ids, vectors = self._setup(tmp_path)
+        ivf = IVFIndex(dims=16, nprobe=8)
+        ivf.refresh(db)
+
+        results = ivf.top_k(vectors[1].tolist(), 5, ["memory"])
+        assert results[0][0] == "c1"
+        assert all(int(c[1:]) % 2 == 1 for c, _ in results)
+
+        ivf.mark_deleted(["c1"])
+        assert "c1" not in [c for c, _ in ivf.top_k(vectors[1].tolist(), 5)]
+
+    def test_incremental_add_after_training(self, tmp_path):
+        """测试训练后增量添加"""
+        db, engine, _, _ = self._setup(tmp_path)
+        ivf = IVFIndex(dims=16, nprobe=64)
+        ivf.refresh(db)
+
+        db.execute("INSERT INTO chunks VALUES ('new', '/n.md', 'memory', 1, 2, 'new')")
+        engine.insert_vector("new", [1.0] * 16)
+        ivf.refresh(db)
+
+        assert ivf.top_k([1.0] * 16, 1)[0][0] == "new"
+
+    def test_save_and_load(self, tmp_path):
+        """测试持久化"""
+        db, _, _, vectors = self._setup(tmp_path)
+        path = tmp_path / "memory.ivf.npz"
+        ivf = IVFIndex(dims=16, nprobe=8, path=path)
+        ivf.refresh(db)
+        ivf.mark_deleted(["c0"])
+        ivf.save()
+
+        loaded = IVFIndex(dims=16, nprobe=8, path=path)
+        assert loaded.load()
+        assert loaded.is_trained
+        assert len(loaded) == len(ivf)
+        query = vectors[3].tolist()
+        assert loaded.top_k(query, 5) == ivf.top_k(query, 5)
+
+        # 维度不符时拒绝加载
+        assert IVFIndex(dims=8, path=path).load() is False
+
+    def _build_index_db(self, db_path, prefix, n=1200, dims=16, seed=0):
+        """用正式 schema 建库并插入随机向量，返回 (db, vectors)"""
+        import numpy as np
+        from backend.memory.schema import ensure_memory_index_schema
+
+        db = sqlite3.connect(db_path)
+        ensure_memory_index_schema(db)
+        engine = VectorSearchEngine(db, dims=dims, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+        vectors = np.random.default_rng(seed).standard_normal((n, dims))
+        db.executemany(
+            "INSERT INTO chunks (id, path, source, start_line, end_line, hash, text, updated_at) "
+            "VALUES (?, '/t.md', 'memory', 1, 2, '', ?, 0)",
+            [(f"{prefix}-{i}", f"{prefix}-{i}") for i in range(n)]
+        )
+        engine.insert_vectors([(f"{prefix}-{i}", v.tolist()) for i, v in enumerate(vectors)])
+        db.commit()
+        return db, vectors
+
+    def test_sync_defers_sidecar_rewrite(self, tmp_path):
+        """测试增量同步只刷新内存索引，变更未达阈值时不重写索引文件"""
+        clear_ann_indexes()
+        db, engine, _, _ = self._setup(tmp_path)
+        index = get_ann_index(db, 16, nprobe=64)
+        index.refresh(db)
+        index.save()
+        path = get_ann_index_path(tmp_path / "memory.db")
+        saved = path.stat().st_mtime_ns
+
+        db.execute("INSERT INTO chunks VALUES ('new', '/n.md', 'memory', 1, 2, 'new')")
+        engine.insert_vector("new", [1.0] * 16)
+        db.commit()
+
+        assert sync_ann_index(db) is index
+        assert index.top_k([1.0] * 16, 1)[0][0] == "new"
+        assert path.stat().st_mtime_ns == saved
+        clear_ann_indexes()
+
+    def test_saved_index_rejected_for_recreated_db(self, tmp_path):
+        """测试数据库删除重建后不再使用旧的索引文件"""
+        clear_ann_indexes()
+        db_path = tmp_path / "memory.db"
+        ann_path = get_ann_index_path(db_path)
+
+        old_db, _ = self._build_index_db(db_path, "old", seed=0)
+        old = get_ann_index(old_db, 16)
+        old.refresh(old_db)
+        assert old.is_trained
+        old.save()
+        old_db.close()
+        clear_ann_indexes()
+        db_path.unlink()
+
+        new_db, vectors = self._build_index_db(db_path, "new", seed=1)
+        query = vectors[5].tolist()
+
+        assert IVFIndex(dims=16, path=ann_path).load(db=new_db) is False
+        index = get_ann_index(new_db, 16, nprobe=64)
+        index.refresh(new_db)
+        results = index.top_k(query, 3)
+        assert results[0][0] == "new-5"
+        assert all(chunk_id.startswith("new-") for chunk_id, _ in results)
+
+        # 未校验加载的旧索引在刷新时按数据库标识整体重建
+        stale = IVFIndex(dims=16, nprobe=64, path=ann_path)
+        assert stale.load()
+        stale.refresh(new_db)
+        assert all(chunk_id.startswith("new-") for chunk_id, _ in stale.top_k(query, 3))
+
+        new_db.close()
+        clear_ann_indexes()
+
+    def test_engine_switches_to_ann(self, tmp_path):
+        """测试超过阈值后引擎使用 ANN 并持久化到索引文件旁"""
+        clear_ann_indexes()
+        db, engine, _, vectors = self._setup(tmp_path, ann_min_vectors=1000)
+
+        results = engine.search(vectors[5].tolist(), limit=3)
+
+        assert isinstance(engine._matrix, IVFIndex)
+        assert results[0]["id"] == "c5"
+        assert get_ann_index_path(tmp_path / "memory.db").exists()
+
+        small = VectorSearchEngine(db, dims=16, use_sqlite_vec=False, ann_min_vectors=None)
+        small.search(vectors[5].tolist(), limit=3)
+        assert not isinstance(small._matrix, IVFIndex)
+        clear_ann_indexes()
+
+
 class TestHybridSearchEngine:
     """测试混合搜索引擎"""
 
@@ -408,6 +827,121 @@ class TestHybridSearchEngine:
         python_chunks = [r for r in results if "python" in r["text"].lower()]
         assert len(python_chunks) >= 1
 
+    def test_search_without_vector_table(self):
+        """测试向量表不存在时仅使用 FTS 且不建表"""
+        db = sqlite3.connect(":memory:")
+        _create_chunks_table(db)
+        db.execute("CREATE VIRTUAL TABLE chunks_fts USING fts5(text)")
+        db.execute("INSERT INTO chunks VALUES ('c1', '/a.md', 'memory', 1, 2, 'python')")
+        db.execute("INSERT INTO chunks_fts (rowid, text) SELECT rowid, text FROM chunks")
+        engine = HybridSearchEngine(db, dims=2, use_sqlite_vec=False)
+
+        results = engine.search("python", [1.0, 0.0], limit=5)
+
+        assert [r["id"] for r in results] == ["c1"]
+        assert not engine.vec_engine.has_vector_table()
+
+
+class TestHybridScoring:
+    """测试 BM25 分数与融合"""
+
+    def _engine(self, texts, vectors):
+        db = sqlite3.connect(":memory:")
+        _create_chunks_table(db)
+        db.execute("CREATE VIRTUAL TABLE chunks_fts USING fts5(text)")
+        for i, text in enumerate(texts):
+            db.execute(
+                "INSERT INTO chunks VALUES (?, ?, 'memory', 1, 2, ?)", (f"c{i}", f"/{i}.md", text)
+            )
+        db.execute("INSERT INTO chunks_fts (rowid, text) SELECT rowid, text FROM chunks")
+        engine = HybridSearchEngine(db, dims=2, use_sqlite_vec=False, ann_min_vectors=None)
+        engine.ensure_vector_tables()
+        for i, vector in enumerate(vectors):
+            engine.insert_vector(f"c{i}", vector)
+        return engine
+
+    def test_fts_scores_are_bm25(self):
+        """测试 FTS 分数来自 bm25 且按最佳结果归一化"""
+        engine = self._engine(
+            ["python python python", "python and other words here", "javascript"],
+            [[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]]
+        )
+        results = engine._search_fts("python", 10, None)
+
+        assert [r["id"] for r in results] == ["c0", "c1"]
+        assert results[0]["fts_score"] == 1.0
+        assert 0.0 < results[1]["fts_score"] < 1.0
+        assert results[0]["bm25"] < results[1]["bm25"] < 0
+
+    def test_fusion_completes_missing_scores(self):
+        """测试只被一路召回的块补算另一路分数"""
+        engine = self._engine(
+            ["python tips", "unrelated text", "python notes"],
+            [[0.0, 1.0], [1.0, 0.0], [0.6, 0.8]]
+        )
+        results = engine.search("python", [1.0, 0.0], limit=3, fts_weight=0.5, vec_weight=0.5)
+        by_id = {r["id"]: r for r in results}
+
+        # c1 只被向量召回，FTS 分数为 0；c0 只被 FTS 召回时补算余弦相似度 0
+        assert by_id["c1"]["fts_score"] == 0.0
+        assert by_id["c1"]["vec_score"] == pytest.approx(1.0)
+        assert by_id["c2"]["vec_score"] == pytest.approx(0.6)
+        for r in results:
+            assert r["score"] == pytest.approx(0.5 * r["fts_score"] + 0.5 * r["vec_score"])
+        assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+    def test_min_score_filters(self):
+        """测试 min_score 过滤低分结果"""
+        engine = self._engine(["python", "java", "rust"], [[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]])
+        results = engine.search("python", [1.0, 0.0], limit=3, min_score=0.5)
+        assert [r["id"] for r in results] == ["c0"]
+
+    def test_adaptive_fanout_matches_exhaustive(self, monkeypatch):
+        """测试按需扩大候选数的结果与全量候选一致，且能提前结束"""
+        texts, vectors = [], []
+        for i in range(200):
+            texts.append("python " * (1 + i % 7) + f"doc{i}")
+            angle = (i * 37 % 200) / 200 * 1.5
+            vectors.append([math.cos(angle), math.sin(angle)])
+        engine = self._engine(texts, vectors)
+
+        fanouts = []
+        original = engine._search_fts
+
+        def spy(query, limit, source_filter):
+            fanouts.append(limit)
+            return original(query, limit, source_filter)
+
+        monkeypatch.setattr(engine, "_search_fts", spy)
+        adaptive = engine.search("python", [1.0, 0.0], limit=5)
+
+        exhaustive = engine._combine_results(
+            "python", [1.0, 0.0],
+            original("python", 1000, None),
+            engine.vec_engine.search([1.0, 0.0], 1000),
+            0.3, 0.7
+        )[:5]
+
+        assert [r["id"] for r in adaptive] == [r["id"] for r in exhaustive]
+        assert max(fanouts) < 200
+
+    def test_indexer_scores(self, tmp_path):
+        """测试 MemoryIndexer 的 FTS 结果使用 bm25 分数"""
+        from backend.memory.index import MemoryIndexer
+
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        (memory_dir / "a.md").write_text("gmv gmv gmv", encoding="utf-8")
+        (memory_dir / "b.md").write_text("gmv report with many other words", encoding="utf-8")
+        indexer = MemoryIndexer(db_path=tmp_path / "index.db")
+        indexer.index_directory(memory_dir)
+
+        results = indexer.search("gmv")
+        assert results[0]["path"].endswith("a.md")
+        assert results[0]["score"] == 1.0
+        assert 0.0 < results[1]["score"] < 1.0
+        indexer.close()
+
 
 class TestEdgeCases:
     """边界情况测试"""
@@ -7,6 +7,8 @@ Pytest 配置文件
 import sys
 from pathlib import Path
 
+import pytest
+
 
 def pytest_configure(config):
     """
@@ -32,3 +34,27 @@ project_root = Path(__file__).parent.parent.resolve()
 sys.path.insert(0, str(project_root))
 if str(project_root / "config") not in sys.path:
     sys.path.insert(0, str(project_root / "config"))
+
+
+@pytest.fixture(autouse=True)
+def isolated_checkpointer(monkeypatch, tmp_path):
+    """
+    每个测试使用独立的对话检查点数据库
+
+    全局共享的 checkpointer 默认持久化到存储目录，测试中改到 tmp_path，
+    并在测试结束后关闭，避免测试之间共享对话历史或写入用户目录。
+    """
+    try:
+        from backend.api.services import ba_agent as ba_agent_module
+    except Exception:
+        yield
+        return
+
+    ba_agent_module.reset_shared_memory_saver()
+    monkeypatch.setattr(
+        ba_agent_module,
+        "get_checkpoint_db_path",
+        lambda: tmp_path / "checkpoints" / "agent_checkpoints.db"
+    )
+    yield
+    ba_agent_module.reset_shared_memory_saver()
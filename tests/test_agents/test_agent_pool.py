@@ -0,0 +1,159 @@
+"""
+Agent 实例池测试
+"""
+
+import threading
+import time
+
+import pytest
+
+from backend.agents.agent_pool import AgentPool, agent_config_hash, api_key_fingerprint
+from backend.api.services.ba_agent import BAAgentService, get_shared_memory_saver
+
+
+class FakeAgent:
+    """记录 shutdown 的占位实例"""
+
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def shutdown(self):
+        self.closed = True
+
+
+class TestAgentPool:
+    """测试 LRU 实例池"""
+
+    def test_reuses_instance(self):
+        pool = AgentPool(max_size=2)
+        builds = []
+
+        def factory():
+            builds.append(1)
+            return FakeAgent("a")
+
+        key = ("m", "default", "cfg")
+        assert pool.get_or_create(key, factory) is pool.get_or_create(key, factory)
+        assert len(builds) == 1
+        status = pool.get_status()
+        assert status["hits"] == 1 and status["misses"] == 1
+
+    def test_lru_eviction_shuts_down(self):
+        pool = AgentPool(max_size=2)
+        agents = {name: FakeAgent(name) for name in "abc"}
+
+        pool.get_or_create(("a", "", ""), lambda: agents["a"])
+        pool.get_or_create(("b", "", ""), lambda: agents["b"])
+        pool.get_or_create(("a", "", ""), lambda: FakeAgent("unused"))  # a 变为最近使用
+        pool.get_or_create(("c", "", ""), lambda: agents["c"])
+
+        assert ("b", "", "") not in pool
+        assert agents["b"].closed and not agents["a"].closed
+        assert pool.get_status()["evictions"] == 1
+
+    def test_concurrent_miss_builds_once(self):
+        pool = AgentPool()
+        builds = []
+
+        def factory():
+            builds.append(1)
+            time.sleep(0.05)
+            return FakeAgent("slow")
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(pool.get_or_create(("m", "", ""), factory)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(builds) == 1
+        assert len({id(r) for r in results}) == 1
+
+    def test_key_parts(self):
+        assert api_key_fingerprint(None) == "default"
+        assert api_key_fingerprint("sk-a") != api_key_fingerprint("sk-b")
+        assert "sk-a" not in api_key_fingerprint("sk-a")
+        assert agent_config_hash({"model": "a"}) != agent_config_hash({"model": "b"})
+        assert AgentPool.make_key("m", "sk-a", {"x": 1}) == AgentPool.make_key("m", "sk-a", {"x": 1})
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key-123")
+    service = BAAgentService(model_name="glm-4.7")
+    yield service
+    service.shutdown()
+
+
+class TestServiceAgentPool:
+    """测试 BAAgentService 使用实例池"""
+
+    def test_same_model_reuses_agent(self, service):
+        first = service._create_agent_for_request("claude-a")
+        second = service._create_agent_for_request("claude-a")
+        other = service._create_agent_for_request("claude-b")
+
+        assert first is second
+        assert other is not first
+        assert service.get_status()["agent_pool"]["misses"] == 2
+
+    def test_api_key_isolated(self, service):
+        env_agent = service._create_agent_for_request("claude-a")
+        keyed = service._create_agent_for_request("claude-a", "sk-request")
+
+        assert keyed is not env_agent
+        assert keyed.llm.anthropic_api_key.get_secret_value() == "sk-request"
+        assert env_agent.llm.anthropic_api_key.get_secret_value() == "test-key-123"
+
+    def test_derived_agent_shares_immutable_parts(self, service):
+        template = service.agent
+        derived = service._create_agent_for_request("claude-a")
+
+        assert derived.config.model == "claude-a"
+        assert derived.llm.model == "claude-a"
+        assert derived.llm is not template.llm
+        assert derived.agent is not template.agent
+        assert derived.memory is get_shared_memory_saver()
+        assert derived.system_prompt is template.system_prompt
+        assert derived.skill_registry is template.skill_registry
+        assert derived.skill_tool is template.skill_tool
+        assert [t.name for t in derived.tools] == [t.name for t in template.tools]
+        assert derived.tools is not template.tools
+        assert derived.memory_watcher is None
+
+    def test_derived_agent_runs(self, service):
+        from tests.test_agents.test_async_agent import StubChatModel
+        import asyncio
+
+        derived = service._create_agent_for_request("claude-a")
+        derived.llm = StubChatModel()
+        derived._monitoring_enabled = False
+
+        result = asyncio.run(derived.ainvoke("你好", conversation_id="conv_pool"))
+        assert "完成: 你好" in result["response"]
+        # 共享 checkpointer：默认 Agent 可以读到派生 Agent 的对话
+        state = service.agent.agent.get_state({"configurable": {"thread_id": "conv_pool"}})
+        assert len(state.values["messages"]) == 2
+
+    def test_warm_up(self, service):
+        status = service.warm_up(["claude-a", "claude-b"])
+
+        assert service._ba_agent is not None
+        assert status["size"] == 2
+        service._create_agent_for_request("claude-a")
+        assert service.get_status()["agent_pool"]["hits"] == 1
+
+    def test_pool_size_from_config(self, monkeypatch, service):
+        from config import get_config
+        monkeypatch.setattr(get_config().api, "agent_pool_size", 1)
+        small = BAAgentService(model_name="glm-4.7")
+        small._ba_agent = service.agent
+
+        small._create_agent_for_request("claude-a")
+        small._create_agent_for_request("claude-b")
+        assert small.get_status()["agent_pool"]["size"] == 1
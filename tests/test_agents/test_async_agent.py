@@ -0,0 +1,313 @@
+"""
+BAAgent 异步调用路径测试
+"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+
+from backend.agents.agent import BAAgent, _is_async_tool
+from backend.agents.sync_executor import (
+    AgentSyncExecutor,
+    get_agent_sync_executor,
+    reset_agent_sync_executor,
+)
+from backend.api.services.ba_agent import BAAgentService
+
+
+class StubChatModel(BaseChatModel):
+    """本地桩 LLM：按配置延迟返回，首轮可请求一次工具调用"""
+
+    delay: float = 0.05
+    tool_name: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        if self.tool_name and not isinstance(messages[-1], ToolMessage):
+            message = AIMessage(
+                content="",
+                tool_calls=[{"name": self.tool_name, "args": {"query": "gmv"}, "id": "call_1"}],
+            )
+        else:
+            message = AIMessage(content=f"完成: {messages[-1].content}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.delay)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return self._respond(messages)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        # 流式调用时按字符输出文本
+        await asyncio.sleep(self.delay)
+        message = self._respond(messages).generations[0].message
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": 0}
+                                  for c in message.tool_calls],
+            ))
+            return
+        for char in message.content:
+            yield ChatGenerationChunk(message=AIMessageChunk(content=char))
+
+
+tool_threads: List[str] = []
+
+
+@tool
+def slow_lookup(query: str) -> str:
+    """同步工具：记录执行线程"""
+    tool_threads.append(threading.current_thread().name)
+    time.sleep(0.02)
+    return f"lookup:{query}"
+
+
+@pytest.fixture(autouse=True)
+def fresh_executor():
+    reset_agent_sync_executor()
+    tool_threads.clear()
+    yield
+    reset_agent_sync_executor()
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key-123")
+    agent = BAAgent(tools=[slow_lookup], system_prompt="测试助手")
+    agent.llm = StubChatModel()
+    agent._monitoring_enabled = False
+    yield agent
+    agent.shutdown()
+
+
+class TestAsyncInvoke:
+    """测试 BAAgent.ainvoke"""
+
+    def test_ainvoke_matches_invoke(self, agent):
+        sync_result = agent.invoke("你好", conversation_id="conv_sync")
+        async_result = asyncio.run(agent.ainvoke("你好", conversation_id="conv_async"))
+
+        assert async_result["success"] is True
+        assert async_result["response"] == sync_result["response"]
+        assert "完成: 你好" in async_result["response"]
+        state = agent.agent.get_state({"configurable": {"thread_id": "conv_async"}})
+        assert [m.type for m in state.values["messages"]] == ["human", "ai"]
+
+    def test_concurrent_conversations_overlap(self, agent):
+        agent.llm = StubChatModel(delay=0.2)
+
+        async def run():
+            return await asyncio.gather(*[
+                agent.ainvoke(f"问题{i}", conversation_id=f"conv_{i}") for i in range(20)
+            ])
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+        assert all(f"完成: 问题{i}" in r["response"] for i, r in enumerate(results))
+        # 串行需要 4 秒
+        assert elapsed < 2.0
+
+    def test_event_loop_not_blocked(self, agent):
+        agent.llm = StubChatModel(delay=0.3)
+
+        async def run():
+            lags = []
+
+            async def heartbeat():
+                while True:
+                    start = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    lags.append(time.perf_counter() - start - 0.01)
+
+            beat = asyncio.create_task(heartbeat())
+            await agent.ainvoke("你好", conversation_id="conv_beat")
+            beat.cancel()
+            return lags
+
+        lags = asyncio.run(run())
+        assert len(lags) > 10
+        assert max(lags) < 0.1
+
+    def test_sync_tools_run_on_bounded_executor(self, agent):
+        agent.llm = StubChatModel(tool_name="slow_lookup")
+
+        result = asyncio.run(agent.ainvoke("查询", conversation_id="conv_tool"))
+
+        assert "完成: lookup:gmv" in result["response"]
+        # ToolNode.invoke 在执行器线程内再分发，工具不会落在事件循环线程
+        assert tool_threads and threading.main_thread().name not in tool_threads
+        status = get_agent_sync_executor().get_status()
+        assert status["completed"] >= 2
+        assert status["active"] == 0
+
+    def test_session_id_isolated_per_invocation(self, agent):
+        seen = {}
+        prepare = agent._context_coordinator.prepare_messages
+
+        def record(messages, session_id=None):
+            seen[messages[-1].content] = session_id
+            return prepare(messages, session_id=session_id)
+
+        agent._context_coordinator.prepare_messages = record
+        agent.llm = StubChatModel(delay=0.05)
+
+        async def run():
+            await asyncio.gather(*[
+                agent.ainvoke(f"m{i}", conversation_id=f"conv_s{i}", session_id=f"s{i}")
+                for i in range(5)
+            ])
+
+        asyncio.run(run())
+        assert seen == {f"m{i}": f"s{i}" for i in range(5)}
+        assert agent._current_session_id is None
+
+    def test_error_is_reported(self, agent):
+        class BrokenModel(StubChatModel):
+            async def _agenerate(self, *args, **kwargs):
+                raise RuntimeError("upstream 529")
+
+        agent.llm = BrokenModel()
+        result = asyncio.run(agent.ainvoke("你好", conversation_id="conv_err"))
+        assert result["success"] is False
+        assert "upstream 529" in result["error"]
+
+
+class TestAstreamEvents:
+    """测试 BAAgent.astream_events"""
+
+    def _collect(self, agent, message, conversation_id):
+        async def run():
+            return [event async for event in agent.astream_events(message, conversation_id=conversation_id)]
+        return asyncio.run(run())
+
+    def test_event_sequence(self, agent):
+        agent.llm = StubChatModel(tool_name="slow_lookup")
+
+        events = self._collect(agent, "查询", "conv_stream")
+        kinds = [e["event"] for e in events]
+
+        assert kinds.index("tool_start") < kinds.index("tool_end") < kinds.index("token")
+        assert kinds[-1] == "final"
+        assert [e["node"] for e in events if e["event"] == "node"] == ["agent", "tools", "agent"]
+        assert events[kinds.index("node")]["tool_calls"][0]["name"] == "slow_lookup"
+        tool_end = events[kinds.index("tool_end")]
+        assert tool_end["name"] == "slow_lookup" and tool_end["status"] == "success"
+
+        text = "".join(e["text"] for e in events if e["event"] == "token")
+        assert text == "完成: lookup:gmv"
+        assert events[-1]["result"]["success"] is True
+        assert "完成: lookup:gmv" in events[-1]["result"]["response"]
+
+    def test_error_yields_failed_final(self, agent):
+        class BrokenModel(StubChatModel):
+            async def _astream(self, *args, **kwargs):
+                raise RuntimeError("upstream 529")
+                yield
+
+        agent.llm = BrokenModel()
+        events = self._collect(agent, "你好", "conv_stream_err")
+        assert events[-1]["event"] == "final"
+        assert events[-1]["result"]["success"] is False
+        assert "upstream 529" in events[-1]["result"]["error"]
+
+    def test_close_cancels_in_flight_tool(self, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key-123")
+        state = {"started": False, "cancelled": False, "finished": False}
+
+        @tool
+        async def long_query(query: str) -> str:
+            """原生异步的长耗时工具"""
+            state["started"] = True
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+            state["finished"] = True
+            return "done"
+
+        agent = BAAgent(tools=[long_query], system_prompt="测试助手")
+        agent.llm = StubChatModel(tool_name="long_query")
+        agent._monitoring_enabled = False
+
+        async def run():
+            stream = agent.astream_events("查询", conversation_id="conv_cancel")
+            async for event in stream:
+                if event["event"] == "tool_start":
+                    break
+            await asyncio.sleep(0.05)
+            await stream.aclose()
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        agent.shutdown()
+
+        assert time.perf_counter() - start < 2.0
+        assert state["started"] and state["cancelled"] and not state["finished"]
+        assert agent._tracer is None
+
+
+class TestSyncExecutor:
+    """测试有界同步执行器"""
+
+    def test_concurrency_is_bounded(self):
+        executor = AgentSyncExecutor(max_workers=2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+        async def run():
+            await asyncio.gather(*[executor.run(work) for _ in range(8)])
+
+        asyncio.run(run())
+        assert max(peak) == 2
+        assert executor.get_status()["completed"] == 8
+        executor.shutdown()
+
+    def test_is_async_tool(self):
+        @tool
+        async def native(query: str) -> str:
+            """原生异步工具"""
+            return query
+
+        assert _is_async_tool(native)
+        assert not _is_async_tool(slow_lookup)
+
+
+class TestServiceQuery:
+    """测试 BAAgentService.query 使用异步路径"""
+
+    def test_query_uses_ainvoke(self, agent):
+        service = BAAgentService(model_name="stub")
+        service._ba_agent = agent
+        agent.invoke = None  # 同步路径不应被调用
+
+        result = asyncio.run(service.query("你好"))
+
+        assert "完成: 你好" in result["response"]
+        assert service.get_conversation(result["conversation_id"])["message_count"] == 1
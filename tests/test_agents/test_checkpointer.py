@@ -0,0 +1,201 @@
+"""
+有界 SQLite checkpointer 测试
+"""
+
+import asyncio
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.memory import MemorySaver
+
+from backend.agents.agent import BAAgent
+from backend.agents.checkpointer import BoundedSqliteSaver
+from backend.agents.sync_executor import reset_agent_sync_executor
+from backend.api.services.ba_agent import get_shared_memory_saver, reset_shared_memory_saver
+from tests.test_agents.test_async_agent import StubChatModel
+
+
+def make_checkpoint(value):
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = str(uuid6())
+    checkpoint["channel_values"] = {"messages": [value]}
+    checkpoint["channel_versions"] = {"messages": 1}
+    return checkpoint
+
+
+def put(saver, thread_id, value, parent_id=None):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    if parent_id:
+        config["configurable"]["checkpoint_id"] = parent_id
+    return saver.put(config, make_checkpoint(value), {"source": "loop", "step": 0}, {})
+
+
+def latest(thread_id):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / "checkpoints" / "agent_checkpoints.db"
+
+
+@pytest.fixture
+def saver(db_path):
+    saver = BoundedSqliteSaver.open(db_path, keep_checkpoints=3, hot_threads=2)
+    saver.setup()
+    yield saver
+    saver.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_executor():
+    reset_agent_sync_executor()
+    yield
+    reset_agent_sync_executor()
+
+
+class TestBoundedSqliteSaver:
+    """测试检查点读写、清理和热线程缓存"""
+
+    def test_wal_enabled(self, saver):
+        assert saver.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_round_trip_and_reopen(self, saver, db_path):
+        put(saver, "t1", "hello")
+
+        assert saver.get_tuple(latest("t1")).checkpoint["channel_values"]["messages"] == ["hello"]
+
+        saver.close()
+        reopened = BoundedSqliteSaver.open(db_path)
+        reopened.setup()
+        try:
+            restored = reopened.get_tuple(latest("t1"))
+            assert restored.checkpoint["channel_values"]["messages"] == ["hello"]
+            assert restored.metadata["step"] == 0
+        finally:
+            reopened.close()
+
+    def test_prunes_to_latest_checkpoints(self, saver):
+        parent = None
+        ids = []
+        for i in range(6):
+            parent = put(saver, "t1", f"v{i}", parent)["configurable"]["checkpoint_id"]
+            ids.append(parent)
+            saver.put_writes({"configurable": {**latest("t1")["configurable"], "checkpoint_id": parent}},
+                             [("messages", f"w{i}")], task_id=f"task{i}")
+        put(saver, "t2", "other")
+
+        kept = [t.config["configurable"]["checkpoint_id"] for t in saver.list(latest("t1"))]
+        assert kept == list(reversed(ids[-3:]))
+        writes = saver.conn.execute("SELECT COUNT(*) FROM writes WHERE thread_id = 't1'").fetchone()[0]
+        assert writes == 3
+        stats = saver.get_stats()
+        assert stats["checkpoints"] == 4 and stats["threads"] == 2 and stats["pruned"] == 3
+
+    def test_hot_cache_serves_latest(self, saver):
+        put(saver, "t1", "a")
+        saver.conn.execute("DELETE FROM checkpoints")  # 命中缓存时不查询数据库
+
+        cached = saver.get_tuple(latest("t1"))
+        assert cached.checkpoint["channel_values"]["messages"] == ["a"]
+        assert saver.get_stats()["hot_hits"] == 1
+
+    def test_hot_cache_returns_copies(self, saver):
+        put(saver, "t1", "a")
+
+        first = saver.get_tuple(latest("t1"))
+        first.checkpoint["versions_seen"]["agent"] = {"messages": 1}
+        first.checkpoint["channel_values"]["messages"] = ["changed"]
+
+        second = saver.get_tuple(latest("t1"))
+        assert second.checkpoint["versions_seen"] == {}
+        assert second.checkpoint["channel_values"]["messages"] == ["a"]
+
+    def test_hot_cache_lru_bounded(self, saver):
+        for thread_id in ("t1", "t2", "t3"):
+            put(saver, thread_id, thread_id)
+
+        assert saver.get_stats()["hot_cached"] == 2
+        # t1 已被淘汰，从数据库读取后重新缓存
+        assert saver.get_tuple(latest("t1")).checkpoint["channel_values"]["messages"] == ["t1"]
+        assert saver.get_stats()["hot_misses"] == 1
+
+    def test_put_writes_invalidates_cache(self, saver):
+        saved = put(saver, "t1", "a")
+        saver.put_writes(saved, [("messages", "pending")], task_id="task1")
+
+        result = saver.get_tuple(latest("t1"))
+        assert result.pending_writes == [("task1", "messages", "pending")]
+
+    def test_delete_thread(self, saver):
+        put(saver, "t1", "a")
+        saver.delete_thread("t1")
+
+        assert saver.get_tuple(latest("t1")) is None
+
+    def test_async_methods(self, saver):
+        async def run():
+            saved = await saver.aput(latest("t1"), make_checkpoint("a"), {"step": 0}, {})
+            await saver.aput_writes(saved, [("messages", "pending")], task_id="task1")
+            result = await saver.aget_tuple(latest("t1"))
+            listed = [t async for t in saver.alist(latest("t1"))]
+            await saver.adelete_thread("t1")
+            return result, listed, await saver.aget_tuple(latest("t1"))
+
+        result, listed, deleted = asyncio.run(run())
+        assert result.pending_writes == [("task1", "messages", "pending")]
+        assert len(listed) == 1
+        assert deleted is None
+
+
+class TestAgentWithSqliteCheckpointer:
+    """测试 Agent 图使用 SQLite checkpointer"""
+
+    def _agent(self, saver, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key-123")
+        agent = BAAgent.__new__(BAAgent)
+        agent._memory = saver
+        agent.__init__(tools=[], system_prompt="测试助手")
+        agent.llm = StubChatModel(delay=0)
+        agent._monitoring_enabled = False
+        return agent
+
+    def test_conversation_survives_restart(self, db_path, monkeypatch):
+        saver = BoundedSqliteSaver.open(db_path, keep_checkpoints=2)
+        saver.setup()
+        agent = self._agent(saver, monkeypatch)
+        asyncio.run(agent.ainvoke("第一轮", conversation_id="conv_db"))
+        agent.invoke("第二轮", conversation_id="conv_db")
+        agent.shutdown()
+        saver.close()
+
+        saver = BoundedSqliteSaver.open(db_path, keep_checkpoints=2)
+        agent = self._agent(saver, monkeypatch)
+        try:
+            state = agent.agent.get_state({"configurable": {"thread_id": "conv_db"}})
+            assert [m.type for m in state.values["messages"]] == ["human", "ai", "human", "ai"]
+            assert len(list(saver.list({"configurable": {"thread_id": "conv_db"}}))) == 2
+        finally:
+            agent.shutdown()
+            saver.close()
+
+
+class TestSharedCheckpointer:
+    """测试全局共享 checkpointer 的配置"""
+
+    def test_default_is_sqlite(self, monkeypatch):
+        from config import get_config
+        monkeypatch.setattr(get_config().api, "checkpoint_keep_per_thread", 5)
+
+        saver = get_shared_memory_saver()
+        assert isinstance(saver, BoundedSqliteSaver)
+        assert saver.keep_checkpoints == 5
+        assert get_shared_memory_saver() is saver
+
+    def test_memory_backend(self, monkeypatch):
+        from config import get_config
+        monkeypatch.setattr(get_config().api, "checkpoint_backend", "memory")
+        reset_shared_memory_saver()
+
+        assert isinstance(get_shared_memory_saver(), MemorySaver)
@@ -219,6 +219,68 @@ class TestMemoryFlushIntegration:
                 assert agent.session_tokens == 450
 
 
+    def test_background_flush_compresses_without_waiting(self):
+        """测试后台 flush：提取未完成时上下文已压缩，同一周期只调度一次"""
+        import threading
+        from langchain_core.messages import HumanMessage
+        from backend.memory.flush import MemoryFlushWorker
+
+        with patch('backend.agents.agent.get_config') as mock_get_config:
+            mock_config = Mock()
+            mock_config.memory.enabled = True
+            mock_config.memory.flush.enabled = True
+            mock_config.memory.flush.background = True
+            mock_config.memory.flush.soft_threshold_tokens = 100
+            mock_config.memory.flush.reserve_tokens_floor = 50
+            mock_config.memory.flush.min_memory_count = 1
+            mock_config.memory.flush.max_memory_age_hours = 24.0
+            mock_config.memory.flush.llm_model = "glm-4.7-flash"
+            mock_config.memory.flush.llm_timeout = 30
+            mock_config.memory.memory_dir = tempfile.mkdtemp()
+            mock_config.memory.watcher.enabled = False
+            mock_config.llm.model = "claude-3-5-sonnet-20241022"
+            mock_config.llm.temperature = 0.7
+            mock_config.llm.max_tokens = 4096
+            mock_config.llm.timeout = 120
+            mock_config.llm.provider = "anthropic"
+            mock_get_config.return_value = mock_config
+
+            with patch('backend.agents.agent.os.environ.get', return_value="test-key"):
+                agent = BAAgent()
+
+            release = threading.Event()
+
+            def slow_extract(messages):
+                release.wait(5)
+                return [m["content"] for m in messages]
+
+            agent.memory_flush.extractor.extract_from_messages = slow_extract
+            agent.token_counter = Mock()
+            agent.token_counter.count_messages.return_value = 4000
+            agent.agent = Mock()
+            agent.agent.get_state.return_value = Mock(messages={"messages": ["m1", "m2"]})
+            agent.context_manager = Mock()
+            agent.context_manager.compress.return_value = ["m2"]
+            worker = MemoryFlushWorker()
+
+            with patch('backend.agents.agent.get_memory_flush_worker', return_value=worker):
+                agent.session_tokens = 4000
+                result = agent._check_and_flush(
+                    "conv_123", [HumanMessage(content="记住：后台提取的记忆")], 4000
+                )
+
+                assert result["scheduled"] is True and result["cycle"] == 0
+                assert not result["future"].done()
+                agent.agent.update_state.assert_called_once()
+                assert agent.session_tokens == 0
+                assert agent.compaction_count == 1
+
+                release.set()
+                assert result["future"].result(timeout=5)["flushed"] is True
+                assert worker.get_status()["flushed"] == 1
+            worker.shutdown()
+
+
 class TestMemoryFlushConfigModel:
     """测试 MemoryFlush 配置模型"""
 
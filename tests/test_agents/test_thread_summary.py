@@ -0,0 +1,166 @@
+"""
+线程状态摘要测试
+"""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.agents.agent import BAAgent
+from backend.agents.sync_executor import reset_agent_sync_executor
+from backend.agents.thread_summary import ThreadSummaryStore
+from tests.test_agents.test_async_agent import StubChatModel, slow_lookup
+
+
+class CountingCounter:
+    """按字符计数并记录调用次数的 token 计数器"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def count_messages(self, messages):
+        self.calls += 1
+        return sum(len(m.content) for m in messages)
+
+
+class TestThreadSummaryStore:
+    """测试摘要存储"""
+
+    def test_record_ignores_unknown_thread(self):
+        store = ThreadSummaryStore()
+        store.record("t1", [HumanMessage(content="abc")], CountingCounter())
+
+        assert store.get("t1") is None
+
+    def test_sync_then_incremental(self):
+        store = ThreadSummaryStore()
+        counter = CountingCounter()
+        history = [HumanMessage(content="ab"), AIMessage(content="cde")]
+
+        summary = store.sync("t1", history, counter)
+        assert (summary.message_count, summary.token_total) == (2, 5)
+
+        new = [HumanMessage(content="f"), AIMessage(content="gh")]
+        store.record("t1", new, counter)
+        counter.calls = 0
+        summary = store.sync("t1", history + new, counter)
+
+        assert (summary.message_count, summary.token_total) == (4, 8)
+        assert counter.calls == 0  # 消息数一致，不重新计数
+        assert store.get_stats()["recounts"] == 1
+
+    def test_sync_recounts_on_mismatch(self):
+        store = ThreadSummaryStore()
+        counter = CountingCounter()
+        store.sync("t1", [HumanMessage(content="ab")], counter)
+
+        summary = store.sync("t1", [HumanMessage(content="ab"), AIMessage(content="c")], counter)
+        assert (summary.message_count, summary.token_total) == (2, 3)
+
+    def test_mark_compacted_forces_recount(self):
+        store = ThreadSummaryStore()
+        counter = CountingCounter()
+        messages = [HumanMessage(content="ab"), AIMessage(content="c")]
+        store.sync("t1", messages, counter)
+
+        store.mark_compacted("t1", cycle=3)
+        summary = store.get("t1")
+        assert summary.last_compaction_cycle == 3 and summary.last_compaction_at is not None
+        assert not summary.synced
+
+        counter.calls = 0
+        assert store.sync("t1", messages, counter).synced
+        assert counter.calls == 1
+
+    def test_lru_bounded(self):
+        store = ThreadSummaryStore(max_threads=2)
+        for thread_id in ("t1", "t2", "t3"):
+            store.sync(thread_id, [], None)
+
+        assert len(store) == 2
+        assert store.get("t1") is None
+
+    def test_get_returns_copy(self):
+        store = ThreadSummaryStore()
+        store.sync("t1", [HumanMessage(content="a")], None)
+        store.get("t1").message_count = 99
+
+        assert store.get("t1").message_count == 1
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    reset_agent_sync_executor()
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key-123")
+    agent = BAAgent(tools=[slow_lookup], system_prompt="测试助手")
+    agent.llm = StubChatModel(delay=0)
+    agent._monitoring_enabled = False
+    yield agent
+    agent.shutdown()
+    reset_agent_sync_executor()
+
+
+def state_messages(agent, conversation_id):
+    return agent.agent.get_state({"configurable": {"thread_id": conversation_id}}).values["messages"]
+
+
+class TestAgentThreadSummary:
+    """测试 Agent 调用路径使用摘要"""
+
+    def test_summary_tracks_graph_state(self, agent):
+        agent.llm = StubChatModel(delay=0, tool_name="slow_lookup")
+        for i in range(3):
+            asyncio.run(agent.ainvoke(f"问题{i}", conversation_id="conv_sum"))
+
+        messages = state_messages(agent, "conv_sum")
+        summary = agent.get_thread_summary("conv_sum")
+        assert summary.message_count == len(messages) == 12
+        assert summary.token_total == agent.token_counter.count_messages(messages)
+        # 只有首轮完整计数，之后由节点增量更新
+        assert agent.thread_summaries.get_stats()["recounts"] == 1
+
+    def test_invoke_skips_get_state(self, agent, monkeypatch):
+        agent.invoke("你好", conversation_id="conv_nostate")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("invoke 不应加载完整状态")
+
+        monkeypatch.setattr(agent.agent, "get_state", fail)
+        monkeypatch.setattr(agent.agent, "aget_state", fail)
+
+        assert agent.invoke("继续", conversation_id="conv_nostate")["success"] is True
+        assert asyncio.run(agent.ainvoke("再继续", conversation_id="conv_nostate"))["success"] is True
+
+        async def stream():
+            return [e async for e in agent.astream_events("流式", conversation_id="conv_nostate")]
+
+        final = asyncio.run(stream())[-1]
+        assert final["result"]["success"] is True
+        assert agent.get_thread_summary("conv_nostate").message_count == 8
+
+    def test_flush_receives_only_new_messages(self, agent, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            agent, "_check_and_flush",
+            lambda conversation_id, messages, current_tokens, total_tokens=None:
+                calls.append(([m.content for m in messages], total_tokens))
+        )
+
+        agent.invoke("第一轮", conversation_id="conv_flush")
+        agent.invoke("第二轮", conversation_id="conv_flush")
+
+        assert calls[1][0] == ["第二轮", "完成: 第二轮"]
+        assert calls[1][1] == agent.token_counter.count_messages(state_messages(agent, "conv_flush"))
+
+    def test_compaction_decision_uses_summary(self, agent, monkeypatch):
+        agent.invoke("你好", conversation_id="conv_small")
+        monkeypatch.setattr(agent.agent, "get_state", lambda config: pytest.fail("不应加载状态"))
+
+        assert agent._compact_conversation("conv_small", keep_recent=10) is False
+
+    def test_reset_conversation_discards_summary(self, agent):
+        agent.invoke("你好", conversation_id="conv_reset")
+        agent.reset_conversation("conv_reset")
+
+        assert agent.get_thread_summary("conv_reset") is None
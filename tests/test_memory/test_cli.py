@@ -26,6 +26,26 @@ class TestMemoryCLI:
         assert result.exit_code == 0
         assert "重建记忆索引" in result.output
 
+    def test_index_command_rebuild(self):
+        """测试 index 命令整体重建目录"""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            memory_dir = Path("memory")
+            memory_dir.mkdir()
+            (memory_dir / "2026-01-01.md").write_text("GMV 异常检测\n完成", encoding="utf-8")
+            (memory_dir / "MEMORY.md").write_text("长期记忆", encoding="utf-8")
+
+            result = runner.invoke(memory, [
+                "index",
+                "--memory-dir", str(memory_dir),
+                "--index-path", "idx/memory.db",
+                "--rebuild"
+            ])
+
+            assert result.exit_code == 0, result.output
+            assert "索引完成" in result.output
+            assert "文件数: 2" in result.output
+
     def test_search_command_help(self):
         """测试 search 命令帮助"""
         runner = CliRunner()
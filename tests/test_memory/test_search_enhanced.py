@@ -164,6 +164,73 @@ class TestFileRefIndex:
         assert len(result_refs) == 1
 
 
+class TestFileRefIndexBulkLookup:
+    """测试批量查询、覆盖索引和按 chunk 缓存"""
+
+    def test_covering_indexes(self, file_ref_index):
+        with file_ref_index._connection() as db:
+            names = {row[0] for row in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'chunk_file_refs'"
+            )}
+            plan = " ".join(row[3] for row in db.execute(
+                "EXPLAIN QUERY PLAN SELECT chunk_id, file_id, category, metadata "
+                "FROM chunk_file_refs WHERE chunk_id IN (?, ?) ORDER BY chunk_id, created_at DESC, id",
+                ("a", "b")
+            ))
+        assert "idx_chunk_file_refs_chunk_cover" in names
+        assert "idx_chunk_file_refs_file_category" in names
+        assert "idx_chunk_file_refs_chunk_id" not in names
+        assert "COVERING INDEX idx_chunk_file_refs_chunk_cover" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_cached_lookup_skips_query(self, file_ref_index, sample_file_refs):
+        file_ref_index.add_file_refs_to_chunk("chunk_1", sample_file_refs)
+        first = file_ref_index.get_file_refs_for_chunks(["chunk_1", "chunk_2"])
+
+        statements = []
+        with file_ref_index._connection() as db:
+            db.set_trace_callback(statements.append)
+        second = file_ref_index.get_file_refs_for_chunks(["chunk_2", "chunk_1"])
+        with file_ref_index._connection() as db:
+            db.set_trace_callback(None)
+
+        assert second == first
+        assert not any("chunk_file_refs" in sql for sql in statements)
+        stats = file_ref_index.get_cache_stats()
+        assert (stats["hits"], stats["misses"]) == (2, 2)
+
+    def test_write_from_other_instance_invalidates(self, temp_db_path, file_ref_index):
+        refs = [FileRef(file_id="artifact_1", category=FileCategory.ARTIFACT)]
+        assert file_ref_index.get_file_refs_for_chunk("chunk_1") == []
+
+        other = FileRefIndex(temp_db_path)
+        other.add_file_refs_to_chunk("chunk_1", refs)
+        assert len(file_ref_index.get_file_refs_for_chunk("chunk_1")) == 1
+
+        other.remove_file_refs_for_chunk("chunk_1")
+        assert file_ref_index.get_file_refs_for_chunk("chunk_1") == []
+        other.close()
+        file_ref_index.close()
+
+    def test_large_page_is_batched(self, file_ref_index):
+        refs = [FileRef(file_id="artifact_1", category=FileCategory.ARTIFACT)]
+        for i in range(0, 1200, 100):
+            file_ref_index.add_file_refs_to_chunk(f"chunk_{i}", refs)
+
+        result = file_ref_index.get_file_refs_for_chunks([f"chunk_{i}" for i in range(1200)])
+        assert len(result) == 1200
+        assert sum(len(v) for v in result.values()) == 12
+
+    def test_shared_instance(self, temp_db_path):
+        from backend.memory.search_enhanced import reset_file_ref_indexes
+
+        index = get_file_ref_index(temp_db_path)
+        assert get_file_ref_index(temp_db_path) is index
+        reset_file_ref_indexes()
+        assert get_file_ref_index(temp_db_path) is not index
+        reset_file_ref_indexes()
+
+
 class TestFileRefSearchResult:
     """测试文件引用搜索结果"""
 
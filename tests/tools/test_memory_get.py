@@ -218,5 +218,39 @@ class TestRecentLogs:
             mg.MEMORY_DIR = original_dir
 
 
+    def test_recent_logs_stop_at_max_length(self, memory_dir_with_logs, monkeypatch):
+        """测试达到长度上限后不再读取更早的日志"""
+        mg = _get_memory_get_module()
+        monkeypatch.setattr(mg, "MEMORY_DIR", memory_dir_with_logs)
+
+        chunks = list(mg.iter_recent_logs(3, max_length=30))
+        assert len(chunks) == 1
+        assert chunks[0].endswith("... (已截断)")
+
+        full = list(mg.iter_recent_logs(3))
+        assert len(full) == 3
+        assert "内容2" in full[2]
+
+
+class TestLineRangeReads:
+    """测试按行号读取大文件"""
+
+    def test_line_range_on_large_file(self, tmp_path, monkeypatch):
+        mg = _get_memory_get_module()
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        (memory_dir / "MEMORY.md").write_text(
+            "".join(f"记忆第{i}行\n" for i in range(1, 5001)), encoding="utf-8"
+        )
+        monkeypatch.setattr(mg, "MEMORY_DIR", memory_dir)
+
+        result = memory_get("MEMORY.md", line_start=100, line_end=102)
+        assert result == "记忆第100行\n记忆第101行\n记忆第102行\n"
+
+        result = memory_get("MEMORY.md", line_start=4000, max_length=10)
+        assert result.startswith("记忆第4000行\n记\n")
+        assert "内容已截断" in result
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
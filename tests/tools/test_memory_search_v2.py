@@ -2,6 +2,7 @@
 Memory Search v2 测试
 """
 
+import importlib
 import sqlite3
 import pytest
 from pathlib import Path
@@ -198,6 +199,24 @@ class TestSearchFTS:
         assert len(results) == 1
         assert results[0]["id"] == "chunk1"
 
+    def test_search_fts_cjk_index(self, tmp_path):
+        """测试有 CJK 影子表时中文查询走倒排索引"""
+        from backend.memory.index import MemoryIndexer
+
+        memory_dir = tmp_path / "memory"
+        memory_dir.mkdir()
+        (memory_dir / "a.md").write_text("本周 GMV 异常下降", encoding="utf-8")
+        (memory_dir / "b.md").write_text("用户留存分析", encoding="utf-8")
+        indexer = MemoryIndexer(db_path=tmp_path / "test.db")
+        indexer.index_directory(memory_dir)
+
+        results = _search_fts(indexer.db, "异常 GMV", 10, 0.0, "all", use_cjk_index=True)
+
+        assert len(results) == 1
+        assert "异常" in results[0]["text"]
+        assert results[0]["score"] == 1.0
+        indexer.close()
+
 
 class TestMemorySearchV2:
     """测试 memory_search_v2 函数"""
@@ -215,6 +234,46 @@ class TestMemorySearchV2:
         # 当索引不存在时，搜索会返回空结果
         assert "未找到" in result or "no results" in result.lower()
 
+    def test_hybrid_search_does_not_write_index(self, tmp_path, monkeypatch):
+        """测试混合搜索不写入临时查询向量"""
+        from backend.memory import ensure_memory_index_schema, VectorSearchEngine
+        from backend.memory.sharded_search import reset_sharded_search_executor
+        search_module = importlib.import_module("backend.memory.tools.memory_search_v2")
+
+        db_path = tmp_path / "memory.db"
+        db = sqlite3.connect(db_path)
+        ensure_memory_index_schema(db)
+        db.execute(
+            "INSERT INTO chunks (id, path, source, start_line, end_line, hash, text, updated_at) "
+            "VALUES ('c1', 'memory/a.md', 'memory', 1, 1, 'h', 'python decorators', 0)"
+        )
+        engine = VectorSearchEngine(db, dims=2, use_sqlite_vec=False)
+        engine.ensure_vector_tables()
+        engine.insert_vector("c1", [1.0, 0.0])
+        db.commit()
+        db.close()
+
+        class StubProvider:
+            def encode_single(self, text):
+                return [1.0, 0.0]
+
+        monkeypatch.setattr(
+            "backend.memory.index_rotation.get_all_index_paths", lambda: [db_path]
+        )
+        monkeypatch.setattr(
+            search_module, "get_embedding_provider", lambda **kwargs: StubProvider()
+        )
+        reset_sharded_search_executor()
+
+        result = memory_search_v2("python", min_score=0.0)
+
+        assert "memory/a.md" in result
+        db = sqlite3.connect(db_path)
+        rows = db.execute("SELECT chunk_id FROM chunk_vectors").fetchall()
+        db.close()
+        assert rows == [("c1",)]
+        reset_sharded_search_executor()
+
     def test_empty_query(self):
         """测试空查询"""
         # 测试模型验证